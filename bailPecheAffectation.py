@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# Ce script permet l'affectation groupée de parcelles à un droit de pêche depuis la carte.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+from PyQt5.QtCore import (Qt)
+from PyQt5.QtGui import (QBrush, QColor, QCursor)
+from PyQt5.QtWidgets import (QAbstractItemView, QApplication, QCheckBox, QDialog, QDoubleSpinBox, QHBoxLayout, QHeaderView, QLabel,
+    QMessageBox, QPushButton, QRadioButton, QSizePolicy, QSpacerItem, QTableWidget, QTableWidgetItem, QVBoxLayout)
+from qgis.core import (QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsGeometry, QgsPointXY, QgsProject, QgsWkbTypes)
+from qgis.gui import (QgsMapToolEmitPoint, QgsMessageBar, QgsRubberBand)
+
+# Import des fonctions communes aux formulaires (recherche des couches de la légende)
+from .commonDialogs import (Gedopi_common)
+
+# Import des services spatiaux (accrochage aux cours d'eau, graphe du réseau hydrographique)
+from .commonSpatial import (Gedopi_accrochage, Gedopi_reseau)
+
+# Import de la recherche et de l'affectation des parcelles des droits de pêche
+from .bailPecheSpatial import (Parcelle_bail)
+
+class Affectation_parcelle_dialog(QDialog):
+    '''
+    Fenêtre d'affectation groupée de parcelles à un droit de pêche.
+
+    Les parcelles candidates sont celles situées à moins d'une distance donnée du tronçon de cours d'eau compris entre
+    deux clics (chemin suivant le réseau hydrographique), ou celles intersectant un polygone dessiné.
+    Les parcelles déjà liées à un autre droit de pêche sont signalées et ne sont réaffectées que sur demande ;
+    l'affectation est faite par un seul UPDATE. La fenêtre n'est pas modale afin de laisser la carte accessible.
+
+    :param QDialog: Permet d'afficher l'interface graphique comme une fenêtre indépendante
+    :type QDialog: QDialog
+    '''
+    def __init__(self, iface, db, dbSchema, bope_id, parent = None):
+        '''
+        Constructeur, construction de la fenêtre
+
+        :param iface: interface QGIS, fournit le canevas de la carte
+        :type iface: QgsInterface
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+
+        :param bope_id: identifiant du droit de pêche
+        :type bope_id: int
+        '''
+        QDialog.__init__(self, parent)
+        self.iface = iface
+        self.mc = self.iface.mapCanvas()
+        self.db = db
+        self.dbSchema = dbSchema
+        self.bope_id = bope_id
+        self.gc = Gedopi_common(self)
+        self.parcelleBail = Parcelle_bail(db, dbSchema)
+        self.accrochage = Gedopi_accrochage(db, dbSchema)
+        self.setWindowTitle(u"Affectation de parcelles au droit de pêche n° " + str(bope_id))
+
+        self.clickTool = QgsMapToolEmitPoint(self.mc)
+        self.outilPrecedent = None
+        self.bande = QgsRubberBand(self.mc, QgsWkbTypes.LineGeometry)
+        self.bande.setColor(QColor(255, 0, 0, 150))
+        self.bande.setWidth(2)
+        self.points = []
+        self.candidats = []
+        # Droits de pêche dont les parcelles ont changé, relus par le formulaire après l'affectation
+        self.modifies = []
+
+        self.rdbTroncon = QRadioButton(u"Tronçon de cours d'eau (clic amont et clic aval)", self)
+        self.rdbPolygone = QRadioButton(u"Polygone (clic droit pour terminer)", self)
+        self.rdbTroncon.setChecked(True)
+        self.spnTampon = QDoubleSpinBox(self)
+        self.spnTampon.setRange(0, 1000)
+        self.spnTampon.setDecimals(0)
+        self.spnTampon.setValue(20)
+        self.spnTampon.setSuffix(" m")
+        self.btnSaisie = QPushButton(u"Saisir sur la carte", self)
+        self.btnSaisie.setCheckable(True)
+        self.lblBilan = QLabel("", self)
+        self.lblBilan.setWordWrap(True)
+        self.tbwCandidats = QTableWidget(0, 2, self)
+        self.tbwCandidats.setHorizontalHeaderLabels([u"Parcelle", u"Droit de pêche actuel"])
+        self.tbwCandidats.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbwCandidats.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tbwCandidats.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.chkReaffecter = QCheckBox(u"Réaffecter les parcelles liées à un autre droit de pêche", self)
+        self.btnAffecter = QPushButton(u"Affecter", self)
+        self.btnAffecter.setEnabled(False)
+        self.btnFermer = QPushButton(u"Fermer", self)
+
+        tampon = QHBoxLayout()
+        tampon.addWidget(QLabel(u"Distance au cours d'eau :", self))
+        tampon.addWidget(self.spnTampon)
+        tampon.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        tampon.addWidget(self.btnSaisie)
+        boutons = QHBoxLayout()
+        boutons.addWidget(self.btnAffecter)
+        boutons.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons.addWidget(self.btnFermer)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.rdbTroncon)
+        layout.addWidget(self.rdbPolygone)
+        layout.addLayout(tampon)
+        layout.addWidget(self.lblBilan)
+        layout.addWidget(self.tbwCandidats)
+        layout.addWidget(self.chkReaffecter)
+        layout.addLayout(boutons)
+        self.resize(420, 420)
+
+        self.rdbTroncon.toggled.connect(self.changeMode)
+        self.btnSaisie.toggled.connect(self.saisie)
+        self.btnAffecter.clicked.connect(self.affecter)
+        self.btnFermer.clicked.connect(self.reject)
+
+    def changeMode(self, troncon):
+        '''La distance ne s'applique qu'au tronçon de cours d'eau, une saisie en cours est abandonnée'''
+
+        self.spnTampon.setEnabled(troncon)
+        self.btnSaisie.setChecked(False)
+
+    def saisie(self, actif):
+        '''
+        Active ou désactive la saisie sur la carte
+
+        :param actif: état du bouton de saisie
+        :type actif: bool
+        '''
+        if actif:
+            self.points = []
+            self.bande.reset(QgsWkbTypes.LineGeometry if self.rdbTroncon.isChecked() else QgsWkbTypes.PolygonGeometry)
+            self.outilPrecedent = self.mc.mapTool()
+            self.clickTool.canvasClicked.connect(self.clic)
+            self.mc.setMapTool(self.clickTool)
+        else:
+            self.clickTool.canvasClicked.disconnect(self.clic)
+            if self.mc.mapTool() == self.clickTool:
+                self.mc.unsetMapTool(self.clickTool)
+                if self.outilPrecedent is not None:
+                    self.mc.setMapTool(self.outilPrecedent)
+
+    def clic(self, point, bouton):
+        '''
+        Récupère les clics sur le canevas
+
+        :param point: point cliqué, dans le système du canevas
+        :type point: QgsPointXY
+
+        :param bouton: bouton de la souris
+        :type bouton: Qt.MouseButton
+        '''
+        if bouton == Qt.RightButton:
+            if self.rdbPolygone.isChecked() and len(self.points) >= 3:
+                self.btnSaisie.setChecked(False)
+                self.recherche(QgsGeometry.fromPolygonXY([self.versL93(self.points)]), 0)
+            return
+        self.points.append(QgsPointXY(point))
+        self.bande.addPoint(QgsPointXY(point))
+        if self.rdbTroncon.isChecked() and len(self.points) == 2:
+            self.btnSaisie.setChecked(False)
+            troncon = self.troncon()
+            if troncon is not None:
+                self.recherche(troncon, self.spnTampon.value())
+
+    def versL93(self, points):
+        '''Renvoi les points du canevas reprojetés en Lambert 93 (EPSG:2154)'''
+
+        crsSrc = self.mc.mapSettings().destinationCrs()
+        crsDest = QgsCoordinateReferenceSystem("EPSG:2154")
+        if crsSrc == crsDest:
+            return [QgsPointXY(point) for point in points]
+        xform = QgsCoordinateTransform(crsSrc, crsDest, QgsProject.instance())
+        return [xform.transform(point) for point in points]
+
+    def troncon(self):
+        '''
+        Renvoi le tronçon de cours d'eau entre les deux points cliqués, en suivant le réseau hydrographique
+
+        :return: None si les points ne sont pas reliés par le réseau
+        :rtype: QgsGeometry
+        '''
+        reseau = Gedopi_reseau.ouvrir(self.db, self.dbSchema)
+        if reseau is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Graphe du réseau hydrographique indisponible : " + Gedopi_reseau.derniereErreur, level= QgsMessageBar.CRITICAL, duration = 5)
+            return None
+        point1, point2 = self.versL93(self.points)
+        accroche_1 = self.accrochage.accroche(point1)
+        accroche_2 = self.accrochage.accroche(point2)
+        if accroche_1 is None or accroche_2 is None:
+            chemin = reseau.chemin(point1, point2)
+        else:
+            chemin = reseau.chemin(accroche_1[0], accroche_2[0], accroche_1[1], accroche_2[1])
+        if chemin is None:
+            self.iface.messageBar().pushMessage("Erreur : ", reseau.erreur + " !", level= QgsMessageBar.CRITICAL, duration = 5)
+            return None
+        return QgsGeometry.fromPolylineXY(chemin[1])
+
+    def recherche(self, geometrie, tampon):
+        '''
+        Recherche et affiche les parcelles candidates
+
+        :param geometrie: tronçon ou polygone en Lambert 93
+        :type geometrie: QgsGeometry
+
+        :param tampon: distance en mètre, 0 pour les parcelles intersectant la géométrie
+        :type tampon: float
+        '''
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        candidats = self.parcelleBail.candidats(geometrie.asWkt(), tampon)
+        QApplication.restoreOverrideCursor()
+        if candidats is None:
+            QMessageBox.critical(self, u"Erreur SQL", self.parcelleBail.erreur, QMessageBox.Ok)
+            return
+        self.candidats = candidats
+        self.tbwCandidats.setRowCount(len(candidats))
+        conflits = 0
+        dejaLiees = 0
+        for row, (par_id, bope_id) in enumerate(candidats):
+            self.tbwCandidats.setItem(row, 0, QTableWidgetItem(par_id))
+            if bope_id is None:
+                texte = ""
+            elif bope_id == self.bope_id:
+                texte = u"ce droit de pêche"
+                dejaLiees += 1
+            else:
+                texte = u"n° " + str(bope_id)
+                conflits += 1
+            item = QTableWidgetItem(texte)
+            if bope_id is not None and bope_id != self.bope_id:
+                item.setForeground(QBrush(QColor(200, 0, 0)))
+            self.tbwCandidats.setItem(row, 1, item)
+        self.lblBilan.setText(str(len(candidats)) + u" parcelle(s) candidate(s), dont " + str(dejaLiees) + u" déjà liée(s) à ce droit de pêche et " +
+            str(conflits) + u" liée(s) à un autre droit de pêche")
+        self.btnAffecter.setEnabled(len(candidats) - dejaLiees > 0)
+
+        # Sélection des candidates sur la couche des parcelles
+        layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
+        if layer:
+            layer.selectByIds(self.parcelleBail.identifiants(layer, [par_id for par_id, bope_id in candidats]))
+
+    def affecter(self):
+        '''Lie les parcelles candidates au droit de pêche en une requête'''
+
+        reaffecter = self.chkReaffecter.isChecked()
+        parIds = [par_id for par_id, bope_id in self.candidats if bope_id != self.bope_id and (reaffecter or bope_id is None)]
+        if len(parIds) == 0:
+            QMessageBox.information(self, u"Affectation", u"Aucune parcelle libre à affecter (cocher la réaffectation pour les parcelles liées à un autre droit) ...", QMessageBox.Ok)
+            return
+        if QMessageBox.question(self, u"Affectation", u"Lier " + str(len(parIds)) + u" parcelle(s) au droit de pêche n° " + str(self.bope_id) + " ?",
+            QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        resultat = self.parcelleBail.affecte(self.bope_id, parIds, reaffecter)
+        if resultat is None:
+            QMessageBox.critical(self, u"Erreur SQL", self.parcelleBail.erreur, QMessageBox.Ok)
+            return
+        nombre, anciens = resultat
+        self.modifies = [self.bope_id] + anciens
+        self.iface.messageBar().pushMessage("Info : ", str(nombre) + u" parcelle(s) liée(s) au droit de pêche n° " + str(self.bope_id), level= QgsMessageBar.INFO, duration = 5)
+        self.accept()
+
+    def done(self, resultat):
+        '''Restaure l'outil de la carte et efface la saisie à la fermeture'''
+
+        if self.btnSaisie.isChecked():
+            self.btnSaisie.setChecked(False)
+        self.mc.scene().removeItem(self.bande)
+        QDialog.done(self, resultat)
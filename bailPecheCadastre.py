@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Ce script permet la recherche des parcelles cadastrales par leur référence (INSEE, section, numéro).
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import re
+from bisect import (bisect_left, bisect_right)
+from PyQt5.QtCore import (QStringListModel, Qt)
+from PyQt5.QtSql import (QSqlQuery)
+from PyQt5.QtWidgets import (QCompleter)
+
+class Index_cadastre():
+    '''
+    Index des références cadastrales " INSEE SECTION NUMERO " (ex: 15014 0A 123), chargé une fois par session.
+
+    Les références sont conservées dans une liste triée associée aux par_id : la saisie semi-automatique
+    (QCompleter sur un modèle trié, recherche dichotomique) et la résolution d'une liste collée de références
+    se font en mémoire, sans requête. Une référence peut désigner une commune (15014), une section (15014 AB),
+    une ou plusieurs parcelles (15014 AB 12 15) ou des plages de numéros (15014 AB 10-25) ; l'identifiant
+    parcellaire à 14 caractères (150140000A0123) est aussi accepté.
+    '''
+    # Index chargés pendant la session : (base, schéma) -> Index_cadastre
+    instances = {}
+    derniereErreur = ""
+    # Séparateurs des références d'une liste collée
+    separateurs = re.compile(r"[\n;,]+")
+    # Identifiant parcellaire : INSEE, préfixe (commune absorbée), section, numéro
+    identifiant = re.compile(r"^([0-9AB]{5})([0-9]{3})([0-9A-Z]{2})([0-9]{4})$")
+    # Numéro ou plage de numéros
+    plage = re.compile(r"^([0-9]+)(?:-([0-9]+))?$")
+
+    @classmethod
+    def ouvrir(cls, db, dbSchema):
+        '''
+        Renvoi l'index de la base, le charge lors du premier appel
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+
+        :return: None si l'index n'a pu être chargé (voir Index_cadastre.derniereErreur)
+        :rtype: Index_cadastre
+        '''
+        cle = (db.hostName(), db.databaseName(), dbSchema)
+        index = cls.instances.get(cle)
+        if index is None:
+            index = cls(db, dbSchema)
+            if not index.charge():
+                cls.derniereErreur = index.erreur
+                return None
+            cls.instances[cle] = index
+        return index
+
+    @classmethod
+    def vider(cls):
+        '''Libère les index chargés, ils seront relus au prochain appel'''
+
+        cls.instances = {}
+
+    @staticmethod
+    def section(texte):
+        '''Renvoi le code de section sur deux caractères (A -> 0A)'''
+
+        return texte.strip().upper().rjust(2, "0")
+
+    @staticmethod
+    def numero(texte):
+        '''Renvoi le numéro de parcelle sans les zéros de tête (0123 -> 123)'''
+
+        return texte.strip().lstrip("0") or "0"
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.references = []
+        self.parIds = []
+        self.modele = None
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def charge(self):
+        '''
+        Lit toutes les parcelles en une requête et construit la liste triée des références
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if not query.exec_("select par_id, sec_com_insee, sec_nom, par_numero from " + self.relation("parcelle") + " join " +
+            self.relation("section") + " on par_sec_id = sec_id"):
+            self.erreur = query.lastError().text()
+            return False
+        lignes = []
+        while query.next():
+            lignes.append((str(query.value(1)).strip() + " " + self.section(str(query.value(2))) + " " + self.numero(str(query.value(3))),
+                str(query.value(0))))
+        lignes.sort()
+        self.references = [ligne[0] for ligne in lignes]
+        self.parIds = [ligne[1] for ligne in lignes]
+        return True
+
+    def bornes(self, prefixe):
+        '''Renvoi l'intervalle [début, fin[ des références commençant par le préfixe'''
+
+        return bisect_left(self.references, prefixe), bisect_left(self.references, prefixe + "\uffff")
+
+    def completeur(self, parent):
+        '''
+        Renvoi la saisie semi-automatique des références, le modèle est partagé par les formulaires de la session
+
+        :param parent: widget parent du QCompleter
+        :type parent: QWidget
+
+        :rtype: QCompleter
+        '''
+        if self.modele is None:
+            self.modele = QStringListModel(self.references)
+        completeur = QCompleter(self.modele, parent)
+        completeur.setModelSorting(QCompleter.CaseSensitivelySortedModel)
+        completeur.setCaseSensitivity(Qt.CaseSensitive)
+        completeur.setMaxVisibleItems(15)
+        return completeur
+
+    def decoupe(self, reference):
+        '''
+        Découpe une référence saisie en [INSEE, section, numéros ou plages...]
+
+        :rtype: list
+        '''
+        reference = reference.strip().upper()
+        correspondance = self.identifiant.match(reference.replace(" ", ""))
+        if correspondance:
+            return [correspondance.group(1), correspondance.group(3), correspondance.group(4)]
+        return reference.split()
+
+    def resout(self, texte):
+        '''
+        Renvoi les parcelles désignées par une liste de références
+
+        :param texte: références séparées par des retours à la ligne, des virgules ou des points-virgules
+        :type texte: str
+
+        :return: (par_id sans doublon dans l'ordre de saisie, références sans correspondance)
+        :rtype: tuple
+        '''
+        parIds = []
+        vus = set()
+        inconnues = []
+        for reference in self.separateurs.split(texte):
+            elements = self.decoupe(reference)
+            if len(elements) == 0:
+                continue
+            trouvees = []
+            if len(elements) == 1:
+                debut, fin = self.bornes(elements[0] + " ")
+                trouvees = list(range(debut, fin))
+            else:
+                prefixe = elements[0] + " " + self.section(elements[1]) + " "
+                debut, fin = self.bornes(prefixe)
+                if len(elements) == 2:
+                    trouvees = list(range(debut, fin))
+                else:
+                    # Numéros existants de la section triés : une plage est lue par dichotomie, quelle que soit son étendue
+                    numeros = sorted((int(self.references[i][len(prefixe):]), i) for i in range(debut, fin)
+                        if self.references[i][len(prefixe):].isdigit())
+                    valeurs = [numero for numero, i in numeros]
+                    for element in elements[2:]:
+                        correspondance = self.plage.match(element)
+                        if not correspondance:
+                            continue
+                        premier = int(correspondance.group(1))
+                        dernier = int(correspondance.group(2)) if correspondance.group(2) else premier
+                        trouvees.extend(i for numero, i in numeros[bisect_left(valeurs, premier):bisect_right(valeurs, dernier)])
+            if len(trouvees) == 0:
+                inconnues.append(reference.strip())
+            for i in trouvees:
+                if self.parIds[i] not in vus:
+                    vus.add(self.parIds[i])
+                    parIds.append(self.parIds[i])
+        return parIds, inconnues
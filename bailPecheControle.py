@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# Ce script permet le contrôle d'intégrité des droits de pêche (droits sans parcelle, droits sans cours d'eau).
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+from PyQt5.QtCore import (Qt)
+from PyQt5.QtSql import (QSqlQuery)
+from PyQt5.QtWidgets import (QDialog, QHBoxLayout, QLabel, QListWidget, QListWidgetItem, QMessageBox, QPushButton, QSizePolicy,
+    QSpacerItem, QVBoxLayout)
+
+class Controle_bail():
+    '''
+    Droits de pêche sans parcelle liée et droits de pêche sans cours d'eau lié.
+
+    Les deux listes sont obtenues par des anti-jointures (NOT EXISTS) exécutées par PostgreSQL, puis conservées
+    pour la session. Les formulaires signalent chaque modification de liens (ajout ou retrait de parcelle ou de
+    cours d'eau, création ou suppression d'un droit) par actualise(), qui ne recontrôle que les droits concernés.
+    '''
+    # Contrôles chargés pendant la session : (base, schéma) -> Controle_bail
+    instances = {}
+
+    @classmethod
+    def ouvrir(cls, db, dbSchema):
+        '''
+        Renvoi le contrôle de la base, exécuté lors du premier appel
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+
+        :rtype: Controle_bail
+        '''
+        cle = (db.hostName(), db.databaseName(), dbSchema)
+        controle = cls.instances.get(cle)
+        if controle is None:
+            controle = cls(db, dbSchema)
+            controle.charge()
+            if controle.erreur == "":
+                cls.instances[cle] = controle
+        else:
+            # La connexion du pool a pu être rouverte depuis le dernier appel
+            controle.db = db
+        return controle
+
+    @classmethod
+    def vider(cls):
+        '''Libère les contrôles chargés, ils seront réexécutés au prochain appel'''
+
+        cls.instances = {}
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.sansParcelle = set()
+        self.sansRiviere = set()
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def requete(self, filtre = ""):
+        '''
+        Renvoi la requête des droits de pêche orphelins
+
+        :param filtre: condition supplémentaire sur droit_peche (ex: bope_id = any(?))
+        :type filtre: str
+
+        :return: requête renvoyant (bope_id, sans parcelle, sans cours d'eau)
+        :rtype: str
+        '''
+        return ("select bope_id, not exists (select 1 from " + self.relation("parcelle") + " where par_bope_id = bope_id), " +
+            "not exists (select 1 from " + self.relation("bail_cours_eau") + " where bce_bope_id = bope_id) from " +
+            self.relation("droit_peche") + (" where " + filtre if filtre != "" else ""))
+
+    def lit(self, query):
+        '''Répartit les droits renvoyés par requete() dans les deux listes'''
+
+        while query.next():
+            bope_id = int(query.value(0))
+            if query.value(1):
+                self.sansParcelle.add(bope_id)
+            else:
+                self.sansParcelle.discard(bope_id)
+            if query.value(2):
+                self.sansRiviere.add(bope_id)
+            else:
+                self.sansRiviere.discard(bope_id)
+
+    def charge(self):
+        '''
+        Contrôle tous les droits de pêche
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        self.erreur = ""
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        # Seuls les droits orphelins sont renvoyés par la base
+        if not query.exec_("select * from (" + self.requete() + ") as controle (bope_id, sans_parcelle, sans_riviere) " +
+            "where sans_parcelle or sans_riviere"):
+            self.erreur = query.lastError().text()
+            return False
+        self.sansParcelle = set()
+        self.sansRiviere = set()
+        self.lit(query)
+        return True
+
+    def actualise(self, ids):
+        '''
+        Recontrôle les droits de pêche dont les liens ont changé, les droits supprimés sont retirés des listes
+
+        :param ids: identifiants des droits de pêche modifiés
+        :type ids: list
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        self.erreur = ""
+        ids = set(int(id) for id in ids)
+        if len(ids) == 0:
+            return True
+        self.sansParcelle -= ids
+        self.sansRiviere -= ids
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare(self.requete("bope_id = any(?::integer[])"))
+        query.addBindValue("{" + ",".join(str(id) for id in ids) + "}")
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return False
+        self.lit(query)
+        return True
+
+    def valide(self):
+        '''Renvoi True si tous les droits de pêche ont au moins une parcelle et un cours d'eau'''
+
+        return len(self.sansParcelle) == 0 and len(self.sansRiviere) == 0
+
+    def orphelins(self):
+        '''
+        Renvoi la liste des droits de pêche orphelins
+
+        :return: [(bope_id, sans parcelle, sans cours d'eau)] triée sur l'identifiant
+        :rtype: list
+        '''
+        return [(bope_id, bope_id in self.sansParcelle, bope_id in self.sansRiviere)
+            for bope_id in sorted(self.sansParcelle | self.sansRiviere)]
+
+class Controle_bail_dialog(QDialog):
+    '''
+    Fenêtre listant les droits de pêche orphelins, un double clic affiche le droit dans le formulaire "Droits de pêche"
+
+    :param QDialog: Permet d'afficher l'interface graphique comme une fenêtre indépendante
+    :type QDialog: QDialog
+    '''
+    def __init__(self, controle, navigue, parent = None):
+        '''
+        Constructeur, construction de la fenêtre
+
+        :param controle: contrôle d'intégrité de la base
+        :type controle: Controle_bail
+
+        :param navigue: fonction appelée avec l'identifiant du droit de pêche choisi
+        :type navigue: function
+        '''
+        QDialog.__init__(self, parent)
+        self.controle = controle
+        self.navigue = navigue
+        self.setWindowTitle(u"Contrôle des droits de pêche")
+        self.setAttribute(Qt.WA_DeleteOnClose)
+
+        self.lblBilan = QLabel("", self)
+        self.lstOrphelins = QListWidget(self)
+        self.btnAfficher = QPushButton(u"Afficher le droit de pêche", self)
+        self.btnActualiser = QPushButton(u"Actualiser", self)
+        self.btnActualiser.setToolTip(u"Recontrôle tous les droits de pêche (modifications faites hors du formulaire)")
+        self.btnFermer = QPushButton(u"Fermer", self)
+        boutons = QHBoxLayout()
+        boutons.addWidget(self.btnAfficher)
+        boutons.addWidget(self.btnActualiser)
+        boutons.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons.addWidget(self.btnFermer)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.lblBilan)
+        layout.addWidget(self.lstOrphelins)
+        layout.addLayout(boutons)
+        self.resize(420, 350)
+
+        self.lstOrphelins.itemDoubleClicked.connect(self.afficher)
+        self.btnAfficher.clicked.connect(self.afficher)
+        self.btnActualiser.clicked.connect(self.actualiser)
+        self.btnFermer.clicked.connect(self.close)
+        self.remplir()
+
+    def remplir(self):
+        '''Affiche les droits de pêche orphelins'''
+
+        self.lstOrphelins.clear()
+        for bope_id, sansParcelle, sansRiviere in self.controle.orphelins():
+            manques = []
+            if sansParcelle:
+                manques.append(u"aucune parcelle")
+            if sansRiviere:
+                manques.append(u"aucun cours d'eau")
+            item = QListWidgetItem(u"Droit de pêche n° " + str(bope_id) + " : " + ", ".join(manques))
+            item.setData(Qt.UserRole, bope_id)
+            self.lstOrphelins.addItem(item)
+        self.lblBilan.setText(str(len(self.controle.sansParcelle)) + u" droit(s) sans parcelle liée, " +
+            str(len(self.controle.sansRiviere)) + u" droit(s) sans cours d'eau lié")
+        self.btnAfficher.setEnabled(self.lstOrphelins.count() > 0)
+        if self.lstOrphelins.count() > 0:
+            self.lstOrphelins.setCurrentRow(0)
+
+    def actualiser(self):
+        '''Recontrôle tous les droits de pêche'''
+
+        if not self.controle.charge():
+            QMessageBox.critical(self, u"Erreur SQL", self.controle.erreur, QMessageBox.Ok)
+        self.remplir()
+
+    def afficher(self):
+        '''Affiche dans le formulaire le droit de pêche sélectionné'''
+
+        item = self.lstOrphelins.currentItem()
+        if item is not None:
+            self.navigue(item.data(Qt.UserRole))
@@ -7,11 +7,11 @@ import os
 # import datetime
 # import processing
 from functools import partial
-from PyQt5.QtCore import (Qt, QDate)
+from PyQt5.QtCore import (Qt, QDate, QTimer)
 from PyQt5.QtGui import (QCursor)
 from PyQt5.QtWidgets import (QApplication, QDataWidgetMapper, QDialog, QFileDialog, QDockWidget, QHeaderView, QMessageBox, QTableView)
-from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
-from qgis.core import (QgsCoordinateReferenceSystem, QgsExpression, QgsExpressionContext, QgsFeatureRequest, QgsFeature, QgsCoordinateTransform)
+from PyQt5.QtSql import (QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
+from qgis.core import (QgsCoordinateReferenceSystem, QgsExpression, QgsExpressionContext, QgsCoordinateTransform, QgsProject)
 from qgis.gui import (QgsMessageBar)
 
 # Initialise les ressources Qt à partir du fichier resources.py
@@ -30,11 +30,29 @@ from bopeModifProprioForm import (Ui_dlgBopeModifProprioForm)
 from bopeAjouParcelleForm import (Ui_dlgBopeAjoutParcelleForm)
 
 # Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_reference, Gedopi_session)
 
 # Import du script de filtrage des droits de pêche
 from .bailPecheFiltrage import (Filtrage_bope_dialog)
 
+# Import du contrôle d'intégrité des droits de pêche
+from .bailPecheControle import (Controle_bail, Controle_bail_dialog)
+
+# Import de l'emprise et de la sélection des parcelles des droits de pêche
+from .bailPecheSpatial import (Parcelle_bail)
+
+# Import de l'index des références cadastrales
+from .bailPecheCadastre import (Index_cadastre)
+
+# Import de l'affectation de parcelles par la carte
+from .bailPecheAffectation import (Affectation_parcelle_dialog)
+
+# Import de la recherche approchée des propriétaires
+from .bailPecheProprio import (Recherche_proprio)
+
+# Import du suivi des échéances des droits de pêche
+from .bailPecheEcheance import (Echeance_bail, Echeance_bail_dialog)
+
 class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
     '''
     Class principal du formulaire "Droits de pêche"
@@ -88,6 +106,8 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         # Variables diverses
         self.pdfBool = False
         self.boolNew = False
+        self.controle = None
+        self.parcelleBail = None
 
         # Slot pour le filtrage cartographique
         self.slot_bope_select_changed = None
@@ -97,6 +117,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         self.btnFiltreCartoManuel.clicked.connect(slot)
         self.btnFiltreAttributaire.clicked.connect(self.filtreAttributaire)
         self.btnDeleteFiltrage.clicked.connect(self.bope_annule_filtrage)
+        self.btnEcheances.clicked.connect(self.afficheEcheances)
 
         self.btnZoom.clicked.connect(self.zoomBope)
         self.btnSelection.clicked.connect(self.selectionBope)
@@ -109,6 +130,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         self.btnAjoutRiviere.clicked.connect(self.ajoutRiviere)
         self.btnSuppRiviere.clicked.connect(self.suppRiviere)
         self.btnAjoutParcelle.clicked.connect(self.ajoutParcelle)
+        self.btnAffectParcelle.clicked.connect(self.affectationParcelle)
         self.btnSuppParcelle.clicked.connect(self.suppParcelle)
         self.btnZoomParcelle.clicked.connect(self.zoomParcelle)
         self.btnSelectParcelle.clicked.connect(self.selectionParcelle)
@@ -141,7 +163,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         if self.verifiePresenceCouche():
             self.setupModel()
             if not self.validationParcelleRiv():
-                QMessageBox.warning(self, u"Attention", self.messageValidation, QMessageBox.Ok)
+                self.afficheOrphelins()
         else:
             self.clearFields()
             self.activeFields(False)
@@ -255,74 +277,69 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         '''
         Vérifie que tous les droits de pêches soient reliés à au moins une parcelle et rivière et renvoi dans __init__, True ou False,
         rien ne se passe si return True,
-        affiche une fenêtre indiquant les erreurs si return False
+        la liste des droits orphelins est affichée si return False (voir Controle_bail)
         '''
+        self.controle = Controle_bail.ouvrir(self.db, self.dbSchema)
+        if self.controle.erreur != "":
+            QMessageBox.critical(self, u"Erreur validation initiale des droits de pêche", self.controle.erreur, QMessageBox.Ok)
+            return True
+        return self.controle.valide()
 
-        query = QSqlQuery(self.db)
-        wrelation = "droit_peche"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("SELECT bope_id FROM " + wrelation)
-        if not query.exec_():
-            QMessageBox.critical(self, u"Erreur validation initiale des droits de pêche", query.lastError().text(), QMessageBox.Ok)
-        else:
-            wbope_id = ""
-            listBopePar = []
-            listBopeRiv = []
-            size = query.size()
-            sizeMax = query.size()
-            while size > 0:
-                if query.next():
-                    listBopePar.append(query.value(0))
-                    listBopeRiv.append(query.value(0))
-                    if sizeMax == size:
-                        wbope_id = "" + str(query.value(0)) + ""
-                    else :
-                        wbope_id = wbope_id + ", " + str(query.value(0)) + ""
-                    size -= 1
+    def actualiseControle(self, ids):
+        '''
+        Recontrôle les droits de pêche dont les liens viennent d'être modifiés et actualise leur échéance
 
-        if wbope_id != "":
-            queryPar = QSqlQuery(self.db)
-            wrelation = "parcelle"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            queryPar.prepare("SELECT par_bope_id FROM " + wrelation + " WHERE par_bope_id in (" + wbope_id + ")")
-            if not queryPar.exec_():
-                QMessageBox.critical(self, u"Erreur validation initiale des parcelles", queryPar.lastError().text(), QMessageBox.Ok)
-            else:
-                wpar_id = ""
-                size = queryPar.size()
-                while size > 0:
-                    if queryPar.next():
-                        wpar_id = queryPar.value(0)
-                        for elem in listBopePar:
-                            if wpar_id == elem:
-                                listBopePar.remove(wpar_id)
-                        size -= 1
-
-            queryRiv = QSqlQuery(self.db)
-            wrelation = "bail_cours_eau"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            queryRiv.prepare("SELECT bce_bope_id FROM " + wrelation + " WHERE bce_bope_id in (" + wbope_id + ")")
-            if not queryRiv.exec_():
-                QMessageBox.critical(self, u"Erreur validation initiale des bail_cours_eau", queryRiv.lastError().text(), QMessageBox.Ok)
+        :param ids: identifiants des droits de pêche modifiés
+        :type ids: list
+        '''
+        if self.controle:
+            self.controle.db = self.db
+            if not self.controle.actualise(ids):
+                self.iface.messageBar().pushMessage("Erreur : ", u"Contrôle des droits de pêche non actualisé : " + self.controle.erreur, level= QgsMessageBar.CRITICAL, duration = 5)
+
+        # Les échéances ne sont actualisées que si le tableau a déjà été calculé
+        echeance = Echeance_bail.ouvert(self.db, self.dbSchema)
+        if echeance is not None and not echeance.actualise(ids):
+            self.iface.messageBar().pushMessage("Erreur : ", u"Échéances des droits de pêche non actualisées : " + echeance.erreur, level= QgsMessageBar.CRITICAL, duration = 5)
+
+    def afficheOrphelins(self):
+        '''Ouvre la liste des droits de pêche sans parcelle ou sans cours d'eau'''
+
+        if self.controle:
+            dialog = Controle_bail_dialog(self.controle, self.afficheBope, self)
+            dialog.show()
+
+    def afficheEcheances(self):
+        '''Ouvre le tableau des échéances de tous les droits de pêche'''
+
+        echeance = Echeance_bail.ouvrir(self.db, self.dbSchema)
+        if echeance.erreur != "":
+            QMessageBox.critical(self, u"Erreur SQL", echeance.erreur, QMessageBox.Ok)
+            return
+        dialog = Echeance_bail_dialog(echeance, self.afficheBope, self)
+        dialog.show()
+
+    def afficheBope(self, bope_id):
+        '''
+        Positionne le formulaire sur un droit de pêche, le filtrage en cours est annulé s'il l'exclut
+
+        :param bope_id: identifiant du droit de pêche
+        :type bope_id: int
+        '''
+        if not self.modelBauxPe:
+            return
+        for passage in range(2):
+            while self.modelBauxPe.canFetchMore():
+                self.modelBauxPe.fetchMore()
+            for row in range(self.modelBauxPe.rowCount()):
+                if self.modelBauxPe.record(row).value("bope_id") == bope_id:
+                    self.mapper.setCurrentIndex(row)
+                    return
+            if passage == 0 and self.modelBauxPe.filter() != "":
+                self.bope_annule_filtrage()
             else:
-                wriv_id = ""
-                size = queryRiv.size()
-                while size > 0:
-                    if queryRiv.next():
-                        wriv_id = queryRiv.value(0)
-                        for elem in listBopeRiv:
-                            if wriv_id == elem:
-                                listBopeRiv.remove(wriv_id)
-                        size -= 1
-
-        if listBopePar or listBopeRiv:
-            self.messageValidation = u"Les droits de pêches suivants, n'ont pas de parcelles liés : \n " + str(listBopePar) + u" \n Les droits de pêches suivants, n'ont pas de rivières liés : \n" + str(listBopeRiv)
-            return False
-        else:
-            return True
+                break
+        self.iface.messageBar().pushMessage("Erreur : ", u"Le droit de pêche n° " + str(bope_id) + u" n'existe plus ...", level= QgsMessageBar.CRITICAL, duration = 5)
 
     def closeDatabase(self):
         '''Supprime certaines variables et déconnecte la base de données'''
@@ -335,10 +352,9 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         del self.modelAappma
         del self.modelRiviere
 
-        self.db.close()
-        del self.db
+        # Rend la connexion au pool, elle reste ouverte pour la prochaine ouverture du formulaire
+        Gedopi_session.liberer(self.db)
         self.db = None
-        QSqlDatabase.removeDatabase('db1')
 
     def setupModel(self):
         '''
@@ -353,18 +369,18 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
             connectionParams = self.gc.getConnectionParameterFromDbLayer(self.layer)
             if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
                 self.dbType = "postgres"
-                self.db = QSqlDatabase.addDatabase("QPSQL", 'db1')
-                self.db.setDatabaseName(connectionParams['dbname'])
-                self.db.setUserName(connectionParams['user'])
-                self.db.setPassword(connectionParams['password'])
-                self.db.setHostName(connectionParams['host'])
+                self.db = Gedopi_session.acquerir(connectionParams)
                 self.dbSchema = connectionParams['schema']
 
-            if (not self.db.open()):
+            if (not self.db or not self.db.isOpen()):
+                self.db = None
                 QMessageBox.critical(self, "Erreur", u"Impossible de se connecter à la base de données ...", QMessageBox.Ok)
                 QApplication.restoreOverrideCursor()
                 return
 
+        # Emprise et sélection des parcelles des droits de pêche
+        self.parcelleBail = Parcelle_bail(self.db, self.dbSchema)
+
         # Création du modèle des Baux de pêche
         self.modelBauxPe = QSqlRelationalTableModel(self, self.db)
         wrelation = "droit_peche"
@@ -447,18 +463,14 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
 
         self.mapper.currentIndexChanged.connect(self.rowChange)
 
-        if self.row_count == 0 :
+        # Liste des AAPPMA issue du cache partagé, rowChange() se contente de sélectionner la valeur
+        self.modelAappma = Gedopi_reference.modele(self.db, self.dbSchema, "aappma")
+        if self.modelAappma.lastError().isValid():
+            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle AAPPMA dans le setupModel() : \n" + self.modelAappma.lastError().text(), QMessageBox.Ok)
+        self.cmbAappma.setModel(self.modelAappma)
+        self.cmbAappma.setModelColumn(1)
 
-            self.modelAappma = QSqlTableModel(self, self.db)
-            wrelation = "aappma"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelAappma.setTable(wrelation)
-            self.modelAappma.setSort(1, Qt.AscendingOrder)
-            if (not self.modelAappma.select()):
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle AAPPMA dans le rowChange() : \n" + self.modelAappma.lastError().text(), QMessageBox.Ok)
-            self.cmbAappma.setModel(self.modelAappma)
-            self.cmbAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        if self.row_count == 0 :
 
             self.modelProprietaire = QSqlTableModel(self, self.db)
             wrelation = "proprietaire"
@@ -538,6 +550,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         #afin d'éviter leur activation si visibilityChanged renvoie active = False
         self.btnFiltreCartoManuel.setEnabled(False)
         self.btnFiltreAttributaire.setEnabled(active)
+        self.btnEcheances.setEnabled(active)
         self.btnDeleteFiltrage.setEnabled(False)
         self.chkFiltreCartoAuto.setEnabled(active)
 
@@ -572,6 +585,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         self.btnSelectParcelle.setEnabled(active)
 
         self.btnAjoutParcelle.setEnabled(active)
+        self.btnAffectParcelle.setEnabled(active)
         self.btnAjoutRiviere.setEnabled(active)
         self.btnSuppParcelle.setEnabled(active)
         self.btnSuppRiviere.setEnabled(active)
@@ -592,6 +606,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         self.btnFiltreCartoManuel.setEnabled(not active)
         self.chkFiltreCartoAuto.setEnabled(not active)
         self.btnFiltreAttributaire.setEnabled(not active)
+        self.btnEcheances.setEnabled(not active)
         self.btnDeleteFiltrage.setEnabled(not active)
 
         self.btnPremier.setEnabled(not active)
@@ -610,6 +625,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         self.btnSelectParcelle.setEnabled(not active)
 
         self.btnAjoutParcelle.setEnabled(not active)
+        self.btnAffectParcelle.setEnabled(not active)
         self.btnAjoutRiviere.setEnabled(not active)
         self.btnSuppParcelle.setEnabled(not active)
         self.btnSuppRiviere.setEnabled(not active)
@@ -662,19 +678,6 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         # Record de l'AAPPMA courante
         wbope_apma_id = record.value(self.modelBauxPe.fieldIndex("bope_apma_id"))
 
-        # Filtrage aappma
-        self.modelAappma = QSqlTableModel(self, self.db)
-        wrelation = "aappma"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelAappma.setTable(wrelation)
-        self.modelAappma.setSort(1, Qt.AscendingOrder)
-        if (not self.modelAappma.select()):
-            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle AAPPMA dans le rowChange() : \n" + self.modelAappma.lastError().text(), QMessageBox.Ok)
-
-        self.cmbAappma.setModel(self.modelAappma)
-        self.cmbAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
-
         # Sélection AAPPMA
         result = self.cmbAappma.model().match(self.cmbAappma.model().index(0, 0), Qt.EditRole, wbope_apma_id, -1, Qt.MatchExactly)
         if result:
@@ -773,46 +776,29 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                 record = self.modelBauxPe.record(row)
                 wid = record.value("bope_id")
 
-                query = QSqlQuery(self.db)
-                wrelation = "parcelle"
-                if self.dbType == "postgres":
-                    wrelation = self.dbSchema + "." + wrelation
-                query.prepare("SELECT par_id FROM " + wrelation + " WHERE par_bope_id = " + str(wid))
-                if not query.exec_():
-                    QMessageBox.critical(self, u"Erreur", query.lastError().text(), QMessageBox.Ok)
-
-                if query.exec_():
-                    wpar_id = ""
-                    size = query.size()
-                    sizeMax = query.size()
-                    while size > 0:
-                        if query.next():
-                            if sizeMax == size:
-                                wpar_id = "'" + str(query.value(0)) + "'"
-                            else :
-                                wpar_id = wpar_id + ", '" + str(query.value(0)) + "'"
-                            size -= 1
+                resultat = self.parcelleBail.parcelles(bope_id = wid)
+                if resultat is None:
+                    QMessageBox.critical(self, u"Erreur", self.parcelleBail.erreur, QMessageBox.Ok)
+                    return
+                self.zoomEmprise(resultat[1])
 
-                layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
+    def zoomEmprise(self, box):
+        '''
+        Zoome le canevas sur une emprise renvoyée par Parcelle_bail, exprimée dans le système de la couche des parcelles
 
-                query = "par_id in (" + wpar_id + ")"
-                request = QgsFeatureRequest().setFilterExpression(query)
-
-                iter = layer.getFeatures(request)
-                feat = QgsFeature()
-                iter.nextFeature(feat)
-                box = feat.geometry().boundingBox()
-                while iter.nextFeature(feat):
-                    box.combineExtentWith(feat.geometry().boundingBox())
-
-                if box:
-                    if self.mc.hasCrsTransformEnabled():
-                        crsDest = self.mc.mapSettings().destinationCrs()
-                        crsSrc = layer.crs()
-                        xform = QgsCoordinateTransform(crsSrc, crsDest)
-                        box = xform.transform(box)
-                    self.mc.setExtent(box.buffer(50))
-                    self.mc.refresh()
+        :param box: emprise, None si aucune parcelle
+        :type box: QgsRectangle
+        '''
+        if box is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Aucune parcelle liée ...", level= QgsMessageBar.CRITICAL, duration = 3)
+            return
+        layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
+        crsDest = self.mc.mapSettings().destinationCrs()
+        if layer and layer.crs() != crsDest:
+            xform = QgsCoordinateTransform(layer.crs(), crsDest, QgsProject.instance())
+            box = xform.transformBoundingBox(box)
+        self.mc.setExtent(box.buffer(50))
+        self.mc.refresh()
 
     def selectionBope(self):
         '''Permet de sélectionner les parcelles correspondant à l'enregistrement courant'''
@@ -824,34 +810,14 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                 record = self.modelBauxPe.record(row)
                 wid = record.value("bope_id")
 
-                query = QSqlQuery(self.db)
-                wrelation = "parcelle"
-                if self.dbType == "postgres":
-                    wrelation = self.dbSchema + "." + wrelation
-                query.prepare("SELECT par_id FROM " + wrelation + " WHERE par_bope_id = " + str(wid))
-                if not query.exec_():
-                    QMessageBox.critical(self, u"Erreur", query.lastError().text(), QMessageBox.Ok)
-
-                if query.exec_():
-                    wpar_id = ""
-                    size = query.size()
-                    sizeMax = query.size()
-                    while size > 0:
-                        if query.next():
-                            if sizeMax == size:
-                                wpar_id = "'" + str(query.value(0)) + "'"
-                            else :
-                                wpar_id = wpar_id + ", '" + str(query.value(0)) + "'"
-                            size -= 1
-
-                layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
-                layer.removeSelection()
-
-                query = "par_id in (" + wpar_id + ")"
-                selection = layer.getFeatures(QgsFeatureRequest().setFilterExpression(query))
-                layer.setSelectedFeatures([k.id() for k in selection])
+                resultat = self.parcelleBail.parcelles(bope_id = wid)
+                if resultat is None:
+                    QMessageBox.critical(self, u"Erreur", self.parcelleBail.erreur, QMessageBox.Ok)
+                else:
+                    layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
+                    layer.selectByIds(self.parcelleBail.identifiants(layer, resultat[0]))
 
-                self.etat_courant = 0
+            self.etat_courant = 0
 
     def ajoutPdf(self):
         '''Permet de joindre un scan du bail de pêche'''
@@ -972,6 +938,8 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
 
                     if not query.exec_():
                         QMessageBox.critical(self, u"Erreur - Modification du droit de pêche", query.lastError().text(), QMessageBox.Ok)
+                    else:
+                        self.actualiseControle([wid])
 
                     self.setupModel()
 
@@ -997,7 +965,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                 if self.dbType == "postgres":
                     wrelation = self.dbSchema + "." + wrelation
                 query.prepare("INSERT INTO " + wrelation +
-                " (bope_existe, bope_origine_fede, bope_date_sign, bope_infini, bope_date_fin, bope_apma_id, bope_pro_id, bope_pdf) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+                " (bope_existe, bope_origine_fede, bope_date_sign, bope_infini, bope_date_fin, bope_apma_id, bope_pro_id, bope_pdf) VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING bope_id")
                 query.addBindValue(wbope_possession)
                 query.addBindValue(wbope_origine)
                 query.addBindValue(wbope_dateSign)
@@ -1010,6 +978,8 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                 if not query.exec_():
                     QMessageBox.critical(self, u"Erreur - Enregistrement du droit de pêche", query.lastError().text(), QMessageBox.Ok)
                 else:
+                    if query.next():
+                        self.actualiseControle([query.value(0)])
                     self.iface.messageBar().pushMessage("Attention : ", u"N'oubliez pas d'ajouter les parcelles et rivières concernées !", level= QgsMessageBar.INFO, duration = 5)
 
                 # Màj du nombre d'enregistrement
@@ -1060,6 +1030,8 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                             query.addBindValue(wid)
                             if not query.exec_():
                                 QMessageBox.critical(self, "Erreur", u"Impossible de supprimer ce droit de pêche. \n " + query.lastError().text() , QMessageBox.Ok)
+                            else:
+                                self.actualiseControle([wid])
 
                     if filtreCourant != "":
                         filtreCourant = filtreCourant.replace(str(wid), "NULL" )
@@ -1138,67 +1110,32 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                 self.mapper.toFirst()
                 self.btnDeleteFiltrage.setEnabled(True)
 
-    def selectionParcelle(self):
-        '''Permet de sélectionner sur le canevas, les parcelles sélectionnées dans le tableau'''
+    def parcellesSelectionnees(self):
+        '''Renvoi les par_id des parcelles sélectionnées dans le tableau'''
 
         selection = self.tbvParcelle.selectionModel()
-        indexElementSelectionne = selection.selectedRows()
-        nbreSelect = len(indexElementSelectionne)
-        nbreSelectMax = len(indexElementSelectionne)
+        return [str(index.data()) for index in selection.selectedRows()]
 
-        if nbreSelect != 0:
-            while nbreSelect > 0:
-                    if nbreSelectMax == nbreSelect:
-                        wid = "'" + str(indexElementSelectionne[nbreSelect - 1].data()) + "'"
-                    else :
-                        wid = wid + ", '" + str(indexElementSelectionne[nbreSelect - 1].data()) + "'"
-                    nbreSelect -= 1
+    def selectionParcelle(self):
+        '''Permet de sélectionner sur le canevas, les parcelles sélectionnées dans le tableau'''
 
+        par_ids = self.parcellesSelectionnees()
+        if len(par_ids) != 0:
             layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
-            layer.removeSelection()
-
-            query = "par_id in (" + wid + ")"
-            selection = layer.getFeatures(QgsFeatureRequest().setFilterExpression(query))
-            layer.setSelectedFeatures([k.id() for k in selection])
+            layer.selectByIds(self.parcelleBail.identifiants(layer, par_ids))
         else :
             QMessageBox.critical(self, "Erreur", u"Pas d'élément sélectionné ...", QMessageBox.Ok)
 
     def zoomParcelle(self):
         '''Permet de zoomer sur le canevas, sur les parcelles sélectionnées dans le tableau'''
 
-        selection = self.tbvParcelle.selectionModel()
-        indexElementSelectionne = selection.selectedRows()
-        nbreSelect = len(indexElementSelectionne)
-        nbreSelectMax = len(indexElementSelectionne)
-
-        if nbreSelect != 0:
-            while nbreSelect > 0:
-                    if nbreSelectMax == nbreSelect:
-                        wid = "'" + str(indexElementSelectionne[nbreSelect - 1].data()) + "'"
-                    else :
-                        wid = wid + ", '" + str(indexElementSelectionne[nbreSelect - 1].data()) + "'"
-                    nbreSelect -= 1
-
-            layer = self.gc.getLayerFromLegendByTableProps('parcelle', 'par_geom', '')
-            layer.removeSelection()
-
-            query = "par_id in (" + wid + ")"
-            request = QgsFeatureRequest().setFilterExpression(query)
-            iter = layer.getFeatures(request)
-            feat = QgsFeature()
-            iter.nextFeature(feat)
-            box = feat.geometry().boundingBox()
-            while iter.nextFeature(feat):
-                box.combineExtentWith(feat.geometry().boundingBox())
-
-            if box:
-                if self.mc.hasCrsTransformEnabled():
-                    crsDest = self.mc.mapSettings().destinationCrs()
-                    crsSrc = layer.crs()
-                    xform = QgsCoordinateTransform(crsSrc, crsDest)
-                    box = xform.transform(box)
-                self.mc.setExtent(box.buffer(50))
-                self.mc.refresh()
+        par_ids = self.parcellesSelectionnees()
+        if len(par_ids) != 0:
+            resultat = self.parcelleBail.parcelles(par_ids = par_ids)
+            if resultat is None:
+                QMessageBox.critical(self, u"Erreur", self.parcelleBail.erreur, QMessageBox.Ok)
+                return
+            self.zoomEmprise(resultat[1])
         else :
             QMessageBox.critical(self, "Erreur", u"Pas d'élément sélectionné ...", QMessageBox.Ok)
 
@@ -1212,6 +1149,31 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         dialog.setWindowModality(Qt.ApplicationModal)
         if dialog.exec_():
             self.modelParcelle.setFilter("par_bope_id = %i" % wbope_id)
+            self.actualiseControle([wbope_id])
+
+    def affectationParcelle(self):
+        '''Permet l'ouverture de la fenêtre d'affectation de parcelles par la carte (fenêtre non modale)'''
+
+        record = self.modelBauxPe.record(self.row_courant)
+        wbope_id = record.value("bope_id")
+        dialog = Affectation_parcelle_dialog(self.iface, self.db, self.dbSchema, wbope_id, self)
+        dialog.accepted.connect(partial(self.finAffectation, dialog, wbope_id))
+        dialog.show()
+
+    def finAffectation(self, dialog, wbope_id):
+        '''
+        Relit les parcelles du droit de pêche et recontrôle les droits modifiés après une affectation
+
+        :param dialog: fenêtre d'affectation
+        :type dialog: Affectation_parcelle_dialog
+
+        :param wbope_id: identifiant du droit de pêche
+        :type wbope_id: int
+        '''
+        # Le formulaire a pu changer de droit de pêche pendant la saisie sur la carte
+        if self.leBopeId.text() == str(wbope_id):
+            self.modelParcelle.setFilter("par_bope_id = %i" % wbope_id)
+        self.actualiseControle(dialog.modifies)
 
     def suppParcelle(self):
         '''Permet la suppression de la parcelle liée au droit de pêche'''
@@ -1251,6 +1213,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                     if not query.exec_():
                         QMessageBox.critical(self, u"Erreur - Suppression d'une parcelle : ", query.lastError().text(), QMessageBox.Ok)
                     self.modelParcelle.setFilter("par_bope_id = %i" % wbope_id)
+                    self.actualiseControle([wbope_id])
 
     def ajoutRiviere(self):
         '''Permet l'ouverture de la fenêtre de sélection d'une rivière'''
@@ -1262,6 +1225,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         dialog.setWindowModality(Qt.ApplicationModal)
         if dialog.exec_():
             self.modelRiviere.setFilter("bce_bope_id = %i" % wbope_id)
+            self.actualiseControle([wbope_id])
 
     def suppRiviere(self):
         '''Permet la suppression de la rivière liée au droit de pêche'''
@@ -1295,6 +1259,7 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
                 if not query.exec_():
                     QMessageBox.critical(self, "Erreur", u"Impossible de supprimer ce cours d'eau ...", QMessageBox.Ok)
                 self.modelRiviere.setFilter("bce_bope_id = %i" % wbope_id)
+                self.actualiseControle([wbope_id])
 
     def cherchProprio(self):
         '''Permet l'ouverture de la fenêtre de recherche d'un propriétaire'''
@@ -1373,6 +1338,9 @@ class Bail_peche_dialog(QDockWidget, Ui_dwcBopeMainForm):
         # Récupération du propriétaire courant
         wbope_pro_id = record.value(self.modelBauxPe.fieldIndex("bope_pro_id"))
 
+        # Les propriétaires ont pu être créés, modifiés ou supprimés
+        Recherche_proprio.ouvrir(self.db, self.dbSchema).actualise()
+
         # Recharge du modèle propriétaire
         self.modelProprietaire.clear()
         wrelation = "proprietaire"
@@ -1435,6 +1403,14 @@ class Creation_proprio(QDialog, Ui_dlgBopeCreaProprioForm):
         self.dbSchema = dbSchema
         self.setupUi(self)
         self.cmbProprio = cmbProprio
+        self.moteur = Recherche_proprio.ouvrir(self.db, self.dbSchema)
+
+        # Recherche à la saisie, lancée après une pause de la frappe
+        self.minuteur = QTimer(self)
+        self.minuteur.setSingleShot(True)
+        self.minuteur.setInterval(300)
+        self.minuteur.timeout.connect(partial(self.recherche, True))
+        self.leNomRecherche.textChanged.connect(lambda texte: self.minuteur.start())
 
         self.btnChercher.clicked.connect(self.recherche)
         self.btnAjouter.clicked.connect(self.ajouter)
@@ -1444,43 +1420,44 @@ class Creation_proprio(QDialog, Ui_dlgBopeCreaProprioForm):
         self.buttonBox.accepted.connect(self.enregistrer)
 
 
-    def recherche(self):
-        '''Permet de rechercher un propriétaire avant d'en créer un nouveau'''
+    def recherche(self, saisie = False):
+        '''
+        Permet de rechercher un propriétaire avant d'en créer un nouveau, par ressemblance du nom ou de l'adresse
 
-        # Double les ' afin d'éviter de faire échouer la requête SQL de recherche
-        wrecherch = self.leNomRecherche.text()
-        if "'" in wrecherch and "''" not in wrecherch:
-            wrecherch = wrecherch.replace("'", "''")
+        :param saisie: True si la recherche est lancée pendant la frappe, une saisie vide est alors ignorée
+        :type saisie: bool
+        '''
+        wrecherch = self.leNomRecherche.text().strip()
+        if wrecherch == "":
+            if not saisie:
+                QMessageBox.critical(self, "Erreur", u"Aucun nom saisie ...", QMessageBox.Ok)
+            return
+        if saisie and len(wrecherch) < 2:
+            return
 
-        # Requête SQL qui va chercher si le propriétaire saisi existe
-        if wrecherch != "":
-            self.modelCherche = QSqlRelationalTableModel(self, self.db)
-            wrelation = "proprietaire"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelCherche.setTable(wrelation)
-            self.modelCherche.setSort(1, Qt.AscendingOrder)
-
-            self.modelCherche.setFilter("pro_nom ILIKE '%" + wrecherch + "%'")
-            self.modelCherche.select()
-
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_nom"), Qt.Horizontal, u"Nom")
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_telephone"), Qt.Horizontal, u"Téléphone")
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_mail"), Qt.Horizontal, u"Email")
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_adresse"), Qt.Horizontal, u"Adresse")
-
-            if not self.modelCherche.select():
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Cherche dans le Creation_proprio.recherche() : \n" + self.modelCherche.lastError().text(), QMessageBox.Ok)
-
-            self.tbvProprio.setModel(self.modelCherche)
-            self.tbvProprio.setSelectionMode(QTableView.SingleSelection)
-            self.tbvProprio.setSelectionBehavior(QTableView.SelectRows)
-            self.tbvProprio.setColumnHidden(self.modelCherche.fieldIndex("pro_id"), True)
-            self.tbvProprio.resizeColumnsToContents()
-            self.tbvProprio.horizontalHeader().setStretchLastSection(True)
-            self.btnAjouter.setEnabled(True)
-        else:
-            QMessageBox.critical(self, "Erreur", u"Aucun nom saisie ...", QMessageBox.Ok)
+        resultats = self.moteur.recherche(wrecherch)
+        if resultats is None:
+            QMessageBox.critical(self, u"Erreur SQL", self.moteur.erreur, QMessageBox.Ok)
+            return
+        self.afficheResultats(resultats)
+
+    def afficheResultats(self, resultats):
+        '''
+        Affiche les propriétaires trouvés, du plus au moins ressemblant
+
+        :param resultats: résultats de Recherche_proprio.recherche() ou doublons()
+        :type resultats: list
+        '''
+        self.modelCherche = self.moteur.modele(resultats, self)
+        self.tbvProprio.setModel(self.modelCherche)
+        self.tbvProprio.setSelectionMode(QTableView.SingleSelection)
+        self.tbvProprio.setSelectionBehavior(QTableView.SelectRows)
+        self.tbvProprio.setColumnHidden(0, True)
+        self.tbvProprio.resizeColumnsToContents()
+        self.tbvProprio.horizontalHeader().setStretchLastSection(True)
+        if len(resultats) > 0:
+            self.tbvProprio.selectRow(0)
+        self.btnAjouter.setEnabled(len(resultats) > 0)
 
     def ajouter(self):
         ''' Permet après recherche de placer le propriétaire sélectionné en haut de la combobox dans le dockwidget'''
@@ -1519,6 +1496,17 @@ class Creation_proprio(QDialog, Ui_dlgBopeCreaProprioForm):
 
             wpro_adresse= wadresse
 
+            # Signalement des propriétaires existants au nom très proche avant la création
+            doublons = self.moteur.doublons(wpro_nom)
+            if doublons is None:
+                QMessageBox.critical(self, u"Erreur SQL", self.moteur.erreur, QMessageBox.Ok)
+            elif len(doublons) > 0:
+                wliste = "\n".join(ligne[1] + " ; " + ligne[4] + " (" + str(int(round(score * 100))) + " %)" for score, ligne in doublons[:5])
+                if QMessageBox.question(self, u"Doublon probable", u"Des propriétaires au nom proche existent déjà :\n\n" + wliste +
+                    u"\n\nCréer quand même ce propriétaire ?", QMessageBox.Yes|QMessageBox.No) != QMessageBox.Yes:
+                    self.afficheResultats(doublons)
+                    return
+
             querypro = QSqlQuery(self.db)
             wrelation = "proprietaire"
             if self.dbType == "postgres":
@@ -1532,6 +1520,7 @@ class Creation_proprio(QDialog, Ui_dlgBopeCreaProprioForm):
             if not querypro.exec_():
                 QMessageBox.critical(self, u"Erreur - Création du propriétaire", querypro.lastError().text(), QMessageBox.Ok)
             else:
+                self.moteur.actualise()
                 QDialog.accept(self)
 
     def validation_saisie(self):
@@ -1683,49 +1672,51 @@ class Bope_recherche_proprio_dialog(QDialog, Ui_dlgBopeRechercheProprioForm):
         self.dbType = dbType
         self.dbSchema = dbSchema
         self.setupUi(self)
+        self.moteur = Recherche_proprio.ouvrir(self.db, self.dbSchema)
+
+        # Recherche à la saisie, lancée après une pause de la frappe
+        self.minuteur = QTimer(self)
+        self.minuteur.setSingleShot(True)
+        self.minuteur.setInterval(300)
+        self.minuteur.timeout.connect(partial(self.recherche, True))
+        self.leNom.textChanged.connect(lambda texte: self.minuteur.start())
+
         self.btnChercher.clicked.connect(self.recherche)
         self.btnAjouter.clicked.connect(self.ajouter)
         self.btnAnnuler.clicked.connect(self.reject)
         self.btnAjouter.setEnabled(False)
         self.cmbProprio = cmbProprio
 
-    def recherche(self):
-        '''Permet de rechercher un propriétaire'''
+    def recherche(self, saisie = False):
+        '''
+        Permet de rechercher un propriétaire par ressemblance du nom ou de l'adresse
 
-        # Double les ' afin d'éviter de faire échouer la requête SQL de recherche
-        wrecherch = self.leNom.text()
-        if "'" in wrecherch and "''" not in wrecherch:
-            wrecherch = wrecherch.replace("'", "''")
+        :param saisie: True si la recherche est lancée pendant la frappe, une saisie vide est alors ignorée
+        :type saisie: bool
+        '''
+        wrecherch = self.leNom.text().strip()
+        if wrecherch == "":
+            if not saisie:
+                QMessageBox.critical(self, "Erreur", u"Aucun nom saisie ...", QMessageBox.Ok)
+            return
+        if saisie and len(wrecherch) < 2:
+            return
 
-        # Requête SQL qui va chercher si le propriétaire saisi existe
-        if wrecherch != "":
-            self.modelCherche = QSqlRelationalTableModel(self, self.db)
-            wrelation = "proprietaire"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelCherche.setTable(wrelation)
-            self.modelCherche.setSort(1, Qt.AscendingOrder)
-
-            self.modelCherche.setFilter("pro_nom ILIKE '%" + wrecherch + "%'")
-            self.modelCherche.select()
-
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_nom"), Qt.Horizontal, u"Nom")
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_telephone"), Qt.Horizontal, u"Téléphone")
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_mail"), Qt.Horizontal, u"Email")
-            self.modelCherche.setHeaderData(self.modelCherche.fieldIndex("pro_adresse"), Qt.Horizontal, u"Adresse")
-
-            if (not self.modelCherche.select()):
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle recherche dans le Bope_recherche_proprio_dialog.recherche() : \n" + self.modelCherche.lastError().text(), QMessageBox.Ok)
-
-            self.tbvProprio.setModel(self.modelCherche)
-            self.tbvProprio.setSelectionMode(QTableView.SingleSelection)
-            self.tbvProprio.setSelectionBehavior(QTableView.SelectRows)
-            self.tbvProprio.setColumnHidden(self.modelCherche.fieldIndex("pro_id"), True)
-            self.tbvProprio.resizeColumnsToContents()
-            self.tbvProprio.horizontalHeader().setStretchLastSection(True)
-            self.btnAjouter.setEnabled(True)
-        else:
-            QMessageBox.critical(self, "Erreur", u"Aucun nom saisie ...", QMessageBox.Ok)
+        resultats = self.moteur.recherche(wrecherch)
+        if resultats is None:
+            QMessageBox.critical(self, u"Erreur SQL", self.moteur.erreur, QMessageBox.Ok)
+            return
+
+        self.modelCherche = self.moteur.modele(resultats, self)
+        self.tbvProprio.setModel(self.modelCherche)
+        self.tbvProprio.setSelectionMode(QTableView.SingleSelection)
+        self.tbvProprio.setSelectionBehavior(QTableView.SelectRows)
+        self.tbvProprio.setColumnHidden(0, True)
+        self.tbvProprio.resizeColumnsToContents()
+        self.tbvProprio.horizontalHeader().setStretchLastSection(True)
+        if len(resultats) > 0:
+            self.tbvProprio.selectRow(0)
+        self.btnAjouter.setEnabled(len(resultats) > 0)
 
     def ajouter(self):
         ''' Permet après recherche de placer le propriétaire sélectionné en haut de la combobox dans le dockwidget'''
@@ -1900,6 +1891,16 @@ class Ajout_parcelle(QDialog, Ui_dlgBopeAjoutParcelleForm):
 
         self.cmbCommune.setCurrentIndex(0)
 
+        # Index des références cadastrales : saisie semi-automatique et listes de références résolues en mémoire
+        self.indexCadastre = Index_cadastre.ouvrir(self.db, self.dbSchema)
+        if self.indexCadastre is None:
+            QMessageBox.critical(self, u"Erreur SQL", Index_cadastre.derniereErreur, QMessageBox.Ok)
+            self.btnReference.setEnabled(False)
+        else:
+            self.leReference.setCompleter(self.indexCadastre.completeur(self))
+        self.leReference.returnPressed.connect(self.ajoutReference)
+        self.btnReference.clicked.connect(self.rechercheReferences)
+
     def changeCmbCommune(self, newInd):
         '''
         Filtre la combobox section en fonction de la commune affichée dans celle des communes
@@ -1986,11 +1987,32 @@ class Ajout_parcelle(QDialog, Ui_dlgBopeAjoutParcelleForm):
                 else:
                     self.wwhere += "OR par_id = '" + str(self.wparcelle) +"'"
 
+    def ajoutReference(self):
+        '''Ajoute la référence saisie à la liste des références'''
+
+        if self.leReference.text().strip() != "":
+            self.txtReferences.appendPlainText(self.leReference.text().strip())
+            self.leReference.clear()
+
+    def rechercheReferences(self):
+        '''Affiche les parcelles désignées par la liste des références (et la référence en cours de saisie)'''
+
+        parIds, inconnues = self.indexCadastre.resout(self.txtReferences.toPlainText() + "\n" + self.leReference.text())
+        if len(parIds) == 0:
+            QMessageBox.information(self, "Filtrage", u"Aucune parcelle ne correspond aux références ...", QMessageBox.Ok)
+            return
+        self.afficheParcelles(parIds)
+        if len(inconnues) > 0:
+            QMessageBox.information(self, "Filtrage", u"Références sans correspondance : \n" + "\n".join(inconnues[:20]) +
+                (u"\n..." if len(inconnues) > 20 else ""), QMessageBox.Ok)
+
     def raz(self):
         '''Réinitialise toutes les variables de la fenêtre afin de recommencer une nouvelle requête'''
 
         self.wrq = ""
         self.txtSql.setText("")
+        self.txtReferences.clear()
+        self.leReference.clear()
         self.wwhere = ""
         modelRaz = QSqlQueryModel()
         self.tbvResu.setModel(modelRaz)
@@ -2052,48 +2074,57 @@ class Ajout_parcelle(QDialog, Ui_dlgBopeAjoutParcelleForm):
             query = QSqlQuery(self.db)
             query.prepare(self.requete)
             if query.exec_():
-                wparam = ""
+                parIds = []
                 while query.next():
-                    wparam = wparam + "'" + str(query.value(0)) + "' ,"
-                if (wparam != ""):
-                    wparam = "(" + wparam[0:len(wparam) - 1] + ")"
-
-                    # Création du modèle Parcelle
-                    self.modelPar = QSqlRelationalTableModel(self, self.db)
-
-                    wrelation = "parcelle"
-                    if self.dbType == "postgres":
-                        wrelation = self.dbSchema + "." + wrelation
-                    self.modelPar.setTable(wrelation)
-                    self.modelPar.setFilter("par_id in %s" %wparam)
-                    self.modelPar.setSort(0, Qt.AscendingOrder)
-
-                    # Remplissage du tableau avec le modèle Parcelle
-                    self.modelPar.setHeaderData(self.modelPar.fieldIndex("par_id"), Qt.Horizontal, "ID")
-                    self.modelPar.setHeaderData(self.modelPar.fieldIndex("par_numero"), Qt.Horizontal, u"Parcelle")
-
-                    if (not self.modelPar.select()):
-                        QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Parcelle dans le ajoutParcelle.recherche() : \n" + self.modelPar.lastError().text(), QMessageBox.Ok)
-
-                    self.modelPar.setEditStrategy(QSqlTableModel.OnManualSubmit)
-
-                    self.tbvResu.setModel(self.modelPar)
-                    self.tbvResu.setSelectionMode(QTableView.MultiSelection)
-                    self.tbvResu.setSelectionBehavior(QTableView.SelectRows)
-                    self.tbvResu.setColumnHidden(self.modelPar.fieldIndex("par_sec_id"), True)
-                    self.tbvResu.setColumnHidden(self.modelPar.fieldIndex("par_geom"), True)
-                    self.tbvResu.setColumnHidden(self.modelPar.fieldIndex("par_bope_id"), True)
-                    self.tbvResu.resizeColumnsToContents()
-                    self.tbvResu.horizontalHeader().setResizeMode(QHeaderView.Stretch)
-                    self.tbvResu.horizontalHeader().setStretchLastSection(True)
-                    self.tbvResu.horizontalHeader().moveSection(3, 0) # Place la 3émé colonne de PostgreSQL en position 0
-                    self.tbvResu.setColumnWidth(0, 20)
-                    self.btnAjouter.setEnabled(True)
+                    parIds.append(str(query.value(0)))
+                if len(parIds) != 0:
+                    self.afficheParcelles(parIds)
                 else :
                     QMessageBox.information(self, "Filtrage", u"Aucune parcelle ne correspond aux critères ...", QMessageBox.Ok)
             else:
                 QMessageBox.critical(self, u"Erreur SQL", query.lastError().text(), QMessageBox.Ok)
 
+    def afficheParcelles(self, parIds):
+        '''
+        Affiche les parcelles dans le tableau des résultats
+
+        :param parIds: identifiants des parcelles
+        :type parIds: list
+        '''
+        wparam = "(" + ", ".join("'" + par_id.replace("'", "''") + "'" for par_id in parIds) + ")"
+
+        # Création du modèle Parcelle
+        self.modelPar = QSqlRelationalTableModel(self, self.db)
+
+        wrelation = "parcelle"
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "." + wrelation
+        self.modelPar.setTable(wrelation)
+        self.modelPar.setFilter("par_id in %s" %wparam)
+        self.modelPar.setSort(0, Qt.AscendingOrder)
+
+        # Remplissage du tableau avec le modèle Parcelle
+        self.modelPar.setHeaderData(self.modelPar.fieldIndex("par_id"), Qt.Horizontal, "ID")
+        self.modelPar.setHeaderData(self.modelPar.fieldIndex("par_numero"), Qt.Horizontal, u"Parcelle")
+
+        if (not self.modelPar.select()):
+            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Parcelle dans le ajoutParcelle.recherche() : \n" + self.modelPar.lastError().text(), QMessageBox.Ok)
+
+        self.modelPar.setEditStrategy(QSqlTableModel.OnManualSubmit)
+
+        self.tbvResu.setModel(self.modelPar)
+        self.tbvResu.setSelectionMode(QTableView.MultiSelection)
+        self.tbvResu.setSelectionBehavior(QTableView.SelectRows)
+        self.tbvResu.setColumnHidden(self.modelPar.fieldIndex("par_sec_id"), True)
+        self.tbvResu.setColumnHidden(self.modelPar.fieldIndex("par_geom"), True)
+        self.tbvResu.setColumnHidden(self.modelPar.fieldIndex("par_bope_id"), True)
+        self.tbvResu.resizeColumnsToContents()
+        self.tbvResu.horizontalHeader().setResizeMode(QHeaderView.Stretch)
+        self.tbvResu.horizontalHeader().setStretchLastSection(True)
+        self.tbvResu.horizontalHeader().moveSection(3, 0) # Place la 3émé colonne de PostgreSQL en position 0
+        self.tbvResu.setColumnWidth(0, 20)
+        self.btnAjouter.setEnabled(True)
+
     def ajouter (self):
         ''' Permet après recherche d'ajouter dans la base de données le lien entre la parcelle et le droit de pêche'''
 
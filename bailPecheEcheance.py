@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+# Ce script permet le suivi des échéances de tous les droits de pêche (dépassés, à échéance proche, intemporels).
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+from PyQt5.QtCore import (Qt)
+from PyQt5.QtGui import (QBrush, QColor)
+from PyQt5.QtSql import (QSqlQuery)
+from PyQt5.QtWidgets import (QCheckBox, QComboBox, QDialog, QHBoxLayout, QLabel, QMessageBox, QPushButton, QSizePolicy, QSpacerItem,
+    QSpinBox, QTreeWidget, QTreeWidgetItem, QVBoxLayout)
+
+class Echeance_bail():
+    '''
+    Statut d'échéance de tous les droits de pêche, avec leur AAPPMA et leurs cours d'eau.
+
+    Le statut (intemporel, sans date de fin, dépassé, échéance dans les N jours, en cours) est calculé par PostgreSQL
+    en une seule requête sur droit_peche, puis conservé pour la session. Les formulaires signalent chaque modification
+    d'un droit par actualise(), qui ne relit que les droits concernés.
+    '''
+    # Échéances chargées pendant la session : (base, schéma) -> Echeance_bail
+    instances = {}
+    # Délai par défaut (jours) d'une échéance proche, celui de l'avertissement du formulaire
+    delaiDefaut = 90
+    # Statuts, dans l'ordre d'affichage
+    INTEMPOREL, SANS_DATE, DEPASSE, PROCHE, EN_COURS = range(5)
+    statuts = [u"Intemporel", u"Sans date de fin", u"Dépassé", u"Échéance proche", u"En cours"]
+    # Groupe des droits sans AAPPMA ou sans cours d'eau
+    sansGroupe = u"(non renseigné)"
+
+    @classmethod
+    def ouvrir(cls, db, dbSchema):
+        '''
+        Renvoi les échéances de la base, calculées lors du premier appel
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+
+        :rtype: Echeance_bail
+        '''
+        cle = (db.hostName(), db.databaseName(), dbSchema)
+        echeance = cls.instances.get(cle)
+        if echeance is None:
+            echeance = cls(db, dbSchema)
+            echeance.charge()
+            if echeance.erreur == "":
+                cls.instances[cle] = echeance
+        else:
+            # La connexion du pool a pu être rouverte depuis le dernier appel
+            echeance.db = db
+        return echeance
+
+    @classmethod
+    def ouvert(cls, db, dbSchema):
+        '''Renvoi les échéances de la base si elles ont déjà été calculées, None sinon'''
+
+        echeance = cls.instances.get((db.hostName(), db.databaseName(), dbSchema))
+        if echeance is not None:
+            echeance.db = db
+        return echeance
+
+    @classmethod
+    def vider(cls):
+        '''Libère les échéances chargées, elles seront recalculées au prochain appel'''
+
+        cls.instances = {}
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.delai = self.delaiDefaut
+        # Droits de pêche : bope_id -> (date de fin, jours restants, statut, AAPPMA, [cours d'eau])
+        self.baux = {}
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def requete(self, filtre = ""):
+        '''
+        Renvoi la requête des échéances, le premier paramètre est le délai en jours
+
+        :param filtre: condition supplémentaire sur droit_peche (ex: bope_id = any(?))
+        :type filtre: str
+
+        :return: requête renvoyant (bope_id, date de fin, jours restants, statut, AAPPMA, cours d'eau séparés par des retours à la ligne)
+        :rtype: str
+        '''
+        # La date du 01/01/2000 est celle d'un droit sans date de fin (voir rowChange() du formulaire)
+        return ("select d.bope_id, d.bope_date_fin, d.bope_date_fin - current_date, " +
+            "case when d.bope_infini then " + str(self.INTEMPOREL) + " " +
+            "when d.bope_date_fin is null or d.bope_date_fin = date '2000-01-01' then " + str(self.SANS_DATE) + " " +
+            "when d.bope_date_fin < current_date then " + str(self.DEPASSE) + " " +
+            "when d.bope_date_fin <= current_date + ?::integer then " + str(self.PROCHE) + " " +
+            "else " + str(self.EN_COURS) + " end, " +
+            "coalesce(a.apma_nom, ''), coalesce(string_agg(distinct c.ceau_nom, E'\\n'), '') " +
+            "from " + self.relation("droit_peche") + " as d " +
+            "left join " + self.relation("aappma") + " as a on a.apma_id = d.bope_apma_id " +
+            "left join " + self.relation("bail_cours_eau") + " as b on b.bce_bope_id = d.bope_id " +
+            "left join " + self.relation("cours_eau") + " as c on c.ceau_id = b.bce_ceau_id " +
+            (" where " + filtre + " " if filtre != "" else "") +
+            "group by d.bope_id, d.bope_date_fin, d.bope_infini, a.apma_nom")
+
+    def lit(self, query):
+        '''Conserve les droits renvoyés par requete()'''
+
+        while query.next():
+            jours = query.value(2)
+            jours = int(jours) if jours is not None and str(jours) != "NULL" else None
+            rivieres = [riviere for riviere in str(query.value(5)).split("\n") if riviere != ""]
+            self.baux[int(query.value(0))] = (query.value(1), jours, int(query.value(3)), str(query.value(4)), rivieres)
+
+    def charge(self, delai = None):
+        '''
+        Calcule l'échéance de tous les droits de pêche
+
+        :param delai: nombre de jours d'une échéance proche, à défaut le délai courant
+        :type delai: int
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        self.erreur = ""
+        if delai is not None:
+            self.delai = int(delai)
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare(self.requete())
+        query.addBindValue(self.delai)
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return False
+        self.baux = {}
+        self.lit(query)
+        return True
+
+    def actualise(self, ids):
+        '''
+        Recalcule l'échéance des droits de pêche modifiés, les droits supprimés sont retirés
+
+        :param ids: identifiants des droits de pêche modifiés
+        :type ids: list
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        self.erreur = ""
+        ids = set(int(id) for id in ids)
+        if len(ids) == 0:
+            return True
+        for id in ids:
+            self.baux.pop(id, None)
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare(self.requete("d.bope_id = any(?::integer[])"))
+        query.addBindValue(self.delai)
+        query.addBindValue("{" + ",".join(str(id) for id in ids) + "}")
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return False
+        self.lit(query)
+        return True
+
+    def bilan(self):
+        '''
+        Renvoi le nombre de droits de pêche par statut
+
+        :rtype: list
+        '''
+        bilan = [0] * len(self.statuts)
+        for bail in self.baux.values():
+            bilan[bail[2]] += 1
+        return bilan
+
+    def groupes(self, parRiviere = False, statuts = None):
+        '''
+        Renvoi les droits de pêche regroupés par AAPPMA ou par cours d'eau (un droit figure sous chacun de ses cours d'eau)
+
+        :param parRiviere: True pour regrouper par cours d'eau
+        :type parRiviere: bool
+
+        :param statuts: statuts retenus, tous à défaut
+        :type statuts: list
+
+        :return: [(groupe, [bope_id])] triée sur le groupe, droits triés du plus en retard au plus lointain
+        :rtype: list
+        '''
+        groupes = {}
+        for bope_id, (dateFin, jours, statut, aappma, rivieres) in self.baux.items():
+            if statuts is not None and statut not in statuts:
+                continue
+            noms = rivieres if parRiviere else [aappma]
+            for nom in noms or [""]:
+                groupes.setdefault(nom or self.sansGroupe, []).append(bope_id)
+        for ids in groupes.values():
+            ids.sort(key = lambda bope_id: (self.baux[bope_id][2], self.baux[bope_id][1] if self.baux[bope_id][1] is not None else 0, bope_id))
+        return sorted(groupes.items())
+
+class Echeance_bail_dialog(QDialog):
+    '''
+    Tableau des échéances des droits de pêche, un double clic affiche le droit dans le formulaire "Droits de pêche"
+
+    :param QDialog: Permet d'afficher l'interface graphique comme une fenêtre indépendante
+    :type QDialog: QDialog
+    '''
+    # Couleur des droits dépassés et à échéance proche
+    couleurs = {Echeance_bail.DEPASSE: QColor(200, 0, 0), Echeance_bail.PROCHE: QColor(230, 120, 0)}
+
+    def __init__(self, echeance, navigue, parent = None):
+        '''
+        Constructeur, construction de la fenêtre
+
+        :param echeance: échéances des droits de pêche de la base
+        :type echeance: Echeance_bail
+
+        :param navigue: fonction appelée avec l'identifiant du droit de pêche choisi
+        :type navigue: function
+        '''
+        QDialog.__init__(self, parent)
+        self.echeance = echeance
+        self.navigue = navigue
+        self.setWindowTitle(u"Échéances des droits de pêche")
+        self.setAttribute(Qt.WA_DeleteOnClose)
+
+        self.cmbRegroupement = QComboBox(self)
+        self.cmbRegroupement.addItems([u"AAPPMA", u"Cours d'eau"])
+        self.spnDelai = QSpinBox(self)
+        self.spnDelai.setRange(1, 3650)
+        self.spnDelai.setValue(self.echeance.delai)
+        self.spnDelai.setSuffix(u" jours")
+        self.chkTous = QCheckBox(u"Tous les droits", self)
+        self.chkTous.setToolTip(u"Affiche aussi les droits en cours et intemporels")
+        self.lblBilan = QLabel("", self)
+        self.trwEcheances = QTreeWidget(self)
+        self.trwEcheances.setHeaderLabels([u"Droit de pêche", u"Date de fin", u"Jours restants", u"Statut"])
+        self.btnAfficher = QPushButton(u"Afficher le droit de pêche", self)
+        self.btnActualiser = QPushButton(u"Actualiser", self)
+        self.btnActualiser.setToolTip(u"Recalcule l'échéance de tous les droits de pêche (modifications faites hors du formulaire)")
+        self.btnFermer = QPushButton(u"Fermer", self)
+
+        options = QHBoxLayout()
+        options.addWidget(QLabel(u"Regrouper par :", self))
+        options.addWidget(self.cmbRegroupement)
+        options.addWidget(QLabel(u"Échéance proche :", self))
+        options.addWidget(self.spnDelai)
+        options.addWidget(self.chkTous)
+        options.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons = QHBoxLayout()
+        boutons.addWidget(self.btnAfficher)
+        boutons.addWidget(self.btnActualiser)
+        boutons.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons.addWidget(self.btnFermer)
+        layout = QVBoxLayout(self)
+        layout.addLayout(options)
+        layout.addWidget(self.lblBilan)
+        layout.addWidget(self.trwEcheances)
+        layout.addLayout(boutons)
+        self.resize(560, 450)
+
+        self.cmbRegroupement.currentIndexChanged.connect(self.remplir)
+        self.chkTous.stateChanged.connect(self.remplir)
+        self.spnDelai.editingFinished.connect(self.changeDelai)
+        self.trwEcheances.itemDoubleClicked.connect(self.afficher)
+        self.btnAfficher.clicked.connect(self.afficher)
+        self.btnActualiser.clicked.connect(self.actualiser)
+        self.btnFermer.clicked.connect(self.close)
+        self.remplir()
+
+    def remplir(self):
+        '''Affiche les droits de pêche regroupés, les groupes ayant des droits dépassés ou proches sont dépliés'''
+
+        self.trwEcheances.clear()
+        bilan = self.echeance.bilan()
+        self.lblBilan.setText(str(bilan[Echeance_bail.DEPASSE]) + u" dépassé(s), " + str(bilan[Echeance_bail.PROCHE]) +
+            u" à échéance dans les " + str(self.echeance.delai) + u" jours, " + str(bilan[Echeance_bail.SANS_DATE]) + u" sans date de fin, " +
+            str(bilan[Echeance_bail.INTEMPOREL]) + u" intemporel(s), " + str(bilan[Echeance_bail.EN_COURS]) + u" en cours")
+
+        statuts = None if self.chkTous.isChecked() else [Echeance_bail.DEPASSE, Echeance_bail.PROCHE, Echeance_bail.SANS_DATE]
+        for groupe, ids in self.echeance.groupes(self.cmbRegroupement.currentIndex() == 1, statuts):
+            alertes = sum(1 for bope_id in ids if self.echeance.baux[bope_id][2] in self.couleurs)
+            parent = QTreeWidgetItem(self.trwEcheances, [groupe + " (" + str(len(ids)) + ")"])
+            for bope_id in ids:
+                dateFin, jours, statut, aappma, rivieres = self.echeance.baux[bope_id]
+                item = QTreeWidgetItem(parent, [u"n° " + str(bope_id),
+                    dateFin.toString("dd/MM/yyyy") if statut not in (Echeance_bail.SANS_DATE, Echeance_bail.INTEMPOREL) else "",
+                    str(jours) if statut in self.couleurs else "", self.echeance.statuts[statut]])
+                item.setData(0, Qt.UserRole, bope_id)
+                item.setToolTip(0, aappma + "\n" + ", ".join(rivieres))
+                if statut in self.couleurs:
+                    for colonne in range(4):
+                        item.setForeground(colonne, QBrush(self.couleurs[statut]))
+            parent.setExpanded(alertes > 0)
+        self.trwEcheances.resizeColumnToContents(0)
+
+    def changeDelai(self):
+        '''Recalcule les échéances avec le nouveau délai'''
+
+        if self.spnDelai.value() != self.echeance.delai:
+            self.actualiser()
+
+    def actualiser(self):
+        '''Recalcule l'échéance de tous les droits de pêche'''
+
+        if not self.echeance.charge(self.spnDelai.value()):
+            QMessageBox.critical(self, u"Erreur SQL", self.echeance.erreur, QMessageBox.Ok)
+        self.remplir()
+
+    def afficher(self):
+        '''Affiche dans le formulaire le droit de pêche sélectionné'''
+
+        item = self.trwEcheances.currentItem()
+        if item is not None and item.data(0, Qt.UserRole) is not None:
+            self.navigue(item.data(0, Qt.UserRole))
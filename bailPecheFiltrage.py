@@ -17,6 +17,12 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/forms")
 # Import du script Python de l'interface graphique nécessaire
 from bopeRechercheForm import (Ui_dlgBopeRechercheForm)
 
+# Import du cache des tables de référence
+from .commonDialogs import (Gedopi_reference)
+
+# Import de l'index des références cadastrales
+from .bailPecheCadastre import (Index_cadastre)
+
 class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
     '''
     Class de la fenêtre permettant le filtrage attributaire des baux de pêche
@@ -92,16 +98,11 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.wwherePossession = ""
         self.wwhereProprio = ""
 
-        self.modelAappma = QSqlTableModel(self, self.db)
-        wrelation = "aappma"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelAappma.setTable(wrelation)
-        self.modelAappma.setSort(1, Qt.AscendingOrder)
-        if (not self.modelAappma.select()):
+        self.modelAappma = Gedopi_reference.modele(self.db, self.dbSchema, "aappma")
+        if self.modelAappma.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle AAPPMA", self.modelAappma.lastError().text(), QMessageBox.Ok)
         self.cmbAappma.setModel(self.modelAappma)
-        self.cmbAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbAappma.setModelColumn(1)
 
         self.modelRiviere = QSqlTableModel(self, self.db)
         wrelation = "cours_eau"
@@ -141,6 +142,16 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
 
         self.cmbCommune.setCurrentIndex(0)
 
+        # Index des références cadastrales : saisie semi-automatique et listes de références résolues en mémoire
+        self.indexCadastre = Index_cadastre.ouvrir(self.db, self.dbSchema)
+        if self.indexCadastre is None:
+            QMessageBox.critical(self, u"Erreur SQL", Index_cadastre.derniereErreur, QMessageBox.Ok)
+            self.btnReference.setEnabled(False)
+        else:
+            self.leReference.setCompleter(self.indexCadastre.completeur(self))
+        self.leReference.returnPressed.connect(self.ajoutReferenceListe)
+        self.btnReference.clicked.connect(self.ajoutReference)
+
     def reject(self):
         '''Ferme la fenêtre si clic sur le bouton annuler'''
 
@@ -210,6 +221,8 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.spnId.setValue(0)
         self.wrq = ""
         self.txtSql.setText("")
+        self.txtReferences.clear()
+        self.leReference.clear()
         self.wwhere = ""
         self.wwherePossession = ""
         self.wwhereProprio = ""
@@ -230,6 +243,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(True)
         self.btnCS.setEnabled(True)
         self.btnCSP.setEnabled(True)
+        self.btnReference.setEnabled(True)
         self.btnProprio.setEnabled(True)
         self.btnAdresse.setEnabled(True)
 
@@ -264,6 +278,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
 
         if self.CSPBool == False:
             self.btnCSP.setEnabled(True)
+            self.btnReference.setEnabled(True)
 
         self.wwhere += " AND "
 
@@ -281,6 +296,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(True)
         self.btnCS.setEnabled(True)
         self.btnCSP.setEnabled(True)
+        self.btnReference.setEnabled(True)
         self.btnProprio.setEnabled(True)
         self.btnAdresse.setEnabled(True)
         self.btnPossession.setEnabled(True)
@@ -309,6 +325,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -334,6 +351,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -362,6 +380,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -389,6 +408,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -417,6 +437,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -441,6 +462,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -465,6 +487,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -491,6 +514,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -517,6 +541,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -528,6 +553,51 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
             if self.wparcelle != "":
                 self.wwhere += "bope_id in (select par_bope_id from data.parcelle where par_id = '" + str(self.wparcelle) +"')"
 
+    def ajoutReferenceListe(self):
+        '''Ajoute la référence saisie à la liste des références'''
+
+        if self.leReference.text().strip() != "":
+            self.txtReferences.appendPlainText(self.leReference.text().strip())
+            self.leReference.clear()
+
+    def ajoutReference(self):
+        '''Change l'état des boutons et ajoute un critère de références cadastrales à la requête'''
+
+        if self.indexCadastre is None:
+            return
+        parIds, inconnues = self.indexCadastre.resout(self.txtReferences.toPlainText() + "\n" + self.leReference.text())
+        if len(parIds) == 0:
+            QMessageBox.information(self, "Filtrage", u"Aucune parcelle ne correspond aux références ...", QMessageBox.Ok)
+            return
+        if len(inconnues) > 0:
+            QMessageBox.information(self, "Filtrage", u"Références sans correspondance : \n" + "\n".join(inconnues[:20]) +
+                (u"\n..." if len(inconnues) > 20 else ""), QMessageBox.Ok)
+
+        self.btnEt.setEnabled(True)
+        self.btnOu.setEnabled(True)
+
+        self.btnId.setEnabled(False)
+        self.btnSign.setEnabled(False)
+        self.btnFin.setEnabled(False)
+        self.btnRiviere.setEnabled(False)
+        self.btnAappma.setEnabled(False)
+        self.btnPossession.setEnabled(False)
+        self.btnC.setEnabled(False)
+        self.btnCS.setEnabled(False)
+        self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
+        self.btnProprio.setEnabled(False)
+        self.btnAdresse.setEnabled(False)
+
+        self.CSPBool = True
+
+        wrelation = "parcelle"
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "." + wrelation
+        self.wwhere += "bope_id in (select par_bope_id from " + wrelation + " where par_id in (" + ", ".join("'" + par_id.replace("'", "''") + "'" for par_id in parIds) + "))"
+        self.txtReferences.clear()
+        self.leReference.clear()
+
     def ajoutProprio(self):
         '''
         Change l'état des boutons et ajoute un critère de nom de propriétaire
@@ -546,6 +616,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -592,6 +663,7 @@ class Filtrage_bope_dialog(QDialog, Ui_dlgBopeRechercheForm):
         self.btnC.setEnabled(False)
         self.btnCS.setEnabled(False)
         self.btnCSP.setEnabled(False)
+        self.btnReference.setEnabled(False)
         self.btnProprio.setEnabled(False)
         self.btnAdresse.setEnabled(False)
 
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# Ce script permet la recherche approchée des propriétaires (nom et adresse) et la détection des doublons.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import re
+import unicodedata
+from PyQt5.QtCore import (Qt)
+from PyQt5.QtGui import (QStandardItem, QStandardItemModel)
+from PyQt5.QtSql import (QSqlQuery)
+
+class Recherche_proprio():
+    '''
+    Recherche approchée des propriétaires par trigrammes, classée par ressemblance du nom et de l'adresse.
+
+    Si l'extension pg_trgm et l'index GIN (gin_trgm_ops) de pro_nom et pro_adresse sont installés
+    (data/postgresql/migration_proprietaire_trgm.sql), la recherche est faite par PostgreSQL : les variantes
+    d'orthographe d'un même propriétaire sont trouvées sans parcourir la table. À défaut, les propriétaires sont lus
+    une fois et comparés en mémoire avec le même découpage en trigrammes que pg_trgm (mots en minuscules, accents retirés).
+    Le schéma n'est jamais modifié par le plugin.
+    '''
+    # Moteurs ouverts pendant la session : (base, schéma) -> Recherche_proprio
+    instances = {}
+    # Nombre maximal de propriétaires renvoyés par une recherche
+    nbResultats = 50
+    # Ressemblance minimale (0 à 1) d'un résultat de recherche et d'un doublon probable
+    seuilRecherche = 0.3
+    seuilDoublon = 0.5
+    # Colonnes renvoyées, dans l'ordre de la table proprietaire
+    colonnes = ["pro_id", "pro_nom", "pro_telephone", "pro_mail", "pro_adresse"]
+    entetes = [u"Identifiant", u"Nom", u"Téléphone", u"Email", u"Adresse"]
+    # Caractères séparant les mots
+    separateurs = re.compile(r"[^0-9a-z]+")
+
+    @classmethod
+    def ouvrir(cls, db, dbSchema):
+        '''
+        Renvoi le moteur de recherche de la base, détecte pg_trgm lors du premier appel
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+
+        :rtype: Recherche_proprio
+        '''
+        cle = (db.hostName(), db.databaseName(), dbSchema)
+        moteur = cls.instances.get(cle)
+        if moteur is None:
+            moteur = cls(db, dbSchema)
+            moteur.prepare()
+            cls.instances[cle] = moteur
+        else:
+            # La connexion du pool a pu être rouverte depuis le dernier appel
+            moteur.db = db
+        return moteur
+
+    @classmethod
+    def vider(cls):
+        '''Libère les moteurs ouverts, les propriétaires seront relus au prochain appel'''
+
+        cls.instances = {}
+
+    @classmethod
+    def trigrammes(cls, texte):
+        '''
+        Renvoi les trigrammes d'un texte, découpé comme par pg_trgm (chaque mot est précédé de deux espaces et suivi d'un)
+
+        :rtype: set
+        '''
+        texte = unicodedata.normalize("NFD", texte or "").encode("ascii", "ignore").decode("ascii").lower()
+        trigrammes = set()
+        for mot in cls.separateurs.split(texte):
+            if mot:
+                mot = "  " + mot + " "
+                trigrammes.update(mot[i:i + 3] for i in range(len(mot) - 2))
+        return trigrammes
+
+    @staticmethod
+    def ressemblance(recherche, texte):
+        '''
+        Renvoi la part des trigrammes de la recherche présents dans le texte (0 à 1),
+        une saisie partielle ressemble ainsi au nom complet
+
+        :param recherche: trigrammes de la recherche
+        :type recherche: set
+
+        :param texte: trigrammes du texte comparé
+        :type texte: set
+
+        :rtype: float
+        '''
+        if len(recherche) == 0:
+            return 0.0
+        return len(recherche & texte) / float(len(recherche))
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.trgm = False
+        # Propriétaires lus pour la recherche en mémoire : [(ligne, trigrammes du nom, trigrammes de l'adresse)]
+        self.proprietaires = None
+        self.wrelation = "proprietaire"
+        if dbSchema:
+            self.wrelation = dbSchema + "." + self.wrelation
+
+    def prepare(self):
+        '''Détecte l'extension pg_trgm et l'index trigramme des propriétaires, la recherche se fait en mémoire sans eux'''
+
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare("select exists (select 1 from pg_extension where extname = 'pg_trgm') and " +
+            "exists (select 1 from pg_indexes where schemaname = coalesce(nullif(?, ''), current_schema()) " +
+            "and tablename = 'proprietaire' and indexdef like '%gin_trgm_ops%')")
+        query.addBindValue(self.dbSchema or "")
+        if query.exec_() and query.next():
+            self.trgm = bool(query.value(0))
+
+    def charge(self):
+        '''
+        Lit les propriétaires pour la recherche en mémoire
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if not query.exec_("select " + ", ".join(self.colonnes) + " from " + self.wrelation):
+            self.erreur = query.lastError().text()
+            return False
+        self.proprietaires = []
+        while query.next():
+            ligne = [query.value(i) for i in range(len(self.colonnes))]
+            ligne = [valeur if valeur is not None and str(valeur) != "NULL" else "" for valeur in ligne]
+            self.proprietaires.append((ligne, self.trigrammes(ligne[1]), self.trigrammes(ligne[4])))
+        return True
+
+    def actualise(self):
+        '''Les propriétaires ont été modifiés, ils seront relus par la prochaine recherche en mémoire'''
+
+        self.proprietaires = None
+
+    def compare(self, texte):
+        '''
+        Renvoi les propriétaires comparés en mémoire au texte (meilleure ressemblance du nom ou de l'adresse)
+
+        :param texte: nom ou adresse recherché
+        :type texte: str
+
+        :return: [(ressemblance, ligne)], None si la lecture a échoué (voir self.erreur)
+        :rtype: list
+        '''
+        if self.proprietaires is None and not self.charge():
+            return None
+        recherche = self.trigrammes(texte)
+        return [(max(self.ressemblance(recherche, nom), self.ressemblance(recherche, adr)), ligne)
+            for ligne, nom, adr in self.proprietaires]
+
+    def recherche(self, texte):
+        '''
+        Renvoi les propriétaires dont le nom ou l'adresse ressemble au texte, du plus au moins ressemblant
+
+        :param texte: saisie de l'utilisateur, éventuellement partielle
+        :type texte: str
+
+        :return: [(ressemblance, [pro_id, nom, téléphone, mail, adresse])], None si la requête a échoué (voir self.erreur)
+        :rtype: list
+        '''
+        self.erreur = ""
+        texte = texte.strip()
+        if texte == "":
+            return []
+        if not self.trgm:
+            resultats = self.compare(texte)
+            if resultats is None:
+                return None
+            resultats = [resultat for resultat in resultats if resultat[0] >= self.seuilRecherche]
+            resultats.sort(key = lambda resultat: (-resultat[0], resultat[1][1]))
+            return resultats[:self.nbResultats]
+
+        # Le ILIKE et l'opérateur <% (word_similarity) utilisent l'index GIN
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare("select " + ", ".join(self.colonnes) + ", greatest(word_similarity(?, coalesce(pro_nom, '')), " +
+            "word_similarity(?, coalesce(pro_adresse, ''))) as score from " + self.wrelation + " " +
+            "where pro_nom ilike ? or pro_adresse ilike ? or ? <% pro_nom or ? <% pro_adresse " +
+            "order by score desc, pro_nom limit " + str(self.nbResultats))
+        motif = "%" + texte.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        for valeur in (texte, texte, motif, motif, texte, texte):
+            query.addBindValue(valeur)
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        resultats = []
+        while query.next():
+            ligne = [query.value(i) for i in range(len(self.colonnes))]
+            ligne = [valeur if valeur is not None and str(valeur) != "NULL" else "" for valeur in ligne]
+            resultats.append((float(query.value(len(self.colonnes))), ligne))
+        return resultats
+
+    def doublons(self, nom, pro_id = None):
+        '''
+        Renvoi les propriétaires existants dont le nom ressemble fortement au nom saisi (doublons probables)
+
+        :param nom: nom du propriétaire à créer
+        :type nom: str
+
+        :param pro_id: identifiant du propriétaire à exclure (modification)
+        :type pro_id: int
+
+        :return: [(ressemblance, ligne)], None si la requête a échoué (voir self.erreur)
+        :rtype: list
+        '''
+        self.erreur = ""
+        nom = nom.strip()
+        if nom == "":
+            return []
+        if not self.trgm:
+            if self.proprietaires is None and not self.charge():
+                return None
+            # Ressemblance symétrique (indice de Jaccard), comme similarity() de pg_trgm
+            recherche = self.trigrammes(nom)
+            resultats = []
+            for ligne, nomExistant, adr in self.proprietaires:
+                union = len(recherche | nomExistant)
+                if union > 0:
+                    resultats.append((len(recherche & nomExistant) / float(union), ligne))
+        else:
+            query = QSqlQuery(self.db)
+            query.setForwardOnly(True)
+            query.prepare("select " + ", ".join(self.colonnes) + ", similarity(pro_nom, ?) as score from " + self.wrelation + " " +
+                "where pro_nom % ? order by score desc limit 10")
+            query.addBindValue(nom)
+            query.addBindValue(nom)
+            if not query.exec_():
+                self.erreur = query.lastError().text()
+                return None
+            resultats = []
+            while query.next():
+                ligne = [query.value(i) for i in range(len(self.colonnes))]
+                ligne = [valeur if valeur is not None and str(valeur) != "NULL" else "" for valeur in ligne]
+                resultats.append((float(query.value(len(self.colonnes))), ligne))
+        resultats = [resultat for resultat in resultats if resultat[0] >= self.seuilDoublon and resultat[1][0] != pro_id]
+        resultats.sort(key = lambda resultat: -resultat[0])
+        return resultats
+
+    def modele(self, resultats, parent = None):
+        '''
+        Renvoi le modèle d'affichage des résultats, la première colonne (pro_id) est à masquer
+
+        :param resultats: résultats de recherche() ou doublons()
+        :type resultats: list
+
+        :rtype: QStandardItemModel
+        '''
+        modele = QStandardItemModel(0, len(self.colonnes), parent)
+        modele.setHorizontalHeaderLabels(self.entetes)
+        for score, ligne in resultats:
+            items = []
+            for valeur in ligne:
+                item = QStandardItem()
+                item.setData(valeur, Qt.DisplayRole)
+                item.setEditable(False)
+                items.append(item)
+            items[1].setToolTip(u"Ressemblance : " + str(int(round(score * 100))) + " %")
+            modele.appendRow(items)
+        return modele
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# Ce script permet d'obtenir l'emprise et la sélection cartographique des parcelles des droits de pêche.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+from PyQt5.QtSql import (QSqlQuery)
+from qgis.core import (QgsFeatureRequest, QgsRectangle)
+
+class Parcelle_bail():
+    '''
+    Emprise et identifiants des parcelles d'un droit de pêche.
+
+    Une seule requête renvoie les par_id des parcelles et leur emprise (ST_Extent calculé par PostGIS).
+    La sélection sur la couche des parcelles passe par une correspondance par_id -> identifiant d'entité, construite
+    une fois par couche en lisant le seul attribut par_id (sans géométrie), puis conservée pour la session :
+    zoom et sélection ne parcourent plus la couche.
+    Les parcelles candidates à une affectation (tronçon de cours d'eau et distance, ou polygone) sont recherchées par
+    ST_DWithin / ST_Intersects, qui utilisent l'index spatial de par_geom, puis affectées par un seul UPDATE.
+    '''
+    # Correspondances par couche : (identifiant de couche, filtre de la couche) -> {par_id : identifiant d'entité}
+    correspondances = {}
+
+    @classmethod
+    def vider(cls):
+        '''Libère les correspondances, elles seront reconstruites au prochain appel'''
+
+        cls.correspondances = {}
+
+    @staticmethod
+    def tableauTexte(valeurs):
+        '''Renvoi la représentation d'un tableau PostgreSQL de textes, à lier à un paramètre " ?::text[] "'''
+
+        return "{" + ",".join('"' + str(valeur).replace('\\', '\\\\').replace('"', '\\"') + '"' for valeur in valeurs) + "}"
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.wrelation = "parcelle"
+        if dbSchema:
+            self.wrelation = dbSchema + "." + self.wrelation
+
+    def parcelles(self, bope_id = None, par_ids = None):
+        '''
+        Renvoi les parcelles d'un droit de pêche (ou d'une liste de parcelles) et leur emprise
+
+        :param bope_id: identifiant du droit de pêche
+        :type bope_id: int
+
+        :param par_ids: identifiants des parcelles, utilisé si bope_id n'est pas renseigné
+        :type par_ids: list
+
+        :return: (liste des par_id, emprise dans le système de la table ou None si aucune parcelle),
+                None si la requête a échoué (voir self.erreur)
+        :rtype: tuple
+        '''
+        self.erreur = ""
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if bope_id is not None:
+            filtre = "par_bope_id = ?"
+        else:
+            filtre = "par_id = any(?::text[])"
+        query.prepare("with choix as (select par_id, par_geom from " + self.wrelation + " where " + filtre + "), " +
+            "emprise as (select ST_Extent(par_geom) as etendue from choix) " +
+            "select par_id, ST_XMin(etendue), ST_YMin(etendue), ST_XMax(etendue), ST_YMax(etendue) from choix, emprise")
+        if bope_id is not None:
+            query.addBindValue(int(bope_id))
+        else:
+            query.addBindValue(self.tableauTexte(par_ids))
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        ids = []
+        emprise = None
+        while query.next():
+            ids.append(str(query.value(0)))
+            if emprise is None and query.value(1) is not None and str(query.value(1)) != "NULL":
+                emprise = QgsRectangle(float(query.value(1)), float(query.value(2)), float(query.value(3)), float(query.value(4)))
+        return ids, emprise
+
+    def correspondance(self, layer, reconstruire = False):
+        '''
+        Renvoi la correspondance par_id -> identifiant d'entité de la couche, la construit lors du premier appel
+
+        :param layer: couche des parcelles
+        :type layer: QgsVectorLayer
+
+        :param reconstruire: True pour relire la couche
+        :type reconstruire: bool
+
+        :rtype: dict
+        '''
+        cle = (layer.id(), layer.subsetString())
+        correspondance = self.correspondances.get(cle)
+        if correspondance is None or reconstruire:
+            index = layer.fields().indexFromName("par_id")
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([index])
+            correspondance = {}
+            for feature in layer.getFeatures(request):
+                correspondance[str(feature.attribute(index))] = feature.id()
+            self.correspondances[cle] = correspondance
+        return correspondance
+
+    def identifiants(self, layer, par_ids):
+        '''
+        Renvoi les identifiants d'entité des parcelles, la correspondance est reconstruite une fois si une parcelle
+        est inconnue (parcelle ajoutée depuis sa construction)
+
+        :param layer: couche des parcelles
+        :type layer: QgsVectorLayer
+
+        :param par_ids: identifiants des parcelles
+        :type par_ids: list
+
+        :rtype: list
+        '''
+        correspondance = self.correspondance(layer)
+        if any(str(par_id) not in correspondance for par_id in par_ids):
+            correspondance = self.correspondance(layer, True)
+        return [correspondance[str(par_id)] for par_id in par_ids if str(par_id) in correspondance]
+
+    def candidats(self, wkt, tampon = 0):
+        '''
+        Renvoi les parcelles à moins de tampon mètres d'une géométrie (intersectant la géométrie si tampon vaut 0)
+
+        :param wkt: géométrie en Lambert 93 (EPSG:2154), tronçon de cours d'eau ou polygone dessiné
+        :type wkt: str
+
+        :param tampon: distance en mètre
+        :type tampon: float
+
+        :return: [(par_id, par_bope_id ou None)] triée sur par_id, None si la requête a échoué (voir self.erreur)
+        :rtype: list
+        '''
+        self.erreur = ""
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if tampon > 0:
+            condition = "ST_DWithin(par_geom, zone.geom, ?)"
+        else:
+            condition = "ST_Intersects(par_geom, zone.geom)"
+        query.prepare("select par_id, par_bope_id from " + self.wrelation + ", (select ST_GeomFromText(?, 2154) as geom) as zone where " +
+            condition + " order by par_id")
+        query.addBindValue(wkt)
+        if tampon > 0:
+            query.addBindValue(float(tampon))
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        candidats = []
+        while query.next():
+            bope_id = query.value(1)
+            candidats.append((str(query.value(0)), int(bope_id) if bope_id is not None and str(bope_id) != "NULL" else None))
+        return candidats
+
+    def affecte(self, bope_id, par_ids, reaffecter = False):
+        '''
+        Lie les parcelles au droit de pêche par un seul UPDATE
+
+        :param bope_id: identifiant du droit de pêche
+        :type bope_id: int
+
+        :param par_ids: identifiants des parcelles
+        :type par_ids: list
+
+        :param reaffecter: True pour retirer aussi les parcelles déjà liées à un autre droit de pêche,
+                sinon elles restent liées à leur droit actuel
+        :type reaffecter: bool
+
+        :return: (nombre de parcelles affectées, identifiants des droits de pêche qui ont perdu des parcelles),
+                None si la requête a échoué (voir self.erreur)
+        :rtype: tuple
+        '''
+        self.erreur = ""
+        if len(par_ids) == 0:
+            return 0, []
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        condition = "ancien.par_bope_id is distinct from ?" if reaffecter else "ancien.par_bope_id is null"
+        query.prepare("update " + self.wrelation + " as p set par_bope_id = ? from (select par_id, par_bope_id from " + self.wrelation +
+            " where par_id = any(?::text[])) as ancien where p.par_id = ancien.par_id and " + condition + " returning ancien.par_bope_id")
+        query.addBindValue(int(bope_id))
+        query.addBindValue(self.tableauTexte(par_ids))
+        if reaffecter:
+            query.addBindValue(int(bope_id))
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        nombre = 0
+        anciens = set()
+        while query.next():
+            nombre += 1
+            if query.value(0) is not None and str(query.value(0)) != "NULL":
+                anciens.add(int(query.value(0)))
+        return nombre, sorted(anciens)
@@ -20,16 +20,28 @@ email                                : info@3liz.com
  *     (at your option) any later version.
  *
  *******************************************************************
-Ce script permet l'obtetntion des paramétres de connexion à la base de données PostgreSQL liée au plugin.
+Ce script permet l'obtetntion des paramétres de connexion à la base de données PostgreSQL liée au plugin
+et la gestion des connexions partagées entre les formulaires.
 '''
 
-# Import des modules Python et QGIS nécessaire à l'exécution de ce fichier
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
 import re
 import sys
 import os
-from qgis.core import (QgsMapLayer)
+import time
+from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlQueryModel)
+from qgis.core import (QgsMapLayer, QgsMessageLog)
+
+# psycopg2 est optionnel : il permet les COPY ... TO STDOUT / FROM STDIN que le pilote QPSQL ne sait pas faire
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
 
 class Gedopi_common():
+    # Au-delà de ce nombre d'identifiants, le filtrage cartographique passe par une table temporaire
+    seuilSelection = 500
+
     def __init__(self, dialog):
         '''
         Constructeur.
@@ -95,6 +107,73 @@ class Gedopi_common():
         except:
             return None
 
+    def chargeEnregistrement(self, query, valeurs):
+        '''
+        Exécute une requête préparée une seule fois par formulaire (une par type d'enregistrement)
+        et renvoi la première ligne sous forme de dictionnaire {nom de colonne : valeur},
+        afin de récupérer en un seul aller-retour tout ce dont un enregistrement a besoin
+
+        :param query: requête préparée (QSqlQuery.prepare) contenant des paramètres positionnels " ? "
+        :type query: QSqlQuery
+
+        :param valeurs: valeurs des paramètres, dans l'ordre de la requête
+        :type valeurs: list
+
+        :return: None si la requête échoue (voir query.lastError()),
+                un dictionnaire vide si aucune ligne n'est trouvée
+        :rtype: dict
+        '''
+        for i, valeur in enumerate(valeurs):
+            query.bindValue(i, valeur)
+        if not query.exec_():
+            return None
+        resultat = {}
+        if query.next():
+            record = query.record()
+            for i in range(record.count()):
+                resultat[record.fieldName(i)] = query.value(i)
+        query.finish()
+        return resultat
+
+    def filtreSelection(self, db, colonne, ids, nom):
+        '''
+        Construit le filtre d'un modèle à partir des identifiants sélectionnés sur la carte (layer.selectedFeatureIds()).
+        Une petite sélection est filtrée par une liste " in (...) ", une sélection importante est envoyée
+        en un seul aller-retour dans une table temporaire de la connexion (tableau lié à la requête puis unnest)
+        sur laquelle porte le filtre, ce qui évite une clause démesurée à chaque select() du modèle.
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param colonne: colonne identifiant du modèle à filtrer (ex:opep_id)
+        :type colonne: str
+
+        :param ids: identifiants des entités sélectionnées
+        :type ids: list
+
+        :param nom: suffixe de la table temporaire propre au formulaire (ex:peche)
+        :type nom: str
+
+        :return: le filtre à passer à setFilter(), None si la table temporaire n'a pu être alimentée
+        :rtype: str
+        '''
+        ids = [str(int(wid)) for wid in ids]
+        if len(ids) <= self.seuilSelection:
+            return colonne + " in (" + ",".join(ids) + ")"
+
+        table = "gedopi_selection_" + nom
+        query = QSqlQuery(db)
+        if not query.exec_("create temporary table if not exists " + table + " (id integer primary key)"):
+            return None
+        if not query.exec_("truncate " + table):
+            return None
+        query.prepare("insert into " + table + " (id) select distinct unnest(?::integer[])")
+        query.bindValue(0, "{" + ",".join(ids) + "}")
+        if not query.exec_():
+            return None
+        query.exec_("analyze " + table)
+        return colonne + " in (select id from " + table + ")"
+
     def getConnectionParameterFromDbLayer(self, layer):
         '''
         Obtenir les paramètres de connexion à partir de la
@@ -178,3 +257,306 @@ class Gedopi_common():
 
         return connectionParams
 
+
+class Gedopi_session():
+    '''
+    Service de connexion commun à tous les formulaires du plugin.
+
+    Les connexions QPSQL sont nommées et indexées par leurs paramètres (hôte, port, base, utilisateur),
+    elles restent ouvertes lorsqu'un formulaire est masqué afin d'éviter une nouvelle authentification
+    et ne sont réellement fermées qu'au déchargement du plugin (fermerTout).
+    L'état est porté par la classe, il est donc partagé par tous les formulaires.
+    '''
+    # Nombre maximum de connexions conservées ouvertes, limite souple : si toutes les connexions sont utilisées
+    # par des formulaires ouverts, une connexion supplémentaire est créée puis fermée dès qu'elle est libérée
+    tailleMax = 4
+
+    # Clé -> {'nom', 'utilisateurs', 'derniereUtilisation'}
+    pool = {}
+
+    # Statistiques du pool : connexions réutilisées, connexions à établir (absentes du pool ou perdues)
+    reutilisations = 0
+    manques = 0
+    latences = []
+
+    # Numéro de la dernière connexion nommée
+    sequence = 0
+
+    @classmethod
+    def cleConnexion(cls, connectionParams):
+        '''
+        Renvoi la clé identifiant une connexion à partir des paramètres de connexion
+
+        :param connectionParams: paramètres issus de Gedopi_common.getConnectionParameterFromDbLayer()
+        :type connectionParams: dict
+        '''
+        return (connectionParams['host'], connectionParams['port'], connectionParams['dbname'], connectionParams['user'])
+
+    @classmethod
+    def acquerir(cls, connectionParams):
+        '''
+        Renvoi une connexion ouverte correspondant aux paramètres,
+        réutilise la connexion du pool si elle existe, sinon en crée une nouvelle
+
+        :param connectionParams: paramètres issus de Gedopi_common.getConnectionParameterFromDbLayer()
+        :type connectionParams: dict
+
+        :return: la connexion, ouverte si possible (à tester avec isOpen())
+        :rtype: QSqlDatabase
+        '''
+        cle = cls.cleConnexion(connectionParams)
+        entree = cls.pool.get(cle)
+
+        if entree is not None and QSqlDatabase.contains(entree['nom']):
+            db = QSqlDatabase.database(entree['nom'], False)
+            if db.isOpen():
+                cls.reutilisations += 1
+                entree['utilisateurs'] += 1
+                entree['derniereUtilisation'] = time.time()
+                return db
+        else:
+            # Libère une place dans le pool si nécessaire
+            if len(cls.pool) >= cls.tailleMax:
+                cls.evincer()
+            cls.sequence += 1
+            entree = {'nom': "gedopi_" + str(cls.sequence), 'utilisateurs': 0, 'derniereUtilisation': 0}
+            while QSqlDatabase.contains(entree['nom']):
+                cls.sequence += 1
+                entree['nom'] = "gedopi_" + str(cls.sequence)
+            db = QSqlDatabase.addDatabase("QPSQL", entree['nom'])
+            db.setDatabaseName(connectionParams['dbname'])
+            db.setUserName(connectionParams['user'])
+            db.setPassword(connectionParams['password'])
+            db.setHostName(connectionParams['host'])
+            if connectionParams['port']:
+                db.setPort(int(connectionParams['port']))
+
+        # Connexion (nouvelle ou perdue) : mesure de la latence
+        cls.manques += 1
+        debut = time.time()
+        if not db.open():
+            QgsMessageLog.logMessage(u"Connexion impossible à " + connectionParams['dbname'] + " : " + db.lastError().text(), "Gedopi")
+            if entree['utilisateurs'] == 0:
+                cls.pool.pop(cle, None)
+                db = QSqlDatabase()
+                QSqlDatabase.removeDatabase(entree['nom'])
+            return db
+        latence = (time.time() - debut) * 1000
+        cls.latences.append(latence)
+        entree['utilisateurs'] += 1
+        entree['derniereUtilisation'] = time.time()
+        cls.pool[cle] = entree
+        QgsMessageLog.logMessage(u"Connexion " + entree['nom'] + u" ouverte en " + str(round(latence, 1)) + " ms ; " + cls.rapport(), "Gedopi")
+        return db
+
+    @classmethod
+    def liberer(cls, db):
+        '''
+        Rend la connexion au pool sans la fermer, elle reste disponible pour le prochain formulaire
+
+        :param db: connexion obtenue par acquerir()
+        :type db: QSqlDatabase
+        '''
+        if db is None:
+            return
+        for entree in cls.pool.values():
+            if entree['nom'] == db.connectionName():
+                if entree['utilisateurs'] > 0:
+                    entree['utilisateurs'] -= 1
+                entree['derniereUtilisation'] = time.time()
+                break
+        # Retour à la taille maximale si le pool l'a dépassée pendant que toutes les connexions étaient utilisées
+        while len(cls.pool) > cls.tailleMax and cls.evincer():
+            pass
+
+    @classmethod
+    def evincer(cls):
+        '''
+        Ferme la connexion inutilisée depuis le plus longtemps afin de respecter la taille du pool
+
+        :return: False si toutes les connexions sont utilisées
+        :rtype: bool
+        '''
+
+        libres = [(entree['derniereUtilisation'], cle) for cle, entree in cls.pool.items() if entree['utilisateurs'] == 0]
+        if not libres:
+            return False
+        cle = min(libres)[1]
+        cls.fermer(cle)
+        return True
+
+    @classmethod
+    def fermer(cls, cle):
+        '''
+        Ferme et supprime une connexion du pool
+
+        :param cle: clé de la connexion, voir cleConnexion()
+        :type cle: tuple
+        '''
+        entree = cls.pool.pop(cle, None)
+        if entree is None:
+            return
+        Gedopi_reference.oublier(entree['nom'])
+        if QSqlDatabase.contains(entree['nom']):
+            db = QSqlDatabase.database(entree['nom'], False)
+            db.close()
+            del db
+            QSqlDatabase.removeDatabase(entree['nom'])
+
+    @classmethod
+    def fermerTout(cls):
+        '''Ferme toutes les connexions du pool, appelée au déchargement du plugin'''
+
+        for cle in list(cls.pool.keys()):
+            cls.fermer(cle)
+
+    @classmethod
+    def connexionDirecte(cls, db):
+        '''
+        Ouvre une connexion psycopg2 avec les paramètres d'une connexion du pool,
+        réservée aux transferts en masse (COPY) que le pilote QPSQL ne prend pas en charge
+
+        :param db: connexion obtenue par acquerir()
+        :type db: QSqlDatabase
+
+        :return: la connexion psycopg2 (à fermer par l'appelant), None si psycopg2 n'est pas installé
+        :rtype: psycopg2.extensions.connection
+        '''
+        if psycopg2 is None:
+            return None
+        port = db.port()
+        if port <= 0:
+            port = 5432
+        return psycopg2.connect(host = db.hostName(), port = port, dbname = db.databaseName(), user = db.userName(), password = db.password())
+
+    @classmethod
+    def rapport(cls):
+        '''
+        Renvoi un résumé de l'activité du pool : réutilisations, connexions établies
+        et latence moyenne de connexion
+
+        :rtype: str
+        '''
+        moyenne = 0
+        if cls.latences:
+            moyenne = sum(cls.latences) / len(cls.latences)
+        return (u"pool : " + str(len(cls.pool)) + u" connexion(s), " + str(cls.reutilisations) + u" réutilisation(s), " +
+                str(cls.manques) + u" connexion(s) établie(s), latence moyenne " + str(round(moyenne, 1)) + " ms")
+
+class Gedopi_reference():
+    '''
+    Cache des tables de référence (conditions, motifs, IPR, AAPPMA, contextes PDPG, masses d'eau, espèces...).
+
+    Chaque liste est chargée une seule fois par connexion dans un QSqlQueryModel sans parent,
+    partagé par les formulaires, les fenêtres de filtrage et l'export CSV.
+    La première colonne de chaque modèle est la clé, la seconde le libellé à afficher (setModelColumn(1)).
+    '''
+    # Nom de la référence -> (table, colonnes sélectionnées, tri)
+    references = {
+        'condition_peche': ("condition_peche", "cope_id, cope_condition", "cope_condition"),
+        'motif_peche': ("motif_peche", "mope_id, mope_motif", "mope_motif"),
+        'ipr': ("ipr", "ipr_id, ipr_correspondance", "ipr_correspondance"),
+        'baran_s_zfp': ("baran_s_zfp", "baran_id, baran_correspond", "baran_correspond"),
+        'aappma': ("aappma", "apma_id, apma_nom", "apma_nom"),
+        'contexte_pdpg': ("contexte_pdpg", "pdpg_id, pdpg_nom", "pdpg_nom"),
+        'contexte_pdpg_code': ("contexte_pdpg", "pdpg_id, pdpg_nom || ' ; ' || pdpg_code", "pdpg_nom"),
+        'masse_eau': ("masse_eau", "meau_code, meau_code || ' ; ' || meau_nom", "meau_code"),
+        'espece': ("espece", "esp_id, esp_nom", "esp_nom")
+    }
+
+    # (nom de la connexion, nom de la référence) -> QSqlQueryModel
+    modeles = {}
+
+    # Version des stations, incrémentée à chaque actualisation des références et à chaque modification de station :
+    # les formulaires d'opération rechargent alors leur liste de stations même si la rivière courante n'a pas changé
+    versionStations = 0
+
+    @classmethod
+    def modele(cls, db, dbSchema, nom):
+        '''
+        Renvoi le modèle partagé d'une table de référence, chargé lors du premier appel uniquement
+
+        :param db: connexion à la base de données
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma contenant les données (data)
+        :type dbSchema: str
+
+        :param nom: nom de la référence (voir Gedopi_reference.references)
+        :type nom: str
+
+        :return: le modèle, à tester avec lastError().isValid() en cas d'erreur
+        :rtype: QSqlQueryModel
+        '''
+        cle = (db.connectionName(), nom)
+        modele = cls.modeles.get(cle)
+        if modele is None:
+            modele = QSqlQueryModel()
+            cls.modeles[cle] = modele
+            cls.charger(db, dbSchema, nom, modele)
+        return modele
+
+    @classmethod
+    def charger(cls, db, dbSchema, nom, modele):
+        '''
+        Exécute la requête d'une référence dans le modèle donné
+
+        :param db: connexion à la base de données
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma contenant les données (data)
+        :type dbSchema: str
+
+        :param nom: nom de la référence
+        :type nom: str
+
+        :param modele: modèle à (re)charger
+        :type modele: QSqlQueryModel
+        '''
+        table, colonnes, tri = cls.references[nom]
+        if dbSchema:
+            table = dbSchema + "." + table
+        modele.setQuery("select " + colonnes + " from " + table + " order by " + tri + ";", db)
+        # Un modèle en erreur n'est pas conservé afin d'être rechargé au prochain appel
+        if modele.lastError().isValid():
+            cls.modeles.pop((db.connectionName(), nom), None)
+
+    @classmethod
+    def invalider(cls, table=None):
+        '''
+        Recharge les références en place (les combobox liées sont mises à jour automatiquement),
+        appelée par l'action " Actualiser les listes de référence " du menu : le plugin n'écrit pas dans ces tables,
+        elles sont modifiées directement dans la base
+
+        :param table: nom de la table modifiée, toutes les références si None
+        :type table: str
+        '''
+        if table is None or table == "station":
+            cls.stationsModifiees()
+        for (nomConnexion, nom), modele in list(cls.modeles.items()):
+            if table is not None and cls.references[nom][0] != table:
+                continue
+            if not QSqlDatabase.contains(nomConnexion):
+                cls.modeles.pop((nomConnexion, nom), None)
+                continue
+            db = QSqlDatabase.database(nomConnexion, False)
+            requete = modele.query().lastQuery()
+            modele.setQuery(requete, db)
+
+    @classmethod
+    def stationsModifiees(cls):
+        '''Signale la création ou la modification de stations, les listes de stations par rivière seront relues'''
+
+        cls.versionStations += 1
+
+    @classmethod
+    def oublier(cls, nomConnexion):
+        '''
+        Supprime du cache les modèles d'une connexion qui va être fermée
+
+        :param nomConnexion: nom de la connexion dans le pool
+        :type nomConnexion: str
+        '''
+        for cle in list(cls.modeles.keys()):
+            if cle[0] == nomConnexion:
+                cls.modeles.pop(cle).clear()
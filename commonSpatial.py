@@ -0,0 +1,1071 @@
+# -*- coding: utf-8 -*-
+# Ce script regroupe les services spatiaux communs aux formulaires du plugin (accrochage aux cours d'eau, MNT, ...).
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import heapq
+import os
+import time
+from collections import OrderedDict
+from PyQt5.QtCore import (QFileInfo)
+from PyQt5.QtSql import (QSqlQuery)
+from qgis.core import (Qgis, QgsGeometry, QgsMessageLog, QgsPointXY, QgsRasterLayer, QgsRectangle)
+
+# numpy est fourni avec QGIS, il est nécessaire à l'échantillonnage du MNT
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Gedopi_accrochage():
+    '''
+    Accrochage d'un point au cours d'eau le plus proche.
+
+    La recherche est déléguée à PostGIS : l'opérateur KNN " <-> " utilise l'index spatial de cours_eau.ceau_geom
+    pour ne retenir que quelques candidats, départagés ensuite par ST_Distance.
+    La requête est préparée une seule fois par connexion et réutilisée à chaque clic.
+    '''
+    # Nombre de candidats retenus par l'index avant le calcul de la distance exacte
+    nbCandidats = 10
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, préparation de la requête d'accrochage
+
+        :param db: connexion à la base de données, définie dans le setupModel() du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        wrelation = "cours_eau"
+        if dbSchema:
+            wrelation = dbSchema + "." + wrelation
+        self.query = QSqlQuery(self.db)
+        self.query.prepare("select ceau_id, ST_X(pt), ST_Y(pt), dist from (" +
+        "select ceau_id, ST_ClosestPoint(ceau_geom, ST_SetSRID(ST_MakePoint(?, ?), 2154)) as pt, " +
+        "ST_Distance(ceau_geom, ST_SetSRID(ST_MakePoint(?, ?), 2154)) as dist from " + wrelation + " " +
+        "order by ceau_geom <-> ST_SetSRID(ST_MakePoint(?, ?), 2154) limit " + str(self.nbCandidats) + ") as candidat " +
+        "order by dist limit 1")
+
+    def lastError(self):
+        '''Renvoi la dernière erreur de la requête d'accrochage'''
+
+        return self.query.lastError()
+
+    def accroche(self, point):
+        '''
+        Renvoi le point du cours d'eau le plus proche du point donné
+
+        :param point: point en Lambert 93 (EPSG:2154)
+        :type point: QgsPointXY
+
+        :return: (point accroché, ceau_id, distance en mètre) ou None si aucun cours d'eau
+                ou si la requête échoue (voir lastError())
+        :rtype: tuple
+        '''
+        for i in range(3):
+            self.query.bindValue(2 * i, float(point.x()))
+            self.query.bindValue(2 * i + 1, float(point.y()))
+        if not self.query.exec_():
+            return None
+        resultat = None
+        if self.query.next():
+            resultat = (QgsPointXY(float(self.query.value(1)), float(self.query.value(2))), self.query.value(0), float(self.query.value(3)))
+        self.query.finish()
+        return resultat
+
+class Gedopi_mnt():
+    '''
+    Échantillonnage d'un MNT (ex:data/system/raster/mnt10_cantal.tif).
+
+    Le raster est ouvert une seule fois par session (ouvrir()) puis lu par tuiles carrées via le fournisseur de données ;
+    les tuiles lues sont conservées dans un cache LRU. L'échantillonnage se fait par lots de coordonnées :
+    les points sont regroupés par tuile et les altitudes extraites par indexation numpy (valeur du pixel, comme identify()).
+    '''
+    # MNT ouverts pendant la session : chemin -> Gedopi_mnt
+    instances = {}
+    # Taille (pixels) des tuiles lues et nombre de tuiles conservées en mémoire
+    tailleTuile = 256
+    nbTuiles = 64
+    # Types de données du fournisseur -> types numpy
+    typesDonnees = {Qgis.Byte: "uint8", Qgis.UInt16: "uint16", Qgis.Int16: "int16", Qgis.UInt32: "uint32",
+        Qgis.Int32: "int32", Qgis.Float32: "float32", Qgis.Float64: "float64"}
+
+    @classmethod
+    def ouvrir(cls, chemin):
+        '''
+        Renvoi le MNT ouvert pour ce chemin, l'ouvre lors du premier appel
+
+        :param chemin: chemin du raster
+        :type chemin: str
+
+        :return: None si le raster n'est pas valide
+        :rtype: Gedopi_mnt
+        '''
+        mnt = cls.instances.get(chemin)
+        if mnt is None:
+            layer = QgsRasterLayer(chemin, QFileInfo(chemin).baseName())
+            if not layer.isValid():
+                return None
+            mnt = cls(layer)
+            cls.instances[chemin] = mnt
+        return mnt
+
+    @classmethod
+    def vider(cls):
+        '''Libère les MNT ouverts et leurs tuiles, appelée au déchargement du plugin'''
+
+        cls.instances = {}
+
+    def __init__(self, layer):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param layer: couche raster du MNT
+        :type layer: QgsRasterLayer
+        '''
+        self.layer = layer
+        self.provider = layer.dataProvider()
+        self.etendue = self.provider.extent()
+        self.nbColonnes = self.provider.xSize()
+        self.nbLignes = self.provider.ySize()
+        self.resX = self.etendue.width() / self.nbColonnes
+        self.resY = self.etendue.height() / self.nbLignes
+        self.noData = None
+        if self.provider.sourceHasNoDataValue(1):
+            self.noData = self.provider.sourceNoDataValue(1)
+        self.tuiles = OrderedDict()
+        self.nbTuilesX = (self.nbColonnes + self.tailleTuile - 1) // self.tailleTuile
+
+    def tuile(self, cle):
+        '''
+        Renvoi le tableau des altitudes d'une tuile, lu au premier accès puis conservé (LRU)
+
+        :param cle: numéro de la tuile (ligne * nbTuilesX + colonne)
+        :type cle: int
+
+        :rtype: numpy.ndarray
+        '''
+        valeurs = self.tuiles.get(cle)
+        if valeurs is not None:
+            self.tuiles.move_to_end(cle)
+            return valeurs
+        l0 = (cle // self.nbTuilesX) * self.tailleTuile
+        c0 = (cle % self.nbTuilesX) * self.tailleTuile
+        l1 = min(l0 + self.tailleTuile, self.nbLignes)
+        c1 = min(c0 + self.tailleTuile, self.nbColonnes)
+        etendue = QgsRectangle(self.etendue.xMinimum() + c0 * self.resX, self.etendue.yMaximum() - l1 * self.resY,
+            self.etendue.xMinimum() + c1 * self.resX, self.etendue.yMaximum() - l0 * self.resY)
+        bloc = self.provider.block(1, etendue, c1 - c0, l1 - l0)
+        valeurs = numpy.frombuffer(bytes(bloc.data()), dtype = self.typesDonnees.get(bloc.dataType(), "float32"))
+        valeurs = valeurs.reshape(l1 - l0, c1 - c0).astype(float)
+        if self.noData is not None:
+            valeurs[valeurs == self.noData] = numpy.nan
+        self.tuiles[cle] = valeurs
+        if len(self.tuiles) > self.nbTuiles:
+            self.tuiles.popitem(last = False)
+        return valeurs
+
+    def echantillonne(self, xs, ys):
+        '''
+        Renvoi les altitudes d'un lot de points (coordonnées dans le système du MNT, Lambert 93)
+
+        :param xs: abscisses
+        :type xs: list ou numpy.ndarray
+
+        :param ys: ordonnées
+        :type ys: list ou numpy.ndarray
+
+        :return: altitudes, NaN hors du MNT ou sans donnée
+        :rtype: numpy.ndarray
+        '''
+        xs = numpy.asarray(xs, dtype = float)
+        ys = numpy.asarray(ys, dtype = float)
+        altitudes = numpy.full(len(xs), numpy.nan)
+        colonnes = numpy.floor((xs - self.etendue.xMinimum()) / self.resX).astype(numpy.int64)
+        lignes = numpy.floor((self.etendue.yMaximum() - ys) / self.resY).astype(numpy.int64)
+        dedans = (colonnes >= 0) & (colonnes < self.nbColonnes) & (lignes >= 0) & (lignes < self.nbLignes)
+        indices = numpy.flatnonzero(dedans)
+        cles = (lignes[indices] // self.tailleTuile) * self.nbTuilesX + colonnes[indices] // self.tailleTuile
+        for cle in numpy.unique(cles):
+            choix = indices[cles == cle]
+            valeurs = self.tuile(int(cle))
+            altitudes[choix] = valeurs[lignes[choix] % self.tailleTuile, colonnes[choix] % self.tailleTuile]
+        return altitudes
+
+class Gedopi_profil():
+    '''
+    Profil en long d'un cours d'eau entre deux points accrochés.
+
+    Le tracé est extrait par PostGIS (ST_LineSubstring du cours d'eau entre les positions des deux points),
+    rééchantillonné tous les " pas " mètres le long du lit puis les altitudes sont lues en un seul lot dans le MNT.
+    La pente est ajustée par l'estimateur de Theil-Sen (médiane des pentes entre couples de points),
+    peu sensible aux ponts, seuils et pixels aberrants du MNT.
+    '''
+    # Distance (m) entre deux échantillons le long du tracé
+    pas = 10
+    # Nombre maximum d'échantillons utilisés pour l'ajustement (nombre de couples en n²)
+    nbMaxAjustement = 400
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, préparation de la requête d'extraction du tracé
+
+        :param db: connexion à la base de données, définie dans le setupModel() du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.erreur = ""
+        wrelation = "cours_eau"
+        if dbSchema:
+            wrelation = dbSchema + "." + wrelation
+        self.query = QSqlQuery(self.db)
+        self.query.prepare("with riviere as (select ST_LineMerge(ceau_geom) as geom from " + wrelation + " where ceau_id = ?), " +
+        "repere as (select geom, ST_LineLocatePoint(geom, ST_SetSRID(ST_MakePoint(?, ?), 2154)) as a, " +
+        "ST_LineLocatePoint(geom, ST_SetSRID(ST_MakePoint(?, ?), 2154)) as b from riviere where GeometryType(geom) = 'LINESTRING') " +
+        "select ST_X(pt.geom), ST_Y(pt.geom), repere.a > repere.b from repere, " +
+        "ST_DumpPoints(ST_LineSubstring(repere.geom, least(repere.a, repere.b), greatest(repere.a, repere.b))) as pt " +
+        "order by pt.path")
+
+    def trace(self, ceau_id, point1, point2):
+        '''
+        Renvoi les sommets du cours d'eau entre les deux points, du point 1 vers le point 2
+
+        :param ceau_id: identifiant du cours d'eau sur lequel les deux points sont accrochés
+        :type ceau_id: int
+
+        :param point1: premier point en Lambert 93 (EPSG:2154)
+        :type point1: QgsPointXY
+
+        :param point2: second point en Lambert 93 (EPSG:2154)
+        :type point2: QgsPointXY
+
+        :return: (abscisses, ordonnées), None si le tracé n'a pu être extrait (voir self.erreur)
+        :rtype: tuple
+        '''
+        self.query.bindValue(0, int(ceau_id))
+        self.query.bindValue(1, float(point1.x()))
+        self.query.bindValue(2, float(point1.y()))
+        self.query.bindValue(3, float(point2.x()))
+        self.query.bindValue(4, float(point2.y()))
+        if not self.query.exec_():
+            self.erreur = self.query.lastError().text()
+            return None
+        xs, ys = [], []
+        inverse = False
+        while self.query.next():
+            xs.append(float(self.query.value(0)))
+            ys.append(float(self.query.value(1)))
+            inverse = self.query.value(2)
+        self.query.finish()
+        if len(xs) < 2:
+            self.erreur = u"Tracé du cours d'eau introuvable (géométrie non continue ?)"
+            return None
+        xs = numpy.array(xs)
+        ys = numpy.array(ys)
+        if inverse:
+            return xs[::-1], ys[::-1]
+        return xs, ys
+
+    @staticmethod
+    def reechantillonne(xs, ys, pas):
+        '''
+        Renvoi des points régulièrement espacés le long d'une polyligne (extrémités incluses)
+
+        :param pas: distance entre deux points en mètre
+        :type pas: float
+
+        :return: (distances depuis le premier sommet, abscisses, ordonnées)
+        :rtype: tuple
+        '''
+        cumul = numpy.concatenate(([0.0], numpy.cumsum(numpy.hypot(numpy.diff(xs), numpy.diff(ys)))))
+        distances = numpy.arange(0.0, cumul[-1], pas)
+        distances = numpy.append(distances, cumul[-1])
+        return distances, numpy.interp(distances, cumul, xs), numpy.interp(distances, cumul, ys)
+
+    @classmethod
+    def penteRobuste(cls, distances, altitudes):
+        '''
+        Ajuste une droite altitude = pente * distance + ordonnée par l'estimateur de Theil-Sen
+
+        :param distances: distances le long du tracé
+        :type distances: numpy.ndarray
+
+        :param altitudes: altitudes, les NaN sont ignorés
+        :type altitudes: numpy.ndarray
+
+        :return: (pente en m/m, ordonnée à l'origine), None si moins de deux altitudes valides
+        :rtype: tuple
+        '''
+        valides = ~numpy.isnan(altitudes)
+        d = distances[valides]
+        z = altitudes[valides]
+        if len(d) < 2:
+            return None
+        if len(d) > cls.nbMaxAjustement:
+            choix = numpy.linspace(0, len(d) - 1, cls.nbMaxAjustement).astype(numpy.int64)
+            d = d[choix]
+            z = z[choix]
+        i, j = numpy.triu_indices(len(d), 1)
+        ecarts = d[j] - d[i]
+        garde = ecarts > 0
+        pente = float(numpy.median((z[j] - z[i])[garde] / ecarts[garde]))
+        return pente, float(numpy.median(altitudes[valides] - pente * distances[valides]))
+
+    def profil(self, mnt, ceau_id, point1, point2, pas = None):
+        '''
+        Calcule le profil en long entre deux points accrochés au même cours d'eau
+
+        :param mnt: MNT ouvert par Gedopi_mnt.ouvrir()
+        :type mnt: Gedopi_mnt
+
+        :param pas: distance entre deux échantillons, par défaut Gedopi_profil.pas
+        :type pas: float
+
+        :return: {distances, altitudes, longueur (m), pente (%), coefficient (m/m), ordonnee}, None en cas d'échec (voir self.erreur)
+        :rtype: dict
+        '''
+        self.erreur = ""
+        trace = self.trace(ceau_id, point1, point2)
+        if trace is None:
+            return None
+        distances, xs, ys = self.reechantillonne(trace[0], trace[1], pas or self.pas)
+        altitudes = mnt.echantillonne(xs, ys)
+        ajustement = self.penteRobuste(distances, altitudes)
+        if ajustement is None:
+            self.erreur = u"Altitudes non récupérées le long du tracé"
+            return None
+        return {"distances": distances, "altitudes": altitudes, "longueur": float(distances[-1]),
+            "pente": abs(ajustement[0]) * 100, "ordonnee": ajustement[1], "coefficient": ajustement[0]}
+
+class Gedopi_reseau():
+    '''
+    Graphe topologique du réseau hydrographique (cours_eau), construit une fois puis conservé sur disque.
+
+    Les extrémités des affluents sont insérées comme sommets dans le cours d'eau récepteur (ST_Snap), les noeuds
+    du graphe sont les confluences et les extrémités, chaque arête est une portion de tracé entre deux noeuds.
+    L'adjacence est stockée sous forme compacte (tableaux numpy au format CSR) et enregistrée dans un fichier .npz,
+    reconstruit uniquement lorsque la signature de la table cours_eau change.
+    Le plus court chemin est calculé par Dijkstra sur les seuls noeuds, sans relire les cours d'eau.
+    '''
+    # Graphes chargés pendant la session : (base, schéma) -> Gedopi_reseau
+    instances = {}
+    derniereErreur = ""
+    # Distance (m) en dessous de laquelle une extrémité d'affluent est raccordée au cours d'eau récepteur
+    tolerance = 0.5
+    # Précision (1 / m) des clés de fusion des sommets
+    precision = 100
+    # Tableaux enregistrés dans le fichier du graphe
+    tableaux = ["x", "y", "cumul", "debutPartie", "ceauPartie", "areteA", "areteB", "areteLongueur",
+        "areteDebut", "areteFin", "adjDebut", "adjVoisin", "adjArete"]
+
+    @classmethod
+    def ouvrir(cls, db, dbSchema):
+        '''
+        Renvoi le graphe de la base, le charge (ou le construit) lors du premier appel
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+
+        :return: None si le graphe n'a pu être chargé (voir Gedopi_reseau.derniereErreur)
+        :rtype: Gedopi_reseau
+        '''
+        cle = (db.hostName(), db.databaseName(), dbSchema)
+        reseau = cls.instances.get(cle)
+        if reseau is None:
+            reseau = cls(db, dbSchema)
+            if not reseau.charge():
+                cls.derniereErreur = reseau.erreur
+                return None
+            cls.instances[cle] = reseau
+        return reseau
+
+    @classmethod
+    def vider(cls):
+        '''Libère les graphes chargés, ils seront relus (et reconstruits si nécessaire) au prochain appel'''
+
+        cls.instances = {}
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.erreur = ""
+        self.wrelation = "cours_eau"
+        if dbSchema:
+            self.wrelation = dbSchema + "." + self.wrelation
+        self.cheminCache = (os.path.dirname(os.path.abspath(__file__)) + "/data/system/reseau/cours_eau_" +
+            "_".join(str(elt) for elt in (db.hostName(), db.databaseName(), dbSchema) if elt) + ".npz")
+
+    def signature(self):
+        '''Renvoi une empreinte de la table cours_eau, None si la requête échoue'''
+
+        query = QSqlQuery(self.db)
+        if not query.exec_("select count(*), coalesce(sum(ceau_id), 0), coalesce(sum(ST_NPoints(ceau_geom)), 0), " +
+            "coalesce(sum(ST_Length(ceau_geom)), 0)::bigint from " + self.wrelation) or not query.next():
+            self.erreur = query.lastError().text()
+            return None
+        return ";".join(str(query.value(i)) for i in range(4))
+
+    def charge(self):
+        '''
+        Charge le graphe depuis le fichier s'il est à jour, le construit et l'enregistre sinon
+
+        :return: False en cas d'échec (voir self.erreur)
+        :rtype: bool
+        '''
+        if numpy is None:
+            self.erreur = u"Le module numpy est nécessaire au graphe du réseau hydrographique"
+            return False
+        signature = self.signature()
+        if signature is None:
+            return False
+        if os.path.exists(self.cheminCache):
+            try:
+                with numpy.load(self.cheminCache) as donnees:
+                    if str(donnees["signature"]) == signature:
+                        for nom in self.tableaux:
+                            setattr(self, nom, donnees[nom])
+                        self.prepare()
+                        return True
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+        debut = time.time()
+        if not self.construit():
+            return False
+        self.prepare()
+        QgsMessageLog.logMessage(u"Graphe du réseau hydrographique construit : " + str(len(self.areteA)) + u" arêtes, " +
+            str(len(self.adjDebut) - 1) + u" noeuds (" + str(round(time.time() - debut, 1)) + " s)", "Gedopi")
+        try:
+            if not os.path.isdir(os.path.dirname(self.cheminCache)):
+                os.makedirs(os.path.dirname(self.cheminCache))
+            numpy.savez(self.cheminCache, signature = signature, **dict((nom, getattr(self, nom)) for nom in self.tableaux))
+        except (IOError, OSError) as e:
+            QgsMessageLog.logMessage(u"Graphe du réseau hydrographique non enregistré : " + str(e), "Gedopi")
+        return True
+
+    def construit(self):
+        '''
+        Construit le graphe à partir des géométries de cours_eau
+
+        :return: False si la lecture des cours d'eau a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        tolerance = str(self.tolerance)
+        if not query.exec_("select c.ceau_id, ST_AsText(ST_Force2D((ST_Dump(ST_LineMerge(coalesce(ST_Snap(c.ceau_geom, extremite.geom, " + tolerance + "), " +
+            "c.ceau_geom)))).geom)) from " + self.wrelation + " as c left join lateral (" +
+            "select ST_Collect(ST_Collect(ST_StartPoint(l.geom), ST_EndPoint(l.geom))) as geom from (" +
+            "select (ST_Dump(ST_LineMerge(t.ceau_geom))).geom as geom from " + self.wrelation + " as t " +
+            "where t.ceau_id <> c.ceau_id and ST_DWithin(t.ceau_geom, c.ceau_geom, " + tolerance + ")) as l) as extremite on true"):
+            self.erreur = query.lastError().text()
+            return False
+        parties = []
+        ceaux = []
+        while query.next():
+            texte = query.value(1)
+            if not texte or not texte.startswith("LINESTRING"):
+                continue
+            coordonnees = numpy.array(texte[texte.index("(") + 1:texte.rindex(")")].replace(",", " ").split(), dtype = float).reshape(-1, 2)
+            if len(coordonnees) >= 2:
+                parties.append(coordonnees)
+                ceaux.append(int(query.value(0)))
+        if len(parties) == 0:
+            self.erreur = u"Aucun cours d'eau exploitable"
+            return False
+
+        # Sommets : concaténation des parties et distance cumulée depuis le début de chaque partie
+        xy = numpy.concatenate(parties)
+        self.x = xy[:, 0].copy()
+        self.y = xy[:, 1].copy()
+        self.ceauPartie = numpy.array(ceaux, dtype = numpy.int64)
+        self.debutPartie = numpy.concatenate(([0], numpy.cumsum([len(partie) for partie in parties]))).astype(numpy.int64)
+        partiePoint = numpy.repeat(numpy.arange(len(parties)), numpy.diff(self.debutPartie))
+        segments = numpy.hypot(numpy.diff(self.x), numpy.diff(self.y))
+        segments[self.debutPartie[1:-1] - 1] = 0
+        cumul = numpy.concatenate(([0.0], numpy.cumsum(segments)))
+        self.cumul = cumul - cumul[self.debutPartie[partiePoint]]
+
+        # Fusion des sommets identiques et degré de chaque sommet
+        cles = numpy.round(xy * self.precision).astype(numpy.int64)
+        sommets, sommetPoint = numpy.unique(cles, axis = 0, return_inverse = True)
+        sommetPoint = sommetPoint.reshape(-1)
+        suivant = numpy.ones(len(xy) - 1, dtype = bool)
+        suivant[self.debutPartie[1:-1] - 1] = False
+        degre = (numpy.bincount(sommetPoint[:-1][suivant], minlength = len(sommets)) +
+            numpy.bincount(sommetPoint[1:][suivant], minlength = len(sommets)))
+        estNoeud = degre != 2
+        estNoeud[sommetPoint[self.debutPartie[:-1]]] = True
+        estNoeud[sommetPoint[self.debutPartie[1:] - 1]] = True
+
+        # Arêtes : portions de partie entre deux points qui sont des noeuds
+        points = numpy.flatnonzero(estNoeud[sommetPoint])
+        memePartie = partiePoint[points[:-1]] == partiePoint[points[1:]]
+        self.areteDebut = points[:-1][memePartie]
+        self.areteFin = points[1:][memePartie]
+        numero = numpy.full(len(sommets), -1, dtype = numpy.int64)
+        numero[estNoeud] = numpy.arange(int(estNoeud.sum()))
+        self.areteA = numero[sommetPoint[self.areteDebut]]
+        self.areteB = numero[sommetPoint[self.areteFin]]
+        self.areteLongueur = self.cumul[self.areteFin] - self.cumul[self.areteDebut]
+
+        # Adjacence compacte : voisins et arêtes de chaque noeud, contigus dans adjVoisin / adjArete
+        nbNoeuds = int(estNoeud.sum())
+        origines = numpy.concatenate((self.areteA, self.areteB))
+        ordre = numpy.argsort(origines, kind = "stable")
+        self.adjVoisin = numpy.concatenate((self.areteB, self.areteA))[ordre]
+        self.adjArete = numpy.concatenate((numpy.arange(len(self.areteA)), numpy.arange(len(self.areteA))))[ordre]
+        self.adjDebut = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(origines, minlength = nbNoeuds)))).astype(numpy.int64)
+        return True
+
+    def prepare(self):
+        '''Copie en listes Python les tableaux parcourus par Dijkstra (accès unitaire plus rapide)'''
+
+        self.listeAdjDebut = self.adjDebut.tolist()
+        self.listeAdjVoisin = self.adjVoisin.tolist()
+        self.listeAdjArete = self.adjArete.tolist()
+        self.listeLongueur = self.areteLongueur.tolist()
+        self.entree = None
+        self.sortie = None
+
+    def intervalles(self):
+        '''
+        Calcule, au premier appel, l'arbre d'écoulement et les intervalles du parcours en profondeur de chaque noeud.
+
+        Le sens d'écoulement est celui de numérisation des cours d'eau (de la source vers l'aval) : le noeud aval
+        d'un noeud est l'extrémité B de la première arête qui en part par son extrémité A. Les noeuds situés en amont
+        d'un noeud n (n compris) sont ceux dont l'entrée est dans [entree[n], sortie[n]), un test en temps constant.
+        '''
+        if self.entree is not None:
+            return
+        nbNoeuds = len(self.adjDebut) - 1
+        aval = numpy.full(nbNoeuds, -1, dtype = numpy.int64)
+        inverse = numpy.arange(len(self.areteA))[::-1]
+        aval[self.areteA[inverse]] = self.areteB[inverse]
+        aval[aval == numpy.arange(nbNoeuds)] = -1
+
+        # Affluents (noeuds amont directs) de chaque noeud, au format CSR
+        enfants = numpy.flatnonzero(aval >= 0)
+        ordre = numpy.argsort(aval[enfants], kind = "stable")
+        debutEnfant = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(aval[enfants], minlength = nbNoeuds)))).tolist()
+        listeEnfant = enfants[ordre].tolist()
+
+        # Parcours en profondeur depuis les exutoires, puis depuis les noeuds restés isolés (réseau mal orienté)
+        entree = [-1] * nbNoeuds
+        sortie = [-1] * nbNoeuds
+        compteur = 0
+        for racine in numpy.concatenate((numpy.flatnonzero(aval < 0), numpy.arange(nbNoeuds))).tolist():
+            if entree[racine] >= 0:
+                continue
+            entree[racine] = compteur
+            compteur += 1
+            pile = [[racine, debutEnfant[racine]]]
+            while pile:
+                sommet = pile[-1]
+                if sommet[1] < debutEnfant[sommet[0] + 1]:
+                    enfant = listeEnfant[sommet[1]]
+                    sommet[1] += 1
+                    if entree[enfant] < 0:
+                        entree[enfant] = compteur
+                        compteur += 1
+                        pile.append([enfant, debutEnfant[enfant]])
+                else:
+                    sortie[sommet[0]] = compteur
+                    pile.pop()
+        self.entree = numpy.array(entree, dtype = numpy.int64)
+        self.sortie = numpy.array(sortie, dtype = numpy.int64)
+
+    def positionPartie(self, arete, decalage):
+        '''
+        Renvoi la position d'un point du graphe le long de sa partie de cours d'eau
+
+        :param arete: arête renvoyée par localise()
+        :type arete: int
+
+        :param decalage: distance depuis le début de l'arête
+        :type decalage: float
+
+        :return: (partie, distance depuis le début de la partie, longueur de la partie) en mètre
+        :rtype: tuple
+        '''
+        partie = int(numpy.searchsorted(self.debutPartie, self.areteDebut[arete], side = "right")) - 1
+        return partie, float(self.cumul[self.areteDebut[arete]] + decalage), float(self.cumul[self.debutPartie[partie + 1] - 1])
+
+    def localise(self, point, ceau_id = None):
+        '''
+        Renvoi la position sur le graphe du point du réseau le plus proche
+
+        :param point: point en Lambert 93 (EPSG:2154)
+        :type point: QgsPointXY
+
+        :param ceau_id: cours d'eau sur lequel chercher (résultat de Gedopi_accrochage), à défaut tout le réseau
+        :type ceau_id: int
+
+        :return: (arête, distance depuis le début de l'arête, point projeté), None si aucun tracé
+        :rtype: tuple
+        '''
+        if ceau_id is not None:
+            parties = numpy.flatnonzero(self.ceauPartie == int(ceau_id))
+        else:
+            parties = numpy.arange(len(self.ceauPartie))
+        if len(parties) == 0:
+            return None
+        debuts = numpy.concatenate([numpy.arange(self.debutPartie[p], self.debutPartie[p + 1] - 1) for p in parties])
+        ax, ay = self.x[debuts], self.y[debuts]
+        dx, dy = self.x[debuts + 1] - ax, self.y[debuts + 1] - ay
+        carre = dx * dx + dy * dy
+        carre[carre == 0] = 1
+        t = numpy.clip(((point.x() - ax) * dx + (point.y() - ay) * dy) / carre, 0, 1)
+        k = int(numpy.argmin((ax + t * dx - point.x()) ** 2 + (ay + t * dy - point.y()) ** 2))
+        j = int(debuts[k])
+        arete = int(numpy.searchsorted(self.areteDebut, j, side = "right")) - 1
+        decalage = self.cumul[j] + t[k] * (self.cumul[j + 1] - self.cumul[j]) - self.cumul[self.areteDebut[arete]]
+        return arete, float(decalage), QgsPointXY(float(ax[k] + t[k] * dx[k]), float(ay[k] + t[k] * dy[k]))
+
+    def plusCourt(self, depart, arrivee):
+        '''
+        Dijkstra entre deux positions du graphe (arête, distance depuis le début de l'arête)
+
+        :return: (longueur, portions [(arête, de, à)]), None si les positions ne sont pas reliées
+        :rtype: tuple
+        '''
+        a1, o1 = depart
+        a2, o2 = arrivee
+        longueur = self.listeLongueur
+        meilleur = float("inf")
+        fin = None
+        if a1 == a2:
+            meilleur = abs(o2 - o1)
+        cibles = {int(self.areteA[a2]): o2, int(self.areteB[a2]): longueur[a2] - o2}
+        provisoire = {}
+        precedent = {}
+        tas = []
+        for noeud, cout in ((int(self.areteA[a1]), o1), (int(self.areteB[a1]), longueur[a1] - o1)):
+            if cout < provisoire.get(noeud, meilleur):
+                provisoire[noeud] = cout
+                precedent[noeud] = None
+                heapq.heappush(tas, (cout, noeud))
+        definitif = set()
+        while tas:
+            cout, noeud = heapq.heappop(tas)
+            if cout >= meilleur:
+                break
+            if noeud in definitif:
+                continue
+            definitif.add(noeud)
+            if noeud in cibles and cout + cibles[noeud] < meilleur:
+                meilleur = cout + cibles[noeud]
+                fin = noeud
+            for k in range(self.listeAdjDebut[noeud], self.listeAdjDebut[noeud + 1]):
+                voisin = self.listeAdjVoisin[k]
+                arete = self.listeAdjArete[k]
+                nouveau = cout + longueur[arete]
+                if nouveau < provisoire.get(voisin, meilleur):
+                    provisoire[voisin] = nouveau
+                    precedent[voisin] = (noeud, arete)
+                    heapq.heappush(tas, (nouveau, voisin))
+        if meilleur == float("inf"):
+            return None
+        if fin is None:
+            return meilleur, [(a1, o1, o2)]
+
+        # Remontée du chemin : portion d'arrivée, arêtes complètes puis portion de départ
+        portions = [(a2, 0.0 if fin == int(self.areteA[a2]) else longueur[a2], o2)]
+        noeud = fin
+        while precedent[noeud] is not None:
+            amont, arete = precedent[noeud]
+            if int(self.areteA[arete]) == amont:
+                portions.append((arete, 0.0, longueur[arete]))
+            else:
+                portions.append((arete, longueur[arete], 0.0))
+            noeud = amont
+        portions.append((a1, o1, 0.0 if noeud == int(self.areteA[a1]) else longueur[a1]))
+        portions.reverse()
+        return meilleur, portions
+
+    def portion(self, arete, de, a):
+        '''
+        Renvoi les coordonnées d'une portion d'arête, dans le sens de parcours
+
+        :return: tableau (n, 2)
+        :rtype: numpy.ndarray
+        '''
+        i0 = int(self.areteDebut[arete])
+        i1 = int(self.areteFin[arete]) + 1
+        distances = self.cumul[i0:i1] - self.cumul[i0]
+        bas, haut = min(de, a), max(de, a)
+        interieur = numpy.flatnonzero((distances > bas) & (distances < haut))
+        xs = numpy.concatenate(([numpy.interp(bas, distances, self.x[i0:i1])], self.x[i0:i1][interieur], [numpy.interp(haut, distances, self.x[i0:i1])]))
+        ys = numpy.concatenate(([numpy.interp(bas, distances, self.y[i0:i1])], self.y[i0:i1][interieur], [numpy.interp(haut, distances, self.y[i0:i1])]))
+        coordonnees = numpy.column_stack((xs, ys))
+        if de > a:
+            return coordonnees[::-1]
+        return coordonnees
+
+    def chemin(self, point1, point2, ceau1 = None, ceau2 = None):
+        '''
+        Renvoi le chemin le long du réseau entre deux points
+
+        :param point1: point de départ en Lambert 93 (EPSG:2154)
+        :type point1: QgsPointXY
+
+        :param point2: point d'arrivée en Lambert 93 (EPSG:2154)
+        :type point2: QgsPointXY
+
+        :param ceau1: cours d'eau du point de départ (Gedopi_accrochage), à défaut le plus proche du réseau
+        :type ceau1: int
+
+        :param ceau2: cours d'eau du point d'arrivée
+        :type ceau2: int
+
+        :return: (longueur en mètre, liste de QgsPointXY), None si aucun chemin (voir self.erreur)
+        :rtype: tuple
+        '''
+        self.erreur = ""
+        depart = self.localise(point1, ceau1)
+        arrivee = self.localise(point2, ceau2)
+        if depart is None or arrivee is None:
+            self.erreur = u"Point non raccordé au réseau hydrographique"
+            return None
+        resultat = self.plusCourt(depart[:2], arrivee[:2])
+        if resultat is None:
+            self.erreur = u"Les deux points ne sont pas reliés par le réseau hydrographique"
+            return None
+        coordonnees = numpy.concatenate([self.portion(*portion) for portion in resultat[1]])
+        garde = numpy.concatenate(([True], numpy.any(numpy.diff(coordonnees, axis = 0) != 0, axis = 1)))
+        return resultat[0], [QgsPointXY(float(x), float(y)) for x, y in coordonnees[garde]]
+
+    def distance(self, point1, point2, ceau1 = None, ceau2 = None):
+        '''
+        Renvoi la distance le long du réseau entre deux points, None s'ils ne sont pas reliés (voir self.erreur)
+
+        :rtype: float
+        '''
+        self.erreur = ""
+        depart = self.localise(point1, ceau1)
+        arrivee = self.localise(point2, ceau2)
+        if depart is None or arrivee is None:
+            self.erreur = u"Point non raccordé au réseau hydrographique"
+            return None
+        resultat = self.plusCourt(depart[:2], arrivee[:2])
+        if resultat is None:
+            self.erreur = u"Les deux points ne sont pas reliés par le réseau hydrographique"
+            return None
+        return resultat[0]
+
+class Gedopi_bassin():
+    '''
+    Directions d'écoulement et accumulation calculées une fois à partir du MNT, puis conservées sur disque.
+
+    Le MNT est lu à la résolution `resolution` (m) et entouré d'une bordure sans donnée. Les dépressions sont
+    traversées par un remplissage à file de priorité (priority-flood) : chaque cellule s'écoule vers la voisine
+    (D8) par laquelle elle a été atteinte, toute cellule rejoint ainsi le bord du MNT. L'accumulation (nombre de
+    cellules amont) est cumulée dans l'ordre inverse du remplissage. Les deux tableaux sont enregistrés dans un
+    fichier .npz à côté du MNT, recalculé uniquement si le MNT change.
+    La surface du bassin versant d'un point est alors une lecture de l'accumulation à l'exutoire ; le contour
+    est obtenu en remontant l'arbre des écoulements. La surface est limitée à l'emprise du MNT.
+    Le premier calcul (plusieurs minutes pour un grand MNT) signale son avancement et peut être interrompu
+    par la fonction `avancement` transmise à ouvrir().
+    '''
+    # Grilles chargées pendant la session : chemin du MNT -> Gedopi_bassin
+    instances = {}
+    derniereErreur = ""
+    # Résolution (m) de la grille des écoulements
+    resolution = 50
+    # Rayon (cellules) de recherche de la cellule d'accumulation maximale autour de l'exutoire
+    rayonExutoire = 3
+    # Voisinage D8 : (décalage de ligne, décalage de colonne)
+    voisins = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+    # Tableaux enregistrés dans le fichier de la grille
+    tableaux = ["aval", "accumulation", "grille"]
+    # Nombre de cellules traitées entre deux signalements de l'avancement
+    pasAvancement = 100000
+
+    @classmethod
+    def ouvrir(cls, chemin, avancement = None):
+        '''
+        Renvoi la grille des écoulements du MNT, la charge (ou la calcule) lors du premier appel
+
+        :param chemin: chemin du raster
+        :type chemin: str
+
+        :param avancement: fonction appelée pendant le calcul avec la part réalisée (0 à 1),
+                le calcul est interrompu si elle renvoi False
+        :type avancement: function
+
+        :return: None si la grille n'a pu être chargée ou si le calcul a été interrompu (voir Gedopi_bassin.derniereErreur)
+        :rtype: Gedopi_bassin
+        '''
+        bassin = cls.instances.get(chemin)
+        if bassin is None:
+            bassin = cls(chemin)
+            if not bassin.charge(avancement):
+                cls.derniereErreur = bassin.erreur
+                return None
+            cls.instances[chemin] = bassin
+        return bassin
+
+    @classmethod
+    def vider(cls):
+        '''Libère les grilles chargées, appelée au déchargement du plugin'''
+
+        cls.instances = {}
+
+    def __init__(self, chemin):
+        '''
+        Constructeur, appelé par ouvrir()
+
+        :param chemin: chemin du raster
+        :type chemin: str
+        '''
+        self.chemin = chemin
+        self.erreur = ""
+        self.cheminCache = os.path.splitext(chemin)[0] + "_ecoulement" + str(self.resolution) + ".npz"
+        self.enfants = None
+        self.debutEnfants = None
+
+    def signature(self):
+        '''Renvoi une empreinte du MNT et de la résolution de la grille'''
+
+        return ";".join(str(elt) for elt in (os.path.getsize(self.chemin), int(os.path.getmtime(self.chemin)), self.resolution))
+
+    def charge(self, avancement = None):
+        '''
+        Charge la grille depuis le fichier si elle est à jour, la calcule et l'enregistre sinon
+
+        :param avancement: fonction de suivi du calcul, voir ouvrir()
+        :type avancement: function
+
+        :return: False en cas d'échec (voir self.erreur)
+        :rtype: bool
+        '''
+        if numpy is None:
+            self.erreur = u"Le module numpy est nécessaire au calcul des bassins versants"
+            return False
+        if not os.path.exists(self.chemin):
+            self.erreur = u"MNT introuvable : " + self.chemin
+            return False
+        signature = self.signature()
+        if os.path.exists(self.cheminCache):
+            try:
+                with numpy.load(self.cheminCache) as donnees:
+                    if str(donnees["signature"]) == signature:
+                        for nom in self.tableaux:
+                            setattr(self, nom, donnees[nom])
+                        self.prepare()
+                        return True
+            except (IOError, OSError, ValueError, KeyError):
+                pass
+        debut = time.time()
+        altitudes = self.lit()
+        if altitudes is None:
+            return False
+        if not self.calcule(altitudes, avancement):
+            return False
+        self.prepare()
+        QgsMessageLog.logMessage(u"Directions d'écoulement calculées : " + str(self.nbColonnes) + " x " + str(self.nbLignes) +
+            u" cellules (" + str(round(time.time() - debut, 1)) + " s)", "Gedopi")
+        try:
+            numpy.savez(self.cheminCache, signature = signature, **dict((nom, getattr(self, nom)) for nom in self.tableaux))
+        except (IOError, OSError) as e:
+            QgsMessageLog.logMessage(u"Directions d'écoulement non enregistrées : " + str(e), "Gedopi")
+        return True
+
+    def lit(self):
+        '''
+        Lit le MNT à la résolution de la grille et l'entoure d'une bordure sans donnée
+
+        :return: altitudes (NaN sans donnée), None si le raster n'est pas valide
+        :rtype: numpy.ndarray
+        '''
+        layer = QgsRasterLayer(self.chemin, QFileInfo(self.chemin).baseName())
+        if not layer.isValid():
+            self.erreur = u"Layer failed to load !"
+            return None
+        provider = layer.dataProvider()
+        etendue = provider.extent()
+        nbColonnes = int(numpy.ceil(etendue.width() / self.resolution))
+        nbLignes = int(numpy.ceil(etendue.height() / self.resolution))
+        bloc = provider.block(1, etendue, nbColonnes, nbLignes)
+        valeurs = numpy.frombuffer(bytes(bloc.data()), dtype = Gedopi_mnt.typesDonnees.get(bloc.dataType(), "float32"))
+        valeurs = valeurs.reshape(nbLignes, nbColonnes).astype(float)
+        if provider.sourceHasNoDataValue(1):
+            valeurs[valeurs == provider.sourceNoDataValue(1)] = numpy.nan
+        altitudes = numpy.full((nbLignes + 2, nbColonnes + 2), numpy.nan)
+        altitudes[1:-1, 1:-1] = valeurs
+        resX = etendue.width() / nbColonnes
+        resY = etendue.height() / nbLignes
+        # Origine (coin haut gauche) de la grille bordée, résolutions et nombre de colonnes
+        self.grille = numpy.array([etendue.xMinimum() - resX, etendue.yMaximum() + resY, resX, resY, nbColonnes + 2, nbLignes + 2])
+        return altitudes
+
+    def calcule(self, altitudes, avancement = None):
+        '''
+        Calcule les directions d'écoulement (cellule aval) et l'accumulation
+
+        :param altitudes: altitudes de la grille bordée (NaN sans donnée)
+        :type altitudes: numpy.ndarray
+
+        :param avancement: fonction de suivi du calcul, voir ouvrir()
+        :type avancement: function
+
+        :return: False si le calcul a été interrompu (voir self.erreur)
+        :rtype: bool
+        '''
+        nbLignes, nbColonnes = altitudes.shape
+        valide = ~numpy.isnan(altitudes)
+        # Départ du remplissage : cellules valides voisines d'une cellule sans donnée (bord du MNT)
+        bord = numpy.zeros(valide.shape, dtype = bool)
+        for dl, dc in self.voisins:
+            decale = numpy.ones(valide.shape, dtype = bool)
+            decale[max(0, -dl):nbLignes - max(0, dl), max(0, -dc):nbColonnes - max(0, dc)] = ~valide[max(0, dl):nbLignes - max(0, -dl),
+                max(0, dc):nbColonnes - max(0, -dc)]
+            bord |= decale
+        departs = numpy.flatnonzero((valide & bord).ravel())
+
+        z = altitudes.ravel().tolist()
+        vu = (~valide).ravel().tolist()
+        aval = [-1] * len(z)
+        for cellule in departs.tolist():
+            vu[cellule] = True
+        file = list(zip(altitudes.ravel()[departs].tolist(), departs.tolist()))
+        heapq.heapify(file)
+        decalages = [dl * nbColonnes + dc for dl, dc in self.voisins]
+        ordre = []
+        # Le remplissage puis l'accumulation parcourent chacun toutes les cellules valides
+        total = 2.0 * max(int(valide.sum()), 1)
+        # La bordure sans donnée est marquée vue : aucun test de limite n'est nécessaire
+        while file:
+            zc, cellule = heapq.heappop(file)
+            ordre.append(cellule)
+            if avancement is not None and len(ordre) % self.pasAvancement == 0 and not avancement(len(ordre) / total):
+                self.erreur = u"Calcul des directions d'écoulement interrompu"
+                return False
+            for decalage in decalages:
+                voisin = cellule + decalage
+                if not vu[voisin]:
+                    vu[voisin] = True
+                    aval[voisin] = cellule
+                    zv = z[voisin]
+                    heapq.heappush(file, (zv if zv > zc else zc, voisin))
+
+        accumulation = [1] * len(z)
+        for i, cellule in enumerate(reversed(ordre)):
+            suivante = aval[cellule]
+            if suivante >= 0:
+                accumulation[suivante] += accumulation[cellule]
+            if avancement is not None and i % self.pasAvancement == 0 and not avancement((len(ordre) + i) / total):
+                self.erreur = u"Calcul des directions d'écoulement interrompu"
+                return False
+        self.aval = numpy.array(aval, dtype = numpy.int32)
+        self.accumulation = numpy.array(accumulation, dtype = numpy.int32)
+        self.accumulation[~valide.ravel()] = 0
+        return True
+
+    def prepare(self):
+        '''Renseigne les caractéristiques de la grille après chargement ou calcul'''
+
+        self.xMin, self.yMax, self.resX, self.resY = [float(valeur) for valeur in self.grille[:4]]
+        self.nbColonnes, self.nbLignes = int(self.grille[4]), int(self.grille[5])
+        self.enfants = None
+        self.debutEnfants = None
+
+    def exutoire(self, x, y):
+        '''
+        Renvoi la cellule exutoire d'un point : la cellule d'accumulation maximale dans un rayon de rayonExutoire cellules,
+        le point est ainsi replacé sur l'axe d'écoulement le plus proche
+
+        :return: indice de la cellule, -1 hors du MNT
+        :rtype: int
+        '''
+        ligne = int(numpy.floor((self.yMax - y) / self.resY))
+        colonne = int(numpy.floor((x - self.xMin) / self.resX))
+        if ligne < 1 or ligne > self.nbLignes - 2 or colonne < 1 or colonne > self.nbColonnes - 2:
+            return -1
+        l0, l1 = max(ligne - self.rayonExutoire, 0), min(ligne + self.rayonExutoire + 1, self.nbLignes)
+        c0, c1 = max(colonne - self.rayonExutoire, 0), min(colonne + self.rayonExutoire + 1, self.nbColonnes)
+        fenetre = self.accumulation.reshape(self.nbLignes, self.nbColonnes)[l0:l1, c0:c1]
+        if fenetre.max() == 0:
+            return -1
+        l, c = divmod(int(numpy.argmax(fenetre)), c1 - c0)
+        return (l0 + l) * self.nbColonnes + c0 + c
+
+    def surface(self, x, y):
+        '''
+        Renvoi la surface du bassin versant amont d'un point (Lambert 93)
+
+        :return: surface en km², None hors du MNT
+        :rtype: float
+        '''
+        cellule = self.exutoire(x, y)
+        if cellule < 0:
+            return None
+        return float(self.accumulation[cellule]) * self.resX * self.resY / 1000000
+
+    def amont(self, cellule):
+        '''
+        Renvoi les cellules du bassin versant d'une cellule (elle comprise), remontées niveau par niveau
+
+        :rtype: numpy.ndarray
+        '''
+        if self.enfants is None:
+            # Cellules triées par cellule aval (format CSR) : les cellules amont de c sont enfants[debutEnfants[c]:debutEnfants[c + 1]]
+            ordre = numpy.argsort(self.aval, kind = "stable")
+            self.enfants = ordre[numpy.count_nonzero(self.aval < 0):]
+            self.debutEnfants = numpy.searchsorted(self.aval[self.enfants], numpy.arange(len(self.aval) + 1))
+        cellules = [numpy.array([cellule])]
+        front = cellules[0]
+        while len(front) > 0:
+            debuts = self.debutEnfants[front]
+            nombres = self.debutEnfants[front + 1] - debuts
+            total = int(nombres.sum())
+            if total == 0:
+                break
+            front = self.enfants[numpy.repeat(debuts - numpy.cumsum(nombres) + nombres, nombres) + numpy.arange(total)]
+            cellules.append(front)
+        return numpy.concatenate(cellules)
+
+    def contour(self, cellules):
+        '''
+        Renvoi le polygone couvrant un ensemble de cellules : les suites de cellules contiguës de chaque ligne sont
+        converties en rectangles puis fusionnées
+
+        :rtype: QgsGeometry
+        '''
+        lignes, colonnes = numpy.divmod(cellules, self.nbColonnes)
+        ordre = numpy.lexsort((colonnes, lignes))
+        lignes, colonnes = lignes[ordre], colonnes[ordre]
+        ruptures = numpy.flatnonzero((numpy.diff(lignes) != 0) | (numpy.diff(colonnes) != 1))
+        debuts = numpy.concatenate(([0], ruptures + 1))
+        fins = numpy.concatenate((ruptures, [len(lignes) - 1]))
+        rectangles = [QgsGeometry.fromRect(QgsRectangle(self.xMin + colonnes[d] * self.resX, self.yMax - (lignes[d] + 1) * self.resY,
+            self.xMin + (colonnes[f] + 1) * self.resX, self.yMax - lignes[d] * self.resY)) for d, f in zip(debuts.tolist(), fins.tolist())]
+        return QgsGeometry.unaryUnion(rectangles)
+
+    def bassin(self, x, y):
+        '''
+        Renvoi la surface et le contour du bassin versant amont d'un point (Lambert 93)
+
+        :return: (surface en km², contour), None hors du MNT
+        :rtype: tuple
+        '''
+        cellule = self.exutoire(x, y)
+        if cellule < 0:
+            return None
+        cellules = self.amont(cellule)
+        return float(len(cellules)) * self.resX * self.resY / 1000000, self.contour(cellules)
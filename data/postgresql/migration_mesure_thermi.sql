@@ -0,0 +1,29 @@
+-- Relevés bruts des enregistreurs thermiques et agrégats journaliers (formulaire "Suivi thermique", opeSuiviStock.py)
+--
+-- À exécuter une fois par un administrateur de la base :
+--     psql -h localhost -U postgres -d gedopi -f migration_mesure_thermi.sql
+--
+-- Le plugin ne modifie pas le schéma : il vérifie seulement la présence des deux tables avant d'enregistrer des relevés.
+-- Sans elles, les suivis sont enregistrés sans leurs relevés bruts et la courbe est lue dans le fichier de l'enregistreur.
+-- Schéma des données : data (à adapter si la base utilise un autre schéma).
+
+-- Relevés bruts, chargés par COPY et supprimés avec leur suivi
+CREATE TABLE IF NOT EXISTS data.mesure_thermi (
+    mth_opest_id integer NOT NULL REFERENCES data.ope_suivi_thermi (opest_id) ON DELETE CASCADE,
+    mth_date timestamp NOT NULL,
+    mth_temperature real NOT NULL
+);
+
+-- Lecture d'une période d'un suivi (zoom de la courbe, recalcul des indicateurs)
+CREATE INDEX IF NOT EXISTS mesure_thermi_opest_date_idx ON data.mesure_thermi (mth_opest_id, mth_date);
+
+-- Agrégats journaliers, recalculés par le plugin à chaque enregistrement des relevés d'un suivi
+CREATE TABLE IF NOT EXISTS data.mesure_thermi_jour (
+    mtj_opest_id integer NOT NULL REFERENCES data.ope_suivi_thermi (opest_id) ON DELETE CASCADE,
+    mtj_jour date NOT NULL,
+    mtj_min real,
+    mtj_moy real,
+    mtj_max real,
+    mtj_nb integer,
+    PRIMARY KEY (mtj_opest_id, mtj_jour)
+);
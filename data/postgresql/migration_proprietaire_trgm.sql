@@ -0,0 +1,14 @@
+-- Recherche approchée des propriétaires (formulaire "Droits de pêche", bailPecheProprio.py)
+--
+-- À exécuter une fois par un administrateur de la base (création d'extension), hors des heures d'utilisation :
+--     psql -h localhost -U postgres -d gedopi -f migration_proprietaire_trgm.sql
+--
+-- Le plugin ne modifie pas le schéma : à l'ouverture d'une recherche il vérifie seulement la présence de l'extension
+-- pg_trgm et de l'index ci-dessous. S'ils sont absents, les propriétaires sont lus une fois et comparés en mémoire.
+-- Schéma des données : data (à adapter si la base utilise un autre schéma).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Index trigramme du nom et de l'adresse : ILIKE '%...%', similarity (%) et word_similarity (<%)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS proprietaire_trgm_idx ON data.proprietaire
+    USING gin (pro_nom gin_trgm_ops, pro_adresse gin_trgm_ops);
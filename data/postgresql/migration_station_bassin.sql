@@ -0,0 +1,15 @@
+-- Contour du bassin versant amont des stations (calcul en masse de opePecheRecalcul.py, stationReseau.py)
+--
+-- À exécuter une fois par un administrateur de la base :
+--     psql -h localhost -U postgres -d gedopi -f migration_station_bassin.sql
+--
+-- Le plugin ne modifie pas le schéma : il vérifie seulement la présence de la table lorsque l'enregistrement
+-- des contours est demandé. La surface (sta_surf_bv_amont) est écrite sans elle.
+-- Schéma des données : data (à adapter si la base utilise un autre schéma).
+
+-- Une ligne par station, mise à jour à chaque calcul et supprimée avec la station
+CREATE TABLE IF NOT EXISTS data.station_bassin (
+    stab_sta_id integer PRIMARY KEY REFERENCES data.station (sta_id) ON DELETE CASCADE,
+    stab_surface real,
+    stab_geom geometry(MultiPolygon, 2154)
+);
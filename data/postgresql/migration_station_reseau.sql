@@ -0,0 +1,23 @@
+-- Position des stations sur le réseau hydrographique (calcul en masse de opePecheRecalcul.py, stationReseau.py)
+--
+-- À exécuter une fois par un administrateur de la base :
+--     psql -h localhost -U postgres -d gedopi -f migration_station_reseau.sql
+--
+-- Le plugin ne modifie pas le schéma : il vérifie seulement la présence de la table avant le calcul des positions.
+-- Sans elle, les fiches station indiquent que la station n'est pas positionnée.
+-- Schéma des données : data (à adapter si la base utilise un autre schéma).
+
+-- Une ligne par station positionnée, remplacée à chaque calcul et supprimée avec la station
+CREATE TABLE IF NOT EXISTS data.station_reseau (
+    star_sta_id integer PRIMARY KEY REFERENCES data.station (sta_id) ON DELETE CASCADE,
+    star_ceau_id integer,
+    star_arete integer NOT NULL,
+    star_decalage real NOT NULL,
+    star_entree integer NOT NULL,
+    star_amont_entree integer NOT NULL,
+    star_amont_sortie integer NOT NULL,
+    star_distance_source real,
+    star_distance_confluence real,
+    star_rang integer,
+    star_nb_rang integer
+);
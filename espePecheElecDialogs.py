@@ -8,7 +8,7 @@ import os
 #from PyQt5.QtGui import ()
 from PyQt5.QtWidgets import (QApplication, QDialog, QFileDialog, QMessageBox)
 from PyQt5.QtCore import (Qt, QFileInfo)
-from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlTableModel)
+from PyQt5.QtSql import (QSqlQuery, QSqlTableModel)
 from qgis.gui import (QgsMessageBar)
 
 
@@ -19,7 +19,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/forms")
 from espePecheElecForm import (Ui_espePecheElecForm)
 
 # Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_session)
 
 class EspePecheElec_dialog(QDialog, Ui_espePecheElecForm):
     '''Gére le fonctionnement interne du Dialog "Export pêche électrique" après son ouverture via le menu'''
@@ -79,18 +79,15 @@ class EspePecheElec_dialog(QDialog, Ui_espePecheElecForm):
             connectionParams = self.gc.getConnectionParameterFromDbLayer(self.layer)
             if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
                 self.dbType = "postgres"
-                self.db = QSqlDatabase.addDatabase("QPSQL", 'db1')
-                self.db.setDatabaseName(connectionParams['dbname'])
-                self.db.setUserName(connectionParams['user'])
-                self.db.setPassword(connectionParams['password'])
-                self.db.setHostName(connectionParams['host'])
+                self.db = Gedopi_session.acquerir(connectionParams)
                 self.dbSchema = connectionParams['schema']
                 self.host = connectionParams['host']
                 self.user = connectionParams['user']
                 self.password = connectionParams['password']
                 self.dbname = connectionParams['dbname']
 
-            if (not self.db.open()):
+            if (not self.db or not self.db.isOpen()):
+                self.db = None
                 QMessageBox.critical(self, "Erreur", u"Impossible de se connecter à la base de données ...", QMessageBox.Ok)
                 QApplication.restoreOverrideCursor()
                 return
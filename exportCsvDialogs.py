@@ -5,13 +5,20 @@
 import sys
 import csv
 import os
-from PyQt5.QtCore import (Qt, QDate)
+import time
+from PyQt5.QtCore import (Qt, QDate, QVariant)
 from PyQt5.QtGui import (QCursor)
-from PyQt5.QtWidgets import (QApplication, QFileDialog, QDockWidget, QMessageBox)
-from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlQueryModel, QSqlTableModel)
-#from qgis.core import ()
+from PyQt5.QtWidgets import (QApplication, QFileDialog, QDockWidget, QMessageBox, QProgressDialog)
+from PyQt5.QtSql import (QSqlQuery, QSqlQueryModel, QSqlTableModel)
+from qgis.core import (QgsMessageLog)
 from qgis.gui import (QgsMessageBar)
 
+# psycopg2 est optionnel : il permet l'export rapide par COPY ... TO STDOUT
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
 # Initialise les ressources Qt à partir du fichier resources.py
 # import resources_rc
 
@@ -22,7 +29,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/forms")
 from exportCsvForm import (Ui_dwcExportForm)
 
 # Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_reference, Gedopi_session)
 
 class Csv_dialog(QDockWidget, Ui_dwcExportForm):
     '''
@@ -35,6 +42,9 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
             apporte les éléments de l'interface
     :type Ui_dwcBopeMainForm: class
     '''
+    # Nombre de lignes lues à chaque FETCH lors de l'export en flux continu
+    tailleLot = 5000
+
     def __init__(self, iface, action):
         '''
         Constructeur, déclaration de variable, connection des événements et initialisation du formulaire
@@ -241,10 +251,9 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
 
         self.raz()
 
-        self.db.close()
-        del self.db
+        # Rend la connexion au pool, elle reste ouverte pour la prochaine ouverture du formulaire
+        Gedopi_session.liberer(self.db)
         self.db = None
-        QSqlDatabase.removeDatabase('db1')
 
     def setupModel(self):
         '''
@@ -257,14 +266,11 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
             connectionParams = self.gc.getConnectionParameterFromDbLayer(self.layer)
             if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
                 self.dbType = "postgres"
-                self.db = QSqlDatabase.addDatabase("QPSQL", 'db1')
-                self.db.setDatabaseName(connectionParams['dbname'])
-                self.db.setUserName(connectionParams['user'])
-                self.db.setPassword(connectionParams['password'])
-                self.db.setHostName(connectionParams['host'])
+                self.db = Gedopi_session.acquerir(connectionParams)
                 self.dbSchema = connectionParams['schema']
 
-            if (not self.db.open()):
+            if (not self.db or not self.db.isOpen()):
+                self.db = None
                 QMessageBox.critical(self, "Erreur", u"Impossible de se connecter à la base de données ...", QMessageBox.Ok)
                 QApplication.restoreOverrideCursor()
                 return
@@ -282,25 +288,20 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
         self.cmbBopeCommune.setModelColumn(self.modelCommune.fieldIndex("com_nom"))
 
         # Création du modèle des AAPPMA et attribution aux combobox
-        self.modelAappma= QSqlTableModel(self, self.db)
-        wrelation = "aappma"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelAappma.setTable(wrelation)
-        self.modelAappma.setSort(1, Qt.AscendingOrder)
-        if (not self.modelAappma.select()):
+        self.modelAappma = Gedopi_reference.modele(self.db, self.dbSchema, "aappma")
+        if self.modelAappma.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle AAPPMA dans le setupModele() : \n" + self.modelAappma.lastError().text(), QMessageBox.Ok)
         self.cmbBopeAappma.setModel(self.modelAappma)
-        self.cmbBopeAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbBopeAappma.setModelColumn(1)
 
         self.cmbPecheAappma.setModel(self.modelAappma)
-        self.cmbPecheAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbPecheAappma.setModelColumn(1)
 
         self.cmbThermiAappma.setModel(self.modelAappma)
-        self.cmbThermiAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbThermiAappma.setModelColumn(1)
 
         self.cmbReproAappma.setModel(self.modelAappma)
-        self.cmbReproAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbReproAappma.setModelColumn(1)
 
         # Création du modèle des Rivières et attribution aux combobox
         self.modelRiviere = QSqlTableModel(self, self.db)
@@ -325,11 +326,7 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
         self.cmbReproCeau.setModelColumn(self.modelRiviere.fieldIndex("ceau_nom"))
 
         # Création du modèle des PDPG et attribution aux combobox
-        self.modelPdpg = QSqlQueryModel(self)
-        wrelation = "contexte_pdpg"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelPdpg.setQuery("select pdpg_id, pdpg_nom || ' ; ' || pdpg_code from " + wrelation + " order by pdpg_nom;", self.db)
+        self.modelPdpg = Gedopi_reference.modele(self.db, self.dbSchema, "contexte_pdpg_code")
         if self.modelPdpg.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle PDPG dans le setupModel() : \n" + self.modelPdpg.lastError().text(), QMessageBox.Ok)
         self.cmbPechePdpg.setModel(self.modelPdpg)
@@ -342,11 +339,7 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
         self.cmbReproPdpg.setModelColumn(1)
 
         # Création du modèle des Masses d'eau et attribution aux combobox
-        self.modelMeau = QSqlQueryModel(self)
-        wrelation = "masse_eau"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelMeau.setQuery("select meau_code, meau_code || ' ; ' || meau_nom from " + wrelation + " order by meau_code;", self.db)
+        self.modelMeau = Gedopi_reference.modele(self.db, self.dbSchema, "masse_eau")
         if self.modelMeau.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Masse d'eau dans le rowChange() : \n" + self.modelMeau.lastError().text(), QMessageBox.Ok)
         self.cmbPecheMeau.setModel(self.modelMeau)
@@ -359,16 +352,11 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
         self.cmbReproMeau.setModelColumn(1)
 
         # Création du modèle des Espèces et attribution aux combobox
-        self.modelEspece = QSqlTableModel(self, self.db)
-        wrelation = "espece"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelEspece.setTable(wrelation)
-        self.modelEspece.setSort(2, Qt.AscendingOrder)
-        if (not self.modelEspece.select()):
+        self.modelEspece = Gedopi_reference.modele(self.db, self.dbSchema, "espece")
+        if self.modelEspece.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Espèce dans le setupModele() : \n" + self.modelEspece.lastError().text(), QMessageBox.Ok)
         self.cmbPecheEspece.setModel(self.modelEspece)
-        self.cmbPecheEspece.setModelColumn(self.modelEspece.fieldIndex("esp_nom"))
+        self.cmbPecheEspece.setModelColumn(1)
 
         QApplication.restoreOverrideCursor()
 
@@ -1933,7 +1921,6 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
         if self.tabWidget.currentIndex() == 1 and (self.chkBiomasse.isChecked() == True or self.chkBioCorrespond.isChecked() == True or self.chkDensite.isChecked() == True or self.chkDenCorrespond.isChecked() == True):
             prewwhere = self.wwhere
             prewwhereSelect = self.wwhereSelect
-            self.wgroupBy = ""
             dicoEspece = {}
             prewrq = ""
             prewrq = "SELECT DISTINCT esp_id, esp_sigle FROM " + self.cfrom
@@ -1963,31 +1950,37 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
             else:
                 QMessageBox.critical(self, u"Erreur récup espèces", preQuery.lastError().text(), QMessageBox.Ok)
 
-            numColumn = 0
-            for id, sigle in dicoEspece.items():
-                if self.chkBiomasse.isChecked() == True :
-                    self.wselect = self.wselect.replace("placementBiomasse", "placementBiomasse" + str(numColumn) + "placementBiomasse")
-                    self.wselect = self.wselect.replace("placementBiomasse" + str(numColumn), ", \"join" + sigle + "\".espe_biomasse as \"BIOMASSE_" + sigle + "\"")
-                    self.wgroupBy += ", \"join" + sigle + "\".espe_biomasse"
-
-                if self.chkBioCorrespond.isChecked() == True :
-                    self.wselect = self.wselect.replace("placementCorrespondanceBiomasse", "placementCorrespondanceBiomasse" + str(numColumn) + "placementCorrespondanceBiomasse")
-                    self.wselect = self.wselect .replace("placementCorrespondanceBiomasse" + str(numColumn), ", \"join" + sigle + "\".clbi_val_correspond as \"CORBIO_" + sigle + "\"")
-                    self.wgroupBy += ", \"join" + sigle + "\".clbi_val_correspond"
-
-                if self.chkDensite.isChecked() == True :
-                    self.wselect = self.wselect.replace("placementDensite", "placementDensite" + str(numColumn) + "placementDensite")
-                    self.wselect = self.wselect.replace("placementDensite" + str(numColumn), ", \"join" + sigle + "\".espe_densite as \"DENSITE_" + sigle + "\"")
-                    self.wgroupBy += ", \"join" + sigle + "\".espe_densite"
-
-                if self.chkDenCorrespond.isChecked() == True :
-                    self.wselect = self.wselect.replace("placementCorrespondanceDensite", "placementCorrespondanceDensite" + str(numColumn) + "placementCorrespondanceDensite")
-                    self.wselect = self.wselect.replace("placementCorrespondanceDensite" + str(numColumn), ", \"join" + sigle + "\".clde_val_correspond as \"CORDEN_" + sigle + "\"")
-                    self.wgroupBy += ", \"join" + sigle + "\".clde_val_correspond"
-
-                self.cfrom += " FULL JOIN data.f_poisson_params(" + str(id) + ") as \"join" + sigle + "\" ON operation.ope_code = \"join" + sigle + "\".ope_code"
-
-                numColumn +=1
+            # Pivot des paramètres poisson : f_poisson_params() est appelée une fois par espèce dans une seule sous-requête,
+            # les colonnes BIOMASSE_/CORBIO_/DENSITE_/CORDEN_ sont ensuite obtenues par des agrégats filtrés (FILTER)
+            # au lieu d'une jointure complète par espèce et d'un GROUP BY qui grossit avec chacune d'elles
+            parametres = []
+            if self.chkBiomasse.isChecked() == True :
+                parametres.append(("placementBiomasse", "espe_biomasse", "BIOMASSE_"))
+            if self.chkBioCorrespond.isChecked() == True :
+                parametres.append(("placementCorrespondanceBiomasse", "clbi_val_correspond", "CORBIO_"))
+            if self.chkDensite.isChecked() == True :
+                parametres.append(("placementDensite", "espe_densite", "DENSITE_"))
+            if self.chkDenCorrespond.isChecked() == True :
+                parametres.append(("placementCorrespondanceDensite", "clde_val_correspond", "CORDEN_"))
+
+            if len(dicoEspece) > 0:
+                colonnesPivot = []
+                for placement, colonne, prefixe in parametres:
+                    colonnesSelect = ""
+                    for id, sigle in dicoEspece.items():
+                        alias = "\"" + prefixe + sigle.replace("\"", "\"\"") + "\""
+                        colonnesPivot.append("max(params." + colonne + ") FILTER (WHERE espece_export.esp_id = " + str(id) + ") AS " + alias)
+                        colonnesSelect += ", max(pivot." + alias + ") AS " + alias
+                    self.wselect = self.wselect.replace(placement, colonnesSelect)
+
+                # Seules les opérations exportées sont pivotées (mêmes tables et critères que la requête principale)
+                operationsExport = "SELECT operation.ope_code FROM " + self.cfrom
+                if prewwhere != "":
+                    operationsExport += " WHERE " + prewwhere
+                self.cfrom += (" LEFT JOIN (SELECT params.ope_code, " + ", ".join(colonnesPivot) +
+                " FROM (VALUES (" + "), (".join(str(id) for id in dicoEspece.keys()) + ")) AS espece_export(esp_id)" +
+                " CROSS JOIN LATERAL data.f_poisson_params(espece_export.esp_id) AS params" +
+                " WHERE params.ope_code IN (" + operationsExport + ") GROUP BY params.ope_code) AS pivot ON operation.ope_code = pivot.ope_code")
 
             self.wselect = self.wselect.replace("placementBiomasse", "")
             self.wselect = self.wselect.replace("placementCorrespondanceBiomasse", "")
@@ -2016,8 +2009,6 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
             "ope_peche_elec.ipro_valeur, ipr.ipr_correspondance, ope_peche_elec.opep_complet_partielle, ope_peche_elec.opep_observation, cours_eau.ceau_nom, motif_peche.mope_motif, " +
             "condition_peche.cope_condition, contexte_pdpg.pdpg_code, masse_eau.meau_nom, masse_eau.meau_code, operation.ope_code, station.sta_nom, station.sta_distance_source, " +
             "station.sta_altitude, aappma.apma_nom, station.sta_surf_bv_amont, maitre_ouvrage.moa_nom")
-            if self.wgroupBy != "":
-                self.wrq += self.wgroupBy
 
         else:
             self.wrq = ""
@@ -2119,62 +2110,206 @@ class Csv_dialog(QDockWidget, Ui_dwcExportForm):
                     self.cheminCsv = unicode(savefile)
 
                 if self.cheminCsv != "":
-                    query = QSqlQuery(self.db)
-                    query.prepare(self.requete)
-                    if query.exec_():
-                        # Exécution de la requête et attribution à un QSqlQueryModel()
-                        exportQuery = QSqlQueryModel()
-                        exportQuery.setQuery(query)
-
-                        # Ouverture eet/ou création du fichier
-                        with open(self.cheminCsv, 'wb') as exportFile: # --> V2 de QGIS
-                        # with open(self.cheminCsv, newline = '') as exportFile:  # --> Pour la V3 de QGIS
-                            writer = csv.writer(exportFile, delimiter = ';')
-
-                            # Si il n'y a pas de header, on peut supprimer cette section
-                            listsTmpData = []
-                            for column in range(exportQuery.columnCount()):
-                                    listsTmpData.append(str(exportQuery.headerData(column, Qt.Horizontal)))
-                                    # listsTmpData.append(unicode(exportQuery.headerData(column, Qt.Horizontal))) # --> Pour la V3 de QGIS
-                            writer.writerow(listsTmpData)
-
-                            # Ecrit le document
-                            for row in range(exportQuery.rowCount()):
-                                listsTmpData = []
-                                for column in range(exportQuery.columnCount()):
-                                    # Try / Except pour essayer d'écrire la valeur avec son encodage par défaut, si le Try échou, le Except réessaye en remplacant le caractère problématique par '?'
-                                    try :
-                                        valeur = exportQuery.record(row).value(column)
-                                        # Converti les QDate en string
-                                        if isinstance(valeur, QDate):
-                                            valeur = valeur.toString("dd-MM-yyyy")
-                                        # Remplace les ';' par des ',', le fichier étant CSV ';'
-                                        if ";" in str(valeur):
-                                            valeur = valeur.replace(";", ",")
-                                        if str(valeur) == "NULL":
-                                            valeur = ""
-                                        listsTmpData.append(str(valeur))
-                                        # listsTmpData.append(str(exportQuery.record(row).value(column)))
-                                    except:
-                                        valeur = exportQuery.record(row).value(column)
-                                         # Converti les QDate en string
-                                        if isinstance(valeur, QDate):
-                                            valeur = valeur.toString("dd-MM-yyyy")
-                                        # Remplace les ';' par des ',', le fichier étant CSV ';'
-                                        valeur = str(valeur.encode('ascii', 'replace'))
-                                        if ";" in valeur:
-                                            valeur = valeur.replace(";", ",")
-                                        if valeur == "NULL":
-                                            valeur = ""
-                                        listsTmpData.append(valeur)
-                                        # listsTmpData.append(str(exportQuery.record(row).value(column).encode('ascii', 'replace')))
-
-                                        # Le Try / Except n'est normalement plus nécessaire en V3 de QGIS grâce à l'unicode
-                                        # listsTmpData.append(unicode(exportQuery.record(row).value(column))) # --> Pour la V3 de QGIS
-                                writer.writerow(listsTmpData)
-
-                        self.iface.messageBar().pushMessage("Export : ", u"L'export est terminé ...", level= QgsMessageBar.INFO, duration = 5)
+                    debut = time.time()
+                    if self.chkCopy.isChecked():
+                        nbLignes = self.exportCopy(self.requete, self.cheminCsv)
+                        mode = "COPY"
                     else:
-                        QMessageBox.critical(self, u"Erreur SQL", query.lastError().text(), QMessageBox.Ok)
+                        nbLignes = self.exportFlux(self.requete, self.cheminCsv)
+                        mode = "curseur"
+                    # Durée de l'export, permet de comparer les deux modes
+                    QgsMessageLog.logMessage(u"Export CSV (" + mode + ") : " + str(nbLignes) + u" lignes en " + str(round(time.time() - debut, 2)) + " s", "Gedopi")
+                    if nbLignes is not None:
+                        if nbLignes < 0:
+                            self.iface.messageBar().pushMessage("Export : ", u"L'export a été annulé, le fichier est incomplet ...", level= QgsMessageBar.WARNING, duration = 5)
+                        else:
+                            self.iface.messageBar().pushMessage("Export : ", u"L'export est terminé (" + str(nbLignes) + u" lignes) ...", level= QgsMessageBar.INFO, duration = 5)
         else:
             QMessageBox.information(self, "Export impossible", u"Aucun champs sélectionné pour l'export...", QMessageBox.Ok)
+
+    def formatValeur(self, valeur):
+        '''
+        Met en forme une valeur pour le fichier CSV :
+        dates au format jj-mm-aaaa, ";" remplacés par "," et valeurs NULL vides
+
+        :param valeur: valeur issue de QSqlQuery.value()
+        :type valeur: QVariant
+
+        :rtype: str
+        '''
+        if valeur is None or str(valeur) == "NULL":
+            return ""
+        # Converti les QDate en string
+        if isinstance(valeur, QDate):
+            return valeur.toString("dd-MM-yyyy")
+        valeur = str(valeur)
+        # Remplace les ';' par des ',', le fichier étant CSV ';'
+        if ";" in valeur:
+            valeur = valeur.replace(";", ",")
+        return valeur
+
+    def exportFlux(self, requete, chemin):
+        '''
+        Écrit le résultat de la requête dans le fichier CSV en flux continu :
+        un curseur côté serveur est lu par lots de tailleLot lignes, écrits aussitôt dans le fichier,
+        la mémoire utilisée ne dépend donc pas du nombre de lignes exportées.
+        Une barre de progression permet de suivre et d'annuler l'export.
+
+        :param requete: requête SELECT à exporter
+        :type requete: str
+
+        :param chemin: chemin du fichier CSV à créer
+        :type chemin: str
+
+        :return: nombre de lignes écrites, -1 si l'export a été annulé, None en cas d'erreur
+        :rtype: int
+        '''
+        # Un curseur n'existe qu'au sein d'une transaction
+        if not self.db.transaction():
+            QMessageBox.critical(self, u"Erreur SQL", self.db.lastError().text(), QMessageBox.Ok)
+            return None
+
+        query = QSqlQuery(self.db)
+        if not query.exec_("declare gedopi_export no scroll cursor for " + requete.strip().rstrip(";")):
+            QMessageBox.critical(self, u"Erreur SQL", query.lastError().text(), QMessageBox.Ok)
+            self.db.rollback()
+            return None
+
+        progression = QProgressDialog(u"Export en cours ...", u"Annuler", 0, 0, self)
+        progression.setWindowTitle(u"Export CSV")
+        progression.setWindowModality(Qt.WindowModal)
+        progression.setMinimumDuration(500)
+
+        nbLignes = 0
+        erreur = False
+        annule = False
+        try:
+            with open(chemin, 'w', newline = '', encoding = 'utf-8') as exportFile:
+                writer = csv.writer(exportFile, delimiter = ';')
+                lot = QSqlQuery(self.db)
+                lot.setForwardOnly(True)
+                entete = False
+                while True:
+                    if not lot.exec_("fetch forward " + str(self.tailleLot) + " from gedopi_export"):
+                        QMessageBox.critical(self, u"Erreur SQL", lot.lastError().text(), QMessageBox.Ok)
+                        erreur = True
+                        break
+                    record = lot.record()
+                    nbColonnes = record.count()
+
+                    # Header du fichier, issu des noms de colonnes
+                    if not entete:
+                        writer.writerow([record.fieldName(column) for column in range(nbColonnes)])
+                        entete = True
+
+                    listsTmpData = []
+                    while lot.next():
+                        listsTmpData.append([self.formatValeur(lot.value(column)) for column in range(nbColonnes)])
+                    if not listsTmpData:
+                        break
+                    writer.writerows(listsTmpData)
+                    nbLignes += len(listsTmpData)
+
+                    progression.setLabelText(str(nbLignes) + u" lignes exportées ...")
+                    QApplication.processEvents()
+                    if progression.wasCanceled():
+                        annule = True
+                        break
+                lot.finish()
+        except (OSError, UnicodeError) as e:
+            QMessageBox.critical(self, u"Erreur", u"Écriture du fichier impossible : " + str(e), QMessageBox.Ok)
+            erreur = True
+        finally:
+            # La connexion du pool est partagée : le curseur est toujours fermé et la transaction terminée
+            query.exec_("close gedopi_export")
+            if erreur:
+                self.db.rollback()
+            else:
+                self.db.commit()
+            progression.close()
+
+        if erreur:
+            return None
+        if annule:
+            return -1
+        return nbLignes
+
+    def requeteFormatee(self, requete):
+        '''
+        Encapsule la requête afin que PostgreSQL applique lui-même la mise en forme de formatValeur() :
+        dates au format jj-mm-aaaa et ";" remplacés par "," dans les textes.
+        Les types des colonnes sont obtenus sans lire de données (limit 0).
+
+        :param requete: requête SELECT à exporter
+        :type requete: str
+
+        :return: la requête encapsulée, None en cas d'erreur
+        :rtype: str
+        '''
+        requete = requete.strip().rstrip(";")
+        query = QSqlQuery(self.db)
+        if not query.exec_("select * from (" + requete + ") as export limit 0"):
+            QMessageBox.critical(self, u"Erreur SQL", query.lastError().text(), QMessageBox.Ok)
+            return None
+        record = query.record()
+        listColonnes = []
+        for column in range(record.count()):
+            nom = '"' + record.fieldName(column).replace('"', '""') + '"'
+            if record.field(column).type() == QVariant.Date:
+                listColonnes.append("to_char(" + nom + ", 'DD-MM-YYYY') as " + nom)
+            elif record.field(column).type() == QVariant.String:
+                listColonnes.append("replace(" + nom + ", ';', ',') as " + nom)
+            else:
+                listColonnes.append(nom)
+        query.finish()
+        return "select " + ", ".join(listColonnes) + " from (" + requete + ") as export"
+
+    def exportCopy(self, requete, chemin):
+        '''
+        Export rapide : le fichier CSV est produit par PostgreSQL via COPY ... TO STDOUT,
+        le client se contente d'écrire le flux reçu dans le fichier.
+        Nécessite psycopg2, à défaut la requête mise en forme est exportée par exportFlux().
+
+        :param requete: requête SELECT à exporter
+        :type requete: str
+
+        :param chemin: chemin du fichier CSV à créer
+        :type chemin: str
+
+        :return: nombre de lignes écrites, -1 si l'export a été annulé, None en cas d'erreur
+        :rtype: int
+        '''
+        requeteCopy = self.requeteFormatee(requete)
+        if requeteCopy is None:
+            return None
+
+        if psycopg2 is None:
+            self.iface.messageBar().pushMessage("Export : ", u"Module psycopg2 absent, l'export rapide utilise le mode curseur ...", level= QgsMessageBar.WARNING, duration = 5)
+            return self.exportFlux(requeteCopy, chemin)
+
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        connexion = None
+        nbLignes = None
+        erreur = None
+        try:
+            connexion = Gedopi_session.connexionDirecte(self.db)
+            # Le flux COPY est demandé en UTF-8, comme l'écriture du fichier
+            connexion.set_client_encoding('UTF8')
+            curseur = connexion.cursor()
+            with open(chemin, 'w', newline = '', encoding = 'utf-8') as exportFile:
+                curseur.copy_expert("copy (" + requeteCopy + ") to stdout with csv header delimiter ';'", exportFile)
+            nbLignes = curseur.rowcount
+            curseur.close()
+        except psycopg2.Error as e:
+            erreur = (u"Erreur SQL", str(e))
+        except (OSError, UnicodeError) as e:
+            erreur = (u"Erreur", u"Écriture du fichier impossible : " + str(e))
+        finally:
+            # Le curseur d'attente est rétabli quelle que soit l'issue de l'export
+            QApplication.restoreOverrideCursor()
+            if connexion is not None:
+                connexion.close()
+        if erreur is not None:
+            QMessageBox.critical(self, erreur[0], erreur[1], QMessageBox.Ok)
+            return None
+        return nbLignes
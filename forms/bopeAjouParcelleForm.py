@@ -85,6 +85,22 @@ class Ui_dlgBopeAjoutParcelleForm(object):
         self.btnCSP.setObjectName("btnCSP")
         self.horizontalLayout_20.addWidget(self.btnCSP)
         self.verticalLayout_11.addLayout(self.horizontalLayout_20)
+        self.label_40 = QtWidgets.QLabel(self.groupBox_3)
+        self.label_40.setObjectName("label_40")
+        self.verticalLayout_11.addWidget(self.label_40)
+        self.horizontalLayout_40 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_40.setObjectName("horizontalLayout_40")
+        self.leReference = QtWidgets.QLineEdit(self.groupBox_3)
+        self.leReference.setObjectName("leReference")
+        self.horizontalLayout_40.addWidget(self.leReference)
+        self.btnReference = QtWidgets.QPushButton(self.groupBox_3)
+        self.btnReference.setObjectName("btnReference")
+        self.horizontalLayout_40.addWidget(self.btnReference)
+        self.verticalLayout_11.addLayout(self.horizontalLayout_40)
+        self.txtReferences = QtWidgets.QPlainTextEdit(self.groupBox_3)
+        self.txtReferences.setMaximumSize(QtCore.QSize(16777215, 80))
+        self.txtReferences.setObjectName("txtReferences")
+        self.verticalLayout_11.addWidget(self.txtReferences)
         self.verticalLayout_7.addWidget(self.groupBox_3)
         self.verticalLayout_10.addWidget(self.groupBox_2)
         self.groupBox_4 = QtWidgets.QGroupBox(self.scrollAreaWidgetContents)
@@ -144,6 +160,9 @@ class Ui_dlgBopeAjoutParcelleForm(object):
         self.btnC.setText(_translate("dlgBopeAjoutParcelleForm", "Commune"))
         self.btnCS.setText(_translate("dlgBopeAjoutParcelleForm", "Commune / Section"))
         self.btnCSP.setText(_translate("dlgBopeAjoutParcelleForm", "Commune / Section / Parcelle"))
+        self.label_40.setText(_translate("dlgBopeAjoutParcelleForm", "Références (INSEE section numéro ; une par ligne, plages 10-25) :"))
+        self.leReference.setPlaceholderText(_translate("dlgBopeAjoutParcelleForm", "ex : 15014 AB 123"))
+        self.btnReference.setText(_translate("dlgBopeAjoutParcelleForm", "Rechercher les références"))
         self.groupBox_4.setTitle(_translate("dlgBopeAjoutParcelleForm", "Requête SQL :"))
         self.label_6.setText(_translate("dlgBopeAjoutParcelleForm", "<html><head/><body><p align=\"justify\"><span style=\" font-size:7pt;\">Attention : les modifications dans la requête sont possibles mais peuvent faire échouer celle-ci voir endommager la base de données ! ! !</span></p></body></html>"))
         self.txtSql.setHtml(_translate("dlgBopeAjoutParcelleForm", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
@@ -51,6 +51,10 @@ class Ui_dwcBopeMainForm(object):
         self.btnDeleteFiltrage.setMinimumSize(QtCore.QSize(110, 30))
         self.btnDeleteFiltrage.setObjectName("btnDeleteFiltrage")
         self.horizontalLayout_12.addWidget(self.btnDeleteFiltrage)
+        self.btnEcheances = QtWidgets.QPushButton(self.scrollAreaWidgetContents)
+        self.btnEcheances.setMinimumSize(QtCore.QSize(80, 30))
+        self.btnEcheances.setObjectName("btnEcheances")
+        self.horizontalLayout_12.addWidget(self.btnEcheances)
         self.verticalLayout_2.addLayout(self.horizontalLayout_12)
         self.grp_bail = QtWidgets.QGroupBox(self.scrollAreaWidgetContents)
         self.grp_bail.setMinimumSize(QtCore.QSize(0, 0))
@@ -124,6 +128,10 @@ class Ui_dwcBopeMainForm(object):
         self.btnSuppParcelle.setMaximumSize(QtCore.QSize(25, 16777215))
         self.btnSuppParcelle.setObjectName("btnSuppParcelle")
         self.verticalLayout_12.addWidget(self.btnSuppParcelle)
+        self.btnAffectParcelle = QtWidgets.QPushButton(self.grp_localisation)
+        self.btnAffectParcelle.setMaximumSize(QtCore.QSize(25, 16777215))
+        self.btnAffectParcelle.setObjectName("btnAffectParcelle")
+        self.verticalLayout_12.addWidget(self.btnAffectParcelle)
         self.horizontalLayout.addLayout(self.verticalLayout_12)
         self.verticalLayout_13 = QtWidgets.QVBoxLayout()
         self.verticalLayout_13.setObjectName("verticalLayout_13")
@@ -366,6 +374,8 @@ class Ui_dwcBopeMainForm(object):
         self.chkFiltreCartoAuto.setText(_translate("dwcBopeMainForm", "filtre carto automatique"))
         self.btnFiltreAttributaire.setText(_translate("dwcBopeMainForm", "Filtre attributaire"))
         self.btnDeleteFiltrage.setText(_translate("dwcBopeMainForm", "Suppression filtrage"))
+        self.btnEcheances.setToolTip(_translate("dwcBopeMainForm", "Tableau des échéances de tous les droits de pêche"))
+        self.btnEcheances.setText(_translate("dwcBopeMainForm", "Échéances"))
         self.grp_bail.setTitle(_translate("dwcBopeMainForm", "Bail de pêche :"))
         self.label.setText(_translate("dwcBopeMainForm", "ID :"))
         self.grp_localisation.setTitle(_translate("dwcBopeMainForm", "Localisation :"))
@@ -373,6 +383,8 @@ class Ui_dwcBopeMainForm(object):
         self.lbl_parcelles.setText(_translate("dwcBopeMainForm", "Parcelle(s) concernée(s) :"))
         self.btnAjoutParcelle.setText(_translate("dwcBopeMainForm", "+"))
         self.btnSuppParcelle.setText(_translate("dwcBopeMainForm", "-"))
+        self.btnAffectParcelle.setToolTip(_translate("dwcBopeMainForm", "Affectation de parcelles par la carte (tronçon de cours d'eau ou polygone)"))
+        self.btnAffectParcelle.setText(_translate("dwcBopeMainForm", "~"))
         self.lbl_riviere.setText(_translate("dwcBopeMainForm", "Rivière(s) concernée(s) :"))
         self.btnAjoutRiviere.setText(_translate("dwcBopeMainForm", "+"))
         self.btnSuppRiviere.setText(_translate("dwcBopeMainForm", "-"))
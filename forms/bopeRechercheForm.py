@@ -234,6 +234,22 @@ class Ui_dlgBopeRechercheForm(object):
         self.btnCSP.setObjectName("btnCSP")
         self.horizontalLayout_20.addWidget(self.btnCSP)
         self.verticalLayout_11.addLayout(self.horizontalLayout_20)
+        self.label_40 = QtWidgets.QLabel(self.groupBox_3)
+        self.label_40.setObjectName("label_40")
+        self.verticalLayout_11.addWidget(self.label_40)
+        self.horizontalLayout_40 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_40.setObjectName("horizontalLayout_40")
+        self.leReference = QtWidgets.QLineEdit(self.groupBox_3)
+        self.leReference.setObjectName("leReference")
+        self.horizontalLayout_40.addWidget(self.leReference)
+        self.btnReference = QtWidgets.QPushButton(self.groupBox_3)
+        self.btnReference.setObjectName("btnReference")
+        self.horizontalLayout_40.addWidget(self.btnReference)
+        self.verticalLayout_11.addLayout(self.horizontalLayout_40)
+        self.txtReferences = QtWidgets.QPlainTextEdit(self.groupBox_3)
+        self.txtReferences.setMaximumSize(QtCore.QSize(16777215, 80))
+        self.txtReferences.setObjectName("txtReferences")
+        self.verticalLayout_11.addWidget(self.txtReferences)
         self.verticalLayout_7.addWidget(self.groupBox_3)
         self.groupBox_5 = QtWidgets.QGroupBox(self.groupBox_2)
         self.groupBox_5.setObjectName("groupBox_5")
@@ -365,6 +381,9 @@ class Ui_dlgBopeRechercheForm(object):
         self.btnC.setText(_translate("dlgBopeRechercheForm", "Commune"))
         self.btnCS.setText(_translate("dlgBopeRechercheForm", "Commune / Section"))
         self.btnCSP.setText(_translate("dlgBopeRechercheForm", "Commune / Section / Parcelle"))
+        self.label_40.setText(_translate("dlgBopeRechercheForm", "Références (INSEE section numéro ; une par ligne, plages 10-25) :"))
+        self.leReference.setPlaceholderText(_translate("dlgBopeRechercheForm", "ex : 15014 AB 123"))
+        self.btnReference.setText(_translate("dlgBopeRechercheForm", "Références"))
         self.groupBox_5.setTitle(_translate("dlgBopeRechercheForm", "Propriétaire : "))
         self.lbl_nom_2.setText(_translate("dlgBopeRechercheForm", "Nom :"))
         self.lbl_mail_2.setText(_translate("dlgBopeRechercheForm", "E-mail :"))
@@ -1191,6 +1191,9 @@ class Ui_dwcExportForm(object):
         self.btnRaz = QtWidgets.QPushButton(self.groupBox_2)
         self.btnRaz.setObjectName("btnRaz")
         self.horizontalLayout_12.addWidget(self.btnRaz)
+        self.chkCopy = QtWidgets.QCheckBox(self.groupBox_2)
+        self.chkCopy.setObjectName("chkCopy")
+        self.horizontalLayout_12.addWidget(self.chkCopy)
         self.btnEnregistrer = QtWidgets.QPushButton(self.groupBox_2)
         self.btnEnregistrer.setObjectName("btnEnregistrer")
         self.horizontalLayout_12.addWidget(self.btnEnregistrer)
@@ -1403,6 +1406,8 @@ class Ui_dwcExportForm(object):
         self.btnPreviRequete.setText(_translate("dwcExportForm", "Prévisualiser la requête"))
         self.btnPreviResu.setText(_translate("dwcExportForm", "Prévisualiser le résultat"))
         self.btnRaz.setText(_translate("dwcExportForm", "Réinitialiser"))
+        self.chkCopy.setToolTip(_translate("dwcExportForm", "Le fichier est mis en forme par PostgreSQL (COPY ... TO STDOUT), plus rapide pour les exports volumineux"))
+        self.chkCopy.setText(_translate("dwcExportForm", "Export rapide (COPY)"))
         self.btnEnregistrer.setText(_translate("dwcExportForm", "Exporter en CSV"))
 
 import ressourceGedopi_rc
@@ -292,6 +292,9 @@ class Ui_dwcPecheMainForm(object):
         self.btnPente = QtWidgets.QPushButton(self.groupBox_3)
         self.btnPente.setObjectName("btnPente")
         self.horizontalLayout_18.addWidget(self.btnPente)
+        self.chkProfil = QtWidgets.QCheckBox(self.groupBox_3)
+        self.chkProfil.setObjectName("chkProfil")
+        self.horizontalLayout_18.addWidget(self.chkProfil)
         spacerItem6 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_18.addItem(spacerItem6)
         self.verticalLayout_8.addLayout(self.horizontalLayout_18)
@@ -528,6 +531,8 @@ class Ui_dwcPecheMainForm(object):
         self.label_14.setText(_translate("dwcPecheMainForm", "Profondeur moyenne (cm) :"))
         self.label_19.setText(_translate("dwcPecheMainForm", "* Pente (%) :"))
         self.btnPente.setText(_translate("dwcPecheMainForm", "Calcul de la pente (2 clics)"))
+        self.chkProfil.setToolTip(_translate("dwcPecheMainForm", "Trace le cours d'eau entre les deux clics, échantillonne le MNT le long du tracé et renseigne la longueur prospectée"))
+        self.chkProfil.setText(_translate("dwcPecheMainForm", "Profil en long"))
         self.label_18.setText(_translate("dwcPecheMainForm", "Observation :"))
         self.btnExcel.setText(_translate("dwcPecheMainForm", "Fiche Externe"))
         self.btnAjoutFiche.setText(_translate("dwcPecheMainForm", "Lier fiche"))
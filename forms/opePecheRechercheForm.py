@@ -184,6 +184,29 @@ class Ui_dlgPecheRechercheForm(object):
         self.btnMotif.setObjectName("btnMotif")
         self.horizontalLayout_7.addWidget(self.btnMotif)
         self.verticalLayout.addLayout(self.horizontalLayout_7)
+        self.horizontalLayout_20 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_20.setObjectName("horizontalLayout_20")
+        self.label_20 = QtWidgets.QLabel(self.groupBox)
+        self.label_20.setObjectName("label_20")
+        self.horizontalLayout_20.addWidget(self.label_20)
+        self.cmbSensReseau = QtWidgets.QComboBox(self.groupBox)
+        self.cmbSensReseau.setObjectName("cmbSensReseau")
+        self.cmbSensReseau.addItem("")
+        self.cmbSensReseau.addItem("")
+        self.horizontalLayout_20.addWidget(self.cmbSensReseau)
+        self.cmbStationReseau = QtWidgets.QComboBox(self.groupBox)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.cmbStationReseau.sizePolicy().hasHeightForWidth())
+        self.cmbStationReseau.setSizePolicy(sizePolicy)
+        self.cmbStationReseau.setObjectName("cmbStationReseau")
+        self.horizontalLayout_20.addWidget(self.cmbStationReseau)
+        self.btnReseau = QtWidgets.QPushButton(self.groupBox)
+        self.btnReseau.setMaximumSize(QtCore.QSize(50, 16777215))
+        self.btnReseau.setObjectName("btnReseau")
+        self.horizontalLayout_20.addWidget(self.btnReseau)
+        self.verticalLayout.addLayout(self.horizontalLayout_20)
         self.verticalLayout_4.addWidget(self.groupBox)
         self.groupBox_4 = QtWidgets.QGroupBox(self.scrollAreaWidgetContents)
         self.groupBox_4.setObjectName("groupBox_4")
@@ -242,6 +265,10 @@ class Ui_dlgPecheRechercheForm(object):
         self.btnMeau.setText(_translate("dlgPecheRechercheForm", "Ajouter"))
         self.label_8.setText(_translate("dlgPecheRechercheForm", "Motif :"))
         self.btnMotif.setText(_translate("dlgPecheRechercheForm", "Ajouter"))
+        self.label_20.setText(_translate("dlgPecheRechercheForm", "Réseau :"))
+        self.cmbSensReseau.setItemText(0, _translate("dlgPecheRechercheForm", "En amont de"))
+        self.cmbSensReseau.setItemText(1, _translate("dlgPecheRechercheForm", "En aval de"))
+        self.btnReseau.setText(_translate("dlgPecheRechercheForm", "Ajouter"))
         self.groupBox_4.setTitle(_translate("dlgPecheRechercheForm", "Requête SQL :"))
         self.label_6.setText(_translate("dlgPecheRechercheForm", "<html><head/><body><p align=\"justify\"><span style=\" font-size:7pt;\">Attention : les modifications dans la requête sont possibles mais peuvent faire échouer celle-ci voir endommager la base de données ! ! !</span></p></body></html>"))
         self.txtSql.setHtml(_translate("dlgPecheRechercheForm", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
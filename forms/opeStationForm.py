@@ -157,9 +157,32 @@ class Ui_dlgStationForm(object):
         self.leDistance.setAlignment(QtCore.Qt.AlignCenter)
         self.leDistance.setObjectName("leDistance")
         self.horizontalLayout_10.addWidget(self.leDistance)
+        self.label_40 = QtWidgets.QLabel(self.groupBox)
+        self.label_40.setObjectName("label_40")
+        self.horizontalLayout_10.addWidget(self.label_40)
+        self.leConfluence = QtWidgets.QLineEdit(self.groupBox)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.leConfluence.sizePolicy().hasHeightForWidth())
+        self.leConfluence.setSizePolicy(sizePolicy)
+        self.leConfluence.setMaximumSize(QtCore.QSize(50, 16777215))
+        self.leConfluence.setAlignment(QtCore.Qt.AlignCenter)
+        self.leConfluence.setObjectName("leConfluence")
+        self.horizontalLayout_10.addWidget(self.leConfluence)
         spacerItem6 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_10.addItem(spacerItem6)
         self.verticalLayout_3.addLayout(self.horizontalLayout_10)
+        self.horizontalLayout_40 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_40.setObjectName("horizontalLayout_40")
+        self.label_41 = QtWidgets.QLabel(self.groupBox)
+        self.label_41.setObjectName("label_41")
+        self.horizontalLayout_40.addWidget(self.label_41)
+        self.leReseau = QtWidgets.QLineEdit(self.groupBox)
+        self.leReseau.setReadOnly(True)
+        self.leReseau.setObjectName("leReseau")
+        self.horizontalLayout_40.addWidget(self.leReseau)
+        self.verticalLayout_3.addLayout(self.horizontalLayout_40)
         self.horizontalLayout_11 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_11.setObjectName("horizontalLayout_11")
         self.label_12 = QtWidgets.QLabel(self.groupBox)
@@ -255,6 +278,8 @@ class Ui_dlgStationForm(object):
         self.label_7.setText(_translate("dlgStationForm", "Contexte PDPG :"))
         self.label_8.setText(_translate("dlgStationForm", "AAPPMA :"))
         self.label_11.setText(_translate("dlgStationForm", "Distance à la source (km) :"))
+        self.label_40.setText(_translate("dlgStationForm", "À la confluence (km) :"))
+        self.label_41.setText(_translate("dlgStationForm", "Réseau :"))
         self.label_12.setText(_translate("dlgStationForm", "Surface du bassin versant amont (km²) :"))
         self.groupBox_2.setTitle(_translate("dlgStationForm", "Photo de la station :"))
         self.label_28.setText(_translate("dlgStationForm", "Masse eau :"))
@@ -245,6 +245,21 @@ class Ui_dwcThermiMainForm(object):
         self.btnImpCsv.setStyleSheet("color: rgb(231, 0, 0)")
         self.btnImpCsv.setObjectName("btnImpCsv")
         self.horizontalLayout_2.addWidget(self.btnImpCsv)
+        self.btnImpLot = QtWidgets.QPushButton(self.groupBox_5)
+        self.btnImpLot.setMinimumSize(QtCore.QSize(100, 30))
+        self.btnImpLot.setMaximumSize(QtCore.QSize(100, 16777215))
+        self.btnImpLot.setObjectName("btnImpLot")
+        self.horizontalLayout_2.addWidget(self.btnImpLot)
+        self.btnCourbe = QtWidgets.QPushButton(self.groupBox_5)
+        self.btnCourbe.setMinimumSize(QtCore.QSize(100, 30))
+        self.btnCourbe.setMaximumSize(QtCore.QSize(100, 16777215))
+        self.btnCourbe.setObjectName("btnCourbe")
+        self.horizontalLayout_2.addWidget(self.btnCourbe)
+        self.btnRecalcul = QtWidgets.QPushButton(self.groupBox_5)
+        self.btnRecalcul.setMinimumSize(QtCore.QSize(100, 30))
+        self.btnRecalcul.setMaximumSize(QtCore.QSize(100, 16777215))
+        self.btnRecalcul.setObjectName("btnRecalcul")
+        self.horizontalLayout_2.addWidget(self.btnRecalcul)
         spacerItem6 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_2.addItem(spacerItem6)
         self.verticalLayout_3.addLayout(self.horizontalLayout_2)
@@ -706,6 +721,12 @@ class Ui_dwcThermiMainForm(object):
         self.btnRetraitFiche.setText(_translate("dwcThermiMainForm", "Délier fiche"))
         self.groupBox_5.setTitle(_translate("dwcThermiMainForm", "Résultats"))
         self.btnImpCsv.setText(_translate("dwcThermiMainForm", "Import CSV"))
+        self.btnImpLot.setToolTip(_translate("dwcThermiMainForm", "Importe en une fois les fichiers des enregistreurs d'un répertoire, selon un fichier de correspondance fichier / station / code opération"))
+        self.btnImpLot.setText(_translate("dwcThermiMainForm", "Import groupé"))
+        self.btnCourbe.setToolTip(_translate("dwcThermiMainForm", "Affiche la courbe des températures du suivi"))
+        self.btnCourbe.setText(_translate("dwcThermiMainForm", "Courbe"))
+        self.btnRecalcul.setToolTip(_translate("dwcThermiMainForm", "Recalcule les indicateurs à partir des relevés bruts enregistrés dans la base"))
+        self.btnRecalcul.setText(_translate("dwcThermiMainForm", "Recalculer"))
         self.label_23.setText(_translate("dwcThermiMainForm", "* T°C minimale instantanée :"))
         self.label_25.setText(_translate("dwcThermiMainForm", "* T°C maximale instantanée :"))
         self.label_26.setText(_translate("dwcThermiMainForm", "<html><head/><body><p>* Amplitude thermique journalière maximale :</p></body></html>"))
@@ -9,12 +9,19 @@ from PyQt5.QtWidgets import (QAction, QDockWidget, QMenu)
 from .resources_rc import *
 
 # Import des scripts principaux des différentes pages du plugin
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_reference, Gedopi_session)
+from .commonSpatial import (Gedopi_bassin, Gedopi_mnt, Gedopi_reseau)
 from .autreDialogs import (About_dialog, Version_dialog, Help_dialog)
 from .espePecheElecDialogs import (EspePecheElec_dialog)
 from .exportCsvDialogs import (Csv_dialog)
 from .bailPecheDialogs import (Bail_peche_dialog)
+from .bailPecheControle import (Controle_bail)
+from .bailPecheSpatial import (Parcelle_bail)
+from .bailPecheCadastre import (Index_cadastre)
+from .bailPecheProprio import (Recherche_proprio)
+from .bailPecheEcheance import (Echeance_bail)
 from .opePecheDialogs import (Peche_elec_dialog)
+from .opePecheRecalcul import (Recalcul_pente_dialog)
 from .opeSuiviDialogs import (Suivi_thermi_dialog)
 from .opeInventaireDialogs import (Inventaire_dialog)
 from .stationDialogs import (Station_dialog)
@@ -53,6 +60,8 @@ class gedopi:
         self.ope_peche_action = None
         self.ope_suivi_action = None
         self.ope_inventaire_action = None
+        self.reference_action = None
+        self.recalcul_action = None
         self.about_action = None
         self.help_action = None
         self.version_action = None
@@ -125,6 +134,16 @@ class gedopi:
         self.ope_inventaire_action.setChecked(False)
         self.ope_inventaire_action.triggered.connect(self.toggle_inventaire_dialog)
 
+     # Actualisation des listes de référence
+        icon = QIcon(os.path.dirname(__file__) + "/icons/icon2.png")
+        self.reference_action = QAction(icon, u"Actualiser les listes de référence", self.iface.mainWindow())
+        self.reference_action.triggered.connect(self.actualise_references)
+
+     # Recalculs en masse (pentes, altitudes, positions des stations sur le réseau)
+        icon = QIcon(os.path.dirname(__file__) + "/icons/icon2.png")
+        self.recalcul_action = QAction(icon, u"Recalculs (pentes, altitudes, réseau, bassins versants)", self.iface.mainWindow())
+        self.recalcul_action.triggered.connect(self.open_recalcul_dialog)
+
      # Onglet Autres
       # Action à propos
         icon = QIcon(os.path.dirname(__file__) + "/icons/about1.png")
@@ -150,6 +169,8 @@ class gedopi:
         self.ope_menu.addAction(self.ope_peche_action)
         self.ope_menu.addAction(self.ope_suivi_action)
         self.ope_menu.addAction(self.ope_inventaire_action)
+        self.menu.addAction(self.reference_action)
+        self.menu.addAction(self.recalcul_action)
         self.menu.addAction(self.about_action)
         self.menu.addAction(self.help_action)
         self.menu.addAction(self.version_action)
@@ -183,6 +204,8 @@ class gedopi:
             if (type(elem).__name__ == "Station_dialog"):
                 if (elem.isVisible()):
                     elem.hide()
+                    # Des stations ont pu être créées ou modifiées
+                    Gedopi_reference.stationsModifiees()
 
     def toggle_csv_dialog(self):
         '''Gère la fermeture et l'ouverture du QDockWidget de l'export CSV'''
@@ -270,6 +293,8 @@ class gedopi:
         else:
             if self.station_dialog.isVisible():
                 self.station_dialog.hide()
+                # Des stations ont pu être créées ou modifiées
+                Gedopi_reference.stationsModifiees()
             else:
                 self.hide_toogle_dialog()
                 self.station_dialog.show()
@@ -291,6 +316,31 @@ class gedopi:
         '''Permet l'exécution et l'ouverture du dialog "Couche espèce (Pêche électrique)"'''
         dialog = EspePecheElec_dialog(self.iface)
         dialog.exec_()
+        # Rend la connexion au pool à la fermeture du dialog
+        Gedopi_session.liberer(dialog.db)
+
+    def actualise_references(self):
+        '''Recharge les tables de référence mises en cache (AAPPMA, PDPG, masses d'eau, espèces...)'''
+
+        # Les listes de stations des formulaires d'opération sont relues au prochain changement d'enregistrement
+        Gedopi_reference.invalider()
+        # Le graphe du réseau hydrographique est relu, il est reconstruit si cours_eau a changé
+        Gedopi_reseau.vider()
+        # Le contrôle des droits de pêche est réexécuté à la prochaine ouverture du formulaire
+        Controle_bail.vider()
+        # L'index des références cadastrales est relu à la prochaine recherche de parcelles
+        Index_cadastre.vider()
+        # Les propriétaires sont relus à la prochaine recherche
+        Recherche_proprio.vider()
+        # Les échéances sont recalculées (noms des AAPPMA et des cours d'eau) à la prochaine ouverture du tableau
+        Echeance_bail.vider()
+
+    def open_recalcul_dialog(self):
+        '''Permet l'exécution et l'ouverture du dialog "Recalculs (pentes, altitudes, réseau, bassins versants)"'''
+        dialog = Recalcul_pente_dialog(self.iface)
+        dialog.exec_()
+        # Rend la connexion au pool à la fermeture du dialog
+        Gedopi_session.liberer(dialog.db)
 
     def open_about_dialog(self):
         '''Permet l'exécution et l'ouverture du Dialog "A Propos"'''
@@ -338,6 +388,21 @@ class gedopi:
                 if (elem.isVisible()):
                     elem.close()
 
+        # Fermeture des connexions conservées par le pool
+        Gedopi_session.fermerTout()
+
+        # Libération des MNT ouverts, de leurs tuiles et des grilles d'écoulement
+        Gedopi_mnt.vider()
+        Gedopi_bassin.vider()
+
+        # Libération des graphes du réseau hydrographique et des caches des droits de pêche (contrôle, parcelles, cadastre, propriétaires, échéances)
+        Gedopi_reseau.vider()
+        Controle_bail.vider()
+        Parcelle_bail.vider()
+        Index_cadastre.vider()
+        Recherche_proprio.vider()
+        Echeance_bail.vider()
+
     def run(self):
         '''Exécute la méthode qui charge et démarre le plugin.'''
         if not self.pluginIsActive:
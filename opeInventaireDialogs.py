@@ -8,8 +8,8 @@ from functools import partial
 from PyQt5.QtCore import (Qt)
 from PyQt5.QtGui import (QCursor, QPixmap)
 from PyQt5.QtWidgets import (QApplication, QDataWidgetMapper, QDialog, QFileDialog, QDockWidget, QHeaderView, QMessageBox, QTableView)
-from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
-from qgis.core import (QgsPointXY, QgsTracer, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsDataSourceUri, QgsExpression, QgsExpressionContext, QgsFeatureRequest,  QgsGeometry, QgsPoint, QgsRaster, QgsRasterLayer, QgsVectorDataProvider, QgsVectorLayer)
+from PyQt5.QtSql import (QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
+from qgis.core import (QgsPointXY, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsDataSourceUri, QgsFeatureRequest,  QgsGeometry, QgsPoint, QgsRaster, QgsRasterLayer, QgsVectorDataProvider)
 from qgis.gui import (QgsMapToolPan, QgsMessageBar, QgsMapToolEmitPoint, QgsVertexMarker)
 
 # Initialise les ressources Qt à partir du fichier resources.py
@@ -24,7 +24,13 @@ from opeStationForm import (Ui_dlgStationForm)
 from opeMoaAjoutForm import (Ui_dlgMoaAjoutForm)
 
 # Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_reference, Gedopi_session)
+
+# Import des services d'accrochage aux cours d'eau et du graphe du réseau hydrographique
+from .commonSpatial import (Gedopi_accrochage, Gedopi_reseau)
+
+# Import de la position des stations sur le réseau hydrographique
+from .stationReseau import (Reseau_station)
 
 # Import du script de filtrage des inventaires
 from .opeInventaireFiltrage import (Filtrage_inventaire_dialog)
@@ -85,6 +91,10 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
         self.modelRiviere = None
         self.modelBaran = None
         self.modelMoa = None
+        self.queryEnregistrement = None
+        self.ceauStation = None
+        self.geomExiste = True
+        self.accrochage = None
 
         # Variables diverses
         self.excelBool = False
@@ -183,25 +193,20 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
                 if layer.selectedFeatureCount() != 0:
                     self.btnFiltreCartoManuel.setEnabled(True)
                     if (origine == 1 and self.chkFiltreCartoAuto.isChecked()) or (origine == 2):
-                        if (layer.selectedFeatureCount() >= 1000) and (QGis.QGIS_VERSION_INT < 21203):
-                            layer.removeSelection()
-                            self.iface.messageBar().pushMessage("Erreur : ", u"Le nombre d'éléments sélectionnés est trop important ...", level=QgsMessageBar.CRITICAL, duration=3)
-                        else:
-                            self.infoMessage = u"(FILTRAGE EN COURS) Gedopi - Inventaire de reproduction"
-                            wparam = ""
-                            for feature in layer.selectedFeatures():
-                                expressContext = QgsExpressionContext()
-                                expressContext.setFeature(feature)
-                                wid = QgsExpression("$id").evaluate(expressContext)
-                                wparam += str(wid) + ","
-                            if (wparam != ""):
-                                wparam = "(" + wparam[0:len(wparam) - 1] + ")"
-                                if self.modelInventaire:
-                                    self.modelInventaire.setFilter("opeir_id in %s" % wparam)
-                                    self.modelInventaire.select()
-                                    self.row_count = self.modelInventaire.rowCount()
-                                    self.mapper.toFirst()
-                                    self.btnDeleteFiltrage.setEnabled(True)
+                        self.infoMessage = u"(FILTRAGE EN COURS) Gedopi - Inventaire de reproduction"
+                        if self.modelInventaire:
+                            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+                            wfiltre = self.gc.filtreSelection(self.db, "opeir_id", layer.selectedFeatureIds(), "inventaire")
+                            if wfiltre is None:
+                                QApplication.restoreOverrideCursor()
+                                QMessageBox.critical(self, u"Erreur SQL", u"Impossible de filtrer la sélection cartographique ...", QMessageBox.Ok)
+                                return
+                            self.modelInventaire.setFilter(wfiltre)
+                            self.modelInventaire.select()
+                            self.row_count = self.modelInventaire.rowCount()
+                            self.mapper.toFirst()
+                            self.btnDeleteFiltrage.setEnabled(True)
+                            QApplication.restoreOverrideCursor()
                 else:
                     self.btnFiltreCartoManuel.setEnabled(False)
 
@@ -265,11 +270,13 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
         del self.modelBaran
         del self.modelRiviere
         del self.modelStation
+        del self.queryEnregistrement
+        self.queryEnregistrement = None
+        self.accrochage = None
 
-        self.db.close()
-        del self.db
+        # Rend la connexion au pool, elle reste ouverte pour la prochaine ouverture du formulaire
+        Gedopi_session.liberer(self.db)
         self.db = None
-        QSqlDatabase.removeDatabase('db1')
 
         # Supprime le vertex du canevas si existant
         if self.point_click_1 != "":
@@ -291,17 +298,14 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
             connectionParams = self.gc.getConnectionParameterFromDbLayer(self.layer)
             if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
                 self.dbType = "postgres"
-                self.db = QSqlDatabase.addDatabase("QPSQL", 'db1')
-                self.db.setDatabaseName(connectionParams['dbname'])
-                self.db.setUserName(connectionParams['user'])
-                self.db.setPassword(connectionParams['password'])
-                self.db.setHostName(connectionParams['host'])
+                self.db = Gedopi_session.acquerir(connectionParams)
                 self.dbSchema = connectionParams['schema']
                 self.user = connectionParams['user']
                 self.password = connectionParams['password']
                 self.dbname = connectionParams['dbname']
 
-            if (not self.db.open()):
+            if (not self.db or not self.db.isOpen()):
+                self.db = None
                 QMessageBox.critical(self, "Erreur", u"Impossible de se connecter à la base de données ...", QMessageBox.Ok)
                 QApplication.restoreOverrideCursor()
                 return
@@ -334,17 +338,6 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(0)
 
-            self.modelBaran = QSqlTableModel(self, self.db)
-            wrelation = "baran_s_zfp"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelBaran.setTable(wrelation)
-            self.modelBaran.setSort(3, Qt.AscendingOrder)
-            if (not self.modelBaran.select()):
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Baran dans le setupModel() : \n" + self.modelBaran.lastError().text(), QMessageBox.Ok)
-            self.cmbBaran.setModel(self.modelBaran)
-            self.cmbBaran.setModelColumn(3)
-
         self.modelRiviere = QSqlTableModel(self, self.db)
         wrelation = "cours_eau"
         if self.dbType == "postgres":
@@ -363,7 +356,26 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
         self.cmbRiviere.addItem(riviereNR)
 
         self.modelStation = QSqlQueryModel(self)
-        self.modelBaran = QSqlQueryModel(self)
+
+        # Liste de référence issue du cache partagé, rowChange() se contente de sélectionner la valeur
+        self.modelBaran = Gedopi_reference.modele(self.db, self.dbSchema, "baran_s_zfp")
+        if self.modelBaran.lastError().isValid():
+            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Baran dans le setupModel() : \n" + self.modelBaran.lastError().text(), QMessageBox.Ok)
+        self.cmbBaran.setModel(self.modelBaran)
+        self.cmbBaran.setModelColumn(1)
+
+        # Requête préparée récupérant en un seul aller-retour la station, la rivière
+        # et la présence d'une géométrie de l'enregistrement courant (voir rowChange())
+        self.ceauStation = None
+        self.queryEnregistrement = QSqlQuery(self.db)
+        wrelation = ""
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "."
+        self.queryEnregistrement.prepare("select ope_sta_id, sta_ceau_id, opeir_geom is not null as geom_existe from " + wrelation + "ope_inventaire_repro " +
+        "join " + wrelation + "operation on ope_code = opeir_ope_code left join " + wrelation + "station on sta_id = ope_sta_id where opeir_id = ?")
+
+        # Service d'accrochage des clics au cours d'eau le plus proche
+        self.accrochage = Gedopi_accrochage(self.db, self.dbSchema)
 
         self.mapper = QDataWidgetMapper(self)
         self.mapper.setSubmitPolicy(QDataWidgetMapper.ManualSubmit)
@@ -599,6 +611,7 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
             self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id in (select ceau_id from data.cours_eau where ceau_nom = 'NR') order by sta_id;", self.db)
             if self.modelStation.lastError().isValid():
                 QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le changeCmbRiviere() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+            self.ceauStation = None
 
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(1)
@@ -617,6 +630,9 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
             self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wceau_id), self.db)
             if self.modelStation.lastError().isValid():
                 QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le changeCmbRiviere() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+                self.ceauStation = None
+            else:
+                self.ceauStation = (wceau_id, Gedopi_reference.versionStations)
 
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(1)
@@ -646,32 +662,18 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
 
         # Record de l'inventaire courant
         record = self.modelInventaire.record(row)
-        wopeir_ope_code = record.value(self.modelInventaire.fieldIndex("opeir_ope_code"))
-
-        # Récupération de la clé de l'operation correspondante
-        query = QSqlQuery(self.db)
-        wrelation = "operation"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("select ope_sta_id from " + wrelation + " where ope_code = ?")
-        query.addBindValue(wopeir_ope_code)
-        wope_sta_id = ""
-        if query.exec_():
-            if query.next():
-                wope_sta_id = query.value(0)
-                self.currentStation = wope_sta_id
+        wopeir_id = record.value("opeir_id")
 
-        # Récupération de la clé de la riviere correspondante
-        query = QSqlQuery(self.db)
-        wrelation = "station"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("select sta_ceau_id from " + wrelation + " where sta_id = ?")
-        query.addBindValue(wope_sta_id)
-        wsta_ceau_id = ""
-        if query.exec_():
-            if query.next():
-                wsta_ceau_id = query.value(0)
+        # Récupération de la station, de la rivière et de la présence de géométrie en une seule requête
+        enregistrement = self.gc.chargeEnregistrement(self.queryEnregistrement, [wopeir_id])
+        if enregistrement is None:
+            QMessageBox.critical(self, u"Erreur SQL", u"Erreur au chargement de l'enregistrement dans le rowChange() : \n" + self.queryEnregistrement.lastError().text(), QMessageBox.Ok)
+            enregistrement = {}
+        wope_sta_id = enregistrement.get("ope_sta_id", "")
+        wsta_ceau_id = enregistrement.get("sta_ceau_id", "")
+        self.geomExiste = enregistrement.get("geom_existe", False)
+        if wope_sta_id != "":
+            self.currentStation = wope_sta_id
 
         # Sélection de la rivière
         result = self.cmbRiviere.model().match(self.cmbRiviere.model().index(0, 0), Qt.EditRole, wsta_ceau_id, -1, Qt.MatchExactly)
@@ -681,39 +683,28 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
             indexNR = self.cmbRiviere.count()
             self.cmbRiviere.setCurrentIndex(indexNR - 1)
 
-        # Filtrage station
-        self.modelStation.clear()
-        wrelation = "station"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wsta_ceau_id), self.db)
-        if self.modelStation.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le rowChange() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+        # Filtrage station, uniquement si la rivière ou les stations diffèrent de celles déjà chargées
+        if self.ceauStation != (wsta_ceau_id, Gedopi_reference.versionStations):
+            self.modelStation.clear()
+            wrelation = "station"
+            if self.dbType == "postgres":
+                wrelation = self.dbSchema + "." + wrelation
+            self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wsta_ceau_id), self.db)
+            if self.modelStation.lastError().isValid():
+                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le rowChange() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+            else:
+                self.ceauStation = (wsta_ceau_id, Gedopi_reference.versionStations)
 
-        self.cmbStation.setModel(self.modelStation)
-        self.cmbStation.setModelColumn(1)
+            self.cmbStation.setModel(self.modelStation)
+            self.cmbStation.setModelColumn(1)
 
         # Sélection station
         result = self.cmbStation.model().match(self.cmbStation.model().index(0, 0), Qt.EditRole, wope_sta_id, -1, Qt.MatchExactly)
         if result:
             self.cmbStation.setCurrentIndex(result[0].row())
 
-       # Filtrage baran
-        record = self.modelInventaire.record(row)
-        wopeir_baran_id = record.value(self.modelInventaire.fieldIndex("opeir_baran_id"))
-        self.modelBaran.clear()
-        wrelation = "baran_s_zfp"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelBaran.setQuery("select baran_id, baran_correspond from " + wrelation + " order by baran_correspond;", self.db)
-
-        if self.modelBaran.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Baran dans le rowChange() : \n" + self.modelBaran.lastError().text(), QMessageBox.Ok)
-
-        self.cmbBaran.setModel(self.modelBaran)
-        self.cmbBaran.setModelColumn(1)
-
         # Sélection baran
+        wopeir_baran_id = record.value(self.modelInventaire.fieldIndex("opeir_baran_id"))
         result = self.cmbBaran.model().match(self.cmbBaran.model().index(0, 0), Qt.EditRole, wopeir_baran_id, -1, Qt.MatchExactly)
         if result:
             self.cmbBaran.setCurrentIndex(result[0].row())
@@ -728,22 +719,9 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
 
         self.verrouillageModif()
 
-        # Vérifie la présence d'une géométrie
-        if self.mapper:
-            row = self.mapper.currentIndex()
-            if row >= 0:
-                record = self.modelInventaire.record(row)
-                wid = record.value("opeir_id")
-
-                layer = self.gc.getLayerFromLegendByTableProps('ope_inventaire_repro', 'opeir_geom', '')
-                request = QgsFeatureRequest().setFilterFids([wid])
-
-                it = layer.getFeatures(request)
-                extent = None
-                for x in it:
-                    extent = x.geometry()
-                if extent == None:
-                    self.iface.messageBar().pushMessage("Attention : ", u"Cet inventaire de reproduction ne possède pas de géométrie.", level= QgsMessageBar.WARNING, duration = 5)
+        # Vérifie la présence d'une géométrie (information issue de la requête de l'enregistrement)
+        if not self.geomExiste:
+            self.iface.messageBar().pushMessage("Attention : ", u"Cet inventaire de reproduction ne possède pas de géométrie.", level= QgsMessageBar.WARNING, duration = 5)
 
     def zoomInventaire(self):
         '''Permet de zoomer le canevas de la carte sur l'inventaire courante'''
@@ -1214,37 +1192,11 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
                 pt1 = QgsPoint(pt1).wellKnownText()
                 pt2 = QgsPoint(pt2).wellKnownText()
 
-            # Sélection des cours d'eau dans les 6km autours du point 1
             if pt1 != "" and pt2 != "":
-                wclick_geom= "ST_GeomFromText(' "+ str(pt1) + "', 2154)"
-                wclick_geom_ceau = "ST_Buffer(" + wclick_geom + ", 6000)"
-                query = QSqlQuery(self.db)
-                wrelation = "cours_eau"
-                if self.dbType == "postgres":
-                    wrelation = self.dbSchema + "." + wrelation
-                requete = "select ceau_id from " + wrelation + " where ST_Intersects(ceau_geom , " + wclick_geom_ceau + ")"
-                query.prepare(requete)
-                ceau_intersect = ""
-                i = 0
-                if query.exec_():
-                    i = int(query.size())
-                    if i != 0:
-                        while i > 0:
-                            if query.next():
-                                if ceau_intersect == "":
-                                    ceau_intersect = str(query.value(0))
-                                else :
-                                    ceau_intersect = str(ceau_intersect) + ", " + str(query.value(0))
-                                i -= 1
-
-                # Import virtuel de la couche des cours d'eau
-                uri = QgsDataSourceURI()
-                uri.setConnection("localhost", "5432", self.dbname, self.password, self.user)
-                uri.setDataSource("data", "cours_eau", "ceau_geom", "ceau_id IN (" + ceau_intersect + ")")
-                vlayer = QgsVectorLayer(uri.uri(), "riviere", "postgres")
-
-                if not vlayer.isValid():
-                    self.iface.messageBar().pushMessage("Erreur : ", u"Layer failed Rivière to load !", level= QgsMessageBar.CRITICAL, duration = 5)
+                # Graphe du réseau hydrographique, chargé une seule fois par session
+                reseau = Gedopi_reseau.ouvrir(self.db, self.dbSchema)
+                if reseau is None:
+                    self.iface.messageBar().pushMessage("Erreur : ", u"Graphe du réseau hydrographique indisponible : " + Gedopi_reseau.derniereErreur, level= QgsMessageBar.CRITICAL, duration = 5)
                 else:
                     if self.point_click_1 != "":
                         self.mc.scene().removeItem(self.point_click_1)
@@ -1253,21 +1205,21 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
                         self.mc.scene().removeItem(self.point_click_2)
                         self.point_click_2 = ""
 
-                    # Recalcul de la position des points afin de les accrocher à la rivière la plus proche
-                    shortestDist_1 = float("inf")
-                    shortestDist_2 = float("inf")
-                    for f in vlayer.getFeatures():
-                        dist_1 = f.geometry().distance(QgsGeometry.fromPoint(self.layerPoint_1))
-                        dist_2 = f.geometry().distance(QgsGeometry.fromPoint(self.layerPoint_2))
-                        if dist_1 < shortestDist_1:
-                            shortestDist_1 = dist_1
-                            pt1 = f.geometry().nearestPoint( QgsGeometry.fromPoint(self.layerPoint_1))
-                            pt1 = pt1.vertexAt(0)
-
-                        if dist_2 < shortestDist_2:
-                            shortestDist_2 = dist_2
-                            pt2 = f.geometry().nearestPoint( QgsGeometry.fromPoint(self.layerPoint_2))
-                            pt2 = pt2.vertexAt(0)
+                    # Accrochage des points à la rivière la plus proche (requête KNN sur l'index spatial)
+                    accroche_1 = self.accrochage.accroche(self.layerPoint_1)
+                    accroche_2 = self.accrochage.accroche(self.layerPoint_2)
+                    if accroche_1 is None or accroche_2 is None:
+                        # Sans accrochage, les points cliqués sont raccordés au tracé le plus proche de tout le réseau
+                        self.iface.messageBar().pushMessage("Erreur : ", u"Accrochage à la rivière impossible : " + self.accrochage.lastError().text(), level= QgsMessageBar.WARNING, duration = 5)
+                        pt1 = QgsPointXY(self.layerPoint_1.x(), self.layerPoint_1.y())
+                        pt2 = QgsPointXY(self.layerPoint_2.x(), self.layerPoint_2.y())
+                        ceau_1 = None
+                        ceau_2 = None
+                    else:
+                        pt1 = accroche_1[0]
+                        pt2 = accroche_2[0]
+                        ceau_1 = accroche_1[1]
+                        ceau_2 = accroche_2[1]
                     self.point_click_2 = QgsVertexMarker(self.mc)
                     self.point_click_2.setCenter(pt2)
 
@@ -1275,39 +1227,14 @@ class Inventaire_dialog(QDockWidget, Ui_dwcInventMainForm):
                     self.point_click_1.setCenter(pt1)
 
                     # Calcul du chemin entre les deux points en suivant le cours d'eau
-                    list = []
-                    list.append(vlayer)
-                    couche = QgsTracer()
-                    couche.setLayers(list)
-                    point_fin = couche.findShortestPath(pt1, pt2)
-                    if point_fin[1] == 1:
-                        self.iface.messageBar().pushMessage("ErrTooManyFeatures : ", "Max feature count threshold was reached while reading features !", level= QgsMessageBar.CRITICAL, duration = 5)
+                    chemin = reseau.chemin(pt1, pt2, ceau_1, ceau_2)
+                    if chemin is None:
+                        self.iface.messageBar().pushMessage("ErrNoPath : ", reseau.erreur + " !", level= QgsMessageBar.CRITICAL, duration = 5)
                         self.line = ""
                         self.clic = 0
                         self.pointOk = False
-                    elif point_fin[1] == 2:
-                        self.iface.messageBar().pushMessage("ErrPoint1 : ", "Start point cannot be joined to the grap !", level= QgsMessageBar.CRITICAL, duration = 5)
-                        self.line = ""
-                        self.clic = 0
-                        self.pointOk = False
-                    elif point_fin[1] == 3:
-                        self.iface.messageBar().pushMessage("ErrPoint2 : ", "End point cannot be joined to the graph !", level= QgsMessageBar.CRITICAL, duration = 5)
-                        self.line = ""
-                        self.clic = 0
-                        self.pointOk = False
-                    elif point_fin[1] == 4:
-                        self.iface.messageBar().pushMessage("ErrNoPath : ", "Points are not connected in the graph !", level= QgsMessageBar.CRITICAL, duration = 5)
-                        self.line = ""
-                        self.clic = 0
-                        self.pointOk = False
-                    elif point_fin[1] == 0:
-                        list_point = point_fin[0]
-                        self.line = QgsGeometry.fromPolyline(list_point)
-                    else :
-                        self.line = ""
-                        self.clic = 0
-                        self.pointOk = False
-                        self.iface.messageBar().pushMessage("Erreur : ", u"Fail at findShortestPath !", level= QgsMessageBar.CRITICAL, duration = 5)
+                    else:
+                        self.line = QgsGeometry.fromPolylineXY(chemin[1])
                 if self.line != "":
                     longueur = self.line.length()
                     self.spnLongueur.setValue(longueur)
@@ -1607,6 +1534,11 @@ class Fiche_station(QDialog, Ui_dlgStationForm):
                 self.lePhoto.setText(wphoto)
                 self.leNom.setText(wnom)
 
+        # Position de la station sur le réseau hydrographique (distance à la confluence, stations amont / aval)
+        confluence, position = Reseau_station(self.db, self.dbSchema).texteFiche(self.wsta_id)
+        self.leConfluence.setText(confluence)
+        self.leReseau.setText(position)
+
         chemin = unicode(self.lePhoto.text())
         if chemin != "" or chemin != "***":
             size = self.size()
@@ -6,7 +6,7 @@ import sys
 import os
 from PyQt5.QtCore import (Qt, QDate)
 from PyQt5.QtWidgets import (QDialog, QMessageBox)
-from PyQt5.QtSql import (QSqlQuery, QSqlTableModel, QSqlQueryModel)
+from PyQt5.QtSql import (QSqlQuery, QSqlTableModel)
 
 # Initialise les ressources Qt à partir du fichier resources.py
 # import resources_rc
@@ -17,6 +17,9 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/forms")
 # Import du script Python de l'interface graphique nécessaire
 from opeInventaireRechercheForm import (Ui_dlgInventRechercheForm)
 
+# Import du cache des tables de référence
+from .commonDialogs import (Gedopi_reference)
+
 class Filtrage_inventaire_dialog(QDialog, Ui_dlgInventRechercheForm):
     '''
     Class de la fenêtre permettant le filtrage attributaire des inventaires de reproduction
@@ -82,27 +85,17 @@ class Filtrage_inventaire_dialog(QDialog, Ui_dlgInventRechercheForm):
 
         self.wwhere = ""
 
-        self.modelPdpg = QSqlTableModel(self, self.db)
-        wrelation = "contexte_pdpg"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelPdpg.setTable(wrelation)
-        self.modelPdpg.setSort(2, Qt.AscendingOrder)
-        if (not self.modelPdpg.select()):
+        self.modelPdpg = Gedopi_reference.modele(self.db, self.dbSchema, "contexte_pdpg")
+        if self.modelPdpg.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle PDPG", self.modelPdpg.lastError().text(), QMessageBox.Ok)
         self.cmbPdpg.setModel(self.modelPdpg)
-        self.cmbPdpg.setModelColumn(self.modelPdpg.fieldIndex("pdpg_nom"))
+        self.cmbPdpg.setModelColumn(1)
 
-        self.modelAappma = QSqlTableModel(self, self.db)
-        wrelation = "aappma"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelAappma.setTable(wrelation)
-        self.modelAappma.setSort(1, Qt.AscendingOrder)
-        if (not self.modelAappma.select()):
+        self.modelAappma = Gedopi_reference.modele(self.db, self.dbSchema, "aappma")
+        if self.modelAappma.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle AAPPMA", self.modelAappma.lastError().text(), QMessageBox.Ok)
         self.cmbAappma.setModel(self.modelAappma)
-        self.cmbAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbAappma.setModelColumn(1)
 
         self.modelRiviere = QSqlTableModel(self, self.db)
         wrelation = "cours_eau"
@@ -116,11 +109,7 @@ class Filtrage_inventaire_dialog(QDialog, Ui_dlgInventRechercheForm):
         self.cmbRiviere.setModel(self.modelRiviere)
         self.cmbRiviere.setModelColumn(self.modelRiviere.fieldIndex("ceau_nom"))
 
-        self.modelMeau = QSqlQueryModel(self)
-        wrelation = "masse_eau"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelMeau.setQuery("select meau_code, meau_code || ' ; ' || meau_nom from " + wrelation + " order by meau_code;", self.db)
+        self.modelMeau = Gedopi_reference.modele(self.db, self.dbSchema, "masse_eau")
         if self.modelMeau.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle Masse d'eau", self.modelMeau.lastError().text(), QMessageBox.Ok)
         self.cmbMeau.setModel(self.modelMeau)
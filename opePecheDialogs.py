@@ -5,11 +5,11 @@
 import sys
 import os
 from functools import partial
-from PyQt5.QtCore import (Qt, QFileInfo, QDate)
+from PyQt5.QtCore import (Qt, QDate)
 from PyQt5.QtGui import (QCursor, QPixmap)
 from PyQt5.QtWidgets import (QApplication, QDataWidgetMapper, QDialog, QFileDialog, QDockWidget, QHeaderView, QMessageBox, QTableView)
-from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
-from qgis.core import (QgsPointXY, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsDataSourceUri, QgsExpression, QgsExpressionContext, QgsFeatureRequest,  QgsGeometry, QgsPoint, QgsRaster, QgsRasterLayer, QgsVectorDataProvider, QgsVectorLayer)
+from PyQt5.QtSql import (QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
+from qgis.core import (QgsPointXY, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsDataSourceUri, QgsFeatureRequest,  QgsPoint, QgsVectorDataProvider)
 from qgis.gui import (QgsMapToolPan, QgsMessageBar, QgsMapToolEmitPoint, QgsVertexMarker)
 
 # Initialise les ressources Qt à partir du fichier resources.py
@@ -26,7 +26,16 @@ from opeOperateurAjoutForm import (Ui_dlgOperateurAjoutForm)
 from opePechePoissonForm import (Ui_dlgPecheSaisieForm)
 
 # Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_reference, Gedopi_session)
+
+# Import du service d'accrochage aux cours d'eau
+from .commonSpatial import (Gedopi_accrochage, Gedopi_mnt, Gedopi_profil, numpy)
+
+# Import de la position des stations sur le réseau hydrographique
+from .stationReseau import (Reseau_station)
+
+# Import de l'affichage du profil en long
+from .opePecheProfil import (Profil_riviere_dialog)
 
 # Import du script de filtrage des pêches électriques
 from .opePecheFiltrage import (Filtrage_peche_dialog)
@@ -90,6 +99,11 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
         self.modelMotif = None
         self.modelMoa = None
         self.modelPoisson = None
+        self.queryEnregistrement = None
+        self.ceauStation = None
+        self.geomExiste = True
+        self.accrochage = None
+        self.profilRiviere = None
 
         # Variables diverses
         self.excelBool = False
@@ -196,25 +210,20 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
 
                     self.btnFiltreCartoManuel.setEnabled(True)
                     if (origine == 1 and self.chkFiltreCartoAuto.isChecked()) or (origine == 2):
-                        if (layer.selectedFeatureCount() >= 1000) and (QGis.QGIS_VERSION_INT < 21203):
-                            layer.removeSelection()
-                            self.iface.messageBar().pushMessage("Erreur : ", u"Le nombre d'éléments sélectionnés est trop important ...", level=QgsMessageBar.CRITICAL, duration=3)
-                        else:
-                            self.infoMessage = u"(FILTRAGE EN COURS) Gedopi - Pêche électrique"
-                            wparam = ""
-                            for feature in layer.selectedFeatures():
-                                expressContext = QgsExpressionContext()
-                                expressContext.setFeature(feature)
-                                wid = QgsExpression("$id").evaluate(expressContext)
-                                wparam += str(wid) + ","
-                            if (wparam != ""):
-                                wparam = "(" + wparam[0:len(wparam) - 1] + ")"
-                                if self.modelPeche:
-                                    self.modelPeche.setFilter("opep_id in %s" % wparam)
-                                    self.modelPeche.select()
-                                    self.row_count = self.modelPeche.rowCount()
-                                    self.mapper.toFirst()
-                                    self.btnDeleteFiltrage.setEnabled(True)
+                        self.infoMessage = u"(FILTRAGE EN COURS) Gedopi - Pêche électrique"
+                        if self.modelPeche:
+                            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+                            wfiltre = self.gc.filtreSelection(self.db, "opep_id", layer.selectedFeatureIds(), "peche")
+                            if wfiltre is None:
+                                QApplication.restoreOverrideCursor()
+                                QMessageBox.critical(self, u"Erreur SQL", u"Impossible de filtrer la sélection cartographique ...", QMessageBox.Ok)
+                                return
+                            self.modelPeche.setFilter(wfiltre)
+                            self.modelPeche.select()
+                            self.row_count = self.modelPeche.rowCount()
+                            self.mapper.toFirst()
+                            self.btnDeleteFiltrage.setEnabled(True)
+                            QApplication.restoreOverrideCursor()
                 else:
                     self.btnFiltreCartoManuel.setEnabled(False)
 
@@ -284,11 +293,14 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
         del self.modelIpr
         del self.modelRiviere
         del self.modelPoisson
+        del self.queryEnregistrement
+        self.queryEnregistrement = None
+        self.accrochage = None
+        self.profilRiviere = None
 
-        self.db.close()
-        del self.db
+        # Rend la connexion au pool, elle reste ouverte pour la prochaine ouverture du formulaire
+        Gedopi_session.liberer(self.db)
         self.db = None
-        QSqlDatabase.removeDatabase('db1')
 
         # Supprime le vertex du canevas si existant
         if self.point_click_1 != "":
@@ -310,17 +322,14 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             connectionParams = self.gc.getConnectionParameterFromDbLayer(self.layer)
             if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
                 self.dbType = "postgres"
-                self.db = QSqlDatabase.addDatabase("QPSQL", 'db1')
-                self.db.setDatabaseName(connectionParams['dbname'])
-                self.db.setUserName(connectionParams['user'])
-                self.db.setPassword(connectionParams['password'])
-                self.db.setHostName(connectionParams['host'])
+                self.db = Gedopi_session.acquerir(connectionParams)
                 self.dbSchema = connectionParams['schema']
                 self.user = connectionParams['user']
                 self.password = connectionParams['password']
                 self.dbname = connectionParams['dbname']
 
-            if (not self.db.open()):
+            if (not self.db or not self.db.isOpen()):
+                self.db = None
                 QMessageBox.critical(self, "Erreur", u"Impossible de se connecter à la base de données ...", QMessageBox.Ok)
                 QApplication.restoreOverrideCursor()
                 return
@@ -352,39 +361,6 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(0)
 
-            self.modelCondition = QSqlTableModel(self, self.db)
-            wrelation = "condition_peche"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelCondition.setTable(wrelation)
-            self.modelCondition.setSort(1, Qt.AscendingOrder)
-            if (not self.modelCondition.select()):
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Condition dans le setupModel() : \n" + self.modelCondition.lastError().text(), QMessageBox.Ok)
-            self.cmbCondition.setModel(self.modelCondition)
-            self.cmbCondition.setModelColumn(1)
-
-            self.modelMotif = QSqlTableModel(self, self.db)
-            wrelation = "motif_peche"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelMotif.setTable(wrelation)
-            self.modelMotif.setSort(1, Qt.AscendingOrder)
-            if (not self.modelMotif.select()):
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Motif dans le setupModel() : \n" + self.modelMotif.lastError().text(), QMessageBox.Ok)
-            self.cmbMotif.setModel(self.modelMotif)
-            self.cmbMotif.setModelColumn(1)
-
-            self.modelIpr = QSqlTableModel(self, self.db)
-            wrelation = "ipr"
-            if self.dbType == "postgres":
-                wrelation = self.dbSchema + "." + wrelation
-            self.modelIpr.setTable(wrelation)
-            self.modelIpr.setSort(3, Qt.AscendingOrder)
-            if (not self.modelIpr.select()):
-                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle IPR dans le setupModel() : \n" + self.modelIpr.lastError().text(), QMessageBox.Ok)
-            self.cmbIpr.setModel(self.modelIpr)
-            self.cmbIpr.setModelColumn(3)
-
         self.modelRiviere = QSqlTableModel(self, self.db)
         wrelation = "cours_eau"
         if self.dbType == "postgres":
@@ -402,13 +378,44 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
         riviereNR = "NR"
         self.cmbRiviere.addItem(riviereNR)
 
-        self.modelCondition = QSqlQueryModel(self)
-        self.modelMotif = QSqlQueryModel(self)
-        self.modelIpr = QSqlQueryModel(self)
+        # Listes de référence issues du cache partagé, rowChange() se contente de sélectionner la valeur
+        self.modelCondition = Gedopi_reference.modele(self.db, self.dbSchema, "condition_peche")
+        if self.modelCondition.lastError().isValid():
+            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Condition dans le setupModel() : \n" + self.modelCondition.lastError().text(), QMessageBox.Ok)
+        self.cmbCondition.setModel(self.modelCondition)
+        self.cmbCondition.setModelColumn(1)
+
+        self.modelMotif = Gedopi_reference.modele(self.db, self.dbSchema, "motif_peche")
+        if self.modelMotif.lastError().isValid():
+            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Motif dans le setupModel() : \n" + self.modelMotif.lastError().text(), QMessageBox.Ok)
+        self.cmbMotif.setModel(self.modelMotif)
+        self.cmbMotif.setModelColumn(1)
+
+        self.modelIpr = Gedopi_reference.modele(self.db, self.dbSchema, "ipr")
+        if self.modelIpr.lastError().isValid():
+            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle IPR dans le setupModel() : \n" + self.modelIpr.lastError().text(), QMessageBox.Ok)
+        self.cmbIpr.setModel(self.modelIpr)
+        self.cmbIpr.setModelColumn(1)
+
         self.modelStation = QSqlQueryModel(self)
         self.modelOperateur = QSqlQueryModel(self)
         self.modelOperation= QSqlQueryModel(self)
 
+        # Requête préparée récupérant en un seul aller-retour la station, la rivière
+        # et la présence d'une géométrie de l'enregistrement courant (voir rowChange())
+        self.ceauStation = None
+        self.queryEnregistrement = QSqlQuery(self.db)
+        wrelation = ""
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "."
+        self.queryEnregistrement.prepare("select ope_sta_id, sta_ceau_id, opep_geom is not null as geom_existe from " + wrelation + "ope_peche_elec " +
+        "join " + wrelation + "operation on ope_code = opep_ope_code left join " + wrelation + "station on sta_id = ope_sta_id where opep_id = ?")
+
+        # Service d'accrochage des clics au cours d'eau le plus proche
+        self.accrochage = Gedopi_accrochage(self.db, self.dbSchema)
+        # Service de calcul du profil en long entre deux points accrochés
+        self.profilRiviere = Gedopi_profil(self.db, self.dbSchema)
+
         self.mapper = QDataWidgetMapper(self)
         self.mapper.setSubmitPolicy(QDataWidgetMapper.ManualSubmit)
         self.mapper.setModel(self.modelPeche)
@@ -624,6 +631,8 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
 
         self.btnPente.setEnabled(False)
 
+        self.chkProfil.setEnabled(False)
+
         self.btnAjoutMoa.setEnabled(active)
         self.btnSuppMoa.setEnabled(active)
         self.btnAjoutOperateur.setEnabled(active)
@@ -669,6 +678,8 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
 
         self.btnPente.setEnabled(active)
 
+        self.chkProfil.setEnabled(active)
+
         self.btnNouveau.setEnabled(not active)
         self.btnModif.setEnabled(not active)
         self.btnSupprimer.setEnabled(not active)
@@ -719,6 +730,7 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id in (select ceau_id from data.cours_eau where ceau_nom = 'NR') order by sta_id;", self.db)
             if self.modelStation.lastError().isValid():
                 QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le changeCmbRiviere() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+            self.ceauStation = None
 
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(1)
@@ -737,6 +749,9 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wceau_id), self.db)
             if self.modelStation.lastError().isValid():
                 QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le changeCmbRiviere() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+                self.ceauStation = None
+            else:
+                self.ceauStation = (wceau_id, Gedopi_reference.versionStations)
 
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(1)
@@ -764,32 +779,18 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
         self.cmbRiviere.currentIndexChanged.disconnect(self.changeCmbRiviere)
 
         record = self.modelPeche.record(row)
-        wopep_ope_code = record.value(self.modelPeche.fieldIndex("opep_ope_code"))
-
-        # Récupération de la clé de l'operation correspondante
-        query = QSqlQuery(self.db)
-        wrelation = "operation"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("select ope_sta_id from " + wrelation + " where ope_code = ?")
-        query.addBindValue(wopep_ope_code)
-        wope_sta_id = ""
-        if query.exec_():
-            if query.next():
-                wope_sta_id = query.value(0)
-                self.currentStation = wope_sta_id
+        wopep_id = record.value("opep_id")
 
-        # Récupération de la clé de la riviere correspondante
-        query = QSqlQuery(self.db)
-        wrelation = "station"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("select sta_ceau_id from " + wrelation + " where sta_id = ?")
-        query.addBindValue(wope_sta_id)
-        wsta_ceau_id = ""
-        if query.exec_():
-            if query.next():
-                wsta_ceau_id = query.value(0)
+        # Récupération de la station, de la rivière et de la présence de géométrie en une seule requête
+        enregistrement = self.gc.chargeEnregistrement(self.queryEnregistrement, [wopep_id])
+        if enregistrement is None:
+            QMessageBox.critical(self, u"Erreur SQL", u"Erreur au chargement de l'enregistrement dans le rowChange() : \n" + self.queryEnregistrement.lastError().text(), QMessageBox.Ok)
+            enregistrement = {}
+        wope_sta_id = enregistrement.get("ope_sta_id", "")
+        wsta_ceau_id = enregistrement.get("sta_ceau_id", "")
+        self.geomExiste = enregistrement.get("geom_existe", False)
+        if wope_sta_id != "":
+            self.currentStation = wope_sta_id
 
         # Sélection de la rivière
         result = self.cmbRiviere.model().match(self.cmbRiviere.model().index(0, 0), Qt.EditRole, wsta_ceau_id, -1, Qt.MatchExactly)
@@ -799,79 +800,40 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             indexNR = self.cmbRiviere.count()
             self.cmbRiviere.setCurrentIndex(indexNR - 1)
 
-        # Filtrage station
-        self.modelStation.clear()
-        wrelation = "station"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wsta_ceau_id), self.db)
-        if self.modelStation.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèle ", u"Erreur au modèle Station dans le rowChange() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+        # Filtrage station, uniquement si la rivière ou les stations diffèrent de celles déjà chargées
+        if self.ceauStation != (wsta_ceau_id, Gedopi_reference.versionStations):
+            self.modelStation.clear()
+            wrelation = "station"
+            if self.dbType == "postgres":
+                wrelation = self.dbSchema + "." + wrelation
+            self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wsta_ceau_id), self.db)
+            if self.modelStation.lastError().isValid():
+                QMessageBox.critical(self, u"Remplissage du modèle ", u"Erreur au modèle Station dans le rowChange() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+            else:
+                self.ceauStation = (wsta_ceau_id, Gedopi_reference.versionStations)
 
-        self.cmbStation.setModel(self.modelStation)
-        self.cmbStation.setModelColumn(1)
+            self.cmbStation.setModel(self.modelStation)
+            self.cmbStation.setModelColumn(1)
 
         # Sélection station
         result = self.cmbStation.model().match(self.cmbStation.model().index(0, 0), Qt.EditRole, wope_sta_id, -1, Qt.MatchExactly)
         if result:
             self.cmbStation.setCurrentIndex(result[0].row())
 
-        # Filtrage condition
-        record = self.modelPeche.record(row)
-        wopep_cope_id = record.value(self.modelPeche.fieldIndex("opep_cope_id"))
-        self.modelCondition.clear()
-        wrelation = "condition_peche"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelCondition.setQuery("select cope_id, cope_condition from " + wrelation + " order by cope_condition;", self.db)
-
-        if self.modelCondition.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Condition dans le rowChange() : \n" + self.modelCondition.lastError().text(), QMessageBox.Ok)
-
-        self.cmbCondition.setModel(self.modelCondition)
-        self.cmbCondition.setModelColumn(1)
-
         # Sélection condition
+        wopep_cope_id = record.value(self.modelPeche.fieldIndex("opep_cope_id"))
         result = self.cmbCondition.model().match(self.cmbCondition.model().index(0, 0), Qt.EditRole, wopep_cope_id, -1, Qt.MatchExactly)
         if result:
             self.cmbCondition.setCurrentIndex(result[0].row())
 
-        # Filtrage motif
-        record = self.modelPeche.record(row)
-        wopep_mope_id = record.value(self.modelPeche.fieldIndex("opep_mope_id"))
-        self.modelMotif.clear()
-        wrelation = "motif_peche"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelMotif.setQuery("select mope_id, mope_motif from " + wrelation + " order by mope_motif;", self.db)
-
-        if self.modelMotif.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Motif dans le rowChange() : \n" + self.modelMotif.lastError().text(), QMessageBox.Ok)
-
-        self.cmbMotif.setModel(self.modelMotif)
-        self.cmbMotif.setModelColumn(1)
-
         # Sélection motif
+        wopep_mope_id = record.value(self.modelPeche.fieldIndex("opep_mope_id"))
         result = self.cmbMotif.model().match(self.cmbMotif.model().index(0, 0), Qt.EditRole, wopep_mope_id, -1, Qt.MatchExactly)
         if result:
             self.cmbMotif.setCurrentIndex(result[0].row())
 
-       # Filtrage IPR
-        record = self.modelPeche.record(row)
-        wopep_ipr_id = record.value(self.modelPeche.fieldIndex("opep_ipr_id"))
-        self.modelIpr.clear()
-        wrelation = "ipr"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelIpr.setQuery("select ipr_id, ipr_correspondance from " + wrelation + " order by ipr_correspondance;", self.db)
-
-        if self.modelIpr.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle IPR dans le rowChange() : \n" + self.modelIpr.lastError().text(), QMessageBox.Ok)
-
-        self.cmbIpr.setModel(self.modelIpr)
-        self.cmbIpr.setModelColumn(1)
-
         # Sélection IPR
+        wopep_ipr_id = record.value(self.modelPeche.fieldIndex("opep_ipr_id"))
         result = self.cmbIpr.model().match(self.cmbIpr.model().index(0, 0), Qt.EditRole, wopep_ipr_id, -1, Qt.MatchExactly)
         if result:
             self.cmbIpr.setCurrentIndex(result[0].row())
@@ -895,22 +857,9 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
         self.verrouillage()
         self.verrouillageModif()
 
-        # Vérifie la présence d'une géométrie
-        if self.mapper:
-            row = self.mapper.currentIndex()
-            if row >= 0:
-                record = self.modelPeche.record(row)
-                wid = record.value("opep_id")
-
-                layer = self.gc.getLayerFromLegendByTableProps('ope_peche_elec', 'opep_geom', '')
-                request = QgsFeatureRequest().setFilterFids([wid])
-
-                it = layer.getFeatures(request)
-                extent = None
-                for x in it:
-                    extent = x.geometry()
-                if extent == None:
-                    self.iface.messageBar().pushMessage("Attention : ", u"Cette pêche électrique ne possède pas de géométrie.", level= QgsMessageBar.WARNING, duration = 5)
+        # Vérifie la présence d'une géométrie (information issue de la requête de l'enregistrement)
+        if not self.geomExiste:
+            self.iface.messageBar().pushMessage("Attention : ", u"Cette pêche électrique ne possède pas de géométrie.", level= QgsMessageBar.WARNING, duration = 5)
 
     def zoomPeche(self):
         '''Permet de zoomer le canevas de la carte sur la pêche courante'''
@@ -1366,7 +1315,7 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
     def calculCoordonnee(self):
         '''Permet de récupérer le clic sur le canevas'''
 
-        if self.spnLongueur.value() == 0:
+        if self.spnLongueur.value() == 0 and not self.chkProfil.isChecked():
             self.iface.messageBar().pushMessage("Attention : ", u"Pour calculer une pente vous devez saisir une longueur !", level = QgsMessageBar.WARNING, duration = 5)
             self.btnPente.setChecked(False)
         else:
@@ -1434,13 +1383,11 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
 
 
                 if pt1 != "" and pt2 != "":
-                    # Import virtuel de la table cours_eau
-                    uri = QgsDataSourceURI()
-                    uri.setConnection("localhost", "5432", self.dbname, self.password, self.user)
-                    uri.setDataSource("data", "cours_eau", "ceau_geom")
-                    vlayer = QgsVectorLayer(uri.uri(), "riviere", "postgres")
-                    if not vlayer.isValid():
-                        self.iface.messageBar().pushMessage("Erreur : ", u"Layer failed Rivière to load !", level= QgsMessageBar.CRITICAL, duration = 5)
+                    # Accrochage des points à la rivière la plus proche (requête KNN sur l'index spatial)
+                    accroche_1 = self.accrochage.accroche(self.layerPoint_1)
+                    accroche_2 = self.accrochage.accroche(self.layerPoint_2)
+                    if accroche_1 is None or accroche_2 is None:
+                        self.iface.messageBar().pushMessage("Erreur : ", u"Accrochage à la rivière impossible : " + self.accrochage.lastError().text(), level= QgsMessageBar.CRITICAL, duration = 5)
                     else:
                         if self.point_click_1 != "":
                             self.mc.scene().removeItem(self.point_click_1)
@@ -1448,56 +1395,36 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
                         if self.point_click_2 != "":
                             self.mc.scene().removeItem(self.point_click_2)
                             self.point_click_2 = ""
-                        # Recalcul de la position des points afin de les accrocher à la rivière la plus proche
-                        shortestDist_1 = float("inf")
-                        shortestDist_2 = float("inf")
-                        for f in vlayer.getFeatures():
-                            dist_1 = f.geometry().distance(QgsGeometry.fromPoint(self.layerPoint_1))
-                            dist_2 = f.geometry().distance(QgsGeometry.fromPoint(self.layerPoint_2))
-                            if dist_1 < shortestDist_1:
-                                shortestDist_1 = dist_1
-                                pt1 = f.geometry().nearestPoint( QgsGeometry.fromPoint(self.layerPoint_1))
-                                pt1 = pt1.vertexAt(0)
-
-                            if dist_2 < shortestDist_2:
-                                shortestDist_2 = dist_2
-                                pt2 = f.geometry().nearestPoint( QgsGeometry.fromPoint(self.layerPoint_2))
-                                pt2 = pt2.vertexAt(0)
+                        pt1 = accroche_1[0]
+                        pt2 = accroche_2[0]
                         self.point_click_2 = QgsVertexMarker(self.mc)
                         self.point_click_2.setCenter(pt2)
 
                         self.point_click_1 = QgsVertexMarker(self.mc)
                         self.point_click_1.setCenter(pt1)
 
-                    # Import virtuel du MNT
-                    fileName = self.cheminRaster + "/mnt10_cantal.tif"
-                    fileInfo = QFileInfo(fileName)
-                    baseName = fileInfo.baseName()
-                    rlayer = QgsRasterLayer(fileName, baseName)
-                    if not rlayer.isValid():
-                        self.iface.messageBar().pushMessage("Erreur : ", u"Layer failed to load !", level= QgsMessageBar.CRITICAL, duration = 5)
-                    else :
-                        # Récupération des valeurs d'altitudes aux deux points corrigés
-                        ident_1 = rlayer.dataProvider().identify(QgsPoint(pt1), QgsRaster.IdentifyFormatValue)
-                        ident_2 = rlayer.dataProvider().identify(QgsPoint(pt2), QgsRaster.IdentifyFormatValue)
-                        if ident_1.isValid():
-                          dico1 = ident_1.results()
-                          alti_1 = dico1[1]
+                        # Altitudes des deux points corrigés, lues dans le MNT ouvert une seule fois par session
+                        mnt = None
+                        if numpy is not None:
+                            mnt = Gedopi_mnt.ouvrir(self.cheminRaster + "/mnt10_cantal.tif")
+                        if mnt is None:
+                            self.iface.messageBar().pushMessage("Erreur : ", u"Layer failed to load !", level= QgsMessageBar.CRITICAL, duration = 5)
+                        elif self.chkProfil.isChecked():
+                            self.calculProfil(mnt, accroche_1, accroche_2)
                         else:
-                            self.iface.messageBar().pushMessage("Erreur : ", u"Altitude du point 1 non récupérée !", level= QgsMessageBar.CRITICAL, duration = 5)
-                        if ident_2.isValid():
-                          dico2 = ident_2.results()
-                          alti_2 = dico2[1]
-                        else:
-                            self.iface.messageBar().pushMessage("Erreur : ", u"Altitude du point 2 non récupérée !", level= QgsMessageBar.CRITICAL, duration = 5)
-                    pente = 0
-                    # Calcul de la pente
-                    pente = (abs(float(alti_1) - float(alti_2))/self.longueur)*100
-                    if pente != 0:
-                        self.spnPente.setValue(pente)
-                    else:
-                        self.spnPente.setValue(0)
-                        self.iface.messageBar().pushMessage("Info : ", u"La pente calculée est de 0% !", level= QgsMessageBar.WARNING, duration = 5)
+                            altitudes = mnt.echantillonne([pt1.x(), pt2.x()], [pt1.y(), pt2.y()])
+                            if numpy.isnan(altitudes[0]):
+                                self.iface.messageBar().pushMessage("Erreur : ", u"Altitude du point 1 non récupérée !", level= QgsMessageBar.CRITICAL, duration = 5)
+                            elif numpy.isnan(altitudes[1]):
+                                self.iface.messageBar().pushMessage("Erreur : ", u"Altitude du point 2 non récupérée !", level= QgsMessageBar.CRITICAL, duration = 5)
+                            else:
+                                # Calcul de la pente
+                                pente = (abs(float(altitudes[0]) - float(altitudes[1]))/self.longueur)*100
+                                if pente != 0:
+                                    self.spnPente.setValue(pente)
+                                else:
+                                    self.spnPente.setValue(0)
+                                    self.iface.messageBar().pushMessage("Info : ", u"La pente calculée est de 0% !", level= QgsMessageBar.WARNING, duration = 5)
 
                 else:
                     self.iface.messageBar().pushMessage("Erreur : ", u"Aucune coordonnée (erreur aux pt1 et / ou pt2) !", level= QgsMessageBar.CRITICAL, duration = 5)
@@ -1511,6 +1438,39 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             elif self.clic != 1 :
                 self.iface.messageBar().pushMessage("Erreur : ", u"La récupération du ou des clic(s) a échouée !", level= QgsMessageBar.CRITICAL, duration = 5)
 
+    def calculProfil(self, mnt, accroche_1, accroche_2):
+        '''
+        Calcule le profil en long entre les deux points accrochés, renseigne la longueur prospectée
+        (distance le long du cours d'eau) et la pente ajustée puis affiche le profil
+
+        :param mnt: MNT ouvert par Gedopi_mnt.ouvrir()
+        :type mnt: Gedopi_mnt
+
+        :param accroche_1: résultat de l'accrochage du premier clic (point, ceau_id, distance)
+        :type accroche_1: tuple
+
+        :param accroche_2: résultat de l'accrochage du second clic (point, ceau_id, distance)
+        :type accroche_2: tuple
+        '''
+        if accroche_1[1] != accroche_2[1]:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Les deux points ne sont pas accrochés au même cours d'eau !", level= QgsMessageBar.CRITICAL, duration = 5)
+            return
+        profil = self.profilRiviere.profil(mnt, accroche_1[1], accroche_1[0], accroche_2[0])
+        if profil is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Calcul du profil en long impossible : " + self.profilRiviere.erreur, level= QgsMessageBar.CRITICAL, duration = 5)
+            return
+        if profil["longueur"] == 0:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Les deux points accrochés sont confondus !", level= QgsMessageBar.CRITICAL, duration = 5)
+            return
+        self.spnLongueur.setValue(profil["longueur"])
+        self.spnPente.setValue(profil["pente"])
+        if profil["pente"] == 0:
+            self.iface.messageBar().pushMessage("Info : ", u"La pente calculée est de 0% !", level= QgsMessageBar.WARNING, duration = 5)
+        QApplication.restoreOverrideCursor()
+        dialog = Profil_riviere_dialog(profil)
+        dialog.exec_()
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+
     def saisieAuto(self):
         '''Permet la saisie automatique de certains champs'''
 
@@ -1711,6 +1671,7 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             self.cmbRiviere.setEnabled(False)
             self.cmbStation.setEnabled(False)
             self.btnPente.setEnabled(False)
+            self.chkProfil.setEnabled(False)
             self.btnAjoutFiche.setEnabled(False)
             self.btnRetraitFiche.setEnabled(False)
             self.btnExcel.setEnabled(True)
@@ -1734,6 +1695,7 @@ class Peche_elec_dialog(QDockWidget, Ui_dwcPecheMainForm):
             self.cmbRiviere.setEnabled(True)
             self.cmbStation.setEnabled(True)
             self.btnPente.setEnabled(True)
+            self.chkProfil.setEnabled(True)
             self.btnAjoutFiche.setEnabled(True)
             self.btnRetraitFiche.setEnabled(True)
             self.btnExcel.setEnabled(False)
@@ -2064,6 +2026,11 @@ class Fiche_station(QDialog, Ui_dlgStationForm):
                 self.lePhoto.setText(wphoto)
                 self.leNom.setText(wnom)
 
+        # Position de la station sur le réseau hydrographique (distance à la confluence, stations amont / aval)
+        confluence, position = Reseau_station(self.db, self.dbSchema).texteFiche(self.wsta_id)
+        self.leConfluence.setText(confluence)
+        self.leReseau.setText(position)
+
         chemin = unicode(self.lePhoto.text())
         if chemin != "" or chemin != "***":
             size = self.size()
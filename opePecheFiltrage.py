@@ -6,7 +6,7 @@ import sys
 import os
 from PyQt5.QtCore import (Qt, QDate)
 from PyQt5.QtWidgets import (QDialog, QMessageBox)
-from PyQt5.QtSql import (QSqlQuery, QSqlTableModel, QSqlQueryModel)
+from PyQt5.QtSql import (QSqlQuery, QSqlTableModel)
 
 # Initialise les ressources Qt à partir du fichier resources.py
 # import resources_rc
@@ -17,6 +17,12 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/forms")
 # Import du script Python de l'interface graphique nécessaire
 from opePecheRechercheForm import (Ui_dlgPecheRechercheForm)
 
+# Import du cache des tables de référence
+from .commonDialogs import (Gedopi_reference)
+
+# Import de la position des stations sur le réseau hydrographique
+from .stationReseau import (Reseau_station)
+
 class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
     '''
     Class de la fenêtre permettant le filtrage attributaire des inventaires de reproduction
@@ -71,6 +77,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.clicked.connect(self.ajoutAappma)
         self.btnMeau.clicked.connect(self.ajoutMeau)
         self.btnMotif.clicked.connect(self.ajoutMotif)
+        self.btnReseau.clicked.connect(self.ajoutReseau)
 
         self.btnEt.setEnabled(False)
         self.btnOu.setEnabled(False)
@@ -81,30 +88,21 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.ceauBool = False
         self.meauBool = False
         self.anneeBool = False
+        self.reseauBool = False
 
         self.wwhere = ""
 
-        self.modelPdpg = QSqlTableModel(self, self.db)
-        wrelation = "contexte_pdpg"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelPdpg.setTable(wrelation)
-        self.modelPdpg.setSort(2, Qt.AscendingOrder)
-        if (not self.modelPdpg.select()):
+        self.modelPdpg = Gedopi_reference.modele(self.db, self.dbSchema, "contexte_pdpg")
+        if self.modelPdpg.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle PDPG", self.modelPdpg.lastError().text(), QMessageBox.Ok)
         self.cmbPdpg.setModel(self.modelPdpg)
-        self.cmbPdpg.setModelColumn(self.modelPdpg.fieldIndex("pdpg_nom"))
+        self.cmbPdpg.setModelColumn(1)
 
-        self.modelAappma = QSqlTableModel(self, self.db)
-        wrelation = "aappma"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelAappma.setTable(wrelation)
-        self.modelAappma.setSort(1, Qt.AscendingOrder)
-        if (not self.modelAappma.select()):
+        self.modelAappma = Gedopi_reference.modele(self.db, self.dbSchema, "aappma")
+        if self.modelAappma.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle AAPPMA", self.modelAappma.lastError().text(), QMessageBox.Ok)
         self.cmbAappma.setModel(self.modelAappma)
-        self.cmbAappma.setModelColumn(self.modelAappma.fieldIndex("apma_nom"))
+        self.cmbAappma.setModelColumn(1)
 
         self.modelRiviere = QSqlTableModel(self, self.db)
         wrelation = "cours_eau"
@@ -118,26 +116,28 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.cmbRiviere.setModel(self.modelRiviere)
         self.cmbRiviere.setModelColumn(self.modelRiviere.fieldIndex("ceau_nom"))
 
-        self.modelMeau = QSqlQueryModel(self)
-        wrelation = "masse_eau"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelMeau.setQuery("select meau_code, meau_code || ' ; ' || meau_nom from " + wrelation + " order by meau_code;", self.db)
+        self.modelMeau = Gedopi_reference.modele(self.db, self.dbSchema, "masse_eau")
         if self.modelMeau.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle Masse d'eau", self.modelMeau.lastError().text(), QMessageBox.Ok)
         self.cmbMeau.setModel(self.modelMeau)
         self.cmbMeau.setModelColumn(1)
 
-        self.ModelMotif= QSqlTableModel(self, self.db)
-        wrelation = "motif_peche"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.ModelMotif.setTable(wrelation)
-        self.ModelMotif.setSort(1, Qt.AscendingOrder)
-        if (not self.ModelMotif.select()):
+        self.ModelMotif = Gedopi_reference.modele(self.db, self.dbSchema, "motif_peche")
+        if self.ModelMotif.lastError().isValid():
             QMessageBox.critical(self, u"Remplissage du modèle Motif", self.ModelMotif.lastError().text(), QMessageBox.Ok)
         self.cmbMotif.setModel(self.ModelMotif)
-        self.cmbMotif.setModelColumn(self.ModelMotif.fieldIndex("mope_motif"))
+        self.cmbMotif.setModelColumn(1)
+
+        self.modelStation = QSqlTableModel(self, self.db)
+        wrelation = "station"
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "." + wrelation
+        self.modelStation.setTable(wrelation)
+        self.modelStation.setSort(self.modelStation.fieldIndex("sta_nom"), Qt.AscendingOrder)
+        if (not self.modelStation.select()):
+            QMessageBox.critical(self, u"Remplissage du modèle Station", self.modelStation.lastError().text(), QMessageBox.Ok)
+        self.cmbStationReseau.setModel(self.modelStation)
+        self.cmbStationReseau.setModelColumn(self.modelStation.fieldIndex("sta_nom"))
 
     def reject(self):
         '''Ferme la fenêtre si clic sur le bouton annuler'''
@@ -164,6 +164,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(True)
         self.btnMeau.setEnabled(True)
         self.btnMotif.setEnabled(True)
+        self.btnReseau.setEnabled(True)
 
         self.aappmaBool = False
         self.motifBool = False
@@ -171,6 +172,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.ceauBool = False
         self.meauBool = False
         self.anneeBool = False
+        self.reseauBool = False
 
     def et(self):
         '''Change l'état des boutons et ajoute "and" à la requête'''
@@ -187,6 +189,9 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         if self.motifBool == False:
             self.btnMotif.setEnabled(True)
 
+        if self.reseauBool == False:
+            self.btnReseau.setEnabled(True)
+
         if self.pdpgBool == False:
             self.btnPdpg.setEnabled(True)
 
@@ -215,6 +220,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(True)
         self.btnMeau.setEnabled(True)
         self.btnMotif.setEnabled(True)
+        self.btnReseau.setEnabled(True)
 
         self.aappmaBool = False
         self.motifBool = False
@@ -222,6 +228,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.ceauBool = False
         self.meauBool = False
         self.anneeBool = False
+        self.reseauBool = False
 
         self.wwhere += " OR "
 
@@ -238,6 +245,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.wcode = self.leCodeOpe.text()
         if self.leCodeOpe.text() != "":
@@ -259,6 +267,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.wid = self.spnId.value()
         if self.spnId.value() != "":
@@ -283,6 +292,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.wopep_date = self.datePeche.date().toString("yyyy")
         if self.wopep_date != "":
@@ -302,6 +312,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.pdpgBool = True
 
@@ -331,6 +342,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.ceauBool = True
 
@@ -360,6 +372,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.aappmaBool = True
 
@@ -389,6 +402,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.meauBool = True
 
@@ -418,6 +432,7 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
         self.btnAappma.setEnabled(False)
         self.btnMeau.setEnabled(False)
         self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
 
         self.motifBool = True
 
@@ -427,6 +442,38 @@ class Filtrage_peche_dialog(QDialog, Ui_dlgPecheRechercheForm):
             if self.wopep_motif != "":
                 self.wwhere += "opep_mope_id = '" + str(self.wopep_motif) + "'"
 
+    def ajoutReseau(self):
+        '''Change l'état des boutons et ajoute un critère de position sur le réseau (en amont / en aval d'une station) à la requête'''
+
+        self.btnEt.setEnabled(True)
+        self.btnOu.setEnabled(True)
+
+        self.btnCode.setEnabled(False)
+        self.btnId.setEnabled(False)
+        self.btnPdpg.setEnabled(False)
+        self.btnDate.setEnabled(False)
+        self.btnRiviere.setEnabled(False)
+        self.btnAappma.setEnabled(False)
+        self.btnMeau.setEnabled(False)
+        self.btnMotif.setEnabled(False)
+        self.btnReseau.setEnabled(False)
+
+        self.reseauBool = True
+
+        wfromOperation = "operation"
+        wfromPeche = "ope_peche_elec"
+        if self.dbType == "postgres":
+            self.wfromReseau = self.dbSchema + "." + wfromPeche + ", " + self.dbSchema + "." + wfromOperation
+
+        # Stations en amont / en aval, calculées par comparaison des intervalles de station_reseau
+        wrecord = self.cmbStationReseau.model().record(self.cmbStationReseau.currentIndex())
+        self.wsta_reseau = wrecord.value(0)
+        sens = "amont" if self.cmbSensReseau.currentIndex() == 0 else "aval"
+        if self.cmbStationReseau.currentText() != "":
+            if self.wsta_reseau != "":
+                self.wwhere += (" opep_id in (select distinct opep_id from " + self.wfromReseau + " where (opep_ope_code = ope_code) and ope_sta_id in (" +
+                    Reseau_station(self.db, self.dbSchema).sousRequete(self.wsta_reseau, sens) + "))")
+
     def creaRequete(self):
     # def previSql(self):
         '''Regroupe les différentes variables contenant les clauses de la requête SQL et les concatène pour en faire une requête exécutable'''
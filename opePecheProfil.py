@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Ce script permet l'affichage du profil en long d'une station de pêche électrique.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+from PyQt5.QtCore import (Qt, QPointF, QRectF)
+from PyQt5.QtGui import (QColor, QPainter, QPen, QPolygonF)
+from PyQt5.QtWidgets import (QDialog, QHBoxLayout, QLabel, QPushButton, QSizePolicy, QSpacerItem, QVBoxLayout, QWidget)
+
+class Profil_riviere(QWidget):
+    '''
+    Graphique du profil en long : altitudes échantillonnées le long du cours d'eau et droite de pente ajustée.
+    '''
+    # Marges (pixels) réservées aux graduations
+    margeGauche = 55
+    margeBas = 25
+
+    def __init__(self, profil, parent = None):
+        '''
+        Constructeur
+
+        :param profil: profil calculé par Gedopi_profil.profil()
+        :type profil: dict
+
+        :param parent: widget parent
+        :type parent: QWidget
+        '''
+        super(Profil_riviere, self).__init__(parent)
+        self.profil = profil
+        valides = [z for z in profil["altitudes"].tolist() if z == z]
+        self.zMin = min(valides) - 1
+        self.zMax = max(valides) + 1
+        self.setMinimumSize(600, 300)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+    def zoneTrace(self):
+        '''Renvoi le rectangle de tracé (hors graduations)'''
+
+        return QRectF(self.margeGauche, 5, self.width() - self.margeGauche - 10, self.height() - self.margeBas - 10)
+
+    def versPoint(self, zone, distance, altitude):
+        '''Convertit une distance et une altitude en point écran'''
+
+        longueur = max(self.profil["longueur"], 1.0)
+        return QPointF(zone.left() + distance / longueur * zone.width(),
+            zone.bottom() - (altitude - self.zMin) / (self.zMax - self.zMin) * zone.height())
+
+    def paintEvent(self, event):
+        '''Trace les graduations, le profil (interrompu sans donnée) et la droite ajustée'''
+
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        zone = self.zoneTrace()
+        if zone.width() <= 0 or zone.height() <= 0:
+            return
+
+        # Graduations
+        painter.setPen(QPen(QColor(200, 200, 200), 1))
+        painter.drawRect(zone)
+        painter.setPen(QPen(Qt.black, 1))
+        for i in range(5):
+            altitude = self.zMin + (self.zMax - self.zMin) * i / 4.0
+            y = self.versPoint(zone, 0, altitude).y()
+            painter.drawText(QRectF(0, y - 8, self.margeGauche - 5, 16), Qt.AlignRight | Qt.AlignVCenter, str(round(altitude, 1)))
+            distance = self.profil["longueur"] * i / 4.0
+            x = self.versPoint(zone, distance, self.zMin).x()
+            painter.drawText(QRectF(x - 40, zone.bottom() + 3, 80, self.margeBas), Qt.AlignHCenter | Qt.AlignTop, str(int(round(distance))) + " m")
+
+        # Profil
+        painter.setPen(QPen(QColor(30, 30, 30), 1))
+        polygone = QPolygonF()
+        for distance, altitude in zip(self.profil["distances"].tolist(), self.profil["altitudes"].tolist()):
+            if altitude != altitude:
+                if polygone.size() > 1:
+                    painter.drawPolyline(polygone)
+                polygone = QPolygonF()
+                continue
+            polygone.append(self.versPoint(zone, distance, altitude))
+        if polygone.size() > 1:
+            painter.drawPolyline(polygone)
+
+        # Droite ajustée
+        painter.setPen(QPen(QColor(0, 120, 255), 1, Qt.DashLine))
+        painter.drawLine(self.versPoint(zone, 0, self.profil["ordonnee"]),
+            self.versPoint(zone, self.profil["longueur"], self.profil["ordonnee"] + self.profil["coefficient"] * self.profil["longueur"]))
+
+class Profil_riviere_dialog(QDialog):
+    '''
+    Fenêtre affichant le profil en long calculé entre les deux clics
+
+    :param QDialog: Permet d'afficher l'interface graphique comme une fenêtre indépendante
+    :type QDialog: QDialog
+    '''
+    def __init__(self, profil, parent = None):
+        '''
+        Constructeur, construction de la fenêtre
+
+        :param profil: profil calculé par Gedopi_profil.profil()
+        :type profil: dict
+
+        :param parent: défini que cette fenêtre n'hérite pas d'autres widgets
+        :type parent: NoneType
+        '''
+        super(Profil_riviere_dialog, self).__init__(parent)
+        self.setWindowTitle(u"Profil en long")
+        self.graphique = Profil_riviere(profil, self)
+        self.lblResultat = QLabel(u"Longueur le long du cours d'eau : " + str(round(profil["longueur"], 1)) +
+            u" m - Pente ajustée : " + str(round(profil["pente"], 2)) + " %", self)
+
+        self.btnFermer = QPushButton(u"Fermer", self)
+        boutons = QHBoxLayout()
+        boutons.addWidget(self.lblResultat)
+        boutons.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons.addWidget(self.btnFermer)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.graphique)
+        layout.addLayout(boutons)
+
+        self.btnFermer.clicked.connect(self.accept)
@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+# Ce script permet le recalcul en masse des pentes des pêches électriques, des altitudes et des bassins versants des stations.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import os
+import time
+from PyQt5.QtCore import (Qt, QSettings)
+from PyQt5.QtGui import (QCursor)
+from PyQt5.QtSql import (QSqlQuery)
+from PyQt5.QtWidgets import (QApplication, QCheckBox, QDialog, QHBoxLayout, QLabel, QMessageBox, QProgressBar, QPushButton, QSizePolicy, QSpacerItem, QVBoxLayout)
+from qgis.core import (QgsMessageLog)
+from qgis.gui import (QgsMessageBar)
+
+# Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
+from .commonDialogs import (Gedopi_common, Gedopi_session)
+
+# Import des services d'échantillonnage du MNT et de profil en long
+from .commonSpatial import (Gedopi_bassin, Gedopi_mnt, Gedopi_profil, numpy)
+
+# Import de la position des stations sur le réseau hydrographique et de leur bassin versant
+from .stationReseau import (Bassin_station, Reseau_station)
+
+class Recalcul_pente():
+    '''
+    Recalcul en masse de opep_pente (ope_peche_elec) et de sta_altitude (station).
+
+    Les enregistrements sont traités par lots ordonnés sur leur identifiant. Pour chaque lot, une seule requête
+    accroche toutes les géométries au cours d'eau le plus proche (KNN) et renvoie le tronçon centré sur chaque
+    opération (longueur prospectée, à défaut longueurDefaut). Les altitudes de tout le lot sont lues dans le MNT
+    en un appel, puis écrites par un UPDATE ... FROM (VALUES ...) unique, validé avant le lot suivant :
+    un traitement interrompu reprend après le dernier identifiant validé.
+    '''
+    # Nombre d'enregistrements par lot
+    tailleLot = 200
+    # Longueur (m) du tronçon utilisé lorsque la longueur prospectée n'est pas renseignée
+    longueurDefaut = 100
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def filtre(self, table, tout):
+        '''Renvoi la condition des enregistrements à traiter'''
+
+        if table == "ope_peche_elec":
+            condition = "opep_geom is not null"
+            if not tout:
+                condition += " and (opep_pente is null or opep_pente = 0)"
+        else:
+            condition = "sta_geom is not null"
+            if not tout:
+                condition += " and (sta_altitude is null or sta_altitude = 0)"
+        return condition
+
+    def nombre(self, table, tout, dernier = 0):
+        '''
+        Renvoi le nombre d'enregistrements restant à traiter
+
+        :param table: ope_peche_elec ou station
+        :type table: str
+
+        :param tout: True pour recalculer aussi les valeurs déjà renseignées
+        :type tout: bool
+
+        :param dernier: dernier identifiant déjà traité
+        :type dernier: int
+        '''
+        identifiant = "opep_id" if table == "ope_peche_elec" else "sta_id"
+        query = QSqlQuery(self.db)
+        if query.exec_("select count(*) from " + self.relation(table) + " where " + self.filtre(table, tout) +
+            " and " + identifiant + " > " + str(int(dernier))) and query.next():
+            return int(query.value(0))
+        self.erreur = query.lastError().text()
+        return 0
+
+    def lot(self, table, tout, dernier):
+        '''
+        Renvoi les identifiants du lot suivant
+
+        :return: identifiants triés, liste vide s'il ne reste rien à traiter
+        :rtype: list
+        '''
+        identifiant = "opep_id" if table == "ope_peche_elec" else "sta_id"
+        ids = []
+        query = QSqlQuery(self.db)
+        if not query.exec_("select " + identifiant + " from " + self.relation(table) + " where " + self.filtre(table, tout) +
+            " and " + identifiant + " > " + str(int(dernier)) + " order by " + identifiant + " limit " + str(self.tailleLot)):
+            self.erreur = query.lastError().text()
+            return None
+        while query.next():
+            ids.append(int(query.value(0)))
+        return ids
+
+    def miseAJour(self, table, colonne, identifiant, valeurs):
+        '''
+        Écrit les valeurs calculées d'un lot par une seule requête UPDATE ... FROM (VALUES ...)
+
+        :param valeurs: liste de (identifiant, valeur)
+        :type valeurs: list
+
+        :return: False si la requête a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        if len(valeurs) == 0:
+            return True
+        query = QSqlQuery(self.db)
+        query.prepare("update " + self.relation(table) + " set " + colonne + " = calcul.valeur from (values " +
+            ", ".join(["(?::integer, ?::numeric)"] * len(valeurs)) + ") as calcul (id, valeur) where " + identifiant + " = calcul.id")
+        for id, valeur in valeurs:
+            query.addBindValue(id)
+            query.addBindValue(round(valeur, 2))
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return False
+        return True
+
+    def pentes(self, mnt, ids):
+        '''
+        Calcule et écrit la pente des opérations d'un lot
+
+        :param mnt: MNT ouvert par Gedopi_mnt.ouvrir()
+        :type mnt: Gedopi_mnt
+
+        :param ids: identifiants opep_id du lot
+        :type ids: list
+
+        :return: nombre de pentes écrites, None si une requête a échoué (voir self.erreur)
+        :rtype: int
+        '''
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare("select ope.opep_id, ST_X(pt.geom), ST_Y(pt.geom) from (" +
+            "select opep_id, opep_geom, coalesce(nullif(opep_longueur_prospec, 0), " + str(self.longueurDefaut) + ") as longueur from " +
+            self.relation("ope_peche_elec") + " where opep_id = any(?::integer[])) as ope " +
+            "cross join lateral (select ST_LineMerge(ceau_geom) as geom from " + self.relation("cours_eau") +
+            " order by ceau_geom <-> ope.opep_geom limit 1) as riviere " +
+            "cross join lateral (select case when GeometryType(riviere.geom) = 'LINESTRING' then ST_LineLocatePoint(riviere.geom, ope.opep_geom) end as f, " +
+            "ope.longueur / 2 / nullif(ST_Length(riviere.geom), 0) as demi) as repere " +
+            "cross join lateral ST_DumpPoints(ST_LineSubstring(riviere.geom, greatest(repere.f - repere.demi, 0), " +
+            "least(repere.f + repere.demi, 1))) as pt " +
+            "where repere.f is not null and repere.demi is not null order by ope.opep_id, pt.path")
+        query.addBindValue("{" + ",".join(str(id) for id in ids) + "}")
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        traces = {}
+        while query.next():
+            traces.setdefault(int(query.value(0)), []).append((float(query.value(1)), float(query.value(2))))
+
+        # Rééchantillonnage de chaque tronçon puis lecture de toutes les altitudes du lot en un appel
+        troncons = []
+        for id, sommets in traces.items():
+            if len(sommets) < 2:
+                continue
+            sommets = numpy.array(sommets)
+            distances, xs, ys = Gedopi_profil.reechantillonne(sommets[:, 0], sommets[:, 1], Gedopi_profil.pas)
+            troncons.append((id, distances, xs, ys))
+        if len(troncons) == 0:
+            return 0
+        altitudes = mnt.echantillonne(numpy.concatenate([t[2] for t in troncons]), numpy.concatenate([t[3] for t in troncons]))
+        bornes = numpy.cumsum([len(t[1]) for t in troncons])[:-1]
+
+        valeurs = []
+        for (id, distances, xs, ys), z in zip(troncons, numpy.split(altitudes, bornes)):
+            ajustement = Gedopi_profil.penteRobuste(distances, z)
+            if ajustement is not None:
+                valeurs.append((id, abs(ajustement[0]) * 100))
+        if not self.miseAJour("ope_peche_elec", "opep_pente", "opep_id", valeurs):
+            return None
+        return len(valeurs)
+
+    def altitudes(self, mnt, ids):
+        '''
+        Calcule et écrit l'altitude des stations d'un lot (point de la station accroché au cours d'eau)
+
+        :param mnt: MNT ouvert par Gedopi_mnt.ouvrir()
+        :type mnt: Gedopi_mnt
+
+        :param ids: identifiants sta_id du lot
+        :type ids: list
+
+        :return: nombre d'altitudes écrites, None si une requête a échoué (voir self.erreur)
+        :rtype: int
+        '''
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare("select sta.sta_id, ST_X(pt), ST_Y(pt) from " + self.relation("station") + " as sta " +
+            "cross join lateral (select ST_ClosestPoint(ceau_geom, sta.sta_geom) as pt from " + self.relation("cours_eau") +
+            " order by ceau_geom <-> sta.sta_geom limit 1) as riviere where sta.sta_id = any(?::integer[])")
+        query.addBindValue("{" + ",".join(str(id) for id in ids) + "}")
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        stations, xs, ys = [], [], []
+        while query.next():
+            stations.append(int(query.value(0)))
+            xs.append(float(query.value(1)))
+            ys.append(float(query.value(2)))
+        if len(stations) == 0:
+            return 0
+        valeurs = [(id, float(z)) for id, z in zip(stations, mnt.echantillonne(xs, ys)) if not numpy.isnan(z)]
+        if not self.miseAJour("station", "sta_altitude", "sta_id", valeurs):
+            return None
+        return len(valeurs)
+
+    def traiteLot(self, table, mnt, ids):
+        '''
+        Traite un lot dans une transaction
+
+        :return: nombre de valeurs écrites, None en cas d'échec (transaction annulée, voir self.erreur)
+        :rtype: int
+        '''
+        self.db.transaction()
+        if table == "ope_peche_elec":
+            nb = self.pentes(mnt, ids)
+        else:
+            nb = self.altitudes(mnt, ids)
+        if nb is None:
+            self.db.rollback()
+            return None
+        self.db.commit()
+        return nb
+
+class Recalcul_pente_dialog(QDialog):
+    '''
+    Fenêtre de lancement du recalcul des pentes et altitudes, affiche l'avancement et permet l'arrêt puis la reprise
+
+    :param QDialog: Permet d'afficher l'interface graphique comme une fenêtre indépendante
+    :type QDialog: QDialog
+    '''
+    # Tables traitées successivement : (table, libellé)
+    etapes = [("station", u"Altitudes des stations"), ("ope_peche_elec", u"Pentes des pêches électriques")]
+    # Clé QSettings de l'état d'avancement
+    cleReprise = "Gedopi/recalculPente/"
+
+    def __init__(self, iface):
+        '''
+        Constructeur, construction de la fenêtre et connexion à la base de données
+
+        :param iface: Une instance d'interface qui sera passée à cette classe
+                qui fournit le crochet par lequel vous pouvez manipuler l'application QGIS
+                au moment de l'exécution.
+        :type iface: QgsInterface
+        '''
+        QDialog.__init__(self)
+        self.iface = iface
+        self.setWindowTitle(u"Recalculs (pentes, altitudes, réseau, bassins versants)")
+        self.gc = Gedopi_common(self)
+        self.db = None
+        self.dbType = ""
+        self.dbSchema = ""
+        self.arret = False
+        self.cheminMnt = os.path.dirname(os.path.abspath(__file__)) + "/data/system/raster/mnt10_cantal.tif"
+
+        self.chkTout = QCheckBox(u"Recalculer aussi les valeurs déjà renseignées", self)
+        self.lblEtape = QLabel("", self)
+        self.barre = QProgressBar(self)
+        self.btnLancer = QPushButton(u"Lancer", self)
+        self.btnArreter = QPushButton(u"Arrêter", self)
+        self.btnReseau = QPushButton(u"Positions sur le réseau", self)
+        self.btnReseau.setToolTip(u"Distances à la source et à la confluence, ordre amont / aval des stations")
+        self.btnBassin = QPushButton(u"Bassins versants", self)
+        self.btnBassin.setToolTip(u"Surface du bassin versant amont des stations, calculée à partir du MNT")
+        self.chkContour = QCheckBox(u"Enregistrer le contour des bassins versants (station_bassin)", self)
+        self.btnFermer = QPushButton(u"Fermer", self)
+        self.btnArreter.setEnabled(False)
+        boutons = QHBoxLayout()
+        boutons.addWidget(self.btnLancer)
+        boutons.addWidget(self.btnArreter)
+        boutons.addWidget(self.btnReseau)
+        boutons.addWidget(self.btnBassin)
+        boutons.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons.addWidget(self.btnFermer)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.chkTout)
+        layout.addWidget(self.chkContour)
+        layout.addWidget(self.lblEtape)
+        layout.addWidget(self.barre)
+        layout.addLayout(boutons)
+        self.resize(450, 120)
+
+        self.btnLancer.clicked.connect(self.lancer)
+        self.btnArreter.clicked.connect(self.arreter)
+        self.btnReseau.clicked.connect(self.positionsReseau)
+        self.btnBassin.clicked.connect(self.bassinsVersants)
+        self.btnFermer.clicked.connect(self.reject)
+
+        layer = self.gc.getLayerFromLegendByTableProps('ope_peche_elec', 'opep_geom', '')
+        if layer:
+            connectionParams = self.gc.getConnectionParameterFromDbLayer(layer)
+            if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
+                self.dbType = "postgres"
+                self.db = Gedopi_session.acquerir(connectionParams)
+                self.dbSchema = connectionParams['schema']
+        if not self.db or not self.db.isOpen():
+            self.db = None
+            self.btnLancer.setEnabled(False)
+            self.btnReseau.setEnabled(False)
+            self.btnBassin.setEnabled(False)
+            self.lblEtape.setText(u"La couche des opérations de pêches électriques n'est pas chargée ...")
+
+    def positionsReseau(self):
+        '''Positionne toutes les stations sur le graphe du réseau hydrographique (table station_reseau)'''
+
+        if numpy is None:
+            QMessageBox.critical(self, u"Erreur", u"Le module numpy est nécessaire au calcul ...", QMessageBox.Ok)
+            return
+        self.lblEtape.setText(u"Positions des stations sur le réseau ...")
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        QApplication.processEvents()
+        reseau = Reseau_station(self.db, self.dbSchema)
+        nb = reseau.calcule(self.chkTout.isChecked())
+        QApplication.restoreOverrideCursor()
+        if nb is None:
+            self.lblEtape.setText("")
+            QMessageBox.critical(self, u"Erreur SQL", reseau.erreur, QMessageBox.Ok)
+        else:
+            self.lblEtape.setText(str(nb) + u" station(s) positionnée(s) sur le réseau")
+
+    def bassinsVersants(self):
+        '''Renseigne sta_surf_bv_amont de toutes les stations (et leur contour si demandé) à partir de la grille des écoulements'''
+
+        if numpy is None:
+            QMessageBox.critical(self, u"Erreur", u"Le module numpy est nécessaire au calcul ...", QMessageBox.Ok)
+            return
+        self.lblEtape.setText(u"Directions d'écoulement (calculées une seule fois, puis relues) ...")
+        # Le premier calcul de la grille peut durer plusieurs minutes : avancement affiché et arrêt possible
+        self.arret = False
+        self.btnLancer.setEnabled(False)
+        self.btnReseau.setEnabled(False)
+        self.btnBassin.setEnabled(False)
+        self.btnArreter.setEnabled(True)
+        self.barre.setMaximum(1000)
+        self.barre.setValue(0)
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        QApplication.processEvents()
+        bassin = Gedopi_bassin.ouvrir(self.cheminMnt, self.avancementBassin)
+        self.btnLancer.setEnabled(True)
+        self.btnReseau.setEnabled(True)
+        self.btnBassin.setEnabled(True)
+        self.btnArreter.setEnabled(False)
+        self.barre.setValue(1000)
+        if bassin is None:
+            QApplication.restoreOverrideCursor()
+            if self.arret:
+                self.lblEtape.setText(u"Calcul des directions d'écoulement arrêté")
+                return
+            self.lblEtape.setText("")
+            QMessageBox.critical(self, u"Erreur", Gedopi_bassin.derniereErreur, QMessageBox.Ok)
+            return
+        self.lblEtape.setText(u"Bassins versants des stations ...")
+        QApplication.processEvents()
+        calcul = Bassin_station(self.db, self.dbSchema)
+        nb = calcul.calcule(bassin, self.chkTout.isChecked(), self.chkContour.isChecked())
+        QApplication.restoreOverrideCursor()
+        if nb is None:
+            self.lblEtape.setText("")
+            QMessageBox.critical(self, u"Erreur SQL", calcul.erreur, QMessageBox.Ok)
+        else:
+            self.lblEtape.setText(str(nb) + u" surface(s) de bassin versant écrite(s)")
+
+    def avancementBassin(self, part):
+        '''
+        Affiche l'avancement du calcul des directions d'écoulement et traite les clics (bouton Arrêter)
+
+        :param part: part réalisée (0 à 1)
+        :type part: float
+
+        :return: False pour interrompre le calcul
+        :rtype: bool
+        '''
+        self.barre.setValue(int(part * 1000))
+        QApplication.processEvents()
+        return not self.arret
+
+    def arreter(self):
+        '''Demande l'arrêt du traitement à la fin du lot en cours'''
+
+        self.arret = True
+
+    def lancer(self):
+        '''Traite les stations puis les pêches électriques par lots, en reprenant l'avancement mémorisé'''
+
+        if numpy is None:
+            QMessageBox.critical(self, u"Erreur", u"Le module numpy est nécessaire au recalcul ...", QMessageBox.Ok)
+            return
+        mnt = Gedopi_mnt.ouvrir(self.cheminMnt)
+        if mnt is None:
+            QMessageBox.critical(self, u"Erreur", u"Layer failed to load !", QMessageBox.Ok)
+            return
+
+        settings = QSettings()
+        tout = self.chkTout.isChecked()
+        reprise = {}
+        if settings.value(self.cleReprise + "tout") is not None and (settings.value(self.cleReprise + "tout") == "1") == tout:
+            if QMessageBox.question(self, u"Reprise", u"Un recalcul précédent a été interrompu, reprendre là où il s'est arrêté ?",
+                QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+                for table, libelle in self.etapes:
+                    reprise[table] = int(settings.value(self.cleReprise + table, 0))
+        settings.setValue(self.cleReprise + "tout", "1" if tout else "0")
+
+        recalcul = Recalcul_pente(self.db, self.dbSchema)
+        self.arret = False
+        self.btnLancer.setEnabled(False)
+        self.btnReseau.setEnabled(False)
+        self.btnBassin.setEnabled(False)
+        self.btnArreter.setEnabled(True)
+        self.chkTout.setEnabled(False)
+        debut = time.time()
+        bilan = []
+        erreur = ""
+        for table, libelle in self.etapes:
+            dernier = reprise.get(table, 0)
+            total = recalcul.nombre(table, tout, dernier)
+            traites = 0
+            ecrits = 0
+            self.barre.setMaximum(max(total, 1))
+            self.barre.setValue(0)
+            while not self.arret:
+                self.lblEtape.setText(libelle + " : " + str(traites) + " / " + str(total))
+                QApplication.processEvents()
+                ids = recalcul.lot(table, tout, dernier)
+                if ids is None:
+                    erreur = recalcul.erreur
+                    break
+                if len(ids) == 0:
+                    break
+                nb = recalcul.traiteLot(table, mnt, ids)
+                if nb is None:
+                    erreur = recalcul.erreur
+                    break
+                # Les identifiants écartés (sans cours d'eau ou hors MNT) sont aussi dépassés, sinon le lot serait relu
+                dernier = ids[-1]
+                settings.setValue(self.cleReprise + table, dernier)
+                traites += len(ids)
+                ecrits += nb
+                self.barre.setValue(traites)
+            bilan.append(libelle + " : " + str(ecrits) + u" valeur(s) écrite(s) sur " + str(traites))
+            if erreur != "" or self.arret:
+                break
+
+        self.btnLancer.setEnabled(True)
+        self.btnReseau.setEnabled(True)
+        self.btnBassin.setEnabled(True)
+        self.btnArreter.setEnabled(False)
+        self.chkTout.setEnabled(True)
+        QgsMessageLog.logMessage(u"Recalcul des pentes et altitudes : " + " ; ".join(bilan) + " (" + str(round(time.time() - debut, 1)) + " s)", "Gedopi")
+        if erreur != "":
+            self.lblEtape.setText(u"Traitement interrompu, il reprendra au lot en erreur")
+            QMessageBox.critical(self, u"Erreur SQL", erreur, QMessageBox.Ok)
+        elif self.arret:
+            self.lblEtape.setText(u"Traitement arrêté, il pourra être repris")
+        else:
+            for cle in ["tout"] + [table for table, libelle in self.etapes]:
+                settings.remove(self.cleReprise + cle)
+            self.lblEtape.setText(u"Traitement terminé")
+            self.iface.messageBar().pushMessage("Info : ", "\n".join(bilan), level= QgsMessageBar.INFO, duration = 5)
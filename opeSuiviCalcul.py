@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+# Ce script permet le calcul des indicateurs thermiques du formulaire "Suivi thermique" à partir des relevés bruts des enregistreurs.
+
+# Import des modules Python nécessaire à l'exécution de ce fichier
+import csv
+import datetime
+
+# numpy est fourni avec QGIS, son absence est tout de même gérée par le formulaire
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Calcul_thermi():
+    '''
+    Calcul des indicateurs thermiques (colonnes opest_* de ope_suivi_thermi) à partir d'une série de températures
+    instantanées (Ti) horaire ou infra-horaire, en remplacement de la macro Excel Macma Salmo.
+
+    Tous les calculs sont vectorisés avec numpy : moyennes journalières par réduction sur les débuts de jour,
+    moyenne glissante sur 30 jours par somme cumulée, séquences consécutives de dépassement par encodage
+    des plages (run-length) et cumul des degrés-jours pour la phénologie de la truite.
+    '''
+    # Bornes (°C) des températures moyennes journalières favorables
+    tmjMin = 4
+    tmjMax = 19
+    # Seuils (°C) des nombres d'heures consécutives
+    seuilSup19 = 19
+    seuilSupeg25 = 25
+    seuilSupeg15 = 15
+    # Seuils (°C) de la phase embryo-larvaire
+    seuilPelSup = 15
+    seuilPelInf = 1.5
+    # Degrés-jours nécessaires à l'éclosion puis à la résorption de la vésicule
+    degJoursIncubation = 410
+    degJoursResorption = 380
+    # Date 50% de ponte par défaut (mois, jour) lorsque celle du formulaire n'est pas dans la période
+    jourPonte = (12, 1)
+    # Formats de date et heure reconnus dans les fichiers des enregistreurs
+    formatsDate = ["%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%y %H:%M:%S", "%d/%m/%y %H:%M",
+        "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M"]
+
+    @classmethod
+    def estSerieBrute(cls, chemin):
+        '''
+        Différencie un fichier de relevés bruts (date/heure et température)
+        d'un fichier de synthèse issu de la macro Excel Macma Salmo (une ligne d'une quarantaine de colonnes)
+
+        :param chemin: chemin du fichier CSV
+        :type chemin: str
+
+        :rtype: bool
+        '''
+        with open(chemin, 'rt', errors = 'replace') as csvfile:
+            lignes = [ligne for ligne, i in zip(csvfile, range(3))]
+        if len(lignes) < 2:
+            return False
+        return len(lignes[1].split(";")) < 10
+
+    @classmethod
+    def lireSerie(cls, chemin):
+        '''
+        Lit un fichier de relevés bruts, les lignes d'en-tête ou illisibles sont ignorées.
+        La date et l'heure occupent une ou deux colonnes, la température est la dernière colonne renseignée.
+
+        :param chemin: chemin du fichier CSV (séparateur ";", tabulation ou ",")
+        :type chemin: str
+
+        :return: (dates, températures) triées par date
+        :rtype: tuple(numpy.ndarray datetime64[s], numpy.ndarray float)
+        '''
+        with open(chemin, 'rt', errors = 'replace') as csvfile:
+            echantillon = csvfile.read(4096)
+            csvfile.seek(0)
+            separateur = ";"
+            if ";" not in echantillon:
+                separateur = "\t" if "\t" in echantillon else ","
+            dates = []
+            temperatures = []
+            formatCourant = None
+            for ligne in csv.reader(csvfile, delimiter = separateur):
+                colonnes = [colonne.strip() for colonne in ligne if colonne.strip() != ""]
+                if len(colonnes) < 2:
+                    continue
+                try:
+                    temperature = float(colonnes[-1].replace(',', '.'))
+                except ValueError:
+                    continue
+                horodatage = " ".join(colonnes[:-1])
+                # Le premier format reconnu est réutilisé pour les lignes suivantes
+                date = None
+                if formatCourant:
+                    try:
+                        date = datetime.datetime.strptime(horodatage, formatCourant)
+                    except ValueError:
+                        date = None
+                if date is None:
+                    for format in cls.formatsDate:
+                        try:
+                            date = datetime.datetime.strptime(horodatage, format)
+                            formatCourant = format
+                            break
+                        except ValueError:
+                            continue
+                if date is None:
+                    continue
+                dates.append(date)
+                temperatures.append(temperature)
+
+        if len(dates) < 2:
+            raise ValueError(u"Aucune série de températures lisible dans " + chemin)
+        dates = numpy.array(dates, dtype = 'datetime64[s]')
+        temperatures = numpy.array(temperatures, dtype = float)
+        ordre = numpy.argsort(dates, kind = 'mergesort')
+        return dates[ordre], temperatures[ordre]
+
+    @staticmethod
+    def classeTiMax(tiMax):
+        '''
+        Renvoi la classe de température instantanée maximale (opest_timax_id)
+
+        :param tiMax: température instantanée maximale
+        :type tiMax: float
+
+        :rtype: int
+        '''
+        if tiMax <= 19:
+            return 1
+        elif tiMax <= 22:
+            return 2
+        elif tiMax <= 25:
+            return 3
+        return 4
+
+    @staticmethod
+    def pasHoraire(dates):
+        '''
+        Renvoi le pas d'enregistrement en heure (médiane des écarts entre deux relevés)
+
+        :param dates: dates des relevés triées
+        :type dates: numpy.ndarray
+
+        :rtype: float
+        '''
+        ecarts = numpy.diff(dates).astype('timedelta64[s]').astype(float)
+        ecarts = ecarts[ecarts > 0]
+        if len(ecarts) == 0:
+            return 1.0
+        return float(numpy.median(ecarts)) / 3600
+
+    @staticmethod
+    def maxConsecutif(masque, ruptures = None):
+        '''
+        Renvoi la plus longue suite de valeurs vraies d'un masque booléen (encodage des plages)
+
+        :param masque: masque des relevés dépassant un seuil
+        :type masque: numpy.ndarray bool
+
+        :param ruptures: relevés précédés d'une lacune, une suite ne se prolonge pas au-delà
+        :type ruptures: numpy.ndarray bool
+
+        :rtype: int
+        '''
+        if not masque.any():
+            return 0
+        debuts = masque & ~numpy.concatenate(([False], masque[:-1]))
+        if ruptures is not None:
+            debuts |= masque & ruptures
+        return int(numpy.bincount(numpy.cumsum(debuts)[masque]).max())
+
+    @staticmethod
+    def ruptures(dates, pas):
+        '''
+        Renvoi le masque des relevés précédés d'une lacune (écart supérieur à Controle_thermi.facteurLacune fois le pas)
+
+        :param dates: dates des relevés triées
+        :type dates: numpy.ndarray datetime64
+
+        :param pas: pas d'enregistrement en heure
+        :type pas: float
+
+        :rtype: numpy.ndarray bool
+        '''
+        ecarts = numpy.diff(dates).astype('timedelta64[s]').astype(float) / 3600
+        return numpy.concatenate(([False], ecarts > Controle_thermi.facteurLacune * pas))
+
+    @staticmethod
+    def journalier(dates, temperatures):
+        '''
+        Agrège les relevés par jour
+
+        :param dates: dates des relevés triées
+        :type dates: numpy.ndarray datetime64
+
+        :param temperatures: températures instantanées
+        :type temperatures: numpy.ndarray
+
+        :return: (jours, minimum, moyenne, maximum, indice du premier relevé de chaque jour)
+        :rtype: tuple
+        '''
+        jours = dates.astype('datetime64[D]')
+        debuts = numpy.flatnonzero(numpy.concatenate(([True], jours[1:] != jours[:-1])))
+        effectifs = numpy.diff(numpy.concatenate((debuts, [len(temperatures)])))
+        tmj = numpy.add.reduceat(temperatures, debuts) / effectifs
+        tjMin = numpy.minimum.reduceat(temperatures, debuts)
+        tjMax = numpy.maximum.reduceat(temperatures, debuts)
+        return jours[debuts], tjMin, tmj, tjMax, debuts
+
+    @classmethod
+    def indicateurs(cls, dates, temperatures, datePonte = None):
+        '''
+        Calcule les indicateurs thermiques d'une série
+
+        :param dates: dates des relevés triées (voir lireSerie())
+        :type dates: numpy.ndarray datetime64
+
+        :param temperatures: températures instantanées
+        :type temperatures: numpy.ndarray
+
+        :param datePonte: date 50% de ponte, à défaut celle de jourPonte comprise dans la période
+        :type datePonte: datetime.date
+
+        :return: dictionnaire {colonne opest_* : valeur}, les dates de phénologie valent None
+                si la période ne permet pas de les atteindre
+        :rtype: dict
+        '''
+        pas = cls.pasHoraire(dates)
+        ruptures = cls.ruptures(dates, pas)
+        jours, tjMin, tmj, tjMax, debuts = cls.journalier(dates, temperatures)
+        nbJours = len(jours)
+        resultat = {}
+
+        resultat["opest_date_debut"] = jours[0].astype(datetime.date)
+        resultat["opest_date_fin"] = jours[-1].astype(datetime.date)
+        resultat["opest_duree"] = int((jours[-1] - jours[0]).astype(int)) + 1
+
+        # Températures instantanées et amplitude journalière
+        resultat["opest_ti_min"] = round(float(temperatures.min()), 2)
+        resultat["opest_ti_max"] = round(float(temperatures.max()), 2)
+        amplitude = tjMax - tjMin
+        iAmplitude = int(amplitude.argmax())
+        resultat["opest_ajmax_ti"] = round(float(amplitude[iAmplitude]), 2)
+        resultat["opest_d_ajmax_ti"] = jours[iAmplitude].astype(datetime.date)
+
+        # Températures moyennes journalières
+        resultat["opest_tmj_min"] = round(float(tmj.min()), 2)
+        resultat["opest_tmj_max"] = round(float(tmj.max()), 2)
+        resultat["opest_tmp_moy"] = round(float(tmj.mean()), 2)
+        if nbJours >= 30:
+            cumul = numpy.concatenate(([0.], numpy.cumsum(tmj)))
+            resultat["opest_tm30j_max"] = round(float(((cumul[30:] - cumul[:-30]) / 30).max()), 2)
+        else:
+            resultat["opest_tm30j_max"] = resultat["opest_tmp_moy"]
+
+        favorable = (tmj >= cls.tmjMin) & (tmj <= cls.tmjMax)
+        resultat["opest_nbj_tmj_4_19"] = int(favorable.sum())
+        resultat["opest_p100j_tmj_4_19"] = round(100.0 * favorable.sum() / nbJours, 2)
+        resultat["opest_p100_tmj_inf_4"] = round(100.0 * (tmj < cls.tmjMin).sum() / nbJours, 2)
+        resultat["opest_p100_tmj_sup_19"] = round(100.0 * (tmj > cls.tmjMax).sum() / nbJours, 2)
+
+        # Nombres maximum d'heures consécutives au-delà des seuils
+        resultat["opest_nbmax_ti_csf_sup19"] = round(cls.maxConsecutif(temperatures > cls.seuilSup19, ruptures) * pas, 2)
+        resultat["opest_nbmax_ti_csf_sup_eg25"] = round(cls.maxConsecutif(temperatures >= cls.seuilSupeg25, ruptures) * pas, 2)
+        resultat["opest_nbmax_ti_csf_sup_eg15"] = round(cls.maxConsecutif(temperatures >= cls.seuilSupeg15, ruptures) * pas, 2)
+
+        # Phénologie : cumul des degrés-jours depuis la date 50% de ponte
+        for colonne in ["opest_d50_ponte", "opest_nbj_incub", "opest_d50_eclo", "opest_nbj_rsp", "opest_d50_emg", "opest_nbj_pel",
+            "opest_nb_ti_sup15_pel", "opest_nbmax_ti_csf_sup15_pel", "opest_nb_ti_inf_1_5pel", "opest_nbmax_ti_csf_inf1_5_pel"]:
+            resultat[colonne] = None
+
+        ponte = None
+        if datePonte is not None and resultat["opest_date_debut"] <= datePonte <= resultat["opest_date_fin"]:
+            ponte = datePonte
+        else:
+            for annee in range(resultat["opest_date_debut"].year, resultat["opest_date_fin"].year + 1):
+                candidat = datetime.date(annee, cls.jourPonte[0], cls.jourPonte[1])
+                if resultat["opest_date_debut"] <= candidat <= resultat["opest_date_fin"]:
+                    ponte = candidat
+                    break
+        if ponte is None:
+            return resultat
+
+        iPonte = int(numpy.searchsorted(jours, numpy.datetime64(ponte, 'D')))
+        degresJours = numpy.cumsum(numpy.maximum(tmj[iPonte:], 0))
+        resultat["opest_d50_ponte"] = ponte
+        iEclosion = int(numpy.searchsorted(degresJours, cls.degJoursIncubation))
+        if iEclosion >= len(degresJours):
+            return resultat
+        eclosion = jours[iPonte + iEclosion].astype(datetime.date)
+        resultat["opest_d50_eclo"] = eclosion
+        resultat["opest_nbj_incub"] = (eclosion - ponte).days
+        iEmergence = int(numpy.searchsorted(degresJours, cls.degJoursIncubation + cls.degJoursResorption))
+        if iEmergence >= len(degresJours):
+            return resultat
+        emergence = jours[iPonte + iEmergence].astype(datetime.date)
+        resultat["opest_d50_emg"] = emergence
+        resultat["opest_nbj_rsp"] = (emergence - eclosion).days
+        resultat["opest_nbj_pel"] = (emergence - ponte).days
+
+        # Phase embryo-larvaire, de la ponte à l'émergence incluse (durées en heures)
+        fin = iPonte + iEmergence + 1
+        periode = slice(debuts[iPonte], debuts[fin] if fin < nbJours else len(temperatures))
+        pel = temperatures[periode]
+        resultat["opest_nb_ti_sup15_pel"] = round(float((pel > cls.seuilPelSup).sum()) * pas, 2)
+        resultat["opest_nbmax_ti_csf_sup15_pel"] = round(cls.maxConsecutif(pel > cls.seuilPelSup, ruptures[periode]) * pas, 2)
+        resultat["opest_nb_ti_inf_1_5pel"] = round(float((pel < cls.seuilPelInf).sum()) * pas, 2)
+        resultat["opest_nbmax_ti_csf_inf1_5_pel"] = round(cls.maxConsecutif(pel < cls.seuilPelInf, ruptures[periode]) * pas, 2)
+        return resultat
+
+class Controle_thermi():
+    '''
+    Contrôle qualité d'une série brute avant le calcul des indicateurs.
+
+    Toutes les règles sont évaluées sur la série entière par des masques numpy :
+    horodatages en double, lacunes et irrégularités d'horloge (écarts entre relevés comparés au pas),
+    valeurs hors plage physique, pics isolés (saut aller-retour entre trois relevés successifs)
+    et journées d'émersion (amplitude journalière anormale, sonde hors de l'eau).
+    Les seuils sont des attributs de classe et peuvent être ajustés ; une règle est désactivée en mettant son seuil à None.
+    '''
+    # Un écart supérieur à facteurLacune fois le pas est une lacune
+    facteurLacune = 3
+    # Un écart différent du pas de plus de toleranceHorloge (fraction) est une irrégularité d'horloge
+    toleranceHorloge = 0.1
+    # Plage physique acceptée (°C)
+    temperatureMin = -1.0
+    temperatureMax = 35.0
+    # Saut (°C) entre deux relevés successifs au-delà duquel un aller-retour est un pic
+    seuilPic = 3.0
+    # Amplitude journalière (°C) minimale d'une émersion, et rapport à l'amplitude médiane de la série
+    amplitudeEmersion = 6.0
+    facteurEmersion = 3.0
+
+    @classmethod
+    def controle(cls, dates, temperatures):
+        '''
+        Contrôle une série et la nettoie : les doublons, valeurs hors plage, pics
+        et journées d'émersion sont retirés, les lacunes et irrégularités sont signalées
+
+        :param dates: dates des relevés triées (voir Calcul_thermi.lireSerie())
+        :type dates: numpy.ndarray datetime64
+
+        :param temperatures: températures instantanées
+        :type temperatures: numpy.ndarray
+
+        :return: (dates, températures, rapport) où rapport est un dictionnaire des anomalies
+        :rtype: tuple
+        '''
+        rapport = {"releves": len(temperatures), "doublons": 0, "horsPlage": 0, "pics": 0, "emersion": [], "lacunes": [], "irregularites": 0}
+
+        # Horodatages en double : seul le premier relevé est conservé
+        garde = numpy.concatenate(([True], dates[1:] != dates[:-1]))
+        rapport["doublons"] = int((~garde).sum())
+        dates = dates[garde]
+        temperatures = temperatures[garde]
+
+        # Valeurs hors de la plage physique
+        garde = numpy.ones(len(temperatures), dtype = bool)
+        if cls.temperatureMin is not None and cls.temperatureMax is not None:
+            horsPlage = (temperatures < cls.temperatureMin) | (temperatures > cls.temperatureMax)
+            rapport["horsPlage"] = int(horsPlage.sum())
+            garde &= ~horsPlage
+
+        # Pics isolés : saut supérieur au seuil vers un relevé puis retour au relevé suivant
+        if cls.seuilPic is not None and len(temperatures) > 2:
+            sauts = numpy.diff(temperatures)
+            pics = (numpy.abs(sauts[:-1]) > cls.seuilPic) & (numpy.abs(sauts[1:]) > cls.seuilPic) & (numpy.sign(sauts[:-1]) != numpy.sign(sauts[1:]))
+            pics = numpy.concatenate(([False], pics, [False]))
+            rapport["pics"] = int((pics & garde).sum())
+            garde &= ~pics
+
+        # Journées d'émersion : amplitude au-delà du seuil et de facteurEmersion fois l'amplitude médiane
+        if cls.amplitudeEmersion is not None and garde.any():
+            jours, tjMin, tmj, tjMax, debuts = Calcul_thermi.journalier(dates[garde], temperatures[garde])
+            amplitude = tjMax - tjMin
+            emersion = amplitude > max(cls.amplitudeEmersion, cls.facteurEmersion * float(numpy.median(amplitude)))
+            if emersion.any():
+                rapport["emersion"] = [jour.astype(datetime.date) for jour in jours[emersion]]
+                garde &= ~numpy.isin(dates.astype('datetime64[D]'), jours[emersion])
+
+        dates = dates[garde]
+        temperatures = temperatures[garde]
+        if len(dates) < 2:
+            raise ValueError(u"Aucun relevé valide après le contrôle qualité")
+
+        # Lacunes et irrégularités d'horloge, signalées sans modifier la série
+        pas = Calcul_thermi.pasHoraire(dates)
+        ecarts = numpy.diff(dates).astype('timedelta64[s]').astype(float) / 3600
+        lacunes = numpy.flatnonzero(ecarts > cls.facteurLacune * pas)
+        rapport["lacunes"] = [(dates[i].astype(datetime.datetime), dates[i + 1].astype(datetime.datetime)) for i in lacunes]
+        irregulier = (numpy.abs(ecarts - pas) > cls.toleranceHorloge * pas) & (ecarts <= cls.facteurLacune * pas)
+        rapport["irregularites"] = int(irregulier.sum())
+        rapport["supprimes"] = rapport["releves"] - len(temperatures)
+        return dates, temperatures, rapport
+
+    @staticmethod
+    def anomalie(rapport):
+        '''Indique si le rapport de contrôle contient au moins une anomalie'''
+
+        return rapport["supprimes"] > 0 or len(rapport["lacunes"]) > 0 or rapport["irregularites"] > 0
+
+    @staticmethod
+    def texteRapport(rapport):
+        '''
+        Renvoi le rapport de contrôle sous forme de texte
+
+        :param rapport: rapport renvoyé par controle()
+        :type rapport: dict
+
+        :rtype: str
+        '''
+        lignes = [str(rapport["releves"]) + u" relevés, " + str(rapport["supprimes"]) + u" retirés",
+            u"Horodatages en double : " + str(rapport["doublons"]),
+            u"Valeurs hors plage : " + str(rapport["horsPlage"]),
+            u"Pics isolés : " + str(rapport["pics"]),
+            u"Journées d'émersion : " + str(len(rapport["emersion"])) + "".join("\n    " + jour.strftime("%d/%m/%Y") for jour in rapport["emersion"][:10]),
+            u"Lacunes : " + str(len(rapport["lacunes"])) + "".join("\n    " + debut.strftime("%d/%m/%Y %H:%M") + " - " + fin.strftime("%d/%m/%Y %H:%M") for debut, fin in rapport["lacunes"][:10]),
+            u"Irrégularités d'horloge : " + str(rapport["irregularites"])]
+        return "\n".join(lignes)
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+# Ce script permet l'affichage de la courbe des températures d'un suivi thermique.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import datetime
+from PyQt5.QtCore import (Qt, QPointF, QRectF)
+from PyQt5.QtGui import (QColor, QCursor, QPainter, QPen, QPolygonF)
+from PyQt5.QtWidgets import (QApplication, QDialog, QFileDialog, QHBoxLayout, QMessageBox, QPushButton, QSizePolicy, QSpacerItem, QVBoxLayout, QWidget)
+
+# Import du calcul des indicateurs thermiques (lecture des fichiers de relevés)
+from .opeSuiviCalcul import (Calcul_thermi)
+
+# numpy est fourni avec QGIS, son absence est tout de même gérée par le formulaire
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Courbe_thermi(QWidget):
+    '''
+    Graphique des températures instantanées d'une ou plusieurs séries.
+
+    Chaque série est décimée par colonne de pixels (minimum et maximum des relevés de la colonne), ce qui conserve
+    les pics quel que soit le zoom. Les niveaux d'agrégation (un niveau regroupe 4 éléments du niveau précédent)
+    ne sont calculés qu'au moment où le zoom les demande, puis conservés : un affichage ne parcourt jamais plus
+    de quelques éléments par pixel, même pour plusieurs centaines de milliers de relevés.
+
+    Une série enregistrée dans la base est ouverte sur ses agrégats journaliers (minimum et maximum du jour) :
+    les relevés bruts ne sont lus que pour la période affichée, lorsqu'un jour occupe plus de pixelsJour colonnes.
+    '''
+    # Seuils de température affichés (°C, couleur)
+    seuils = [(4, QColor(0, 120, 255)), (15, QColor(0, 160, 0)), (19, QColor(255, 140, 0)), (25, QColor(220, 0, 0))]
+    # Couleurs successives des séries
+    couleurs = [QColor(30, 30, 30), QColor(150, 0, 150), QColor(0, 130, 130), QColor(130, 90, 0)]
+    # Regroupement entre deux niveaux d'agrégation
+    facteur = 4
+    # Marges (pixels) réservées aux graduations
+    margeGauche = 45
+    margeBas = 25
+    # Largeur (pixels) d'un jour à partir de laquelle les relevés bruts de la période affichée sont lus
+    pixelsJour = 4
+
+    def __init__(self, parent = None):
+        '''
+        Constructeur
+
+        :param parent: widget parent
+        :type parent: QWidget
+        '''
+        super(Courbe_thermi, self).__init__(parent)
+        self.series = []
+        self.reperes = []
+        self.debut = None
+        self.fin = None
+        self.yMin = 0
+        self.yMax = 25
+        self.origineGlisse = None
+        self.setMinimumSize(700, 350)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setFocusPolicy(Qt.StrongFocus)
+
+    def ajouteSerie(self, nom, dates, temperatures):
+        '''
+        Ajoute une série au graphique
+
+        :param nom: nom de la série (code opération, fichier ...)
+        :type nom: str
+
+        :param dates: dates des relevés triées
+        :type dates: numpy.ndarray datetime64
+
+        :param temperatures: températures instantanées
+        :type temperatures: numpy.ndarray
+        '''
+        temps = dates.astype('datetime64[s]').astype(numpy.int64).astype(float)
+        valeurs = numpy.asarray(temperatures, dtype = float)
+        self.series.append({"nom": nom, "couleur": self.couleurs[len(self.series) % len(self.couleurs)],
+            "niveaux": [(temps, valeurs, valeurs)], "chargeur": None, "brut": None})
+        self.vueEnsemble()
+
+    def ajouteSerieJournaliere(self, nom, jours, minimum, maximum, chargeur):
+        '''
+        Ajoute une série connue par ses agrégats journaliers, ses relevés bruts sont lus au zoom
+
+        :param nom: nom de la série (code opération)
+        :type nom: str
+
+        :param jours: jours des agrégats triés
+        :type jours: numpy.ndarray datetime64[D]
+
+        :param minimum: températures minimales journalières
+        :type minimum: numpy.ndarray
+
+        :param maximum: températures maximales journalières
+        :type maximum: numpy.ndarray
+
+        :param chargeur: fonction (début, fin) renvoyant les relevés bruts (dates, températures) de la période ou None
+        :type chargeur: function
+        '''
+        temps = jours.astype('datetime64[s]').astype(numpy.int64).astype(float)
+        self.series.append({"nom": nom, "couleur": self.couleurs[len(self.series) % len(self.couleurs)],
+            "niveaux": [(temps, numpy.asarray(minimum, dtype = float), numpy.asarray(maximum, dtype = float))],
+            "chargeur": chargeur, "brut": None})
+        self.vueEnsemble()
+
+    def ajouteRepere(self, date, libelle):
+        '''
+        Ajoute une date repère (phénologie) tracée en vertical
+
+        :param date: date du repère
+        :type date: datetime.date
+
+        :param libelle: texte affiché
+        :type libelle: str
+        '''
+        temps = float(numpy.datetime64(date, 's').astype(numpy.int64))
+        self.reperes.append((temps, libelle))
+        self.update()
+
+    def vueEnsemble(self):
+        '''Affiche la totalité des séries'''
+
+        if len(self.series) == 0:
+            return
+        self.debut = min(serie["niveaux"][0][0][0] for serie in self.series)
+        self.fin = max(serie["niveaux"][0][0][-1] for serie in self.series)
+        if self.fin <= self.debut:
+            self.fin = self.debut + 3600
+        self.yMin = min(0.0, min(float(serie["niveaux"][0][1].min()) for serie in self.series)) - 1
+        self.yMax = max(26.0, max(float(serie["niveaux"][0][2].max()) for serie in self.series)) + 1
+        self.update()
+
+    def niveau(self, niveaux, k):
+        '''
+        Renvoi le niveau d'agrégation k (temps, minimum, maximum), calculé à la demande
+
+        :param niveaux: niveaux d'agrégation déjà calculés, le premier est la série lue
+        :type niveaux: list
+
+        :rtype: tuple
+        '''
+        while len(niveaux) <= k:
+            temps, minimum, maximum = niveaux[-1]
+            bornes = numpy.arange(0, len(temps), self.facteur)
+            niveaux.append((temps[bornes], numpy.minimum.reduceat(minimum, bornes), numpy.maximum.reduceat(maximum, bornes)))
+        return niveaux[k]
+
+    def detail(self, largeur):
+        '''
+        Indique si la période affichée demande les relevés bruts (un jour occupe plus de pixelsJour colonnes)
+
+        :param largeur: largeur de la zone de tracé en pixels
+        :type largeur: int
+
+        :rtype: bool
+        '''
+        return largeur > 0 and (self.fin - self.debut) / largeur * self.pixelsJour < 86400
+
+    def chargeBrut(self):
+        '''
+        Lit les relevés bruts de la période affichée des séries journalières lorsque le zoom les demande.
+        La période lue déborde d'une largeur d'écran de chaque côté pour que le déplacement ne relise pas la base.
+        '''
+        if self.debut is None or not self.detail(int(self.zoneTrace().width())):
+            return
+        duree = self.fin - self.debut
+        for serie in self.series:
+            brut = serie["brut"]
+            if serie["chargeur"] is None or (brut is not None and brut[0] <= self.debut and self.fin <= brut[1]):
+                continue
+            debut = self.debut - duree
+            fin = self.fin + duree
+            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+            releves = serie["chargeur"](datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds = debut),
+                datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds = fin))
+            QApplication.restoreOverrideCursor()
+            temps = numpy.array([], dtype = float)
+            valeurs = numpy.array([], dtype = float)
+            if releves is not None:
+                temps = releves[0].astype('datetime64[s]').astype(numpy.int64).astype(float)
+                valeurs = numpy.asarray(releves[1], dtype = float)
+            serie["brut"] = (debut, fin, [(temps, valeurs, valeurs)])
+
+    def decime(self, serie, largeur):
+        '''
+        Renvoi la série réduite à un minimum et un maximum par colonne de pixels de la période affichée
+
+        :param largeur: largeur de la zone de tracé en pixels
+        :type largeur: int
+
+        :return: (colonnes, minimum, maximum)
+        :rtype: tuple
+        '''
+        niveaux = serie["niveaux"]
+        # Relevés bruts lus par chargeBrut() si la période affichée est comprise dans la période lue
+        brut = serie["brut"]
+        if brut is not None and self.detail(largeur) and brut[0] <= self.debut and self.fin <= brut[1] and len(brut[2][0][0]) > 0:
+            niveaux = brut[2]
+        temps = niveaux[0][0]
+        nbVisible = numpy.searchsorted(temps, self.fin) - numpy.searchsorted(temps, self.debut)
+        k = 0
+        while nbVisible / (self.facteur ** (k + 1)) > 2 * largeur and len(self.niveau(niveaux, k)[0]) > self.facteur:
+            k += 1
+        temps, minimum, maximum = self.niveau(niveaux, k)
+        i0 = max(int(numpy.searchsorted(temps, self.debut)) - 1, 0)
+        i1 = min(int(numpy.searchsorted(temps, self.fin)) + 1, len(temps))
+        if i1 <= i0:
+            return None
+        colonnes = ((temps[i0:i1] - self.debut) / (self.fin - self.debut) * largeur).astype(numpy.int64)
+        bornes = numpy.flatnonzero(numpy.concatenate(([True], colonnes[1:] != colonnes[:-1])))
+        return colonnes[bornes], numpy.minimum.reduceat(minimum[i0:i1], bornes), numpy.maximum.reduceat(maximum[i0:i1], bornes)
+
+    def zoneTrace(self):
+        '''Renvoi le rectangle de tracé (hors graduations)'''
+
+        return QRectF(self.margeGauche, 5, self.width() - self.margeGauche - 10, self.height() - self.margeBas - 10)
+
+    def versY(self, zone, valeur):
+        '''Convertit une température en ordonnée écran'''
+
+        return zone.bottom() - (valeur - self.yMin) / (self.yMax - self.yMin) * zone.height()
+
+    def versX(self, zone, temps):
+        '''Convertit un temps (secondes) en abscisse écran'''
+
+        return zone.left() + (temps - self.debut) / (self.fin - self.debut) * zone.width()
+
+    def texteDate(self, temps):
+        '''Formate une graduation de temps selon la durée affichée'''
+
+        date = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds = temps)
+        if self.fin - self.debut > 60 * 86400:
+            return date.strftime("%d/%m/%Y")
+        elif self.fin - self.debut > 2 * 86400:
+            return date.strftime("%d/%m %Hh")
+        return date.strftime("%d/%m %H:%M")
+
+    def paintEvent(self, event):
+        '''Trace les seuils, les séries décimées et les dates repères'''
+
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        zone = self.zoneTrace()
+        if self.debut is None or zone.width() <= 0 or zone.height() <= 0:
+            painter.drawText(self.rect(), Qt.AlignCenter, u"Aucune série à afficher")
+            return
+
+        # Graduations
+        painter.setPen(QPen(QColor(200, 200, 200), 1))
+        painter.drawRect(zone)
+        painter.setPen(QPen(Qt.black, 1))
+        pas = 5 if self.yMax - self.yMin > 15 else 1
+        valeur = int(self.yMin / pas) * pas
+        while valeur <= self.yMax:
+            if valeur >= self.yMin:
+                y = self.versY(zone, valeur)
+                painter.drawText(QRectF(0, y - 8, self.margeGauche - 5, 16), Qt.AlignRight | Qt.AlignVCenter, str(valeur))
+            valeur += pas
+        for i in range(6):
+            temps = self.debut + (self.fin - self.debut) * i / 5.0
+            x = self.versX(zone, temps)
+            painter.drawText(QRectF(x - 60, zone.bottom() + 3, 120, self.margeBas), Qt.AlignHCenter | Qt.AlignTop, self.texteDate(temps))
+
+        # Seuils
+        for seuil, couleur in self.seuils:
+            if self.yMin < seuil < self.yMax:
+                y = self.versY(zone, seuil)
+                painter.setPen(QPen(couleur, 1, Qt.DashLine))
+                painter.drawLine(QPointF(zone.left(), y), QPointF(zone.right(), y))
+                painter.drawText(QPointF(zone.right() - 40, y - 2), str(seuil) + u" °C")
+
+        # Séries : un segment minimum / maximum par colonne de pixels
+        painter.setClipRect(zone)
+        for serie in self.series:
+            decimee = self.decime(serie, int(zone.width()))
+            if decimee is None:
+                continue
+            colonnes, minimum, maximum = decimee
+            xs = zone.left() + colonnes
+            yMin = self.versY(zone, minimum)
+            yMax = self.versY(zone, maximum)
+            polygone = QPolygonF()
+            for x, y1, y2 in zip(xs.tolist(), yMin.tolist(), yMax.tolist()):
+                polygone.append(QPointF(x, y1))
+                polygone.append(QPointF(x, y2))
+            painter.setPen(QPen(serie["couleur"], 1))
+            painter.drawPolyline(polygone)
+
+        # Dates repères
+        painter.setPen(QPen(QColor(120, 120, 120), 1, Qt.DotLine))
+        for temps, libelle in self.reperes:
+            if self.debut <= temps <= self.fin:
+                x = self.versX(zone, temps)
+                painter.drawLine(QPointF(x, zone.top()), QPointF(x, zone.bottom()))
+                painter.drawText(QPointF(x + 3, zone.top() + 12), libelle)
+
+        # Légende
+        painter.setClipping(False)
+        for i, serie in enumerate(self.series):
+            painter.setPen(QPen(serie["couleur"], 1))
+            painter.drawText(QPointF(zone.left() + 8, zone.top() + 14 * (i + 1)), serie["nom"])
+
+    def wheelEvent(self, event):
+        '''Zoom temporel centré sur le curseur'''
+
+        if self.debut is None:
+            return
+        zone = self.zoneTrace()
+        centre = self.debut + (event.pos().x() - zone.left()) / zone.width() * (self.fin - self.debut)
+        ratio = 0.8 if event.angleDelta().y() > 0 else 1.25
+        duree = max((self.fin - self.debut) * ratio, 3600.0)
+        position = (centre - self.debut) / (self.fin - self.debut)
+        self.debut = centre - duree * position
+        self.fin = self.debut + duree
+        self.chargeBrut()
+        self.update()
+
+    def mousePressEvent(self, event):
+        '''Début du déplacement de la période affichée'''
+
+        if event.button() == Qt.LeftButton:
+            self.origineGlisse = (event.pos().x(), self.debut, self.fin)
+
+    def mouseMoveEvent(self, event):
+        '''Déplacement de la période affichée'''
+
+        if self.origineGlisse is None or self.debut is None:
+            return
+        x, debut, fin = self.origineGlisse
+        decalage = (event.pos().x() - x) / self.zoneTrace().width() * (fin - debut)
+        self.debut = debut - decalage
+        self.fin = fin - decalage
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        '''Fin du déplacement, lecture des relevés bruts de la nouvelle période si nécessaire'''
+
+        if self.origineGlisse is not None:
+            self.origineGlisse = None
+            self.chargeBrut()
+            self.update()
+
+    def mouseDoubleClickEvent(self, event):
+        '''Retour à la vue d'ensemble'''
+
+        self.vueEnsemble()
+
+class Courbe_thermi_dialog(QDialog):
+    '''
+    Fenêtre affichant la courbe des températures d'un suivi thermique
+
+    :param QDialog: Permet d'afficher l'interface graphique comme une fenêtre indépendante
+    :type QDialog: QDialog
+    '''
+    def __init__(self, titre, parent = None):
+        '''
+        Constructeur, construction de la fenêtre
+
+        :param titre: titre de la fenêtre (code opération du suivi)
+        :type titre: str
+
+        :param parent: défini que cette fenêtre n'hérite pas d'autres widgets
+        :type parent: NoneType
+        '''
+        super(Courbe_thermi_dialog, self).__init__(parent)
+        self.setWindowTitle(u"Courbe thermique - " + titre)
+        self.courbe = Courbe_thermi(self)
+
+        self.btnAjout = QPushButton(u"Ajouter un fichier", self)
+        self.btnEnsemble = QPushButton(u"Vue d'ensemble", self)
+        self.btnFermer = QPushButton(u"Fermer", self)
+        boutons = QHBoxLayout()
+        boutons.addWidget(self.btnAjout)
+        boutons.addWidget(self.btnEnsemble)
+        boutons.addItem(QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        boutons.addWidget(self.btnFermer)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.courbe)
+        layout.addLayout(boutons)
+
+        self.btnAjout.clicked.connect(self.ajoutFichier)
+        self.btnEnsemble.clicked.connect(self.courbe.vueEnsemble)
+        self.btnFermer.clicked.connect(self.reject)
+
+    def ajoutFichier(self):
+        '''Superpose la série d'un autre fichier de relevés bruts (autre sonde, autre année)'''
+
+        chemin = QFileDialog.getOpenFileName(self, "Open File", "", "CSV (*.csv *.txt)")[0]
+        if chemin == "":
+            return
+        try:
+            dates, temperatures = Calcul_thermi.lireSerie(chemin)
+        except ValueError:
+            QMessageBox.critical(self, u"Erreur", u"Le fichier n'est pas un fichier de relevés valide ...", QMessageBox.Ok)
+            return
+        self.courbe.ajouteSerie(chemin.replace("\\", "/").split("/")[-1], dates, temperatures)
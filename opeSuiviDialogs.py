@@ -9,8 +9,8 @@ from functools import partial
 from PyQt5.QtCore import (Qt, QDate)
 from PyQt5.QtGui import (QCursor, QPixmap)
 from PyQt5.QtWidgets import (QApplication, QDataWidgetMapper, QDialog, QFileDialog, QDockWidget, QHeaderView, QMessageBox, QTableView)
-from PyQt5.QtSql import (QSqlDatabase, QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
-from qgis.core import (QgsPointXY, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsDataSourceUri, QgsExpression, QgsExpressionContext, QgsFeatureRequest,  QgsGeometry, QgsProject, QgsPoint, QgsRaster, QgsRasterLayer, QgsVectorDataProvider, QgsVectorLayer)
+from PyQt5.QtSql import (QSqlQuery, QSqlQueryModel, QSqlRelationalDelegate, QSqlRelationalTableModel, QSqlTableModel)
+from qgis.core import (QgsPointXY, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsDataSourceUri, QgsFeatureRequest,  QgsProject, QgsPoint, QgsRaster, QgsRasterLayer, QgsVectorDataProvider)
 from qgis.gui import (QgsMapToolPan, QgsMessageBar, QgsMapToolEmitPoint, QgsVertexMarker)
 
 # Initialise les ressources Qt à partir du fichier resources.py
@@ -26,7 +26,25 @@ from opeStationForm import (Ui_dlgStationForm)
 from opeMoaAjoutForm import (Ui_dlgMoaAjoutForm)
 
 # Import de la Class Gedopi_common qui permet la connexion du formulaire avec PostgreSQL
-from .commonDialogs import (Gedopi_common)
+from .commonDialogs import (Gedopi_common, Gedopi_reference, Gedopi_session)
+
+# Import du service d'accrochage aux cours d'eau
+from .commonSpatial import (Gedopi_accrochage)
+
+# Import de la position des stations sur le réseau hydrographique
+from .stationReseau import (Reseau_station)
+
+# Import du calcul des indicateurs thermiques à partir des relevés bruts
+from .opeSuiviCalcul import (Calcul_thermi, Controle_thermi, numpy)
+
+# Import groupé des fichiers d'enregistreurs
+from .opeSuiviImport import (Import_thermi)
+
+# Import du stockage des relevés bruts
+from .opeSuiviStock import (Stock_thermi)
+
+# Import de la fenêtre de la courbe des températures
+from .opeSuiviCourbe import (Courbe_thermi_dialog)
 
 # Import du script de filtrage des suivis thermiques
 from .opeSuiviFiltrage import (Filtrage_thermi_dialog)
@@ -86,6 +104,10 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.modelStation = None
         self.modelRiviere = None
         self.modelMoa = None
+        self.queryEnregistrement = None
+        self.ceauStation = None
+        self.geomExiste = True
+        self.accrochage = None
 
         # Variables diverses
         self.excelBool = False
@@ -94,6 +116,7 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.point_click = ""
         self.pointThermi = ""
         self.cheminCsv = ""
+        self.serieBrute = None
         self.wthermi_geom = ""
         self.creaGeom = False
 
@@ -115,6 +138,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.btnCoordonnee.setCheckable(True)
 
         self.btnImpCsv.clicked.connect(self.importCsv)
+        self.btnImpLot.clicked.connect(self.importGroupe)
+        self.btnCourbe.clicked.connect(self.afficheCourbe)
+        self.btnRecalcul.clicked.connect(self.recalculIndicateurs)
 
         self.btnZoom.clicked.connect(self.zoomThermi)
         self.btnSelection.clicked.connect(self.selectionThermi)
@@ -187,26 +213,20 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
                 if layer.selectedFeatureCount() != 0:
                     self.btnFiltreCartoManuel.setEnabled(True)
                     if (origine == 1 and self.chkFiltreCartoAuto.isChecked()) or (origine == 2):
-                        if (layer.selectedFeatureCount() >= 1000) and (QGis.QGIS_VERSION_INT < 21203):
-                            layer.removeSelection()
-                            self.iface.messageBar().pushMessage("Erreur : ", u"Le nombre d'éléments sélectionnés est trop important ...", level=QgsMessageBar.CRITICAL, duration=3)
-                        else:
-                            self.infoMessage = u"(FILTRAGE EN COURS) Gedopi - Suivi thermique"
-                            wparam = ""
-                            for feature in layer.selectedFeatures():
-                                expressContext = QgsExpressionContext()
-                                expressContext.setFeature(feature)
-                                wid = QgsExpression("$id").evaluate(expressContext)
-                                wparam += str(wid) + ","
-                            if (wparam != ""):
-                                wparam = "(" + wparam[0:len(wparam) - 1] + ")"
-                                if self.modelThermi:
-                                    self.modelThermi.setFilter("opest_id in %s" % wparam)
-                                    self.modelThermi.select()
-
-                                    self.row_count = self.modelThermi.rowCount()
-                                    self.mapper.toFirst()
-                                    self.btnDeleteFiltrage.setEnabled(True)
+                        self.infoMessage = u"(FILTRAGE EN COURS) Gedopi - Suivi thermique"
+                        if self.modelThermi:
+                            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+                            wfiltre = self.gc.filtreSelection(self.db, "opest_id", layer.selectedFeatureIds(), "thermi")
+                            if wfiltre is None:
+                                QApplication.restoreOverrideCursor()
+                                QMessageBox.critical(self, u"Erreur SQL", u"Impossible de filtrer la sélection cartographique ...", QMessageBox.Ok)
+                                return
+                            self.modelThermi.setFilter(wfiltre)
+                            self.modelThermi.select()
+                            self.row_count = self.modelThermi.rowCount()
+                            self.mapper.toFirst()
+                            self.btnDeleteFiltrage.setEnabled(True)
+                            QApplication.restoreOverrideCursor()
                 else:
                     self.btnFiltreCartoManuel.setEnabled(False)
 
@@ -264,6 +284,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         del self.modelRiviere
         del self.modelStation
         del self.modelMoa
+        del self.queryEnregistrement
+        self.queryEnregistrement = None
+        self.accrochage = None
 
         # Supprime le vertex du canevas si existant
         if self.point_click != "":
@@ -271,10 +294,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.point_click = ""
         self.point_click = ""
 
-        self.db.close()
-        del self.db
+        # Rend la connexion au pool, elle reste ouverte pour la prochaine ouverture du formulaire
+        Gedopi_session.liberer(self.db)
         self.db = None
-        QSqlDatabase.removeDatabase('db1')
 
     def setupModel(self):
         '''
@@ -288,17 +310,14 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             connectionParams = self.gc.getConnectionParameterFromDbLayer(self.layer)
             if (connectionParams['dbType'] == u'postgres' or connectionParams['dbType'] == u'postgis'):
                 self.dbType = "postgres"
-                self.db = QSqlDatabase.addDatabase("QPSQL", 'db1')
-                self.db.setDatabaseName(connectionParams['dbname'])
-                self.db.setUserName(connectionParams['user'])
-                self.db.setPassword(connectionParams['password'])
-                self.db.setHostName(connectionParams['host'])
+                self.db = Gedopi_session.acquerir(connectionParams)
                 self.dbSchema = connectionParams['schema']
                 self.user = connectionParams['user']
                 self.password = connectionParams['password']
                 self.dbname = connectionParams['dbname']
 
-            if (not self.db.open()):
+            if (not self.db or not self.db.isOpen()):
+                self.db = None
                 QMessageBox.critical(self, "Erreur", u"Impossible de se connecter à la base de données ...", QMessageBox.Ok)
                 QApplication.restoreOverrideCursor()
                 return
@@ -349,6 +368,19 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
 
         self.modelStation = QSqlQueryModel(self)
 
+        # Requête préparée récupérant en un seul aller-retour la station, la rivière
+        # et la présence d'une géométrie de l'enregistrement courant (voir rowChange())
+        self.ceauStation = None
+        self.queryEnregistrement = QSqlQuery(self.db)
+        wrelation = ""
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "."
+        self.queryEnregistrement.prepare("select ope_sta_id, sta_ceau_id, opest_geom is not null as geom_existe from " + wrelation + "ope_suivi_thermi " +
+        "join " + wrelation + "operation on ope_code = opest_ope_code left join " + wrelation + "station on sta_id = ope_sta_id where opest_id = ?")
+
+        # Service d'accrochage des clics au cours d'eau le plus proche
+        self.accrochage = Gedopi_accrochage(self.db, self.dbSchema)
+
         self.mapper = QDataWidgetMapper(self)
         self.mapper.setSubmitPolicy(QDataWidgetMapper.ManualSubmit)
         self.mapper.setModel(self.modelThermi)
@@ -532,6 +564,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.btnDeleteFiltrage.setEnabled(False)
 
         self.btnImpCsv.setEnabled(False)
+        self.btnImpLot.setEnabled(True)
+        self.btnCourbe.setEnabled(active)
+        self.btnRecalcul.setEnabled(False)
 
         self.btnNouveau.setEnabled(True)
         self.btnModif.setEnabled(active)
@@ -575,6 +610,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.btnCoordonnee.setEnabled(active)
 
         self.btnImpCsv.setEnabled(active)
+        self.btnImpLot.setEnabled(not active)
+        self.btnCourbe.setEnabled(not active)
+        self.btnRecalcul.setEnabled(False)
 
         self.btnPremier.setEnabled(not active)
         self.btnPrec.setEnabled(not active)
@@ -641,6 +679,7 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id in (select ceau_id from data.cours_eau where ceau_nom = 'NR') order by sta_id;", self.db)
             if self.modelStation.lastError().isValid():
                 QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le changeCmbRiviere() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+            self.ceauStation = None
 
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(1)
@@ -659,6 +698,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wceau_id), self.db)
             if self.modelStation.lastError().isValid():
                 QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le changeCmbRiviere() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+                self.ceauStation = None
+            else:
+                self.ceauStation = (wceau_id, Gedopi_reference.versionStations)
 
             self.cmbStation.setModel(self.modelStation)
             self.cmbStation.setModelColumn(1)
@@ -686,32 +728,18 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.cmbRiviere.currentIndexChanged.disconnect(self.changeCmbRiviere)
 
         record = self.modelThermi.record(row)
-        wopest_ope_code = record.value(self.modelThermi.fieldIndex("opest_ope_code"))
-
-       # Récupération de la clé de l'operation correspondante
-        query = QSqlQuery(self.db)
-        wrelation = "operation"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("select ope_sta_id from " + wrelation + " where ope_code = ?")
-        query.addBindValue(wopest_ope_code)
-        wope_sta_id = ""
-        if query.exec_():
-            if query.next():
-                wope_sta_id = query.value(0)
-                self.currentStation = wope_sta_id
+        wopest_id = record.value("opest_id")
 
-        # Récupération de la clé de la riviere correspondante
-        query = QSqlQuery(self.db)
-        wrelation = "station"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        query.prepare("select sta_ceau_id from " + wrelation + " where sta_id = ?")
-        query.addBindValue(wope_sta_id)
-        wsta_ceau_id = ""
-        if query.exec_():
-            if query.next():
-                wsta_ceau_id = query.value(0)
+        # Récupération de la station, de la rivière et de la présence de géométrie en une seule requête
+        enregistrement = self.gc.chargeEnregistrement(self.queryEnregistrement, [wopest_id])
+        if enregistrement is None:
+            QMessageBox.critical(self, u"Erreur SQL", u"Erreur au chargement de l'enregistrement dans le rowChange() : \n" + self.queryEnregistrement.lastError().text(), QMessageBox.Ok)
+            enregistrement = {}
+        wope_sta_id = enregistrement.get("ope_sta_id", "")
+        wsta_ceau_id = enregistrement.get("sta_ceau_id", "")
+        self.geomExiste = enregistrement.get("geom_existe", False)
+        if wope_sta_id != "":
+            self.currentStation = wope_sta_id
 
         # Sélection de la rivière
         result = self.cmbRiviere.model().match(self.cmbRiviere.model().index(0, 0), Qt.EditRole, wsta_ceau_id, -1, Qt.MatchExactly)
@@ -721,17 +749,20 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             indexNR = self.cmbRiviere.count()
             self.cmbRiviere.setCurrentIndex(indexNR - 1)
 
-        # Filtrage station
-        self.modelStation.clear()
-        wrelation = "station"
-        if self.dbType == "postgres":
-            wrelation = self.dbSchema + "." + wrelation
-        self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wsta_ceau_id), self.db)
-        if self.modelStation.lastError().isValid():
-            QMessageBox.critical(self, u"Remplissage du modèl", u"Erreur au modèle Station dans le rowChange() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+        # Filtrage station, uniquement si la rivière ou les stations diffèrent de celles déjà chargées
+        if self.ceauStation != (wsta_ceau_id, Gedopi_reference.versionStations):
+            self.modelStation.clear()
+            wrelation = "station"
+            if self.dbType == "postgres":
+                wrelation = self.dbSchema + "." + wrelation
+            self.modelStation.setQuery("select sta_id, sta_id || ' ; ' || sta_nom from " + wrelation + " where sta_ceau_id = '%s' order by sta_id;" % str(wsta_ceau_id), self.db)
+            if self.modelStation.lastError().isValid():
+                QMessageBox.critical(self, u"Remplissage du modèle", u"Erreur au modèle Station dans le rowChange() : \n" + self.modelStation.lastError().text(), QMessageBox.Ok)
+            else:
+                self.ceauStation = (wsta_ceau_id, Gedopi_reference.versionStations)
 
-        self.cmbStation.setModel(self.modelStation)
-        self.cmbStation.setModelColumn(1)
+            self.cmbStation.setModel(self.modelStation)
+            self.cmbStation.setModelColumn(1)
 
         # Sélection station
         result = self.cmbStation.model().match(self.cmbStation.model().index(0, 0), Qt.EditRole, wope_sta_id, -1, Qt.MatchExactly)
@@ -749,22 +780,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.verrouillage()
         self.verrouillageModif()
 
-        # Vérifie la présence d'une géométrie
-        if self.mapper:
-            row = self.mapper.currentIndex()
-            if row >= 0:
-                record = self.modelThermi.record(row)
-                wid = record.value("opest_id")
-
-                layer = self.gc.getLayerFromLegendByTableProps('ope_suivi_thermi', 'opest_geom', '')
-                request = QgsFeatureRequest().setFilterFids([wid])
-
-                it = layer.getFeatures(request)
-                extent = None
-                for x in it:
-                    extent = x.geometry()
-                if extent == None:
-                    self.iface.messageBar().pushMessage("Attention : ", u"Ce suivi thermique ne possède pas de géométrie.", level= QgsMessageBar.WARNING, duration = 5)
+        # Vérifie la présence d'une géométrie (information issue de la requête de l'enregistrement)
+        if not self.geomExiste:
+            self.iface.messageBar().pushMessage("Attention : ", u"Ce suivi thermique ne possède pas de géométrie.", level= QgsMessageBar.WARNING, duration = 5)
 
     def zoomThermi(self):
         '''Permet de zoomer le canevas de la carte sur le suivi courant'''
@@ -838,13 +856,208 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.excelBool = True
 
     def importCsv(self):
-        ''' Permet d'importer un fichier CSV compatible, issu de la macro Excel Macma Salmo'''
-
+        '''
+        Permet d'importer un fichier CSV compatible, issu de la macro Excel Macma Salmo,
+        ou directement le fichier des relevés bruts de l'enregistreur dont les indicateurs sont alors calculés
+        '''
         self.cheminCsv = ""
-        self.cheminCsv = QFileDialog.getOpenFileName(self, "Open File", "", "CSV (*.csv)")
-        self.cheminCsv = unicode(self.cheminCsv)
+        self.cheminCsv = QFileDialog.getOpenFileName(self, "Open File", "", "CSV (*.csv *.txt)")[0]
         self.saisieAuto()
 
+    def importGroupe(self):
+        '''
+        Permet d'importer en une fois les fichiers des enregistreurs d'un répertoire
+        à l'aide d'un fichier de correspondance " fichier;sta_id;ope_code[;x;y] "
+        '''
+        if numpy is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Le module numpy est nécessaire au calcul des indicateurs ...", level=QgsMessageBar.CRITICAL, duration=5)
+            return
+        dossier = QFileDialog.getExistingDirectory(self, u"Répertoire des fichiers d'enregistreurs")
+        if dossier == "":
+            return
+        manifeste = QFileDialog.getOpenFileName(self, u"Fichier de correspondance", dossier, "CSV (*.csv)")[0]
+        if manifeste == "":
+            return
+
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        importThermi = Import_thermi(self.db, self.dbSchema)
+        nbSuivi, rapport = importThermi.importe(dossier, manifeste)
+        QApplication.restoreOverrideCursor()
+
+        if nbSuivi is None:
+            QMessageBox.critical(self, u"Erreur - Import groupé", importThermi.erreur, QMessageBox.Ok)
+            return
+        echecs = [fichier + " : " + message for fichier, code, duree, message in rapport if message != ""]
+        nbFichier = len(set(fichier for fichier, code, duree, message in rapport))
+        texte = str(nbSuivi) + u" suivi(s) créé(s) sur " + str(nbFichier) + u" fichier(s) en " + str(round(sum(duree for fichier, code, duree, message in rapport), 1)) + " s de calcul."
+        if len(echecs) > 0:
+            texte += u"\n\nFichiers en erreur :\n" + "\n".join(echecs)
+        QMessageBox.information(self, u"Import groupé", texte, QMessageBox.Ok)
+
+        if nbSuivi > 0:
+            self.modelThermi.select()
+            self.row_count = self.modelThermi.rowCount()
+            self.mapper.toLast()
+            self.mc.refresh()
+
+    def afficheCourbe(self):
+        '''
+        Affiche la courbe des températures du suivi courant : agrégats journaliers de mesure_thermi_jour
+        (les relevés bruts de mesure_thermi ne sont lus qu'au zoom), à défaut fichier joint au suivi
+        s'il s'agit de relevés bruts, à défaut fichier choisi par l'utilisateur
+        '''
+        if numpy is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Le module numpy est nécessaire à l'affichage de la courbe ...", level=QgsMessageBar.CRITICAL, duration=5)
+            return
+
+        record = self.modelThermi.record(self.row_courant)
+        wopest_id = record.value("opest_id")
+        stock = Stock_thermi(self.db, self.dbSchema)
+        serie = None
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        journalier = stock.journalier(wopest_id)
+        if journalier is None:
+            # opest_excel est le fichier joint au suivi (le plus souvent la synthèse de la macro Macma Salmo) :
+            # il n'est lu que s'il contient des relevés bruts, une synthèse ne permet pas de tracer la courbe
+            chemin = record.value("opest_excel")
+            if chemin and os.path.isfile(str(chemin)) and Calcul_thermi.estSerieBrute(str(chemin)):
+                try:
+                    serie = Calcul_thermi.lireSerie(str(chemin))
+                except ValueError:
+                    serie = None
+        QApplication.restoreOverrideCursor()
+
+        if journalier is None and serie is None:
+            chemin = QFileDialog.getOpenFileName(self, u"Relevés bruts du suivi", "", "CSV (*.csv *.txt)")[0]
+            if chemin == "":
+                return
+            try:
+                serie = Calcul_thermi.lireSerie(chemin)
+            except ValueError:
+                self.iface.messageBar().pushMessage("Erreur : ", u"Le fichier CSV n'est pas valide, vérifiez son contenu ...", level=QgsMessageBar.CRITICAL, duration=5)
+                return
+
+        dialog = Courbe_thermi_dialog(self.leCodeOpe.text())
+        if journalier is not None:
+            jours, tMin, tMoy, tMax = journalier
+            dialog.courbe.ajouteSerieJournaliere(self.leCodeOpe.text(), jours, tMin, tMax,
+                lambda debut, fin: stock.serie(wopest_id, debut, fin))
+        else:
+            dialog.courbe.ajouteSerie(self.leCodeOpe.text(), serie[0], serie[1])
+        for champ, libelle in [(self.datePonte, u"D50 ponte"), (self.dateEclosion, u"D50 éclosion"), (self.dateEmergence, u"D50 émergence")]:
+            if champ.date().isValid():
+                dialog.courbe.ajouteRepere(champ.date().toPyDate(), libelle)
+        dialog.setWindowModality(Qt.ApplicationModal)
+        dialog.exec_()
+
+    def stockeSerie(self, wope_code):
+        '''
+        Enregistre dans mesure_thermi les relevés bruts importés pour le suivi,
+        sans effet si le suivi n'a pas été saisi à partir d'un fichier de relevés bruts
+
+        :param wope_code: code de l'opération du suivi
+        :type wope_code: str
+        '''
+        if self.serieBrute is None:
+            return
+        dates, temperatures = self.serieBrute
+        self.serieBrute = None
+
+        query = QSqlQuery(self.db)
+        wrelation = "ope_suivi_thermi"
+        if self.dbType == "postgres":
+            wrelation = self.dbSchema + "." + wrelation
+        query.prepare("SELECT opest_id FROM " + wrelation + " WHERE opest_ope_code = ?")
+        query.addBindValue(wope_code)
+        if not query.exec_() or not query.next():
+            QMessageBox.critical(self, u"Erreur - Relevés bruts", query.lastError().text(), QMessageBox.Ok)
+            return
+        wopest_id = query.value(0)
+
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        stock = Stock_thermi(self.db, self.dbSchema)
+        if not stock.enregistre(wopest_id, dates, temperatures):
+            QApplication.restoreOverrideCursor()
+            QMessageBox.critical(self, u"Erreur - Relevés bruts", stock.erreur, QMessageBox.Ok)
+            return
+        QApplication.restoreOverrideCursor()
+
+    def recalculIndicateurs(self):
+        '''
+        Recalcule les indicateurs du suivi courant à partir de ses relevés bruts enregistrés dans mesure_thermi
+        (date de ponte modifiée, évolution du calcul), sans avoir à réimporter le fichier de l'enregistreur
+        '''
+        if numpy is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Le module numpy est nécessaire au calcul des indicateurs ...", level=QgsMessageBar.CRITICAL, duration=5)
+            return
+
+        record = self.modelThermi.record(self.row_courant)
+        stock = Stock_thermi(self.db, self.dbSchema)
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        serie = stock.serie(record.value("opest_id"))
+        QApplication.restoreOverrideCursor()
+        if serie is None:
+            if stock.erreur != "":
+                QMessageBox.critical(self, u"Erreur - Relevés bruts", stock.erreur, QMessageBox.Ok)
+            else:
+                self.iface.messageBar().pushMessage("Info : ", u"Aucun relevé brut n'est enregistré pour ce suivi ...", level=QgsMessageBar.INFO, duration=5)
+            return
+        self.calculIndicateurs(serie)
+
+    def calculIndicateurs(self, serie = None):
+        '''
+        Calcule les indicateurs à partir des relevés bruts et les copie dans les champs correspondant
+
+        :param serie: (dates, températures) déjà enregistrées dans mesure_thermi,
+                à défaut les relevés du fichier importé, enregistrés avec le suivi
+        :type serie: tuple
+        '''
+        if numpy is None:
+            self.iface.messageBar().pushMessage("Erreur : ", u"Le module numpy est nécessaire au calcul des indicateurs ...", level=QgsMessageBar.CRITICAL, duration=5)
+            return
+
+        QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+        try:
+            if serie is None:
+                dates, temperatures = Calcul_thermi.lireSerie(self.cheminCsv)
+            else:
+                dates, temperatures = serie
+            dates, temperatures, controle = Controle_thermi.controle(dates, temperatures)
+            datePonte = self.datePonte.date().toPyDate()
+            indicateurs = Calcul_thermi.indicateurs(dates, temperatures, datePonte)
+            if serie is None:
+                self.serieBrute = (dates, temperatures)
+        except ValueError:
+            QApplication.restoreOverrideCursor()
+            if serie is None:
+                self.iface.messageBar().pushMessage("Erreur : ", u"Le fichier CSV n'est pas valide, vérifiez son contenu ...", level=QgsMessageBar.CRITICAL, duration=5)
+            else:
+                self.iface.messageBar().pushMessage("Erreur : ", u"Aucun relevé enregistré n'est valide après le contrôle qualité ...", level=QgsMessageBar.CRITICAL, duration=5)
+            return
+
+        champs = {"opest_date_debut": self.dateDebut, "opest_date_fin": self.dateFin, "opest_duree": self.spnDuree, "opest_ti_max": self.spnTiMax,
+            "opest_ti_min": self.spnTiMin, "opest_ajmax_ti": self.spnAjmaxTi, "opest_d_ajmax_ti": self.dateAjmaxTi, "opest_tmj_min": self.spnTmjMin,
+            "opest_tmj_max": self.spnTmjMax, "opest_tmp_moy": self.spnTmpMoy, "opest_tm30j_max": self.spnTm30jMax, "opest_nbj_tmj_4_19": self.spnNbjTmj4_19,
+            "opest_p100j_tmj_4_19": self.spnTmj4_19, "opest_p100_tmj_inf_4": self.spnTmjInf4, "opest_p100_tmj_sup_19": self.spnTmjSup19,
+            "opest_nbmax_ti_csf_sup19": self.spnCsfSup19, "opest_nbmax_ti_csf_sup_eg25": self.spnCsfSupeg25, "opest_nbmax_ti_csf_sup_eg15": self.spnCsfSupeg15,
+            "opest_d50_ponte": self.datePonte, "opest_nbj_incub": self.spnIncubation, "opest_d50_eclo": self.dateEclosion, "opest_nbj_rsp": self.spnResorption,
+            "opest_d50_emg": self.dateEmergence, "opest_nbj_pel": self.spnNbjPel, "opest_nb_ti_sup15_pel": self.spnSup15pel,
+            "opest_nbmax_ti_csf_sup15_pel": self.spnCsfSup15pel, "opest_nb_ti_inf_1_5pel": self.spnInf1_5pel, "opest_nbmax_ti_csf_inf1_5_pel": self.spnCsfInf1_5pel}
+        for colonne, champ in champs.items():
+            valeur = indicateurs.get(colonne)
+            if valeur is None:
+                continue
+            if hasattr(valeur, "year"):
+                champ.setDate(QDate(valeur.year, valeur.month, valeur.day))
+            else:
+                champ.setValue(valeur)
+        QApplication.restoreOverrideCursor()
+
+        if Controle_thermi.anomalie(controle):
+            QMessageBox.information(self, u"Contrôle qualité des relevés", Controle_thermi.texteRapport(controle), QMessageBox.Ok)
+        if indicateurs["opest_d50_emg"] is None:
+            self.iface.messageBar().pushMessage("Info : ", u"La période enregistrée ne permet pas de calculer toute la phénologie ...", level=QgsMessageBar.INFO, duration=5)
+
     def supprimer(self):
         '''Permet de supprimer le suivi courant ainsi que toutes les données liées (cascade)'''
 
@@ -908,6 +1121,7 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
         self.mapper.revert()
 
         self.boolNew = False
+        self.serieBrute = None
         self.btnCoordonnee.setChecked(False)
         if self.point_click != "":
             self.mc.scene().removeItem(self.point_click)
@@ -1081,6 +1295,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
                                 else :
                                     QMessageBox.critical(self, u"Erreur - Ajout d'un noeud", "Cette couche ne peut pas / plus changer sa géométrie!", QMessageBox.Ok)
 
+                # Conservation des relevés bruts de l'enregistreur
+                self.stockeSerie(wopest_ope_code)
+
                 # Màj du nombre d'enregistrement
                 self.row_count += 1
                 if self.row_count == 1:
@@ -1252,6 +1469,9 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
                     if not query.exec_():
                         QMessageBox.critical(self, u"Erreur - Modification du suivi et de sa géométrie", query.lastError().text(), QMessageBox.Ok)
 
+                # Conservation des relevés bruts si un nouveau fichier a été importé
+                self.stockeSerie(wopest_ope_code)
+
             # Suppression des marqueurs sur le canevas
             if self.point_click != "":
                 self.mc.scene().removeItem(self.point_click)
@@ -1342,32 +1562,19 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             else:
                 ptThermi = self.layerPoint
 
-            # Import virtuel de la couche des cours d'eau
-            uri = QgsDataSourceURI()
-            uri.setConnection("localhost", "5432", self.dbname, self.password, self.user)
-            uri.setDataSource("data", "cours_eau", "ceau_geom")
-            vlayer = QgsVectorLayer(uri.uri(), "riviere", "postgres")
-            if not vlayer.isValid():
-                self.iface.messageBar().pushMessage("Erreur : ", u"Layer failed Rivière to load !", level= QgsMessageBar.CRITICAL, duration = 5)
-            # Calcul de la distance la plus courte entre le point et la rivière et modification du point
-            shortestDistance = float("inf")
+            # Accrochage du point à la rivière la plus proche (requête KNN sur l'index spatial)
             self.wthermi_geom = ""
             self.pointThermi = ""
             self.point_click = ""
-            x = ""
-            y = ""
-            for f in vlayer.getFeatures():
-                dist = f.geometry().distance( QgsGeometry.fromPoint( ptThermi) )
-                if dist < shortestDistance:
-                    shortestDistance = dist
-                    inter = f.geometry().nearestPoint( QgsGeometry.fromPoint( ptThermi ) )
-                    pointTher = inter.vertexAt(0)
-                    self.addVertex = pointTher
+            accroche = self.accrochage.accroche(ptThermi)
+            if accroche is not None:
+                pointTher = accroche[0]
+                self.addVertex = pointTher
 
-            self.pointThermi = QgsPoint(pointTher)
+                self.pointThermi = QgsPoint(pointTher)
 
-            self.point_click = QgsVertexMarker(self.mc)
-            self.point_click.setCenter(self.pointThermi)
+                self.point_click = QgsVertexMarker(self.mc)
+                self.point_click.setCenter(pointTher)
 
             if pointTher != "":
                 pt_wkt = QgsPoint(pointTher).wellKnownText()
@@ -1381,8 +1588,12 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.btnCoordonnee.setChecked(False)
             QApplication.restoreOverrideCursor()
 
+        # Relevés bruts de l'enregistreur : calcul des indicateurs
+        if self.cheminCsv != "" and Calcul_thermi.estSerieBrute(self.cheminCsv):
+            self.calculIndicateurs()
+
         # Copie des données du CSV dans les champs correspondant
-        if self.cheminCsv != "" :
+        elif self.cheminCsv != "" :
             listValeur = []
             chaine_nom = ""
             chaine_valeur = ""
@@ -1614,6 +1825,7 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.cmbRiviere.setEnabled(False)
             self.cmbStation.setEnabled(False)
             self.btnImpCsv.setEnabled(False)
+            self.btnRecalcul.setEnabled(False)
             self.btnCoordonnee.setEnabled(False)
             self.btnAjoutFiche.setEnabled(False)
             self.btnRetraitFiche.setEnabled(False)
@@ -1625,6 +1837,8 @@ class Suivi_thermi_dialog(QDockWidget, Ui_dwcThermiMainForm):
             self.cmbRiviere.setEnabled(True)
             self.cmbStation.setEnabled(True)
             self.btnImpCsv.setEnabled(True)
+            # Les relevés bruts ne sont enregistrés que pour un suivi existant
+            self.btnRecalcul.setEnabled(not self.boolNew)
             self.btnCoordonnee.setEnabled(True)
             self.codeOpe = self.leCodeOpe.text()
             self.btnAjoutFiche.setEnabled(True)
@@ -1790,6 +2004,11 @@ class Fiche_station(QDialog, Ui_dlgStationForm):
                 self.lePhoto.setText(wphoto)
                 self.leNom.setText(wnom)
 
+        # Position de la station sur le réseau hydrographique (distance à la confluence, stations amont / aval)
+        confluence, position = Reseau_station(self.db, self.dbSchema).texteFiche(self.wsta_id)
+        self.leConfluence.setText(confluence)
+        self.leReseau.setText(position)
+
         chemin = unicode(self.lePhoto.text())
         if chemin != "" or chemin != "***":
             size = self.size()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+# Ce script permet l'import groupé des fichiers d'enregistreurs thermiques dans ope_suivi_thermi.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import csv
+import os
+import time
+from PyQt5.QtSql import (QSqlQuery)
+from qgis.core import (QgsMessageLog)
+
+# Import du calcul des indicateurs thermiques et du stockage des relevés bruts
+from .opeSuiviCalcul import (Calcul_thermi, Controle_thermi)
+from .opeSuiviStock import (Stock_thermi)
+
+# Import de la Class Gedopi_session pour la connexion directe (COPY) partagée par le lot
+from .commonDialogs import (Gedopi_session, psycopg2)
+
+class Import_thermi():
+    '''
+    Import groupé de suivis thermiques : un répertoire de fichiers d'enregistreurs et un fichier de correspondance
+    " fichier;sta_id;ope_code[;x;y] " (x et y en Lambert 93, à défaut les coordonnées aval de la station).
+
+    Les fichiers sont lus et leurs indicateurs calculés l'un après l'autre : la lecture (csv, strptime) est du Python pur
+    que des threads ou des QgsTask ne parallélisent pas (verrou global de l'interpréteur), et des processus ne sont pas
+    utilisables dans QGIS (multiprocessing relance l'exécutable de QGIS sous Windows, l'extension n'est pas importable
+    hors de QGIS). Toutes les opérations et tous les suivis sont ensuite créés par deux INSERT multi-lignes
+    dans une seule transaction : l'import est complet ou n'a pas lieu.
+    Les relevés bruts sont ensuite enregistrés suivi par suivi (COPY) sur une seule connexion directe ;
+    un suivi créé dont les relevés n'ont pu être enregistrés figure en erreur dans le rapport.
+    '''
+    # Colonnes de ope_suivi_thermi alimentées par le calcul des indicateurs
+    colonnes = ["opest_date_debut", "opest_date_fin", "opest_duree", "opest_ti_min", "opest_ti_max", "opest_ajmax_ti", "opest_d_ajmax_ti",
+        "opest_tmj_min", "opest_tmj_max", "opest_tmp_moy", "opest_tm30j_max", "opest_nbj_tmj_4_19", "opest_p100j_tmj_4_19", "opest_p100_tmj_inf_4",
+        "opest_p100_tmj_sup_19", "opest_nbmax_ti_csf_sup19", "opest_nbmax_ti_csf_sup_eg25", "opest_nbmax_ti_csf_sup_eg15", "opest_d50_ponte",
+        "opest_nbj_incub", "opest_d50_eclo", "opest_nbj_rsp", "opest_d50_emg", "opest_nbj_pel", "opest_nb_ti_sup15_pel", "opest_nbmax_ti_csf_sup15_pel",
+        "opest_nb_ti_inf_1_5pel", "opest_nbmax_ti_csf_inf1_5_pel"]
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def lireManifeste(self, chemin):
+        '''
+        Lit le fichier de correspondance, les lignes d'en-tête ou incomplètes sont ignorées
+
+        :param chemin: chemin du fichier de correspondance
+        :type chemin: str
+
+        :return: (liste de dictionnaires {fichier, sta_id, ope_code, x, y},
+                lignes rejetées [(fichier, ope_code, durée en seconde, erreur)] à ajouter au rapport)
+        :rtype: tuple
+        '''
+        lignes = []
+        rejets = []
+        with open(chemin, 'rt', errors = 'replace') as csvfile:
+            for elt in csv.reader(csvfile, delimiter = ';'):
+                elt = [valeur.strip() for valeur in elt]
+                if len(elt) < 3 or not elt[1].isdigit() or elt[2] == "":
+                    continue
+                ligne = {"fichier": elt[0], "sta_id": int(elt[1]), "ope_code": elt[2], "x": None, "y": None}
+                if len(elt) >= 5 and elt[3] != "" and elt[4] != "":
+                    try:
+                        ligne["x"] = float(elt[3].replace(',', '.'))
+                        ligne["y"] = float(elt[4].replace(',', '.'))
+                    except ValueError:
+                        rejets.append((elt[0], elt[2], 0.0, u"coordonnées illisibles (" + elt[3] + " ; " + elt[4] + ")"))
+                        continue
+                lignes.append(ligne)
+        return lignes, rejets
+
+    @staticmethod
+    def calcule(chemin):
+        '''
+        Contrôle la série d'un fichier puis calcule ses indicateurs
+
+        :return: (indicateurs, (dates, températures) contrôlées, durée en seconde, message d'erreur, rapport de contrôle)
+        :rtype: tuple
+        '''
+        debut = time.time()
+        try:
+            dates, temperatures = Calcul_thermi.lireSerie(chemin)
+            dates, temperatures, controle = Controle_thermi.controle(dates, temperatures)
+            return Calcul_thermi.indicateurs(dates, temperatures), (dates, temperatures), time.time() - debut, "", controle
+        except Exception as e:
+            return None, None, time.time() - debut, str(e), None
+
+    def coordonneesStation(self, listSta):
+        '''
+        Renvoi en une requête les coordonnées aval des stations
+
+        :param listSta: identifiants des stations
+        :type listSta: list
+
+        :rtype: dict {sta_id : (x, y)}
+        '''
+        coordonnees = {}
+        if len(listSta) == 0:
+            return coordonnees
+        query = QSqlQuery(self.db)
+        if query.exec_("select sta_id, sta_xl93_aval, sta_yl93_aval from " + self.relation("station") +
+            " where sta_id in (" + ",".join(str(int(sta)) for sta in set(listSta)) + ")"):
+            while query.next():
+                coordonnees[query.value(0)] = (query.value(1), query.value(2))
+        return coordonnees
+
+    def importe(self, dossier, manifeste):
+        '''
+        Importe les fichiers du répertoire listés dans le fichier de correspondance
+
+        :param dossier: répertoire des fichiers d'enregistreurs
+        :type dossier: str
+
+        :param manifeste: chemin du fichier de correspondance
+        :type manifeste: str
+
+        :return: (nombre de suivis créés, rapport [(fichier, ope_code, durée en seconde, erreur)]),
+                le nombre vaut None si la transaction a échoué (voir self.erreur),
+                un fichier peut figurer deux fois au rapport si son suivi est créé sans ses relevés bruts
+        :rtype: tuple
+        '''
+        self.erreur = ""
+        lignes, rapport = self.lireManifeste(manifeste)
+        chemins = [os.path.join(dossier, ligne["fichier"]) for ligne in lignes]
+        # Traitement séquentiel : ni threads ni processus ne sont utilisables ici (voir la description de la classe)
+        resultats = [self.calcule(chemin) for chemin in chemins]
+
+        valides = []
+        series = {}
+        for ligne, (indicateurs, serie, duree, message, controle) in zip(lignes, resultats):
+            rapport.append((ligne["fichier"], ligne["ope_code"], duree, message))
+            if controle is not None and Controle_thermi.anomalie(controle):
+                QgsMessageLog.logMessage(u"Contrôle qualité " + ligne["fichier"] + " :\n" + Controle_thermi.texteRapport(controle), "Gedopi")
+            if indicateurs is not None:
+                valides.append((ligne, indicateurs))
+                series[ligne["ope_code"]] = serie
+        for fichier, code, duree, message in rapport:
+            QgsMessageLog.logMessage(u"Import thermique " + fichier + " (" + code + ") : " + str(round(duree, 2)) + " s " + message, "Gedopi")
+        if len(valides) == 0:
+            return 0, rapport
+
+        coordonnees = self.coordonneesStation([ligne["sta_id"] for ligne, indicateurs in valides if ligne["x"] is None])
+
+        queryOpe = QSqlQuery(self.db)
+        queryOpe.prepare("insert into " + self.relation("operation") + " (ope_code, ope_sta_id) values " + ", ".join(["(?, ?)"] * len(valides)))
+        for ligne, indicateurs in valides:
+            queryOpe.addBindValue(ligne["ope_code"])
+            queryOpe.addBindValue(ligne["sta_id"])
+
+        queryThermi = QSqlQuery(self.db)
+        valeurs = "(" + ", ".join(["?"] * (len(self.colonnes) + 2)) + ", ST_SetSRID(ST_MakePoint(?, ?), 2154))"
+        queryThermi.prepare("insert into " + self.relation("ope_suivi_thermi") + " (" + ", ".join(self.colonnes) + ", opest_ope_code, opest_timax_id, opest_geom) values " +
+            ", ".join([valeurs] * len(valides)))
+        for ligne, indicateurs in valides:
+            for colonne in self.colonnes:
+                valeur = indicateurs[colonne]
+                if hasattr(valeur, "isoformat"):
+                    valeur = valeur.isoformat()
+                queryThermi.addBindValue(valeur)
+            queryThermi.addBindValue(ligne["ope_code"])
+            queryThermi.addBindValue(Calcul_thermi.classeTiMax(indicateurs["opest_ti_max"]))
+            x, y = ligne["x"], ligne["y"]
+            if x is None:
+                x, y = coordonnees.get(ligne["sta_id"], (None, None))
+            queryThermi.addBindValue(x)
+            queryThermi.addBindValue(y)
+
+        self.db.transaction()
+        if not queryOpe.exec_():
+            self.erreur = queryOpe.lastError().text()
+            self.db.rollback()
+            return None, rapport
+        if not queryThermi.exec_():
+            self.erreur = queryThermi.lastError().text()
+            self.db.rollback()
+            return None, rapport
+        self.db.commit()
+
+        # Conservation des relevés bruts de chaque suivi créé, par une seule connexion directe (COPY) pour tout le lot
+        fichiers = dict((ligne["ope_code"], ligne["fichier"]) for ligne, indicateurs in valides)
+        stock = Stock_thermi(self.db, self.dbSchema)
+        connexion = None
+        if psycopg2 is not None:
+            try:
+                connexion = Gedopi_session.connexionDirecte(self.db)
+            except psycopg2.Error as e:
+                QgsMessageLog.logMessage(u"Connexion directe impossible, relevés bruts enregistrés suivi par suivi : " + str(e), "Gedopi")
+        try:
+            query = QSqlQuery(self.db)
+            query.prepare("select opest_id, opest_ope_code from " + self.relation("ope_suivi_thermi") + " where opest_ope_code = any(?::text[])")
+            query.addBindValue("{" + ",".join('"' + code.replace('"', '\\"') + '"' for code in series.keys()) + "}")
+            if not query.exec_():
+                for code in series.keys():
+                    rapport.append((fichiers[code], code, 0.0, u"suivi créé, relevés bruts non enregistrés : " + query.lastError().text()))
+            while query.next():
+                dates, temperatures = series[query.value(1)]
+                if not stock.enregistre(query.value(0), dates, temperatures, connexion):
+                    rapport.append((fichiers[query.value(1)], query.value(1), 0.0, u"suivi créé, relevés bruts non enregistrés : " + stock.erreur))
+                    QgsMessageLog.logMessage(u"Relevés bruts non enregistrés pour " + query.value(1) + " : " + stock.erreur, "Gedopi")
+        finally:
+            if connexion is not None:
+                connexion.close()
+        return len(valides), rapport
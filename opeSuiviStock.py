@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# Ce script permet la conservation des relevés bruts des enregistreurs thermiques et de leurs agrégats journaliers.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import io
+from PyQt5.QtSql import (QSqlQuery)
+from qgis.core import (QgsMessageLog)
+
+# Import de la Class Gedopi_session pour les transferts en masse (COPY)
+from .commonDialogs import (Gedopi_session, psycopg2)
+
+# numpy est fourni avec QGIS, son absence est tout de même gérée par le formulaire
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class Stock_thermi():
+    '''
+    Stockage des relevés bruts d'un suivi thermique (table mesure_thermi, liée à opest_id)
+    et de leurs agrégats journaliers précalculés (table mesure_thermi_jour).
+
+    Les relevés sont chargés par lots avec COPY ... FROM STDIN lorsque psycopg2 est disponible,
+    à défaut par des INSERT ensemblistes (unnest de tableaux liés) via la connexion QPSQL.
+    Les agrégats journaliers sont recalculés par le serveur au chargement : la courbe s'ouvre sur eux et ne lit
+    les relevés bruts que de la période zoomée. Les lectures sont agrégées par le serveur en une seule ligne
+    (string_agg) convertie par numpy, sans parcours ligne à ligne. Les tables sont créées une fois
+    par data/postgresql/migration_mesure_thermi.sql, le plugin vérifie seulement leur présence.
+    '''
+    # Nombre de relevés envoyés par lot
+    tailleLot = 50000
+    # Bases dont les tables ont été trouvées pendant la session : (hôte, base, schéma)
+    installations = set()
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.tableMesure = self.relation("mesure_thermi")
+        self.tableJour = self.relation("mesure_thermi_jour")
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def installe(self):
+        '''
+        Vérifie la présence des tables des relevés et des agrégats journaliers,
+        créées par data/postgresql/migration_mesure_thermi.sql
+
+        :return: False si les tables sont absentes (voir self.erreur)
+        :rtype: bool
+        '''
+        cle = (self.db.hostName(), self.db.databaseName(), self.dbSchema)
+        if cle in Stock_thermi.installations:
+            return True
+        query = QSqlQuery(self.db)
+        query.prepare("select to_regclass(?) is not null and to_regclass(?) is not null")
+        query.addBindValue(self.tableMesure)
+        query.addBindValue(self.tableJour)
+        if not query.exec_() or not query.next():
+            self.erreur = query.lastError().text()
+            return False
+        if not query.value(0):
+            self.erreur = (u"Les tables " + self.tableMesure + u" et " + self.tableJour + u" n'existent pas, " +
+                u"elles sont créées par data/postgresql/migration_mesure_thermi.sql")
+            return False
+        # Seule la présence est conservée : une migration passée en cours de session est prise en compte
+        Stock_thermi.installations.add(cle)
+        return True
+
+    def requeteJournalier(self, opest_id):
+        '''Renvoi la requête de calcul des agrégats journaliers d'un suivi à partir de ses relevés'''
+
+        return ("insert into " + self.tableJour + " (mtj_opest_id, mtj_jour, mtj_min, mtj_moy, mtj_max, mtj_nb) " +
+            "select mth_opest_id, mth_date::date, min(mth_temperature), avg(mth_temperature), max(mth_temperature), count(*) from " + self.tableMesure +
+            " where mth_opest_id = " + str(int(opest_id)) + " group by mth_opest_id, mth_date::date")
+
+    def enregistre(self, opest_id, dates, temperatures, connexion = None):
+        '''
+        Remplace les relevés d'un suivi puis recalcule ses agrégats journaliers, en une seule transaction
+
+        :param opest_id: identifiant du suivi
+        :type opest_id: int
+
+        :param dates: dates des relevés
+        :type dates: numpy.ndarray datetime64
+
+        :param temperatures: températures instantanées
+        :type temperatures: numpy.ndarray
+
+        :param connexion: connexion psycopg2 ouverte par l'appelant (Gedopi_session.connexionDirecte) et réutilisée
+                pour plusieurs suivis, à défaut une connexion est ouverte puis fermée pour ce seul suivi
+        :type connexion: psycopg2.extensions.connection
+
+        :return: False si l'enregistrement a échoué (voir self.erreur)
+        :rtype: bool
+        '''
+        self.erreur = ""
+        if not self.installe():
+            return False
+        opest_id = int(opest_id)
+        horodatages = numpy.datetime_as_string(dates.astype('datetime64[s]'), unit = 's')
+        valeurs = numpy.char.mod('%.3f', temperatures)
+        suppressions = ["delete from " + self.tableJour + " where mtj_opest_id = " + str(opest_id),
+            "delete from " + self.tableMesure + " where mth_opest_id = " + str(opest_id)]
+
+        if psycopg2 is not None:
+            # La connexion fournie par l'appelant reste ouverte, chaque suivi est validé séparément
+            fermer = connexion is None
+            try:
+                if fermer:
+                    connexion = Gedopi_session.connexionDirecte(self.db)
+                curseur = connexion.cursor()
+                for requete in suppressions:
+                    curseur.execute(requete)
+                for debut in range(0, len(horodatages), self.tailleLot):
+                    lot = io.StringIO()
+                    prefixe = str(opest_id) + "\t"
+                    lot.write("".join(prefixe + h + "\t" + v + "\n" for h, v in zip(horodatages[debut:debut + self.tailleLot], valeurs[debut:debut + self.tailleLot])))
+                    lot.seek(0)
+                    curseur.copy_expert("copy " + self.tableMesure + " (mth_opest_id, mth_date, mth_temperature) from stdin", lot)
+                curseur.execute(self.requeteJournalier(opest_id))
+                connexion.commit()
+            except psycopg2.Error as e:
+                if connexion is not None:
+                    connexion.rollback()
+                self.erreur = str(e)
+                return False
+            finally:
+                if fermer and connexion is not None:
+                    connexion.close()
+        else:
+            self.db.transaction()
+            query = QSqlQuery(self.db)
+            for requete in suppressions:
+                if not query.exec_(requete):
+                    self.erreur = query.lastError().text()
+                    self.db.rollback()
+                    return False
+            query.prepare("insert into " + self.tableMesure + " (mth_opest_id, mth_date, mth_temperature) " +
+                "select ?, unnest(?::timestamp[]), unnest(?::real[])")
+            for debut in range(0, len(horodatages), self.tailleLot):
+                query.bindValue(0, opest_id)
+                query.bindValue(1, "{" + ",".join(horodatages[debut:debut + self.tailleLot]) + "}")
+                query.bindValue(2, "{" + ",".join(valeurs[debut:debut + self.tailleLot]) + "}")
+                if not query.exec_():
+                    self.erreur = query.lastError().text()
+                    self.db.rollback()
+                    return False
+            if not query.exec_(self.requeteJournalier(opest_id)):
+                self.erreur = query.lastError().text()
+                self.db.rollback()
+                return False
+            self.db.commit()
+
+        QgsMessageLog.logMessage(str(len(horodatages)) + u" relevés thermiques enregistrés pour le suivi " + str(opest_id), "Gedopi")
+        return True
+
+    @staticmethod
+    def tableau(texte, dtype):
+        '''
+        Convertit une liste de valeurs séparées par des virgules (string_agg) en tableau numpy
+
+        :rtype: numpy.ndarray
+        '''
+        if not texte:
+            return numpy.array([], dtype = dtype)
+        return numpy.fromstring(texte, dtype = dtype, sep = ",")
+
+    def journalier(self, opest_id):
+        '''
+        Renvoi les agrégats journaliers d'un suivi
+
+        :param opest_id: identifiant du suivi
+        :type opest_id: int
+
+        :return: (jours, minimum, moyenne, maximum), None si aucun relevé n'est stocké
+        :rtype: tuple
+        '''
+        self.erreur = ""
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        # Une seule ligne agrégée par le serveur : les jours sont comptés depuis le 01/01/1970
+        if not query.exec_("select string_agg((mtj_jour - date '1970-01-01')::text, ',' order by mtj_jour), " +
+            "string_agg(mtj_min::text, ',' order by mtj_jour), string_agg(mtj_moy::text, ',' order by mtj_jour), " +
+            "string_agg(mtj_max::text, ',' order by mtj_jour) from " + self.tableJour + " where mtj_opest_id = " + str(int(opest_id))):
+            self.erreur = query.lastError().text()
+            return None
+        if not query.next() or not query.value(0):
+            return None
+        return (self.tableau(query.value(0), numpy.int64).astype('datetime64[D]'), self.tableau(query.value(1), float),
+            self.tableau(query.value(2), float), self.tableau(query.value(3), float))
+
+    def serie(self, opest_id, debut = None, fin = None):
+        '''
+        Renvoi les relevés bruts d'un suivi, éventuellement limités à une période
+
+        :param opest_id: identifiant du suivi
+        :type opest_id: int
+
+        :param debut: début de la période (inclus)
+        :type debut: datetime.datetime
+
+        :param fin: fin de la période (exclue)
+        :type fin: datetime.datetime
+
+        :return: (dates, températures), None si aucun relevé n'est stocké
+        :rtype: tuple
+        '''
+        self.erreur = ""
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        # Une seule ligne agrégée par le serveur : les dates sont en secondes depuis le 01/01/1970
+        requete = ("select string_agg(extract(epoch from mth_date)::bigint::text, ',' order by mth_date), " +
+            "string_agg(mth_temperature::text, ',' order by mth_date) from " + self.tableMesure + " where mth_opest_id = ?")
+        if debut is not None:
+            requete += " and mth_date >= ?"
+        if fin is not None:
+            requete += " and mth_date < ?"
+        query.prepare(requete)
+        query.addBindValue(int(opest_id))
+        if debut is not None:
+            query.addBindValue(debut.isoformat())
+        if fin is not None:
+            query.addBindValue(fin.isoformat())
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            return None
+        if not query.next() or not query.value(0):
+            return None
+        return self.tableau(query.value(0), numpy.int64).astype('datetime64[s]'), self.tableau(query.value(1), float)
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+# Ce script permet le positionnement des stations sur le réseau hydrographique (distances, ordre amont / aval)
+# et le calcul de leur bassin versant amont.
+
+# Import des modules Python, PyQt5 et QGIS nécessaire à l'exécution de ce fichier
+import time
+from PyQt5.QtSql import (QSqlQuery)
+from qgis.core import (QgsMessageLog, QgsPointXY)
+
+# Import du graphe du réseau hydrographique
+from .commonSpatial import (Gedopi_reseau)
+
+class Reseau_station():
+    '''
+    Position des stations sur le graphe du réseau hydrographique (table station_reseau).
+
+    Le calcul en masse localise chaque station sur son cours d'eau (sta_ceau_id, à défaut le tracé le plus proche),
+    renseigne la distance à la source et à la confluence (km), le rang de la station depuis la source de son cours d'eau
+    et les intervalles du parcours en profondeur du graphe (voir Gedopi_reseau.intervalles()).
+    Une station S est en amont d'une station X si S est sur la même arête plus près de son début, ou si le noeud aval
+    de l'arête de S est dans l'intervalle du noeud amont de l'arête de X : le test est une comparaison d'entiers,
+    les requêtes " stations en amont / en aval de " sont ainsi de simples filtres SQL.
+    Le calcul est à relancer après une modification des cours d'eau (les numéros d'arêtes changent).
+    La table est créée une fois par data/postgresql/migration_station_reseau.sql, le plugin vérifie seulement sa présence.
+    '''
+    colonnes = ["star_sta_id", "star_ceau_id", "star_arete", "star_decalage", "star_entree", "star_amont_entree", "star_amont_sortie",
+        "star_distance_source", "star_distance_confluence", "star_rang", "star_nb_rang"]
+    # Bases dont la table a été trouvée pendant la session : (hôte, base, schéma)
+    installations = set()
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.table = self.relation("station_reseau")
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def installe(self):
+        '''
+        Vérifie la présence de la table des positions, créée par data/postgresql/migration_station_reseau.sql
+
+        :return: False si la table est absente (voir self.erreur)
+        :rtype: bool
+        '''
+        cle = (self.db.hostName(), self.db.databaseName(), self.dbSchema)
+        if cle in Reseau_station.installations:
+            return True
+        query = QSqlQuery(self.db)
+        query.prepare("select to_regclass(?) is not null")
+        query.addBindValue(self.table)
+        if not query.exec_() or not query.next():
+            self.erreur = query.lastError().text()
+            return False
+        if not query.value(0):
+            self.erreur = u"La table " + self.table + u" n'existe pas, elle est créée par data/postgresql/migration_station_reseau.sql"
+            return False
+        Reseau_station.installations.add(cle)
+        return True
+
+    def calcule(self, tout = False):
+        '''
+        Positionne toutes les stations et met à jour station_reseau et sta_distance_source en une transaction
+
+        :param tout: True pour remplacer aussi les distances à la source déjà renseignées (saisies à la main)
+        :type tout: bool
+
+        :return: nombre de stations positionnées, None en cas d'échec (voir self.erreur)
+        :rtype: int
+        '''
+        self.erreur = ""
+        debut = time.time()
+        if not self.installe():
+            return None
+        reseau = Gedopi_reseau.ouvrir(self.db, self.dbSchema)
+        if reseau is None:
+            self.erreur = Gedopi_reseau.derniereErreur
+            return None
+        reseau.intervalles()
+
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if not query.exec_("select sta_id, sta_ceau_id, ST_X(sta_geom), ST_Y(sta_geom) from " + self.relation("station") +
+            " where sta_geom is not null order by sta_id"):
+            self.erreur = query.lastError().text()
+            return None
+        lignes = []
+        while query.next():
+            point = QgsPointXY(float(query.value(2)), float(query.value(3)))
+            ceau_id = query.value(1)
+            position = None
+            if ceau_id is not None and str(ceau_id) != "NULL":
+                position = reseau.localise(point, int(ceau_id))
+            if position is None:
+                position = reseau.localise(point)
+            if position is None:
+                continue
+            arete, decalage = position[0], position[1]
+            partie, distance, longueur = reseau.positionPartie(arete, decalage)
+            lignes.append({"star_sta_id": int(query.value(0)), "star_ceau_id": int(reseau.ceauPartie[partie]), "star_arete": arete,
+                "star_decalage": decalage, "star_entree": int(reseau.entree[reseau.areteB[arete]]),
+                "star_amont_entree": int(reseau.entree[reseau.areteA[arete]]), "star_amont_sortie": int(reseau.sortie[reseau.areteA[arete]]),
+                "star_distance_source": round(distance / 1000, 3), "star_distance_confluence": round((longueur - distance) / 1000, 3)})
+
+        # Rang de chaque station depuis la source de son cours d'eau
+        parCeau = {}
+        for ligne in lignes:
+            parCeau.setdefault(ligne["star_ceau_id"], []).append(ligne)
+        for stations in parCeau.values():
+            stations.sort(key = lambda ligne: ligne["star_distance_source"])
+            for rang, ligne in enumerate(stations):
+                ligne["star_rang"] = rang + 1
+                ligne["star_nb_rang"] = len(stations)
+
+        self.db.transaction()
+        if not query.exec_("delete from " + self.table):
+            self.erreur = query.lastError().text()
+            self.db.rollback()
+            return None
+        if len(lignes) > 0:
+            query.prepare("insert into " + self.table + " (" + ", ".join(self.colonnes) + ") values " +
+                ", ".join(["(" + ", ".join(["?"] * len(self.colonnes)) + ")"] * len(lignes)))
+            for ligne in lignes:
+                for colonne in self.colonnes:
+                    query.addBindValue(ligne[colonne])
+            if not query.exec_():
+                self.erreur = query.lastError().text()
+                self.db.rollback()
+                return None
+            # Seules les distances non renseignées sont écrites, sauf demande explicite
+            miseAJour = ("update " + self.relation("station") + " set sta_distance_source = star_distance_source from " + self.table +
+                " where sta_id = star_sta_id")
+            if not tout:
+                miseAJour += " and sta_distance_source is null"
+            if not query.exec_(miseAJour):
+                self.erreur = query.lastError().text()
+                self.db.rollback()
+                return None
+        self.db.commit()
+        QgsMessageLog.logMessage(str(len(lignes)) + u" stations positionnées sur le réseau hydrographique (" +
+            str(round(time.time() - debut, 1)) + " s)", "Gedopi")
+        return len(lignes)
+
+    def sousRequete(self, sta_id, sens):
+        '''
+        Renvoi la requête des stations situées en amont ou en aval d'une station
+
+        :param sta_id: identifiant de la station de référence
+        :type sta_id: int
+
+        :param sens: "amont" ou "aval"
+        :type sens: str
+
+        :return: requête SQL renvoyant les sta_id
+        :rtype: str
+        '''
+        if sens == "amont":
+            condition = ("(s.star_arete = x.star_arete and s.star_decalage < x.star_decalage) or " +
+                "(s.star_entree >= x.star_amont_entree and s.star_entree < x.star_amont_sortie)")
+        else:
+            condition = ("(s.star_arete = x.star_arete and s.star_decalage > x.star_decalage) or " +
+                "(x.star_entree >= s.star_amont_entree and x.star_entree < s.star_amont_sortie)")
+        return ("select s.star_sta_id from " + self.table + " as s, " + self.table + " as x where x.star_sta_id = " + str(int(sta_id)) +
+            " and s.star_sta_id <> x.star_sta_id and (" + condition + ")")
+
+    def fiche(self, sta_id):
+        '''
+        Renvoi la position d'une station pour la fiche station
+
+        :param sta_id: identifiant de la station
+        :type sta_id: int
+
+        :return: {distance_confluence, rang, nb_rang, amont, aval} (amont et aval : noms des stations),
+                None si la station n'est pas positionnée
+        :rtype: dict
+        '''
+        query = QSqlQuery(self.db)
+        if not query.exec_("select star_distance_confluence, star_rang, star_nb_rang from " + self.table +
+            " where star_sta_id = " + str(int(sta_id))) or not query.next():
+            return None
+        resultat = {"distance_confluence": query.value(0), "rang": query.value(1), "nb_rang": query.value(2)}
+        for sens in ["amont", "aval"]:
+            resultat[sens] = []
+            if query.exec_("select sta_nom from " + self.relation("station") + " where sta_id in (" + self.sousRequete(sta_id, sens) +
+                ") order by sta_nom"):
+                while query.next():
+                    resultat[sens].append(str(query.value(0)))
+        return resultat
+
+    def texteFiche(self, sta_id):
+        '''
+        Renvoi le résumé affiché dans la fiche station
+
+        :return: (distance à la confluence, texte de position), ("", message) si la station n'est pas positionnée
+        :rtype: tuple
+        '''
+        fiche = self.fiche(sta_id)
+        if fiche is None:
+            return "", u"Station non positionnée (lancer le calcul des positions sur le réseau)"
+        texte = (u"Rang " + str(fiche["rang"]) + " / " + str(fiche["nb_rang"]) + u" depuis la source - " +
+            str(len(fiche["amont"])) + u" station(s) en amont, " + str(len(fiche["aval"])) + u" en aval")
+        if len(fiche["amont"]) > 0:
+            texte += u" - amont : " + ", ".join(fiche["amont"][:10]) + (u"..." if len(fiche["amont"]) > 10 else "")
+        return str(fiche["distance_confluence"]), texte
+
+class Bassin_station():
+    '''
+    Surface du bassin versant amont des stations (sta_surf_bv_amont), contour enregistré en option dans station_bassin.
+
+    L'exutoire de chaque station est son point aval (sta_xl93_aval, sta_yl93_aval, à défaut sta_geom) ; la surface est lue
+    dans la grille d'accumulation du MNT (voir Gedopi_bassin), le contour n'est construit que s'il est demandé.
+    La table des contours est créée une fois par data/postgresql/migration_station_bassin.sql.
+    '''
+    # Bases dont la table a été trouvée pendant la session : (hôte, base, schéma)
+    installations = set()
+
+    def __init__(self, db, dbSchema):
+        '''
+        Constructeur
+
+        :param db: connexion à la base de données du formulaire
+        :type db: QSqlDatabase
+
+        :param dbSchema: nom du schéma sous PostgreSQL contenant les données (data)
+        :type dbSchema: str
+        '''
+        self.db = db
+        self.dbSchema = dbSchema
+        self.erreur = ""
+        self.table = self.relation("station_bassin")
+
+    def relation(self, table):
+        '''Renvoi le nom de la table préfixé du schéma'''
+
+        if self.dbSchema:
+            return self.dbSchema + "." + table
+        return table
+
+    def installe(self):
+        '''
+        Vérifie la présence de la table des contours, créée par data/postgresql/migration_station_bassin.sql
+
+        :return: False si la table est absente (voir self.erreur)
+        :rtype: bool
+        '''
+        cle = (self.db.hostName(), self.db.databaseName(), self.dbSchema)
+        if cle in Bassin_station.installations:
+            return True
+        query = QSqlQuery(self.db)
+        query.prepare("select to_regclass(?) is not null")
+        query.addBindValue(self.table)
+        if not query.exec_() or not query.next():
+            self.erreur = query.lastError().text()
+            return False
+        if not query.value(0):
+            self.erreur = u"La table " + self.table + u" n'existe pas, elle est créée par data/postgresql/migration_station_bassin.sql"
+            return False
+        Bassin_station.installations.add(cle)
+        return True
+
+    def calcule(self, bassin, tout = False, contours = False, ids = None):
+        '''
+        Calcule la surface du bassin versant amont des stations et l'écrit en une transaction
+
+        :param bassin: grille des écoulements ouverte par Gedopi_bassin.ouvrir()
+        :type bassin: Gedopi_bassin
+
+        :param tout: True pour recalculer aussi les surfaces déjà renseignées
+        :type tout: bool
+
+        :param contours: True pour enregistrer aussi le contour des bassins dans station_bassin
+        :type contours: bool
+
+        :param ids: identifiants des stations à traiter, None pour toutes
+        :type ids: list
+
+        :return: nombre de surfaces écrites, None en cas d'échec (voir self.erreur)
+        :rtype: int
+        '''
+        self.erreur = ""
+        debut = time.time()
+        if contours and not self.installe():
+            return None
+        filtre = "sta_geom is not null"
+        if not tout:
+            filtre += " and sta_surf_bv_amont is null"
+        if ids is not None:
+            if len(ids) == 0:
+                return 0
+            filtre += " and sta_id in (" + ",".join(str(int(id)) for id in ids) + ")"
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if not query.exec_("select sta_id, coalesce(sta_xl93_aval, ST_X(sta_geom)), coalesce(sta_yl93_aval, ST_Y(sta_geom)) from " +
+            self.relation("station") + " where " + filtre + " order by sta_id"):
+            self.erreur = query.lastError().text()
+            return None
+        surfaces = []
+        geometries = []
+        while query.next():
+            x, y = float(query.value(1)), float(query.value(2))
+            if contours:
+                resultat = bassin.bassin(x, y)
+                if resultat is None:
+                    continue
+                surfaces.append((int(query.value(0)), round(resultat[0], 2)))
+                geometries.append(resultat[1].asWkt(1))
+            else:
+                surface = bassin.surface(x, y)
+                if surface is None:
+                    continue
+                surfaces.append((int(query.value(0)), round(surface, 2)))
+        if len(surfaces) == 0:
+            return 0
+
+        self.db.transaction()
+        query.prepare("update " + self.relation("station") + " set sta_surf_bv_amont = calcul.valeur from (values " +
+            ", ".join(["(?::integer, ?::numeric)"] * len(surfaces)) + ") as calcul (id, valeur) where sta_id = calcul.id")
+        for id, surface in surfaces:
+            query.addBindValue(id)
+            query.addBindValue(surface)
+        if not query.exec_():
+            self.erreur = query.lastError().text()
+            self.db.rollback()
+            return None
+        if contours:
+            query.prepare("insert into " + self.table + " (stab_sta_id, stab_surface, stab_geom) values " +
+                ", ".join(["(?, ?, ST_Multi(ST_GeomFromText(?, 2154)))"] * len(geometries)) +
+                " on conflict (stab_sta_id) do update set stab_surface = excluded.stab_surface, stab_geom = excluded.stab_geom")
+            for (id, surface), wkt in zip(surfaces, geometries):
+                query.addBindValue(id)
+                query.addBindValue(surface)
+                query.addBindValue(wkt)
+            if not query.exec_():
+                self.erreur = query.lastError().text()
+                self.db.rollback()
+                return None
+        self.db.commit()
+        QgsMessageLog.logMessage(str(len(surfaces)) + u" surface(s) de bassin versant calculée(s) (" +
+            str(round(time.time() - debut, 1)) + " s)", "Gedopi")
+        return len(surfaces)